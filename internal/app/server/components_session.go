@@ -4,6 +4,7 @@ import (
 	"context"
 	"fmt"
 	"net"
+	"strconv"
 	"time"
 	corelog "tunnox-core/internal/core/log"
 
@@ -223,15 +224,22 @@ func (c *HandlersComponent) Initialize(ctx context.Context, deps *Dependencies)
 		deps.SessionMgr.SetTunnelRoutingTable(tunnelRouting)
 
 		// 注册节点地址到 Redis（用于跨节点转发）
-		// 通过 UDP 探测获取本机出口 IP（不依赖外部服务）
-		nodeHost := getLocalOutboundIP()
-		if nodeHost == "" {
-			nodeHost = deps.NodeID
-			corelog.Warnf("Failed to detect local IP, using nodeID as fallback: %s", nodeHost)
+		// 优先使用配置的 cross_node.addr（CROSS_NODE_ADDR，同机多节点或经过代理时指定完整地址），
+		// 否则通过 UDP 探测获取本机出口 IP（不依赖外部服务）
+		crossNodePort := deps.Config.CrossNode.Port
+		nodeAddr := deps.Config.CrossNode.Addr
+		if nodeAddr != "" {
+			corelog.Infof("Cross-node address from config: %s", nodeAddr)
 		} else {
-			corelog.Infof("Detected local outbound IP: %s", nodeHost)
+			nodeHost := getLocalOutboundIP()
+			if nodeHost == "" {
+				nodeHost = deps.NodeID
+				corelog.Warnf("Failed to detect local IP, using nodeID as fallback: %s", nodeHost)
+			} else {
+				corelog.Infof("Detected local outbound IP: %s", nodeHost)
+			}
+			nodeAddr = net.JoinHostPort(nodeHost, strconv.Itoa(crossNodePort))
 		}
-		nodeAddr := fmt.Sprintf("%s:50052", nodeHost)
 		if err := tunnelRouting.RegisterNodeAddress(deps.NodeID, nodeAddr); err != nil {
 			corelog.Warnf("Failed to register node address: %v", err)
 		} else {
@@ -266,6 +274,8 @@ func (c *HandlersComponent) Initialize(ctx context.Context, deps *Dependencies)
 
 		// ✅ 创建并注入 CrossNodePool（跨节点连接池）- 保留用于兼容
 		crossNodePoolConfig := session.DefaultCrossNodePoolConfig()
+		// 存储中没有对端地址时按本节点的端口拨号（集群内各节点使用相同端口）
+		crossNodePoolConfig.NodePort = crossNodePort
 		crossNodePool := session.NewCrossNodePool(ctx, deps.Storage, deps.NodeID, crossNodePoolConfig)
 		deps.SessionMgr.SetCrossNodePool(crossNodePool)
 		corelog.Infof("CrossNodePool initialized for node %s", deps.NodeID)
@@ -280,12 +290,12 @@ func (c *HandlersComponent) Initialize(ctx context.Context, deps *Dependencies)
 		corelog.Infof("TunnelConnectionManager initialized for node %s (dedicated connection model)", deps.NodeID)
 
 		// ✅ 创建并启动 CrossNodeListener（跨节点连接监听器）
-		crossNodeListener := session.NewCrossNodeListener(deps.SessionMgr, 50052)
+		crossNodeListener := session.NewCrossNodeListener(deps.SessionMgr, crossNodePort)
 		if err := crossNodeListener.Start(ctx); err != nil {
 			corelog.Warnf("Failed to start CrossNodeListener: %v", err)
 		} else {
 			deps.SessionMgr.SetCrossNodeListener(crossNodeListener)
-			corelog.Infof("CrossNodeListener started on port 50052 for node %s", deps.NodeID)
+			corelog.Infof("CrossNodeListener started on port %d for node %s", crossNodePort, deps.NodeID)
 		}
 	}
 
@@ -9,6 +9,7 @@ import (
 	"tunnox-core/internal/constants"
 	coreerrors "tunnox-core/internal/core/errors"
 	corelog "tunnox-core/internal/core/log"
+	"tunnox-core/internal/protocol/session"
 	"tunnox-core/internal/utils"
 
 	"gopkg.in/yaml.v3"
@@ -112,6 +113,15 @@ type SecurityConfig struct {
 	SecretKeyMasterKey   string `yaml:"secretkey_master_key"`   // SecretKey AES-256 主密钥（Base64编码，32字节），为空时自动生成
 }
 
+// DefaultCrossNodePort 跨节点转发监听端口的默认值（cross_node.port）
+const DefaultCrossNodePort = session.DefaultCrossNodePort
+
+// CrossNodeConfig 跨节点转发配置（集群模式）
+type CrossNodeConfig struct {
+	Port int    `yaml:"port"` // 跨节点转发监听端口，默认 50052
+	Addr string `yaml:"addr"` // 注册到路由表的地址 host:port，为空时使用出口 IP:Port（同机多节点或经代理时指定）
+}
+
 // Config 应用配置
 type Config struct {
 	Server      ServerConfig      `yaml:"server"`
@@ -123,6 +133,7 @@ type Config struct {
 	Postgres    PostgresConfig    `yaml:"postgres"`
 	Platform    PlatformConfig    `yaml:"platform"`
 	Security    SecurityConfig    `yaml:"security"`
+	CrossNode   CrossNodeConfig   `yaml:"cross_node"`
 }
 
 // LoadConfig 加载配置文件
@@ -304,6 +315,14 @@ func ValidateConfig(config *Config) error {
 		config.Platform.Timeout = 10
 	}
 
+	// 验证 CrossNode 配置
+	if config.CrossNode.Port <= 0 {
+		config.CrossNode.Port = DefaultCrossNodePort
+	}
+	if config.CrossNode.Port > 65535 {
+		return coreerrors.Newf(coreerrors.CodeConfigError, "cross_node.port out of range: %d", config.CrossNode.Port)
+	}
+
 	// 验证 Security 配置
 	if config.Security.ReconnectTokenSecret == "" {
 		// 未配置密钥时自动生成随机密钥
@@ -435,6 +454,9 @@ func GetDefaultConfig() *Config {
 			ReconnectTokenSecret: "", // 为空时自动生成
 			ReconnectTokenTTL:    30,
 		},
+		CrossNode: CrossNodeConfig{
+			Port: DefaultCrossNodePort,
+		},
 	}
 }
 
@@ -3,6 +3,9 @@ package server
 import (
 	"os"
 	"strconv"
+	"strings"
+
+	corelog "tunnox-core/internal/core/log"
 )
 
 // ApplyEnvOverrides 应用环境变量覆盖配置
@@ -131,4 +134,25 @@ func ApplyEnvOverrides(config *Config) {
 	if v := os.Getenv("MANAGEMENT_PPROF_ENABLED"); v != "" {
 		config.Management.PProf.Enabled = (v == "true" || v == "1")
 	}
+
+	// 跨节点转发配置（同机启动多个节点时各自指定端口和注册地址）
+	if v := os.Getenv("CROSS_NODE_PORT"); v != "" {
+		if port, ok := parsePort(v); ok {
+			config.CrossNode.Port = port
+		} else {
+			corelog.Warnf("Invalid CROSS_NODE_PORT %q, keeping %d", v, config.CrossNode.Port)
+		}
+	}
+	if v := os.Getenv("CROSS_NODE_ADDR"); v != "" {
+		config.CrossNode.Addr = v
+	}
+}
+
+// parsePort 解析端口号，只接受 1-65535
+func parsePort(v string) (int, bool) {
+	port, err := strconv.Atoi(strings.TrimSpace(v))
+	if err != nil || port <= 0 || port > 65535 {
+		return 0, false
+	}
+	return port, true
 }
@@ -188,3 +188,67 @@ func TestValidateConfig(t *testing.T) {
 		t.Error("Expected error for invalid Storage config")
 	}
 }
+
+// TestParsePort 测试端口解析
+func TestParsePort(t *testing.T) {
+	tests := []struct {
+		name   string
+		input  string
+		want   int
+		wantOK bool
+	}{
+		{name: "默认端口", input: "50052", want: 50052, wantOK: true},
+		{name: "最小端口", input: "1", want: 1, wantOK: true},
+		{name: "最大端口", input: "65535", want: 65535, wantOK: true},
+		{name: "两端空白", input: " 51000 ", want: 51000, wantOK: true},
+		{name: "零", input: "0", wantOK: false},
+		{name: "负数", input: "-1", wantOK: false},
+		{name: "超出范围", input: "65536", wantOK: false},
+		{name: "非数字", input: "abc", wantOK: false},
+		{name: "带主机名", input: "127.0.0.1:50052", wantOK: false},
+		{name: "空字符串", input: "", wantOK: false},
+	}
+
+	for _, tt := range tests {
+		t.Run(tt.name, func(t *testing.T) {
+			got, ok := parsePort(tt.input)
+			if ok != tt.wantOK {
+				t.Fatalf("parsePort(%q) ok = %v, want %v", tt.input, ok, tt.wantOK)
+			}
+			if ok && got != tt.want {
+				t.Errorf("parsePort(%q) = %d, want %d", tt.input, got, tt.want)
+			}
+		})
+	}
+}
+
+// TestApplyEnvOverridesCrossNode 测试跨节点配置的环境变量覆盖
+func TestApplyEnvOverridesCrossNode(t *testing.T) {
+	tests := []struct {
+		name     string
+		port     string
+		addr     string
+		wantPort int
+		wantAddr string
+	}{
+		{name: "未设置", wantPort: DefaultCrossNodePort},
+		{name: "指定端口", port: "51001", wantPort: 51001},
+		{name: "无效端口保留原值", port: "70000", wantPort: DefaultCrossNodePort},
+		{name: "指定地址", port: "51002", addr: "127.0.0.1:41002", wantPort: 51002, wantAddr: "127.0.0.1:41002"},
+	}
+
+	for _, tt := range tests {
+		t.Run(tt.name, func(t *testing.T) {
+			t.Setenv("CROSS_NODE_PORT", tt.port)
+			t.Setenv("CROSS_NODE_ADDR", tt.addr)
+			config := GetDefaultConfig()
+			ApplyEnvOverrides(config)
+			if config.CrossNode.Port != tt.wantPort {
+				t.Errorf("CrossNode.Port = %d, want %d", config.CrossNode.Port, tt.wantPort)
+			}
+			if config.CrossNode.Addr != tt.wantAddr {
+				t.Errorf("CrossNode.Addr = %q, want %q", config.CrossNode.Addr, tt.wantAddr)
+			}
+		})
+	}
+}
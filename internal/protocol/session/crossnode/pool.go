@@ -4,6 +4,8 @@ package crossnode
 import (
 	"context"
 	"fmt"
+	"net"
+	"strconv"
 	"sync"
 	"sync/atomic"
 	"time"
@@ -14,12 +16,16 @@ import (
 	"tunnox-core/internal/core/storage"
 )
 
+// DefaultPort 跨节点转发监听端口的默认值
+const DefaultPort = 50052
+
 // PoolConfig 跨节点连接池配置
 type PoolConfig struct {
 	MinConns    int           `json:"min_conns"`    // 每节点最小连接数，默认 2
 	MaxConns    int           `json:"max_conns"`    // 每节点最大连接数，默认 10
 	IdleTimeout time.Duration `json:"idle_timeout"` // 空闲连接超时，默认 5 分钟
 	DialTimeout time.Duration `json:"dial_timeout"` // 建立连接超时，默认 5 秒
+	NodePort    int           `json:"node_port"`    // 存储中没有节点地址时拨号使用的端口，默认 DefaultPort
 }
 
 // DefaultPoolConfig 返回默认配置
@@ -29,6 +35,7 @@ func DefaultPoolConfig() PoolConfig {
 		MaxConns:    100,              // 支持高并发（每个隧道复用连接）
 		IdleTimeout: 10 * time.Minute, // 减少频繁重建
 		DialTimeout: 5 * time.Second,
+		NodePort:    DefaultPort,
 	}
 }
 
@@ -207,21 +214,30 @@ func (p *Pool) getOrCreateNodePool(nodeID string) (*NodeConnectionPool, error) {
 	return nodePool, nil
 }
 
+// fallbackAddress 存储中没有节点地址时的回退地址：节点 ID 作为主机名，端口为 NodePort
+func (p *Pool) fallbackAddress(nodeID string) string {
+	port := p.config.NodePort
+	if port <= 0 {
+		port = DefaultPort
+	}
+	return net.JoinHostPort(nodeID, strconv.Itoa(port))
+}
+
 // getNodeAddress 获取节点地址
 func (p *Pool) getNodeAddress(nodeID string) (string, error) {
 	if p.storage == nil {
-		// 默认使用节点 ID 作为主机名，跨节点 TCP 端口为 50052
-		corelog.Warnf("CrossNodePool.getNodeAddress: storage is nil, using fallback address %s:50052", nodeID)
-		return fmt.Sprintf("%s:50052", nodeID), nil
+		addr := p.fallbackAddress(nodeID)
+		corelog.Warnf("CrossNodePool.getNodeAddress: storage is nil, using fallback address %s", addr)
+		return addr, nil
 	}
 
 	key := fmt.Sprintf("tunnox:node:%s:addr", nodeID)
 	value, err := p.storage.Get(key)
 	if err != nil {
 		if err == storage.ErrKeyNotFound {
-			// 默认使用节点 ID 作为主机名
-			corelog.Warnf("CrossNodePool.getNodeAddress: key %s not found in storage, using fallback address %s:50052", key, nodeID)
-			return fmt.Sprintf("%s:50052", nodeID), nil
+			addr := p.fallbackAddress(nodeID)
+			corelog.Warnf("CrossNodePool.getNodeAddress: key %s not found in storage, using fallback address %s", key, addr)
+			return addr, nil
 		}
 		corelog.Errorf("CrossNodePool.getNodeAddress: failed to get key %s: %v", key, err)
 		return "", err
@@ -237,7 +253,7 @@ func (p *Pool) getNodeAddress(nodeID string) (string, error) {
 		return addr, nil
 	default:
 		corelog.Warnf("CrossNodePool.getNodeAddress: unexpected value type %T for key %s, using fallback", value, key)
-		return fmt.Sprintf("%s:50052", nodeID), nil
+		return p.fallbackAddress(nodeID), nil
 	}
 }
 
@@ -0,0 +1,29 @@
+package crossnode
+
+import "testing"
+
+func TestPoolFallbackAddress(t *testing.T) {
+	tests := []struct {
+		name     string
+		nodePort int
+		want     string
+	}{
+		{"default port", DefaultPort, "node-b:50052"},
+		{"configured port", 51002, "node-b:51002"},
+		{"unset port uses default", 0, "node-b:50052"},
+	}
+
+	for _, tt := range tests {
+		t.Run(tt.name, func(t *testing.T) {
+			p := &Pool{config: PoolConfig{NodePort: tt.nodePort}}
+			// storage 为空时直接使用回退地址
+			got, err := p.getNodeAddress("node-b")
+			if err != nil {
+				t.Fatalf("getNodeAddress returned error: %v", err)
+			}
+			if got != tt.want {
+				t.Errorf("getNodeAddress = %q, want %q", got, tt.want)
+			}
+		})
+	}
+}
@@ -71,6 +71,9 @@ const (
 	// 帧大小常量
 	FrameHeaderSize = crossnode.FrameHeaderSize
 	MaxFrameSize    = crossnode.MaxFrameSize
+
+	// 跨节点转发监听端口的默认值
+	DefaultCrossNodePort = crossnode.DefaultPort
 )
 
 // ============================================================================
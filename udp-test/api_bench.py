@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+Management API 延迟与数据规模
+
+逐级把数据集（用户、客户端、映射）扩充到指定对象数（默认 1k、10k、100k、1M），
+每级用一组 keep-alive 连接测量列表类接口的延迟：
+
+- clients:        GET /tunnox/clients
+- mappings:       GET /tunnox/mappings
+- user_mappings:  GET /tunnox/users/{id}/mappings（随机用户）
+- traffic:        GET /tunnox/stats/traffic
+
+每个接口按 log(p50) 对 log(对象数) 拟合得到规模指数：1 表示与数据量线性相关，
+0 表示与数据量无关。指数超过 --max-exponent（默认 1.2）的接口视为超线性，
+测试失败，这是规模指数唯一的判定；指数同时写入结果库，仅供参考，与基线比较时不判定回归。
+
+延迟随规模的曲线输出到终端表格，并写成 SVG 图（--plot）。
+
+用法:
+    ./api_bench.py --local
+    ./api_bench.py --local --sizes 1k,10k,100k --requests 500 --plot api.svg
+    ./api_bench.py --target 127.0.0.1:9000 --token $TOKEN --sizes 1k,10k
+"""
+
+import argparse
+import http.client
+import json
+import math
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from common import (
+    CONFIG_FILE, log_info, log_success, log_warning, log_error, log_header, load_config, parse_address,
+)
+from histogram import LatencyHistogram
+from seed_data import Checkpoint, Shape, format_count, parse_count, seed
+
+DEFAULT_SIZES = ("1k", "10k", "100k", "1m")
+# 每个用户 4 个客户端、每个客户端 1 条映射：1 + 4 + 4 = 9 个对象
+CLIENTS_PER_USER = 4
+MAPPINGS_PER_CLIENT = 1
+ENDPOINTS = ("clients", "mappings", "user_mappings", "traffic")
+
+class APIConnection:
+    """一条到 Management API 的 keep-alive 连接，出错后下次请求时重连"""
+
+    def __init__(self, address, token, timeout):
+        self.address = address
+        self.token = token
+        self.timeout = timeout
+        self.conn = None
+        self.opened = 0
+
+    def request(self, method, path, body=None):
+        """返回 (status, 响应体)"""
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(*self.address, timeout=self.timeout)
+            self.opened += 1
+        headers = {"Connection": "keep-alive"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers["Content-Type"] = "application/json"
+        try:
+            self.conn.request(method, path, body=data, headers=headers)
+            resp = self.conn.getresponse()
+            payload = resp.read()
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+        if resp.will_close:
+            self.close()
+        return resp.status, payload
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+        self.conn = None
+
+class ConnectionPool:
+    """每个线程一条 keep-alive 连接"""
+
+    def __init__(self, address, token, timeout=60):
+        self.address = address
+        self.token = token
+        self.timeout = timeout
+        self.local = threading.local()
+        self.connections = []
+        self.lock = threading.Lock()
+
+    def get(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = APIConnection(self.address, self.token, self.timeout)
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+
+    def close(self):
+        for conn in self.connections:
+            conn.close()
+
+# ---------- 数据集 ----------
+
+class Dataset:
+    """按固定形状扩充数据集（seed_data.py 的流水线灌数），记录已创建的用户"""
+
+    def __init__(self, address, token, seed, seed_args):
+        self.address = address
+        self.token = token
+        self.shape = Shape(seed, CLIENTS_PER_USER, MAPPINGS_PER_CLIENT, prefix="bench")
+        self.seed_args = seed_args
+        self.checkpoint = Checkpoint(None, None)
+        self.rng = random.Random(seed)
+        self.user_ids = []
+        self.next_index = 0
+
+    @property
+    def objects(self):
+        return len(self.user_ids) * self.shape.objects_per_user
+
+    def grow_to(self, objects):
+        """扩充到至少 objects 个对象，返回灌数结果（无需扩充时为 None）"""
+        target_users = -(-objects // self.shape.objects_per_user)
+        if target_users <= self.next_index:
+            return None
+        log_info(f"扩充数据集到 {format_count(objects)} 个对象（+{target_users - self.next_index} 个用户）...")
+        result = seed(self.address, self.token, self.shape, target_users, self.seed_args,
+                      self.checkpoint, start_index=self.next_index)
+        self.next_index = target_users
+        self.user_ids = [e["user"] for e in self.checkpoint.done.values()]
+        log_success(f"新增 {result['objects']} 个对象，耗时 {result['seconds']:.1f}s"
+                    f"（{result['objects_rate_per_s']:.0f} 个/秒）")
+        if result["users_failed"]:
+            log_warning(f"{result['users_failed']} 个用户创建失败")
+        return result
+
+    def endpoint_path(self, name):
+        if name == "clients":
+            return "/tunnox/clients"
+        if name == "mappings":
+            return "/tunnox/mappings"
+        if name == "user_mappings":
+            return f"/tunnox/users/{self.rng.choice(self.user_ids)}/mappings"
+        if name == "traffic":
+            return "/tunnox/stats/traffic?range=1h"
+        raise ValueError(f"未知接口: {name}")
+
+# ---------- 测量 ----------
+
+def measure_endpoint(pool, dataset, name, requests, connections, max_seconds):
+    """用 connections 条连接并发请求，直到完成 requests 次或超过 max_seconds"""
+    hist = LatencyHistogram()
+    statuses = Counter()
+    errors = Counter()
+    total_bytes = [0]
+    remaining = [requests]
+    lock = threading.Lock()
+    deadline = time.monotonic() + max_seconds
+
+    def worker():
+        api = pool.get()
+        with lock:
+            path = dataset.endpoint_path(name)
+        # 预热：建立连接，不计入统计
+        try:
+            api.request("GET", path)
+        except (OSError, http.client.HTTPException):
+            pass
+        while time.monotonic() < deadline:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+                path = dataset.endpoint_path(name)
+            start = time.perf_counter_ns()
+            try:
+                status, body = api.request("GET", path)
+            except (OSError, http.client.HTTPException) as e:
+                with lock:
+                    errors[type(e).__name__] += 1
+                continue
+            with lock:
+                hist.record_since(start)
+                statuses[status] += 1
+                total_bytes[0] += len(body)
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(connections)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - start
+    done = sum(statuses.values())
+    failed = done - statuses.get(200, 0) + sum(errors.values())
+    return {
+        "name": name,
+        "requests": done,
+        "qps": done / elapsed if elapsed > 0 else 0.0,
+        "error_rate": failed / (done + sum(errors.values())) if done + sum(errors.values()) else 0.0,
+        "response_bytes": total_bytes[0] / done if done else 0,
+        "latency_ms": hist.summary_ms(),
+        "latency_histogram": hist.encode(),
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "errors": dict(errors),
+    }
+
+def scaling_exponent(points):
+    """对 [(对象数, 延迟)] 做 log-log 最小二乘，返回斜率"""
+    points = [(math.log(n), math.log(v)) for n, v in points if n > 0 and v and v > 0]
+    if len(points) < 2:
+        return None
+    mx = sum(x for x, _ in points) / len(points)
+    my = sum(y for _, y in points) / len(points)
+    var = sum((x - mx) ** 2 for x, _ in points)
+    return sum((x - mx) * (y - my) for x, y in points) / var if var else None
+
+def analyze(levels, noise_floor_ms, max_exponent):
+    """每个接口的规模指数：整体拟合值与相邻两级的最大局部值
+
+    两级延迟都低于 noise_floor_ms 时固定开销占主导，不参与局部指数计算。
+    """
+    endpoints = []
+    for name in ENDPOINTS:
+        points = []
+        for level in levels:
+            ep = next((e for e in level["endpoints"] if e["name"] == name), None)
+            if ep and ep["requests"]:
+                points.append((level["objects"], ep["latency_ms"]["p50"]))
+        steps = [scaling_exponent([a, b]) for a, b in zip(points, points[1:])
+                 if max(a[1], b[1]) >= noise_floor_ms]
+        steps = [s for s in steps if s is not None]
+        fitted = scaling_exponent(points)
+        worst = max(steps) if steps else None
+        endpoints.append({
+            "name": name,
+            "scaling_exponent": fitted,
+            "max_step_exponent": worst,
+            "super_linear": any(v is not None and v > max_exponent for v in (fitted, worst)),
+        })
+    return endpoints
+
+def run_levels(address, token, args):
+    pool = ConnectionPool(address, token, timeout=args.timeout)
+    seed_args = argparse.Namespace(connections=args.seed_connections, pipeline=args.seed_pipeline,
+                                   batch=args.seed_pipeline, timeout=args.timeout, progress_interval=10)
+    dataset = Dataset(address, token, args.seed, seed_args)
+    levels = []
+    try:
+        for size in args.sizes:
+            seeded = dataset.grow_to(size)
+            level = {
+                "name": f"n{format_count(size)}",
+                "objects": dataset.objects,
+                "users": len(dataset.user_ids),
+                "seed_seconds": seeded["seconds"] if seeded else 0.0,
+                "seed_rate_per_s": seeded["objects_rate_per_s"] if seeded else None,
+                "endpoints": [],
+            }
+            for name in args.endpoints:
+                ep = measure_endpoint(pool, dataset, name, args.requests, args.connections, args.max_seconds)
+                lat = ep["latency_ms"]
+                log_info(f"{level['name']} {name}: p50 {lat.get('p50', 0):.2f}ms  p99 {lat.get('p99', 0):.2f}ms  "
+                         f"{ep['requests']} 次  响应 {ep['response_bytes'] / 1024:.1f}KB")
+                level["endpoints"].append(ep)
+            levels.append(level)
+    finally:
+        pool.close()
+    return {
+        "shape": dataset.shape.to_dict(),
+        "levels": levels,
+        "endpoints": analyze(levels, args.noise_floor_ms, args.max_exponent),
+    }
+
+# ---------- 输出 ----------
+
+def print_report(result):
+    log_header("Management API 延迟与数据规模")
+    levels = result["levels"]
+    header = f"{'接口':<16}" + "".join(f"{format_count(l['objects']):>18}" for l in levels)
+    print(header + f"{'规模指数':>10}{'最大局部':>10}")
+    print(f"{'':<16}" + "".join(f"{'p50 / p99 (ms)':>18}" for _ in levels))
+    for ep in result["endpoints"]:
+        row = f"{ep['name']:<16}"
+        for level in levels:
+            e = next((x for x in level["endpoints"] if x["name"] == ep["name"]), None)
+            if e and e["requests"]:
+                row += f"{e['latency_ms']['p50']:>9.2f} / {e['latency_ms']['p99']:<6.2f}"
+            else:
+                row += f"{'-':>18}"
+        fmt = lambda v: f"{v:.2f}" if v is not None else "-"
+        mark = "  超线性" if ep["super_linear"] else ""
+        print(row + f"{fmt(ep['scaling_exponent']):>10}{fmt(ep['max_step_exponent']):>10}{mark}")
+    rates = [l["seed_rate_per_s"] for l in levels if l["seed_rate_per_s"]]
+    if rates:
+        print(f"\n数据集扩充速度: {min(rates):.0f} - {max(rates):.0f} 个对象/秒")
+
+SVG_COLORS = ("#1f77b4", "#d62728", "#2ca02c", "#ff7f0e", "#9467bd", "#8c564b")
+
+def write_svg(result, path, width=720, height=440):
+    """延迟（p50 实线、p99 虚线）随对象数变化的 log-log 图"""
+    series = []
+    for i, ep in enumerate(result["endpoints"]):
+        p50, p99 = [], []
+        for level in result["levels"]:
+            e = next((x for x in level["endpoints"] if x["name"] == ep["name"]), None)
+            if e and e["requests"]:
+                p50.append((level["objects"], e["latency_ms"]["p50"]))
+                p99.append((level["objects"], e["latency_ms"]["p99"]))
+        if p50:
+            series.append((ep["name"], SVG_COLORS[i % len(SVG_COLORS)], p50, p99))
+    values = [v for _, _, a, b in series for _, v in a + b if v > 0]
+    sizes = [n for _, _, a, _ in series for n, _ in a]
+    if not values:
+        return False
+    left, right, top, bottom = 70, 150, 20, 50
+    x_lo, x_hi = math.floor(math.log10(min(sizes))), math.ceil(math.log10(max(sizes)))
+    y_lo, y_hi = math.floor(math.log10(min(values))), math.ceil(math.log10(max(values)))
+    x_hi, y_hi = max(x_hi, x_lo + 1), max(y_hi, y_lo + 1)
+    sx = lambda n: left + (math.log10(n) - x_lo) / (x_hi - x_lo) * (width - left - right)
+    sy = lambda v: height - bottom - (math.log10(max(v, 10 ** y_lo)) - y_lo) / (y_hi - y_lo) * (height - top - bottom)
+
+    out = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+           f'font-family="sans-serif" font-size="12">',
+           f'<rect width="{width}" height="{height}" fill="white"/>']
+    for e in range(x_lo, x_hi + 1):
+        x = sx(10 ** e)
+        out.append(f'<line x1="{x:.1f}" y1="{top}" x2="{x:.1f}" y2="{height - bottom}" stroke="#ddd"/>')
+        out.append(f'<text x="{x:.1f}" y="{height - bottom + 16}" text-anchor="middle">{format_count(10 ** e)}</text>')
+    for e in range(y_lo, y_hi + 1):
+        y = sy(10 ** e)
+        out.append(f'<line x1="{left}" y1="{y:.1f}" x2="{width - right}" y2="{y:.1f}" stroke="#ddd"/>')
+        out.append(f'<text x="{left - 6}" y="{y + 4:.1f}" text-anchor="end">{10.0 ** e:g}</text>')
+    out.append(f'<text x="{(left + width - right) / 2}" y="{height - 12}" text-anchor="middle">对象数</text>')
+    out.append(f'<text x="16" y="{(top + height - bottom) / 2}" text-anchor="middle" '
+               f'transform="rotate(-90 16 {(top + height - bottom) / 2})">延迟 (ms)</text>')
+    for i, (name, color, p50, p99) in enumerate(series):
+        for points, dash in ((p50, ""), (p99, ' stroke-dasharray="5,4"')):
+            coords = " ".join(f"{sx(n):.1f},{sy(v):.1f}" for n, v in points)
+            out.append(f'<polyline points="{coords}" fill="none" stroke="{color}" stroke-width="2"{dash}/>')
+        for n, v in p50:
+            out.append(f'<circle cx="{sx(n):.1f}" cy="{sy(v):.1f}" r="3" fill="{color}"/>')
+        y = top + 10 + i * 18
+        out.append(f'<line x1="{width - right + 12}" y1="{y}" x2="{width - right + 32}" y2="{y}" '
+                   f'stroke="{color}" stroke-width="2"/>')
+        out.append(f'<text x="{width - right + 38}" y="{y + 4}">{name}</text>')
+    y = top + 10 + len(series) * 18 + 8
+    out.append(f'<text x="{width - right + 12}" y="{y}" fill="#555">实线 p50，虚线 p99</text>')
+    out.append("</svg>")
+    Path(path).write_text("\n".join(out) + "\n", encoding="utf-8")
+    return True
+
+def run_local(config, args):
+    from local_stack import LocalStack
+
+    with LocalStack(config) as stack:
+        stack.prepare()
+        stack.start_server()
+        return run_levels(("127.0.0.1", stack.ports["management"]), stack.api_token, args)
+
+def main():
+    parser = argparse.ArgumentParser(description="Management API 延迟与数据规模")
+    parser.add_argument('--config', default=str(CONFIG_FILE), help='配置文件路径（--local 时读取 local 段）')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--target', help='Management API 地址 host:port（会写入测试数据）')
+    target.add_argument('--local', action='store_true', help='启动本地 server')
+    parser.add_argument('--token', help='--target 模式的 Management API Bearer token')
+    parser.add_argument('--sizes', type=lambda s: sorted(parse_count(x) for x in s.split(",") if x.strip()),
+                        default=[parse_count(s) for s in DEFAULT_SIZES], help='逗号分隔的对象数，如 1k,10k,100k')
+    parser.add_argument('--endpoints', type=lambda s: [x.strip() for x in s.split(",") if x.strip()],
+                        default=list(ENDPOINTS), help=f'逗号分隔的接口（{",".join(ENDPOINTS)}）')
+    parser.add_argument('--requests', type=int, default=200, help='每级每个接口的请求数')
+    parser.add_argument('--max-seconds', type=float, default=30, help='每级每个接口的测量时长上限（秒）')
+    parser.add_argument('--connections', type=int, default=4, help='测量使用的 keep-alive 连接数')
+    parser.add_argument('--seed-connections', type=int, default=16, help='扩充数据集的 keep-alive 连接数')
+    parser.add_argument('--seed-pipeline', type=int, default=16, help='扩充数据集的流水线深度')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子（数据集内容与 user_mappings 选择的用户）')
+    parser.add_argument('--timeout', type=float, default=120, help='单个请求超时（秒）')
+    parser.add_argument('--max-exponent', type=float, default=1.2, help='规模指数上限，超过视为超线性')
+    parser.add_argument('--noise-floor-ms', type=float, default=1.0, help='低于该延迟的相邻两级不计算局部指数')
+    parser.add_argument('--plot', default='api_bench.svg', help='延迟曲线 SVG 输出路径（空字符串表示不输出）')
+    parser.add_argument('--results-db', help='测试结果库路径（默认 ~/tunnox-test/results.db）')
+    parser.add_argument('--no-store', action='store_true', help='不把结果写入结果库')
+    args = parser.parse_args()
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"未知接口: {', '.join(sorted(unknown))}")
+
+    config = {}
+    try:
+        if args.local:
+            config = load_config(args.config) if Path(args.config).exists() else {}
+            result = run_local(config, args)
+        else:
+            result = run_levels(parse_address(args.target), args.token, args)
+    except KeyboardInterrupt:
+        log_error("测试被用户中断")
+        return 130
+
+    print_report(result)
+    if args.plot and write_svg(result, args.plot):
+        log_info(f"延迟曲线已写入 {args.plot}")
+    errors = [f"{l['name']}.{e['name']}" for l in result["levels"] for e in l["endpoints"]
+              if not e["requests"] or e["error_rate"] >= 0.01]
+    super_linear = [e["name"] for e in result["endpoints"] if e["super_linear"]]
+    passed = not errors and not super_linear
+    if not args.no_store:
+        from results_store import DEFAULT_DB, ResultsStore
+        with ResultsStore(args.results_db or DEFAULT_DB) as store:
+            run_id = store.record_run("api", result, config=config, passed=passed)
+        log_info(f"结果已写入结果库 (运行 #{run_id})")
+
+    if errors:
+        log_error(f"请求失败或错误率超过 1%: {', '.join(errors)}")
+    if super_linear:
+        log_error(f"延迟随数据量超线性增长（指数 > {args.max_exponent}）: {', '.join(super_linear)}")
+    if not passed:
+        return 1
+    log_success("Management API 规模测试完成")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+带宽时延积扫描
+
+对 tcp / websocket 两种连接协议，在客户端与 server 之间插入 tcp_bdp_relay.py，
+按 RTT × 瓶颈速率 × 窗口 的组合逐点启动本地栈，经由 TCP 映射向 tcp_sink.py 批量发送，
+输出每个点的有效吞吐（goodput）与理论上限，并画出 链路利用率 - BDP 曲线：
+
+    BDP    = 速率 × RTT
+    理论值 = min(速率, 窗口 / RTT)          窗口为 0 时即速率
+    利用率 = goodput / 速率
+
+两个客户端都经过中继，数据依次经过 listen-client→server（up）和 server→target-client（down）两段链路，
+每段的 RTT 即 --rtts 的取值（单向时延为其一半），两段速率相同，理论值对每段都成立。
+
+窗口模拟长距离链路上 TCP 连接能维持的在途字节数（见 tcp_bdp_relay.py）：
+窗口代表假设的每连接接收窗口，512k 以 cmd/perftest 显式设置的 512KB socket 缓冲区作为参照值，
+0 表示不限制窗口，此时吞吐低于速率说明隧道自身（iocopy 缓冲区、websocket 分帧、单流串行处理）成为瓶颈。
+
+每个点的数据量按 理论值 × --seconds 估算，包含隧道建立和 sink 回执的往返，
+RTT 较大而时长较短时利用率会偏低。
+
+用法:
+    ./bdp_sweep.py
+    ./bdp_sweep.py --rtts 20,75,150 --rates 10,100,500 --windows 512k,0 --seconds 8
+    ./bdp_sweep.py --transports tcp --rtts 150 --rates 100 --windows 256k,512k,2m,0 --streams 4
+"""
+
+import argparse
+import math
+import signal
+import sys
+from pathlib import Path
+
+from api_bench import SVG_COLORS
+from bulk_throughput import run_bulk
+from common import CONFIG_FILE, log_info, log_success, log_warning, log_error, log_header, load_config
+from tcp_bdp_relay import bdp_bytes, format_size, parse_size
+
+TRANSPORTS = ("tcp", "websocket")
+
+def parse_list(cast):
+    def parse(text):
+        try:
+            values = [cast(x) for x in text.split(",") if x.strip()]
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"取值无效: {text}") from None
+        if not values:
+            raise argparse.ArgumentTypeError("列表不能为空")
+        return values
+    return parse
+
+def theory_mbit(rate_mbit, rtt_ms, window):
+    """速率与窗口共同决定的理论吞吐（Mbit/s）"""
+    if not window or not rtt_ms:
+        return rate_mbit
+    return min(rate_mbit, window * 8 / 1e6 / (rtt_ms / 1000))
+
+def run_point(config, args, transport, rtt_ms, rate_mbit, window):
+    """一个扫描点：启动带中继的本地栈、sink 和映射，批量发送后读取中继统计"""
+    from local_stack import LocalStack, find_free_port
+    from readiness import tcp_accept_probe
+
+    link = f"rate={rate_mbit * 1000:g},delay={rtt_ms / 2:g},queue={args.queue:g},window={format_size(window)}"
+    theory = theory_mbit(rate_mbit, rtt_ms, window)
+    size = int(max(theory * 1e6 / 8 * args.seconds / args.streams, 256 * 1024))
+    size = min(size, int(args.max_size_mb * 1024 * 1024))
+
+    stack = LocalStack(config, transport=transport, bdp=link)
+    with stack:
+        stack.start_tunnel()
+        sink_port = find_free_port("tcp")
+        stack.start_service("tcp-sink", "tcp_sink.py", ["--port", sink_port, "--workers", args.sink_workers],
+                            tcp_accept_probe("127.0.0.1", sink_port))
+        listen_port = find_free_port("tcp")
+        stack.create_mapping("bdp-tcp", "tcp", listen_port, "127.0.0.1", sink_port)
+        result = run_bulk("127.0.0.1", listen_port, args.streams, size)
+    relay = stack.bdp_summary or {}
+
+    goodput = result["total_bytes"] * 8 / 1e6 / result["elapsed_seconds"] if result["elapsed_seconds"] else 0.0
+    return {
+        "name": f"{transport}.rtt{rtt_ms:g}.rate{rate_mbit:g}.win{format_size(window)}",
+        "transport": transport,
+        "rtt_ms": rtt_ms,
+        "rate_mbit": rate_mbit,
+        "window": window,
+        "bdp_bytes": bdp_bytes(rate_mbit * 1000, rtt_ms),
+        "theory_mbit": theory,
+        "goodput_mbit": goodput,
+        "throughput_mb_s": result["aggregate_mb_s"],
+        "utilization": goodput / rate_mbit,
+        "of_theory": goodput / theory if theory else None,
+        "window_limited": {d: relay[d]["window_limited"] for d in ("up", "down") if d in relay},
+        "max_queue_ms": {d: relay[d]["max_queue_ms"] for d in ("up", "down") if d in relay},
+        "elapsed_seconds": result["elapsed_seconds"],
+        "failed_streams": result["failed_streams"],
+    }
+
+def run_sweep(config, args):
+    points = []
+    total = len(args.transports) * len(args.rtts) * len(args.rates) * len(args.windows)
+    for transport in args.transports:
+        for rtt in args.rtts:
+            for rate in args.rates:
+                for window in args.windows:
+                    log_header(f"[{len(points) + 1}/{total}] {transport} RTT {rtt:g}ms × {rate:g}Mbit/s "
+                               f"窗口 {format_size(window)}")
+                    points.append(run_point(config, args, transport, rtt, rate, window))
+    return points
+
+def print_report(points):
+    log_header("带宽时延积扫描结果")
+    print(f"{'协议':<11}{'RTT ms':>8}{'Mbit/s':>8}{'窗口':>7}{'BDP':>9}{'理论':>9}{'goodput':>9}"
+          f"{'利用率':>8}{'达理论':>8}{'窗口受限':>9}{'排队 ms':>9}{'失败':>6}")
+    for p in points:
+        limited = p["window_limited"].get("up")
+        queue = p["max_queue_ms"].get("up")
+        print(f"{p['transport']:<11}{p['rtt_ms']:>8g}{p['rate_mbit']:>8g}{format_size(p['window']):>7}"
+              f"{p['bdp_bytes'] / 1024:>8.0f}K{p['theory_mbit']:>9.1f}{p['goodput_mbit']:>9.1f}"
+              f"{p['utilization'] * 100:>7.0f}%"
+              f"{(format(p['of_theory'] * 100, '.0f') + '%') if p['of_theory'] is not None else '-':>8}"
+              f"{(format(limited * 100, '.0f') + '%') if limited is not None else '-':>9}"
+              f"{(format(queue, '.1f')) if queue is not None else '-':>9}{p['failed_streams']:>6}")
+    print("\n理论 = min(速率, 窗口 / RTT)；窗口受限为 up 方向有数据在途、瓶颈队列已空时因窗口耗尽停止读取的时间占比")
+    # 窗口不限时仍达不到理论值的点：瓶颈在隧道自身
+    short = [p for p in points if not p["window"] and p["of_theory"] is not None and p["of_theory"] < 0.8]
+    for p in short:
+        log_warning(f"{p['transport']} RTT {p['rtt_ms']:g}ms × {p['rate_mbit']:g}Mbit/s 不限窗口时只达到理论值的 "
+                    f"{p['of_theory'] * 100:.0f}%（BDP {p['bdp_bytes'] / 1024:.0f}KB）")
+
+def format_si(n):
+    for suffix, scale in (("G", 1e9), ("M", 1e6), ("k", 1e3)):
+        if n >= scale:
+            return f"{n / scale:g}{suffix}"
+    return f"{n:g}"
+
+def write_svg(points, path, width=760, height=460):
+    """链路利用率随 BDP 变化的曲线：每个 协议/窗口 一条线，灰色虚线为窗口决定的理论利用率"""
+    points = [p for p in points if p["bdp_bytes"] > 0]
+    if not points:
+        return False
+    left, right, top, bottom = 70, 170, 20, 50
+    bdps = [p["bdp_bytes"] for p in points]
+    x_lo, x_hi = math.floor(math.log10(min(bdps))), math.ceil(math.log10(max(bdps)))
+    x_hi = max(x_hi, x_lo + 1)
+    y_hi = max(1.0, max(p["utilization"] for p in points))
+    sx = lambda b: left + (math.log10(b) - x_lo) / (x_hi - x_lo) * (width - left - right)
+    sy = lambda u: height - bottom - min(u, y_hi) / y_hi * (height - top - bottom)
+
+    out = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+           f'font-family="sans-serif" font-size="12">',
+           f'<rect width="{width}" height="{height}" fill="white"/>']
+    for e in range(x_lo, x_hi + 1):
+        x = sx(10 ** e)
+        out.append(f'<line x1="{x:.1f}" y1="{top}" x2="{x:.1f}" y2="{height - bottom}" stroke="#ddd"/>')
+        out.append(f'<text x="{x:.1f}" y="{height - bottom + 16}" text-anchor="middle">{format_si(10 ** e)}</text>')
+    for i in range(0, 11, 2):
+        u = y_hi * i / 10
+        y = sy(u)
+        out.append(f'<line x1="{left}" y1="{y:.1f}" x2="{width - right}" y2="{y:.1f}" stroke="#ddd"/>')
+        out.append(f'<text x="{left - 6}" y="{y + 4:.1f}" text-anchor="end">{u * 100:.0f}%</text>')
+    out.append(f'<text x="{(left + width - right) / 2}" y="{height - 12}" text-anchor="middle">BDP（字节，对数坐标）</text>')
+    out.append(f'<text x="16" y="{(top + height - bottom) / 2}" text-anchor="middle" '
+               f'transform="rotate(-90 16 {(top + height - bottom) / 2})">goodput / 瓶颈速率</text>')
+
+    # 理论利用率 min(1, 窗口 / BDP)
+    steps = 60
+    for window in sorted({p["window"] for p in points if p["window"]}):
+        coords = []
+        for i in range(steps + 1):
+            b = 10 ** (x_lo + (x_hi - x_lo) * i / steps)
+            coords.append(f"{sx(b):.1f},{sy(min(1.0, window / b)):.1f}")
+        out.append(f'<polyline points="{" ".join(coords)}" fill="none" stroke="#999" stroke-dasharray="4,4"/>')
+        out.append(f'<text x="{sx(min(max(window, 10 ** x_lo), 10 ** x_hi)) + 4:.1f}" y="{sy(1.0) - 4:.1f}" '
+                   f'fill="#777">{format_size(window)}</text>')
+
+    series = {}
+    for p in points:
+        series.setdefault((p["transport"], p["window"]), []).append(p)
+    for i, ((transport, window), items) in enumerate(sorted(series.items())):
+        color = SVG_COLORS[i % len(SVG_COLORS)]
+        items.sort(key=lambda p: p["bdp_bytes"])
+        coords = " ".join(f"{sx(p['bdp_bytes']):.1f},{sy(p['utilization']):.1f}" for p in items)
+        out.append(f'<polyline points="{coords}" fill="none" stroke="{color}" stroke-width="1.5" opacity="0.6"/>')
+        for p in items:
+            out.append(f'<circle cx="{sx(p["bdp_bytes"]):.1f}" cy="{sy(p["utilization"]):.1f}" r="3.5" fill="{color}">'
+                       f'<title>RTT {p["rtt_ms"]:g}ms × {p["rate_mbit"]:g}Mbit/s: {p["goodput_mbit"]:.1f}Mbit/s</title>'
+                       f'</circle>')
+        y = top + 10 + i * 18
+        out.append(f'<line x1="{width - right + 12}" y1="{y}" x2="{width - right + 32}" y2="{y}" '
+                   f'stroke="{color}" stroke-width="2"/>')
+        out.append(f'<text x="{width - right + 38}" y="{y + 4}">{transport} 窗口 {format_size(window)}</text>')
+    y = top + 10 + len(series) * 18 + 8
+    out.append(f'<text x="{width - right + 12}" y="{y}" fill="#555">虚线：窗口决定的理论值</text>')
+    out.append("</svg>")
+    Path(path).write_text("\n".join(out) + "\n", encoding="utf-8")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="带宽时延积扫描（RTT × 瓶颈速率 × 窗口，tcp / websocket）")
+    parser.add_argument('--config', default=str(CONFIG_FILE), help='配置文件路径（读取 local 段）')
+    parser.add_argument('--transports', type=parse_list(str), default=list(TRANSPORTS),
+                        help='逗号分隔的连接协议（tcp,websocket）')
+    parser.add_argument('--rtts', type=parse_list(float), default=[10.0, 50.0, 150.0],
+                        help='逗号分隔的每段链路 RTT（毫秒）')
+    parser.add_argument('--rates', type=parse_list(float), default=[10.0, 100.0, 500.0],
+                        help='逗号分隔的瓶颈速率（Mbit/s）')
+    parser.add_argument('--windows', type=parse_list(parse_size), default=[512 * 1024, 0],
+                        help='逗号分隔的窗口（如 512k,4m；0 为不限制）')
+    parser.add_argument('--queue', type=float, default=50, help='瓶颈队列长度（毫秒）')
+    parser.add_argument('--streams', type=int, default=1, help='每个点的并发流数量')
+    parser.add_argument('--seconds', type=float, default=6, help='每个点按理论吞吐估算的传输时长（秒）')
+    parser.add_argument('--max-size-mb', type=float, default=512, help='每条流数据量上限（MB）')
+    parser.add_argument('--sink-workers', type=int, default=2, help='tcp_sink 进程数')
+    parser.add_argument('--plot', default='bdp_sweep.svg', help='利用率曲线 SVG 输出路径（空字符串表示不输出）')
+    parser.add_argument('--results-db', help='测试结果库路径（默认 ~/tunnox-test/results.db）')
+    parser.add_argument('--no-store', action='store_true', help='不把结果写入结果库')
+    args = parser.parse_args()
+    unknown = set(args.transports) - set(TRANSPORTS)
+    if unknown:
+        parser.error(f"带宽时延积中继只支持 {', '.join(TRANSPORTS)}: {', '.join(sorted(unknown))}")
+    if any(r <= 0 for r in args.rates) or any(r < 0 for r in args.rtts):
+        parser.error("--rates 必须为正数，--rtts 不能为负数")
+
+    # SIGTERM 与 Ctrl+C 一样走清理流程，保证子进程被回收
+    def _raise_interrupt(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+
+    config = load_config(args.config) if Path(args.config).exists() else {}
+    try:
+        points = run_sweep(config, args)
+    except KeyboardInterrupt:
+        log_error("测试被用户中断")
+        return 130
+    except (RuntimeError, ValueError, FileNotFoundError) as e:
+        log_error(str(e))
+        return 1
+
+    print_report(points)
+    if args.plot and write_svg(points, args.plot):
+        log_info(f"利用率曲线已写入 {args.plot}")
+    failed = sum(p["failed_streams"] for p in points)
+    if not args.no_store:
+        from results_store import DEFAULT_DB, ResultsStore
+        with ResultsStore(args.results_db or DEFAULT_DB) as store:
+            run_id = store.record_run("bdp", {"points": points}, config=config,
+                                      label=f"{'/'.join(args.transports)} ×{args.streams}", passed=failed == 0)
+        log_info(f"结果已写入结果库 (运行 #{run_id})")
+
+    if failed:
+        log_error(f"{failed} 条流失败")
+        return 1
+    log_success("带宽时延积扫描完成")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+基于内容哈希的 Go 二进制构建缓存
+
+对 cmd/、internal/、api/ 下的 Go 源码以及 go.mod/go.sum 计算指纹，
+再叠加目标包、Go 版本、构建环境（GOOS/GOARCH/CGO_ENABLED/GOFLAGS，按目标的环境由 go env 解析）
+和构建参数（-tags、-ldflags）。指纹命中缓存时直接复用产物，
+否则并发编译 server 和 client。
+
+缓存目录: bin/.build-cache/
+- <name>-<指纹前 16 位>       编译产物
+- stat-cache.json              文件 (size, mtime) → 内容哈希，避免每次重新读取未改动的文件
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from common import PROJECT_ROOT, log_info, log_success, log_error
+
+SOURCE_DIRS = ("cmd", "internal", "api")
+MODULE_FILES = ("go.mod", "go.sum")
+CACHE_DIR = PROJECT_ROOT / "bin" / ".build-cache"
+# 每个目标保留的历史产物数量（切换分支时可以直接命中）
+KEEP_ARTIFACTS = 3
+# 影响编译产物、需要计入指纹的 go env 变量
+BUILD_ENV_VARS = ("GOOS", "GOARCH", "CGO_ENABLED", "GOFLAGS")
+
+@dataclass
+class BuildTarget:
+    """一个待编译的二进制"""
+    name: str
+    package: str
+    output: Path
+    goos: str = ""
+    goarch: str = ""
+    tags: tuple = ()
+    ldflags: str = ""
+
+    def env(self):
+        env = dict(os.environ)
+        if self.goos:
+            env["GOOS"] = self.goos
+        if self.goarch:
+            env["GOARCH"] = self.goarch
+        return env
+
+    def build_args(self):
+        args = []
+        if self.tags:
+            args.append("-tags=" + ",".join(self.tags))
+        if self.ldflags:
+            args.append("-ldflags=" + self.ldflags)
+        return args
+
+def _go_env(*names, env=None):
+    out = subprocess.run(["go", "env", *names], cwd=PROJECT_ROOT, check=True, env=env,
+                         capture_output=True, text=True, timeout=30).stdout
+    return out.splitlines()
+
+def _iter_source_files(root):
+    for name in MODULE_FILES:
+        path = root / name
+        if path.exists():
+            yield path
+    for dirname in SOURCE_DIRS:
+        base = root / dirname
+        if not base.exists():
+            continue
+        for dirpath, dirnames, filenames in os.walk(base):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                # _test.go 不参与编译，不影响产物
+                if filename.endswith(".go") and not filename.endswith("_test.go"):
+                    yield Path(dirpath) / filename
+
+class SourceFingerprint:
+    """计算源码树指纹，文件内容哈希按 (size, mtime_ns) 缓存"""
+
+    def __init__(self, root=PROJECT_ROOT, cache_dir=CACHE_DIR):
+        self.root = Path(root)
+        self.stat_cache_path = Path(cache_dir) / "stat-cache.json"
+
+    def compute(self):
+        try:
+            stat_cache = json.loads(self.stat_cache_path.read_text())
+        except (OSError, ValueError):
+            stat_cache = {}
+
+        new_cache = {}
+        digest = hashlib.sha256()
+        for path in _iter_source_files(self.root):
+            rel = path.relative_to(self.root).as_posix()
+            st = path.stat()
+            key = [st.st_size, st.st_mtime_ns]
+            cached = stat_cache.get(rel)
+            if cached and cached[0] == key:
+                file_hash = cached[1]
+            else:
+                file_hash = hashlib.sha256(path.read_bytes()).hexdigest()
+            new_cache[rel] = [key, file_hash]
+            digest.update(rel.encode())
+            digest.update(b"\0")
+            digest.update(file_hash.encode())
+            digest.update(b"\n")
+
+        self.stat_cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.stat_cache_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(new_cache))
+        tmp.replace(self.stat_cache_path)
+        return digest.hexdigest()
+
+def target_fingerprint(source_hash, target, go_version, build_env):
+    """源码指纹 + 目标包 + Go 版本 + 构建环境（BUILD_ENV_VARS 的解析值）+ 构建参数"""
+    digest = hashlib.sha256()
+    for part in (source_hash, target.package, go_version, *build_env, *target.build_args()):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def _artifact_path(target, fingerprint):
+    return CACHE_DIR / f"{target.name}-{fingerprint[:16]}"
+
+def _install(artifact, output):
+    """把缓存产物放到目标位置（优先硬链接）"""
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp = output.with_name(output.name + ".tmp")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(artifact, tmp)
+    except OSError:
+        shutil.copy2(artifact, tmp)
+    tmp.replace(output)
+
+def _prune(target):
+    artifacts = sorted(CACHE_DIR.glob(f"{target.name}-*"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for stale in artifacts[KEEP_ARTIFACTS:]:
+        stale.unlink(missing_ok=True)
+
+def _build_one(target, fingerprint, timeout):
+    artifact = _artifact_path(target, fingerprint)
+    tmp = artifact.with_name(artifact.name + f".{os.getpid()}.tmp")
+    start = time.monotonic()
+    result = subprocess.run(
+        ["go", "build", *target.build_args(), "-o", str(tmp), target.package],
+        cwd=PROJECT_ROOT, env=target.env(),
+        capture_output=True, text=True, timeout=timeout,
+    )
+    if result.returncode != 0:
+        tmp.unlink(missing_ok=True)
+        raise RuntimeError(f"{target.name} 编译失败:\n{result.stderr}")
+    tmp.replace(artifact)
+    return time.monotonic() - start
+
+def build_targets(targets, force=False, timeout=300):
+    """按需编译目标，返回 {name: {"cached": bool, "seconds": float}}"""
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+    start = time.monotonic()
+    source_hash = SourceFingerprint().compute()
+    (go_version,) = _go_env("GOVERSION")
+    log_info(f"源码指纹: {source_hash[:16]} ({go_version}, 计算耗时 {time.monotonic() - start:.2f}s)")
+
+    results = {}
+    pending = []
+    for target in targets:
+        # 按目标的环境解析，交叉编译时 CGO_ENABLED 的默认值与本机不同
+        build_env = _go_env(*BUILD_ENV_VARS, env=target.env())
+        fingerprint = target_fingerprint(source_hash, target, go_version, build_env)
+        artifact = _artifact_path(target, fingerprint)
+        if artifact.exists() and not force:
+            _install(artifact, target.output)
+            os.utime(artifact)
+            results[target.name] = {"cached": True, "seconds": 0.0}
+            log_success(f"{target.name} 命中构建缓存 ({artifact.name})")
+        else:
+            pending.append((target, fingerprint))
+
+    if pending:
+        log_info(f"并发编译: {', '.join(t.name for t, _ in pending)}")
+        with ThreadPoolExecutor(max_workers=len(pending)) as pool:
+            futures = {pool.submit(_build_one, t, fp, timeout): (t, fp) for t, fp in pending}
+            errors = []
+            for future, (target, fingerprint) in futures.items():
+                try:
+                    seconds = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    log_error(str(e))
+                    continue
+                _install(_artifact_path(target, fingerprint), target.output)
+                _prune(target)
+                results[target.name] = {"cached": False, "seconds": seconds}
+                log_success(f"{target.name} 编译完成，耗时 {seconds:.2f}s")
+            if errors:
+                raise errors[0]
+
+    return results
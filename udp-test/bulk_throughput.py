@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+多流批量吞吐测试
+
+用 asyncio 同时打开 K 条 TCP 连接，经由 tunnox TCP 映射向 tcp_sink.py 发送数据，
+统计每条流和总体的有效吞吐（goodput），以及各流之间的 Jain 公平性指数：
+
+    J = (Σx)² / (n · Σx²)      x 为各流吞吐，1 表示完全公平，1/n 表示一条流独占带宽
+
+两种模式：
+- sink（默认）：单向发送，sink 收完后回复实际接收字节数，以收到回复为结束
+- echo：数据经隧道往返，以收齐回显数据为结束
+
+用法:
+    ./bulk_throughput.py --local --streams 16 --size-mb 64           # 本地栈 + 新建映射
+    ./bulk_throughput.py --local --transport quic --baseline         # 同时直连 sink 测基线
+    ./bulk_throughput.py --target 127.0.0.1:9990 --streams 8         # 已有映射
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import time
+from pathlib import Path
+
+from common import (
+    CONFIG_FILE, log_info, log_success, log_error, log_header, load_config, parse_address,
+)
+from local_stack import add_cluster_arguments, add_impair_arguments, network_label
+from tcp_sink import MODE_SINK, MODE_ECHO, LENGTH, READ_SIZE, SOCKET_BUFFER
+
+CHUNK_SIZE = 64 * 1024
+
+def jain_index(values):
+    """Jain 公平性指数"""
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    square_sum = sum(v * v for v in values)
+    return sum(values) ** 2 / (len(values) * square_sum) if square_sum > 0 else 1.0
+
+async def open_stream(host, port):
+    reader, writer = await asyncio.open_connection(host, port, limit=READ_SIZE)
+    sock = writer.get_extra_info("socket")
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER)
+    return reader, writer
+
+async def send_bytes(writer, payload, total):
+    view = memoryview(payload)
+    sent = 0
+    while sent < total:
+        n = min(len(view), total - sent)
+        writer.write(view[:n])
+        await writer.drain()
+        sent += n
+
+async def run_stream(index, host, port, total, payload, mode, start_gate):
+    """单条流：返回 {index, bytes, seconds, goodput, error}"""
+    await start_gate.wait()
+    result = {"index": index, "bytes": 0, "seconds": None, "goodput": None, "error": None}
+    start = time.perf_counter()
+    writer = None
+    try:
+        reader, writer = await open_stream(host, port)
+        if mode == "sink":
+            writer.write(MODE_SINK + LENGTH.pack(total))
+            await send_bytes(writer, payload, total)
+            (received,) = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+            if received != total:
+                raise RuntimeError(f"sink 只收到 {received}/{total} 字节")
+        else:
+            writer.write(MODE_ECHO)
+
+            async def read_back():
+                got = 0
+                while got < total:
+                    data = await reader.read(READ_SIZE)
+                    if not data:
+                        raise RuntimeError(f"回显提前结束: {got}/{total} 字节")
+                    got += len(data)
+                return got
+
+            reading = asyncio.ensure_future(read_back())
+            await send_bytes(writer, payload, total)
+            received = await reading
+        elapsed = time.perf_counter() - start
+        result.update(bytes=received, seconds=elapsed, goodput=received / elapsed)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        result["seconds"] = time.perf_counter() - start
+    finally:
+        if writer is not None:
+            writer.close()
+    return result
+
+async def run_bulk_async(host, port, streams, size_bytes, mode):
+    payload = os.urandom(CHUNK_SIZE)
+    gate = asyncio.Event()
+    tasks = [
+        asyncio.ensure_future(run_stream(i, host, port, size_bytes, payload, mode, gate))
+        for i in range(streams)
+    ]
+    start = time.perf_counter()
+    gate.set()
+    results = await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+    return results, elapsed
+
+def run_bulk(host, port, streams, size_bytes, mode="sink"):
+    """K 条流并发传输，返回汇总结果"""
+    log_info(f"{streams} 条流 × {size_bytes / 1024**2:.1f} MB → {host}:{port} ({mode})")
+    results, elapsed = asyncio.run(run_bulk_async(host, port, streams, size_bytes, mode))
+    ok = [r for r in results if r["error"] is None]
+    total_bytes = sum(r["bytes"] for r in ok)
+    goodputs = [r["goodput"] for r in ok]
+    return {
+        "host": host,
+        "port": port,
+        "mode": mode,
+        "streams": streams,
+        "size_bytes": size_bytes,
+        "elapsed_seconds": elapsed,
+        "total_bytes": total_bytes,
+        "aggregate_mb_s": total_bytes / 1024**2 / elapsed if elapsed > 0 else 0.0,
+        "stream_mb_s": {
+            "min": min(goodputs) / 1024**2 if goodputs else None,
+            "mean": sum(goodputs) / len(goodputs) / 1024**2 if goodputs else None,
+            "max": max(goodputs) / 1024**2 if goodputs else None,
+        },
+        "jain_index": jain_index(goodputs),
+        "failed_streams": len(results) - len(ok),
+        "per_stream": results,
+    }
+
+def print_report(result, title="批量吞吐结果", show_streams=True):
+    log_header(title)
+    s = result["stream_mb_s"]
+    print(f"目标:       {result['host']}:{result['port']} ({result['mode']})")
+    print(f"流数:       {result['streams']} × {result['size_bytes'] / 1024**2:.1f} MB"
+          f"  (失败 {result['failed_streams']})")
+    print(f"总耗时:     {result['elapsed_seconds']:.2f}s")
+    print(f"总吞吐:     {result['aggregate_mb_s']:.1f} MB/s")
+    if s["mean"] is not None:
+        print(f"单流吞吐:   min={s['min']:.1f}  mean={s['mean']:.1f}  max={s['max']:.1f} MB/s")
+        print(f"Jain 指数:  {result['jain_index']:.4f}")
+    if show_streams:
+        print(f"\n{'流':>4}{'MB/s':>10}{'耗时(s)':>10}  错误")
+        for r in result["per_stream"]:
+            mbs = f"{r['goodput'] / 1024**2:.1f}" if r["goodput"] else "-"
+            print(f"{r['index']:>4}{mbs:>10}{r['seconds']:>10.2f}  {r['error'] or ''}")
+
+def run_local(config, args):
+    """启动本地栈、tcp_sink 和一条 TCP 映射，再执行测试"""
+    from local_stack import LocalStack, cluster_options, find_free_port
+    from readiness import tcp_accept_probe
+
+    stack = LocalStack(config, transport=args.transport, **cluster_options(args))
+    with stack:
+        stack.start_tunnel()
+        sink_port = find_free_port("tcp")
+        stack.start_service("tcp-sink", "tcp_sink.py", ["--port", sink_port, "--workers", args.sink_workers],
+                            tcp_accept_probe("127.0.0.1", sink_port))
+        listen_port = args.listen_port or find_free_port("tcp")
+        stack.create_mapping("bulk-tcp", "tcp", listen_port, "127.0.0.1", sink_port)
+
+        results = {}
+        if args.baseline:
+            results["direct"] = run_bulk("127.0.0.1", sink_port, args.streams, args.size, args.mode)
+        results["tunnel"] = run_bulk("127.0.0.1", listen_port, args.streams, args.size, args.mode)
+    # 损伤代理的最终计数在测试栈停止后才写出
+    if stack.impair_summary:
+        results["impairment"] = stack.impair_summary
+    if stack.bdp_summary:
+        results["bdp"] = stack.bdp_summary
+    return stack.transport, results
+
+def main():
+    parser = argparse.ArgumentParser(description="多流批量吞吐测试（经由 TCP 映射）")
+    parser.add_argument('--config', default=str(CONFIG_FILE), help='配置文件路径（--local 时读取 local 段）')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--target', help='已有映射的本地地址 host:port（目标端须运行 tcp_sink.py）')
+    target.add_argument('--local', action='store_true', help='启动本地栈、tcp_sink 并新建 TCP 映射')
+    parser.add_argument('--transport', choices=['tcp', 'websocket', 'quic', 'kcp'], help='本地模式的连接协议')
+    parser.add_argument('--streams', type=int, default=8, help='并发流数量')
+    parser.add_argument('--size-mb', type=float, default=32, help='每条流发送的数据量（MB）')
+    parser.add_argument('--mode', choices=['sink', 'echo'], default='sink', help='单向 sink 或往返 echo')
+    parser.add_argument('--sink-workers', type=int, default=2, help='本地模式 tcp_sink 进程数')
+    parser.add_argument('--listen-port', type=int, help='本地模式映射监听端口（默认自动分配）')
+    parser.add_argument('--baseline', action='store_true', help='本地模式下先直连 sink 测一次基线')
+    parser.add_argument('--quiet', action='store_true', help='不输出每条流的明细')
+    parser.add_argument('--results-db', help='测试结果库路径（默认 ~/tunnox-test/results.db）')
+    parser.add_argument('--no-store', action='store_true', help='不把结果写入结果库')
+    add_cluster_arguments(parser)
+    add_impair_arguments(parser)
+    args = parser.parse_args()
+    args.size = int(args.size_mb * 1024 * 1024)
+
+    config = {}
+    if args.local:
+        config = load_config(args.config) if Path(args.config).exists() else {}
+        try:
+            transport, results = run_local(config, args)
+        except KeyboardInterrupt:
+            log_error("测试被用户中断")
+            return 130
+    else:
+        host, port = parse_address(args.target)
+        transport, results = None, {"tunnel": run_bulk(host, port, args.streams, args.size, args.mode)}
+
+    for name, result in results.items():
+        if name in ("impairment", "bdp"):
+            continue
+        print_report(result, title=f"批量吞吐结果 ({name})", show_streams=not args.quiet)
+    if "direct" in results and results["direct"]["aggregate_mb_s"]:
+        ratio = results["tunnel"]["aggregate_mb_s"] / results["direct"]["aggregate_mb_s"]
+        log_info(f"隧道吞吐为直连的 {ratio * 100:.1f}%")
+
+    if not args.no_store:
+        from results_store import DEFAULT_DB, ResultsStore
+        with ResultsStore(args.results_db or DEFAULT_DB) as store:
+            run_id = store.record_run("bulk", results, transport=transport, config=config, label=network_label(args),
+                                      passed=results["tunnel"]["failed_streams"] == 0)
+        log_info(f"结果已写入结果库 (运行 #{run_id})")
+
+    if results["tunnel"]["failed_streams"]:
+        log_error(f"{results['tunnel']['failed_streams']} 条流失败")
+        return 1
+    log_success("批量吞吐测试完成")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+连接抖动（短连接）测试
+
+生产环境中 MySQL、HTTP 的隧道大多是短连接，每条连接都要经历一次 TunnelOpen → TunnelOpenAck。
+本工具在 TCP 映射上反复执行「建立连接 → 一次小请求/响应 → 关闭」，统计：
+
+- 建连耗时：TCP connect 到 listen-client 本地端口（不含隧道）
+- 建立耗时：从 connect 开始到收到第一个响应（含隧道建立和一次往返）
+- 每秒完成的连接数、按类型统计的失败
+
+对照模式 reuse 让每个 worker 在一条长连接上重复请求/响应，不再建立隧道，
+两者的差值即隧道建立的开销，也是连接复用（TunnelPool）能够节省的上限。
+
+用法:
+    ./churn_bench.py --local --concurrency 64 --duration 20
+    ./churn_bench.py --local --mode both                  # churn 与 reuse 对比
+    ./churn_bench.py --target 127.0.0.1:9990 --mode churn # 已有映射（目标端运行 tcp_sink.py）
+"""
+
+import argparse
+import asyncio
+import socket
+import struct
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+from common import (
+    CONFIG_FILE, log_info, log_success, log_error, log_header, load_config, parse_address, error_key,
+)
+from histogram import LatencyHistogram
+from local_stack import add_cluster_arguments, add_impair_arguments, network_label
+from tcp_sink import MODE_ECHO
+
+LINGER_RST = struct.pack("ii", 1, 0)
+
+class ChurnStats:
+    """所有 worker 共享的统计（单线程事件循环内无需加锁）"""
+
+    def __init__(self):
+        self.connect = LatencyHistogram()
+        self.setup = LatencyHistogram()
+        self.errors = Counter()
+        self.completed = 0
+
+async def churn_worker(host, port, request, deadline, remaining, stats, timeout, rst_close):
+    """每次新建连接：connect → 请求 → 读取响应 → 关闭"""
+    while time.monotonic() < deadline and remaining[0] != 0:
+        if remaining[0] > 0:
+            remaining[0] -= 1
+        writer = None
+        start = time.perf_counter_ns()
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+            stats.connect.record_since(start)
+            writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            writer.write(MODE_ECHO + request)
+            await asyncio.wait_for(reader.readexactly(len(request)), timeout)
+            stats.setup.record_since(start)
+            stats.completed += 1
+        except Exception as e:
+            stats.errors[error_key(e)] += 1
+            await asyncio.sleep(0.01)
+        finally:
+            if writer is not None:
+                if rst_close:
+                    # 以 RST 关闭，避免本端大量 TIME_WAIT 耗尽临时端口
+                    sock = writer.get_extra_info("socket")
+                    if sock is not None:
+                        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, LINGER_RST)
+                writer.close()
+
+async def reuse_worker(host, port, request, deadline, remaining, stats, timeout):
+    """一条长连接上重复请求/响应（隧道只建立一次）"""
+    reader = writer = None
+    try:
+        while time.monotonic() < deadline and remaining[0] != 0:
+            if writer is None:
+                start = time.perf_counter_ns()
+                try:
+                    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+                    stats.connect.record_since(start)
+                    writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    writer.write(MODE_ECHO)
+                except Exception as e:
+                    stats.errors[f"connect:{error_key(e)}"] += 1
+                    writer = None
+                    await asyncio.sleep(0.01)
+                    continue
+            if remaining[0] > 0:
+                remaining[0] -= 1
+            start = time.perf_counter_ns()
+            try:
+                writer.write(request)
+                await asyncio.wait_for(reader.readexactly(len(request)), timeout)
+                stats.setup.record_since(start)
+                stats.completed += 1
+            except Exception as e:
+                stats.errors[error_key(e)] += 1
+                writer.close()
+                writer = None
+    finally:
+        if writer is not None:
+            writer.close()
+
+async def run_async(mode, host, port, concurrency, duration, count, request_size, timeout, rst_close):
+    stats = ChurnStats()
+    request = bytes(i % 256 for i in range(request_size))
+    deadline = time.monotonic() + duration if duration else float("inf")
+    remaining = [count if count else -1]
+    if mode == "churn":
+        workers = [churn_worker(host, port, request, deadline, remaining, stats, timeout, rst_close)
+                   for _ in range(concurrency)]
+    else:
+        workers = [reuse_worker(host, port, request, deadline, remaining, stats, timeout)
+                   for _ in range(concurrency)]
+    start = time.perf_counter()
+    await asyncio.gather(*workers)
+    return stats, time.perf_counter() - start
+
+def run_churn(host, port, mode="churn", concurrency=32, duration=10, count=None,
+              request_size=64, timeout=10, rst_close=False):
+    """运行一轮测试并返回结果；mode 为 churn（短连接）或 reuse（长连接）"""
+    log_info(f"[{mode}] 并发 {concurrency}，"
+             + (f"时长 {duration}s" if duration else f"请求数 {count}")
+             + f"，请求 {request_size} 字节 → {host}:{port}")
+    stats, elapsed = asyncio.run(run_async(mode, host, port, concurrency, duration, count,
+                                           request_size, timeout, rst_close))
+    failed = sum(stats.errors.values())
+    return {
+        "mode": mode,
+        "concurrency": concurrency,
+        "elapsed_seconds": elapsed,
+        "completed": stats.completed,
+        "failed": failed,
+        "rate_per_s": stats.completed / elapsed if elapsed > 0 else 0.0,
+        "error_rate": failed / (stats.completed + failed) if stats.completed + failed else 0.0,
+        "connect_ms": stats.connect.summary_ms(),
+        "setup_ms": stats.setup.summary_ms(),
+        "setup_histogram": stats.setup.encode(),
+        "errors": dict(stats.errors),
+    }
+
+def print_report(results):
+    log_header("连接抖动测试结果")
+    print(f"{'模式':<8}{'完成':>10}{'失败':>8}{'每秒':>10}{'p50(ms)':>10}{'p90(ms)':>10}"
+          f"{'p99(ms)':>10}{'p99.9(ms)':>11}{'max(ms)':>10}")
+    for r in results.values():
+        s = r["setup_ms"]
+        cells = [f"{s[k]:.2f}" if s.get(k) is not None else "-" for k in ("p50", "p90", "p99", "p99.9", "max")]
+        print(f"{r['mode']:<8}{r['completed']:>10}{r['failed']:>8}{r['rate_per_s']:>10.0f}"
+              f"{cells[0]:>10}{cells[1]:>10}{cells[2]:>10}{cells[3]:>11}{cells[4]:>10}")
+    print("\nchurn 的延迟为 connect → 首个响应（含隧道建立）；reuse 为长连接上一次请求/响应的往返。")
+    churn, reuse = results.get("churn"), results.get("reuse")
+    if churn and reuse and churn["setup_ms"].get("p50") and reuse["setup_ms"].get("p50"):
+        overhead = churn["setup_ms"]["p50"] - reuse["setup_ms"]["p50"]
+        print(f"隧道建立开销 (p50 差值): {overhead:.2f}ms；连接速率 churn / reuse = "
+              f"{churn['rate_per_s']:.0f} / {reuse['rate_per_s']:.0f} 次/秒")
+    for r in results.values():
+        if r["errors"]:
+            print(f"[{r['mode']}] 错误: " + ", ".join(f"{k}={v}" for k, v in sorted(r["errors"].items())))
+
+def run_modes(host, port, args):
+    modes = ["churn", "reuse"] if args.mode == "both" else [args.mode]
+    return {
+        mode: run_churn(host, port, mode, args.concurrency, args.duration, args.count,
+                        args.request_size, args.timeout, args.rst_close)
+        for mode in modes
+    }
+
+def run_local(config, args):
+    from local_stack import LocalStack, cluster_options, find_free_port
+    from readiness import tcp_accept_probe
+
+    with LocalStack(config, transport=args.transport, **cluster_options(args)) as stack:
+        stack.start_tunnel()
+        echo_port = find_free_port("tcp")
+        stack.start_service("tcp-sink", "tcp_sink.py", ["--port", echo_port, "--workers", 2],
+                            tcp_accept_probe("127.0.0.1", echo_port))
+        listen_port = args.listen_port or find_free_port("tcp")
+        stack.create_mapping("churn-tcp", "tcp", listen_port, "127.0.0.1", echo_port)
+        return stack.transport, run_modes("127.0.0.1", listen_port, args)
+
+def main():
+    parser = argparse.ArgumentParser(description="连接抖动（短连接建立）测试")
+    parser.add_argument('--config', default=str(CONFIG_FILE), help='配置文件路径（--local 时读取 local 段）')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--target', help='已有映射的本地地址 host:port（目标端须运行 tcp_sink.py）')
+    target.add_argument('--local', action='store_true', help='启动本地栈、echo 服务并新建 TCP 映射')
+    parser.add_argument('--transport', choices=['tcp', 'websocket', 'quic', 'kcp'], help='本地模式的连接协议')
+    parser.add_argument('--mode', choices=['churn', 'reuse', 'both'], default='both',
+                        help='churn: 每次新建连接；reuse: 长连接复用；both: 依次运行并对比')
+    parser.add_argument('--concurrency', type=int, default=32, help='并发 worker 数')
+    parser.add_argument('--duration', type=float, default=10, help='每种模式的运行时长（秒）')
+    parser.add_argument('--count', type=int, help='每种模式的请求总数（指定后不限时长）')
+    parser.add_argument('--request-size', type=int, default=64, help='请求/响应大小（字节）')
+    parser.add_argument('--timeout', type=float, default=10, help='单次连接/请求超时（秒）')
+    parser.add_argument('--rst-close', action='store_true',
+                        help='以 RST 关闭连接，避免高速率下本端 TIME_WAIT 耗尽临时端口')
+    parser.add_argument('--listen-port', type=int, help='本地模式映射监听端口（默认自动分配）')
+    parser.add_argument('--results-db', help='测试结果库路径（默认 ~/tunnox-test/results.db）')
+    parser.add_argument('--no-store', action='store_true', help='不把结果写入结果库')
+    add_cluster_arguments(parser)
+    add_impair_arguments(parser)
+    args = parser.parse_args()
+    if args.count:
+        args.duration = None
+
+    config = {}
+    if args.local:
+        config = load_config(args.config) if Path(args.config).exists() else {}
+        try:
+            transport, results = run_local(config, args)
+        except KeyboardInterrupt:
+            log_error("测试被用户中断")
+            return 130
+    else:
+        host, port = parse_address(args.target)
+        transport, results = None, run_modes(host, port, args)
+
+    print_report(results)
+    if not args.no_store:
+        from results_store import DEFAULT_DB, ResultsStore
+        with ResultsStore(args.results_db or DEFAULT_DB) as store:
+            run_id = store.record_run("churn", results, transport=transport, config=config, label=network_label(args),
+                                      passed=all(r["completed"] > 0 for r in results.values()))
+        log_info(f"结果已写入结果库 (运行 #{run_id})")
+
+    if any(r["completed"] == 0 for r in results.values()):
+        log_error("存在没有成功完成任何请求的模式")
+        return 1
+    log_success("连接抖动测试完成")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+udp-test 脚本共用的工具函数
+
+包含终端输出、配置加载等被多个测试脚本复用的部分
+"""
+
+import asyncio
+from pathlib import Path
+
+import yaml
+
+# 配置文件路径
+CONFIG_FILE = Path(__file__).parent / "config.yaml"
+PROJECT_ROOT = Path(__file__).parent.parent
+
+class Colors:
+    """终端颜色"""
+    HEADER = '\033[95m'
+    BLUE = '\033[94m'
+    CYAN = '\033[96m'
+    GREEN = '\033[92m'
+    YELLOW = '\033[93m'
+    RED = '\033[91m'
+    END = '\033[0m'
+    BOLD = '\033[1m'
+
+def log_info(msg):
+    print(f"{Colors.CYAN}ℹ {msg}{Colors.END}")
+
+def log_success(msg):
+    print(f"{Colors.GREEN}✓ {msg}{Colors.END}")
+
+def log_warning(msg):
+    print(f"{Colors.YELLOW}⚠ {msg}{Colors.END}")
+
+def log_error(msg):
+    print(f"{Colors.RED}✗ {msg}{Colors.END}")
+
+def log_header(msg):
+    print(f"\n{Colors.BOLD}{Colors.HEADER}{'='*60}{Colors.END}")
+    print(f"{Colors.BOLD}{Colors.HEADER}{msg}{Colors.END}")
+    print(f"{Colors.BOLD}{Colors.HEADER}{'='*60}{Colors.END}\n")
+
+def load_config(config_file=CONFIG_FILE):
+    """加载配置文件"""
+    log_info(f"加载配置文件: {config_file}")
+    with open(config_file, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    log_success("配置文件加载成功")
+    return config
+
+def parse_address(text, default_host="127.0.0.1"):
+    """'host:port' 或 'port' → (host, port)"""
+    host, _, port = text.rpartition(":")
+    return host or default_host, int(port)
+
+def error_key(e):
+    """asyncio 网络错误分类：超时、短读、OSError(errno) 或异常类型名"""
+    if isinstance(e, asyncio.TimeoutError):
+        return "timeout"
+    if isinstance(e, asyncio.IncompleteReadError):
+        return "short-read"
+    if isinstance(e, OSError) and e.errno is not None:
+        return f"{type(e).__name__}({e.errno})"
+    return type(e).__name__
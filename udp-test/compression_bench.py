@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+隧道压缩收益评估（按负载类型）
+
+把四类负载分别经由 tunnox TCP 映射发送到 tcp_sink.py，对比不压缩与 gzip 压缩两种方式：
+
+- sql：mysql_standin.py 产生的结果集线路字节（列定义取 local.mysql-standin.columns）
+- json：HTTP/1.1 JSON API 响应（映射、客户端列表一类的对象数组）
+- media：已压缩的数据（默认为 deflate 过的文本，--media 可以指定真实的图片、视频、压缩包）
+- random：随机字节（相当于 TLS / SSH 等已加密流量）
+
+映射配置里的 enable_compression / compression_level 目前只随 TunnelOpen 下发，客户端的数据通路并不使用
+（TCP 隧道由 CreateStreamProcessor 以默认配置创建，不经过 GzipWriter / GzipReader），
+因此压缩由本工具在隧道两端完成，方式与 stream/factory.go 对连接的包装一致：
+发送端每写出一个 32KB 块（constants.CopyBufferSize）做一次 gzip 同步刷新，接收端 tcp_sink 的 inflate 模式流式解压。
+
+每种负载、每种方式输出：
+- 吞吐：负载字节 / 墙钟耗时
+- 压缩比：负载字节 / 进入隧道的字节
+- CPU 秒/GB（按负载字节计）：发送端（本进程，含压缩）、接收端（tcp_sink，含解压）、listen-client、target-client、server
+
+并按压缩 / 解压速度与压缩比给出建议：压缩后的吞吐约为 min(链路速率 × 压缩比, 压缩速度, 解压速度)，
+比不压缩快 10% 以上时建议开启，输出开启压缩有收益的最高链路速率。
+本机回环上链路不是瓶颈，可以用 --bdp 插入限速中继（见 tcp_bdp_relay.py）直接测量某个链路速率下的结果。
+
+用法:
+    ./compression_bench.py
+    ./compression_bench.py --classes sql,json --levels 1,6,9 --size-mb 128
+    ./compression_bench.py --bdp "rate=100000,delay=10" --size-mb 32
+    ./compression_bench.py --media ~/Pictures/*.jpg --classes media
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import signal
+import struct
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from bulk_throughput import open_stream
+from common import CONFIG_FILE, log_info, log_success, log_warning, log_error, log_header, load_config
+from local_stack import add_cluster_arguments, add_impair_arguments, network_label
+from mysql_standin import MAX_PACKET, parse_columns, result_set_payloads
+from tcp_sink import MODE_INFLATE, MODE_SINK, LENGTH
+
+CLASSES = ("sql", "json", "media", "random")
+# 各类负载对应的典型映射
+CLASS_MAPPINGS = {
+    "sql": "数据库映射（MySQL / PostgreSQL 结果集）",
+    "json": "HTTP API 映射（未压缩的 JSON 响应）",
+    "media": "图片、视频、压缩包下载",
+    "random": "TLS / SSH 等已加密流量",
+}
+
+# 与 constants.CopyBufferSize 一致，每块做一次同步刷新
+CHUNK_SIZE = 32 * 1024
+DEFAULT_LEVEL = 6
+# 压缩后吞吐至少比不压缩高出这一比例才建议开启
+MIN_GAIN = 0.1
+
+WORDS = (
+    "tunnel mapping client server session stream packet connection bandwidth latency status active inactive "
+    "listen target protocol tcp udp socks http quic kcp websocket node cluster route config user quota traffic "
+    "bytes sent received error timeout retry heartbeat handshake token secret region zone primary replica"
+).split()
+
+# ---------- 负载 ----------
+
+def sql_corpus(size, columns_spec, rows=1000):
+    """mysql_standin 的结果集线路字节（含 4 字节包头），重复到 size"""
+    columns = parse_columns(columns_spec)
+    parts = []
+    for seq, payload in enumerate(result_set_payloads(columns, rows), start=1):
+        for offset in range(0, len(payload) + 1, MAX_PACKET):
+            piece = payload[offset:offset + MAX_PACKET]
+            parts.append(struct.pack("<I", len(piece))[:3] + bytes((seq & 0xFF,)) + piece)
+    block = b"".join(parts)
+    return (block * (size // len(block) + 1))[:size]
+
+def json_corpus(size, rng):
+    """HTTP/1.1 JSON API 响应序列"""
+    base = datetime(2024, 1, 1)
+    out = bytearray()
+    while len(out) < size:
+        items = []
+        for _ in range(rng.randint(10, 50)):
+            items.append({
+                "id": f"pm_{rng.getrandbits(32):08x}",
+                "name": f"{rng.choice(WORDS)}-{rng.choice(WORDS)}-{rng.randint(1, 999)}",
+                "listen_client_id": rng.randint(10000000, 99999999),
+                "target_client_id": rng.randint(10000000, 99999999),
+                "protocol": rng.choice(("tcp", "udp", "socks5", "http")),
+                "source_port": rng.randint(1024, 65535),
+                "target_host": f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+                "target_port": rng.choice((22, 80, 443, 3306, 5432, 6379, 8080)),
+                "status": rng.choice(("active", "inactive")),
+                "created_at": (base + timedelta(seconds=rng.randint(0, 3 * 10 ** 7))).isoformat() + "Z",
+                "traffic_stats": {
+                    "bytes_sent": rng.randint(0, 10 ** 10),
+                    "bytes_received": rng.randint(0, 10 ** 10),
+                    "connections": rng.randint(0, 5000),
+                },
+                "description": " ".join(rng.choices(WORDS, k=rng.randint(3, 12))),
+            })
+        body = json.dumps({"success": True, "data": {"mappings": items, "total": len(items)}}).encode()
+        out += (f"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                f"Date: {(base + timedelta(seconds=len(out))).strftime('%a, %d %b %Y %H:%M:%S GMT')}\r\n\r\n").encode()
+        out += body
+    return bytes(out[:size])
+
+def media_corpus(size, rng, files=()):
+    """已压缩的数据：指定的文件，或 deflate 过的随机文本"""
+    out = bytearray()
+    for path in files:
+        out += Path(path).expanduser().read_bytes()[:size - len(out)]
+        if len(out) >= size:
+            return bytes(out)
+    if files and out:
+        return bytes((out * (size // len(out) + 1))[:size])
+    while len(out) < size:
+        text = " ".join(rng.choices(WORDS, k=200000)).encode()
+        out += zlib.compress(text, 1)
+    return bytes(out[:size])
+
+def random_corpus(size, rng):
+    return rng.randbytes(size)
+
+def build_corpus(kind, size, seed, columns_spec, media_files):
+    rng = random.Random(f"{kind}-{seed}")
+    if kind == "sql":
+        return sql_corpus(size, columns_spec)
+    if kind == "json":
+        return json_corpus(size, rng)
+    if kind == "media":
+        return media_corpus(size, rng, media_files)
+    return random_corpus(size, rng)
+
+# ---------- 发送 ----------
+
+def deflate_chunk(compressor, chunk):
+    """压缩一块并同步刷新（对应 GzipWriter.Write + Flush）"""
+    return compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+async def send_stream(host, port, block, total, level, start_gate):
+    """单条流：返回 {bytes, wire_bytes, seconds, error}"""
+    await start_gate.wait()
+    loop = asyncio.get_running_loop()
+    result = {"bytes": 0, "wire_bytes": 0, "seconds": None, "error": None}
+    # 块两倍长，切片时不需要处理回绕
+    doubled = memoryview(block + block)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31) if level else None
+    start = time.perf_counter()
+    writer = None
+    try:
+        reader, writer = await open_stream(host, port)
+        writer.write((MODE_INFLATE if compressor else MODE_SINK) + LENGTH.pack(total))
+        sent = 0
+        while sent < total:
+            pos = sent % len(block)
+            chunk = doubled[pos:pos + min(CHUNK_SIZE, total - sent)]
+            # zlib 压缩时释放 GIL，放到线程池里让多条流并行压缩
+            data = await loop.run_in_executor(None, deflate_chunk, compressor, chunk) if compressor else chunk
+            writer.write(data)
+            result["wire_bytes"] += len(data)
+            await writer.drain()
+            sent += len(chunk)
+        if compressor:
+            tail = compressor.flush(zlib.Z_FINISH)
+            writer.write(tail)
+            result["wire_bytes"] += len(tail)
+        (received,) = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+        if received != total:
+            raise RuntimeError(f"sink 只收到 {received}/{total} 字节")
+        result.update(bytes=received, seconds=time.perf_counter() - start)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+        result["seconds"] = time.perf_counter() - start
+    finally:
+        if writer is not None:
+            writer.close()
+    return result
+
+async def send_all(port, block, streams, total, level):
+    gate = asyncio.Event()
+    tasks = [asyncio.ensure_future(send_stream("127.0.0.1", port, block, total, level, gate))
+             for _ in range(streams)]
+    start = time.perf_counter()
+    gate.set()
+    results = await asyncio.gather(*tasks)
+    return results, time.perf_counter() - start
+
+def run_arm(stack, port, block, args, level):
+    """一种方式（level 为 0 表示不压缩）：并发发送，采样各进程 CPU"""
+    from proc_sampler import ProcSampler
+
+    watched = ("listen-client", "target-client", "server", "tcp-sink")
+    pids = stack.supervisor.pids
+    cpu_start = time.process_time()
+    with ProcSampler(lambda: {name: pids[name] for name in watched if name in pids}, interval=0.2) as sampler:
+        results, elapsed = asyncio.run(send_all(port, block, args.streams, args.size, level))
+    sender_cpu = time.process_time() - cpu_start
+    summary = sampler.summary()
+
+    ok = [r for r in results if r["error"] is None]
+    payload = sum(r["bytes"] for r in ok)
+    wire = sum(r["wire_bytes"] for r in ok)
+    gb = payload / 1024**3
+    cpu = {"sender": sender_cpu, "receiver": summary.get("tcp-sink", {}).get("cpu_seconds", 0.0)}
+    for name in ("listen-client", "target-client", "server"):
+        cpu[name] = summary.get(name, {}).get("cpu_seconds", 0.0)
+    for r in results:
+        if r["error"]:
+            log_warning(f"流失败: {r['error']}")
+    return {
+        "name": f"gzip-{level}" if level else "plain",
+        "level": level,
+        "elapsed_seconds": elapsed,
+        "payload_bytes": payload,
+        "wire_bytes": wire,
+        "throughput_mb_s": payload / 1024**2 / elapsed if elapsed > 0 else 0.0,
+        "compression_ratio": payload / wire if wire else None,
+        "cpu_seconds": cpu,
+        "cpu_seconds_per_gb": {name: seconds / gb if gb > 0 else None for name, seconds in cpu.items()},
+        "failed_streams": len(results) - len(ok),
+    }
+
+# ---------- 分析 ----------
+
+def advise(plain, arm):
+    """压缩与不压缩的对比：压缩 / 解压速度（单核 MB/s）与开启压缩有收益的最高链路速率（Mbit/s）"""
+    gb = arm["payload_bytes"] / 1024**3
+    if not gb or arm["compression_ratio"] is None:
+        return None
+    # 压缩 / 解压本身的 CPU：减去不压缩时的发送 / 接收开销；差值不为正（采样不到）时视为不受限
+    deflate_cpu = (arm["cpu_seconds_per_gb"]["sender"] or 0) - (plain["cpu_seconds_per_gb"]["sender"] or 0)
+    inflate_cpu = (arm["cpu_seconds_per_gb"]["receiver"] or 0) - (plain["cpu_seconds_per_gb"]["receiver"] or 0)
+    deflate_mb_s = 1024 / deflate_cpu if deflate_cpu > 0 else None
+    inflate_mb_s = 1024 / inflate_cpu if inflate_cpu > 0 else None
+    speeds = [v for v in (deflate_mb_s, inflate_mb_s) if v is not None]
+    ratio = arm["compression_ratio"]
+    # min(B × r, C, D) ≥ (1 + MIN_GAIN) × B  ⇔  r ≥ 1 + MIN_GAIN 且 B ≤ min(C, D) / (1 + MIN_GAIN)
+    # break_even_mbit 为 None 表示 CPU 不构成上限
+    enable = ratio >= 1 + MIN_GAIN
+    break_even = min(speeds) / (1 + MIN_GAIN) * 1024**2 * 8 / 1e6 if enable and speeds else None
+    return {
+        "deflate_mb_s": deflate_mb_s,
+        "inflate_mb_s": inflate_mb_s,
+        "break_even_mbit": break_even if enable else 0.0,
+        "enable": enable,
+    }
+
+def speedup(advice, ratio, link_mbit):
+    """某个链路速率下压缩后的吞吐 / 不压缩的吞吐"""
+    link_mb_s = link_mbit * 1e6 / 8 / 1024**2
+    speeds = [v for v in (advice["deflate_mb_s"], advice["inflate_mb_s"]) if v is not None]
+    return min([link_mb_s * ratio] + speeds) / link_mb_s
+
+def run_bench(config, args):
+    from local_stack import LocalStack, cluster_options, find_free_port
+    from readiness import tcp_accept_probe
+
+    stack = LocalStack(config, transport=args.transport, **cluster_options(args))
+    columns = stack.mysql_standin["columns"]
+    classes = []
+    with stack:
+        stack.start_tunnel()
+        sink_port = find_free_port("tcp")
+        # 单进程 sink，接收端（解压）CPU 全部计入 tcp-sink
+        stack.start_service("tcp-sink", "tcp_sink.py", ["--port", sink_port],
+                            tcp_accept_probe("127.0.0.1", sink_port))
+        listen_port = find_free_port("tcp")
+        stack.create_mapping("compression-tcp", "tcp", listen_port, "127.0.0.1", sink_port)
+
+        for kind in args.classes:
+            log_header(f"负载: {kind}（{CLASS_MAPPINGS[kind]}）")
+            block = build_corpus(kind, args.block, args.seed, columns, args.media)
+            log_info(f"负载块 {len(block) / 1024**2:.1f} MB，zlib-{args.levels[-1]} 离线压缩比 "
+                     f"{len(block) / len(zlib.compress(block, args.levels[-1])):.2f}")
+            arms = []
+            for level in [0] + args.levels:
+                arm = run_arm(stack, listen_port, block, args, level)
+                ratio = f"{arm['compression_ratio']:.2f}" if arm["compression_ratio"] else "-"
+                log_info(f"{arm['name']:<8} {arm['throughput_mb_s']:.1f} MB/s，压缩比 {ratio}")
+                arms.append(arm)
+            plain = arms[0]
+            for arm in arms[1:]:
+                arm["advice"] = advise(plain, arm)
+            classes.append({"name": kind, "mapping": CLASS_MAPPINGS[kind], "arms": arms})
+    return stack.transport, classes
+
+def best_arm(entry):
+    """break_even 最高的压缩级别"""
+    candidates = [a for a in entry["arms"][1:] if a.get("advice")]
+    return max(candidates, key=lambda a: (a["advice"]["enable"], a["advice"]["break_even_mbit"] or float("inf")),
+               default=None)
+
+def fmt(value, spec=".1f"):
+    return format(value, spec) if value is not None else "-"
+
+def print_report(classes, link_rates):
+    log_header("压缩收益对比")
+    print(f"{'负载':<8}{'方式':<9}{'MB/s':>9}{'压缩比':>8}{'发送端':>8}{'接收端':>8}{'listen':>8}{'target':>8}"
+          f"{'server':>8}{'失败':>6}")
+    for entry in classes:
+        for arm in entry["arms"]:
+            per_gb = arm["cpu_seconds_per_gb"]
+            print(f"{entry['name'] if arm is entry['arms'][0] else '':<8}{arm['name']:<9}"
+                  f"{arm['throughput_mb_s']:>9.1f}{fmt(arm['compression_ratio'], '.2f'):>8}"
+                  f"{fmt(per_gb['sender'], '.2f'):>8}{fmt(per_gb['receiver'], '.2f'):>8}"
+                  f"{fmt(per_gb['listen-client'], '.2f'):>8}{fmt(per_gb['target-client'], '.2f'):>8}"
+                  f"{fmt(per_gb['server'], '.2f'):>8}{arm['failed_streams']:>6}")
+    print("\nCPU 列为每 GB 负载的 CPU 秒；发送端含压缩，接收端（tcp_sink）含解压")
+
+    log_header("建议")
+    header = "".join(f"{f'{rate:g}M':>8}" for rate in link_rates)
+    print(f"{'负载':<8}{'级别':<9}{'压缩 MB/s':>10}{'解压 MB/s':>10}{'收益上限':>12}{header}")
+    for entry in classes:
+        arm = best_arm(entry)
+        if arm is None:
+            continue
+        a = arm["advice"]
+        gains = "".join(f"{speedup(a, arm['compression_ratio'], rate):>7.2f}x" for rate in link_rates)
+        if not a["enable"]:
+            limit = "-"
+        elif a["break_even_mbit"] is None:
+            limit = "不受限"
+        else:
+            limit = f"{a['break_even_mbit']:.0f}Mbit/s"
+        print(f"{entry['name']:<8}{arm['name']:<9}{fmt(a['deflate_mb_s'], '.0f'):>10}{fmt(a['inflate_mb_s'], '.0f'):>10}"
+              f"{limit:>12}{gains}")
+    print(f"\n各链路速率列为压缩后吞吐相对不压缩的倍数（单连接单核，min(速率 × 压缩比, 压缩速度, 解压速度) / 速率）")
+    for entry in classes:
+        arm = best_arm(entry)
+        if arm is None:
+            continue
+        a = arm["advice"]
+        if a["enable"]:
+            when = "始终" if a["break_even_mbit"] is None else f"链路低于 {a['break_even_mbit']:.0f}Mbit/s 时"
+            log_success(f"{entry['mapping']}：{when}开启压缩"
+                        f"（{arm['name']}，压缩比 {arm['compression_ratio']:.2f}）")
+        else:
+            log_warning(f"{entry['mapping']}：不开启压缩（压缩比 {arm['compression_ratio']:.2f}，只增加 CPU）")
+
+def parse_levels(text):
+    levels = sorted({int(x) for x in text.split(",") if x.strip()})
+    if not levels or not all(1 <= level <= 9 for level in levels):
+        raise argparse.ArgumentTypeError(f"压缩级别应为 1-9: {text}")
+    return levels
+
+def main():
+    parser = argparse.ArgumentParser(description="隧道压缩收益评估（sql / json / media / random 负载）")
+    parser.add_argument('--config', default=str(CONFIG_FILE), help='配置文件路径（读取 local 段）')
+    parser.add_argument('--transport', choices=['tcp', 'websocket', 'quic', 'kcp'], help='连接协议')
+    parser.add_argument('--classes', type=lambda s: [x.strip() for x in s.split(",") if x.strip()],
+                        default=list(CLASSES), help=f'逗号分隔的负载类型（{",".join(CLASSES)}）')
+    parser.add_argument('--levels', type=parse_levels, default=[DEFAULT_LEVEL],
+                        help=f'逗号分隔的 gzip 压缩级别（默认 {DEFAULT_LEVEL}，与 StreamFactoryConfig 默认值一致）')
+    parser.add_argument('--streams', type=int, default=4, help='并发流数量')
+    parser.add_argument('--size-mb', type=float, default=64, help='每条流发送的负载量（MB）')
+    parser.add_argument('--block-mb', type=float, default=8, help='每类负载生成的数据块大小（MB），发送时循环使用')
+    parser.add_argument('--media', nargs='+', default=[], metavar='FILE', help='media 负载使用的已压缩文件')
+    parser.add_argument('--link-rates', type=lambda s: [float(x) for x in s.split(",") if x.strip()],
+                        default=[10.0, 100.0, 1000.0], help='建议表中估算的链路速率（Mbit/s）')
+    parser.add_argument('--seed', type=int, default=1, help='负载生成的随机种子')
+    parser.add_argument('--results-db', help='测试结果库路径（默认 ~/tunnox-test/results.db）')
+    parser.add_argument('--no-store', action='store_true', help='不把结果写入结果库')
+    add_cluster_arguments(parser)
+    add_impair_arguments(parser)
+    args = parser.parse_args()
+    unknown = set(args.classes) - set(CLASSES)
+    if unknown:
+        parser.error(f"未知负载类型: {', '.join(sorted(unknown))}")
+    args.size = int(args.size_mb * 1024 * 1024)
+    args.block = max(int(args.block_mb * 1024 * 1024), CHUNK_SIZE)
+
+    # SIGTERM 与 Ctrl+C 一样走清理流程，保证子进程被回收
+    def _raise_interrupt(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+
+    config = load_config(args.config) if Path(args.config).exists() else {}
+    try:
+        transport, classes = run_bench(config, args)
+    except KeyboardInterrupt:
+        log_error("测试被用户中断")
+        return 130
+    except (RuntimeError, ValueError, FileNotFoundError) as e:
+        log_error(str(e))
+        return 1
+
+    print_report(classes, args.link_rates)
+    failed = sum(arm["failed_streams"] for entry in classes for arm in entry["arms"])
+    if not args.no_store:
+        from results_store import DEFAULT_DB, ResultsStore
+        with ResultsStore(args.results_db or DEFAULT_DB) as store:
+            run_id = store.record_run("compression", {"classes": classes}, transport=transport, config=config,
+                                      label=network_label(args), passed=failed == 0)
+        log_info(f"结果已写入结果库 (运行 #{run_id})")
+
+    if failed:
+        log_error(f"{failed} 条流失败")
+        return 1
+    log_success("压缩收益评估完成")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,535 @@
+#!/usr/bin/env python3
+"""
+控制面规模模拟
+
+用多个进程（每个进程一个 asyncio 事件循环）模拟大量空闲客户端：每个客户端建立一条 TCP 控制连接，
+按 tunnox 包格式（1 字节类型 + 4 字节大端长度 + 包体，心跳只有类型字节）完成握手，
+之后按真实客户端的节奏（control_connection_keepalive.go，每 5 秒）发送心跳。
+
+客户端数逐级增加（默认 100 → 50000），每级全部连上并稳定后采样 server 进程一段时间，
+输出每级的 CPU、RSS、goroutine、文件描述符，以及相对空载基线折算到每个空闲客户端的成本：
+
+    CPU（µs/客户端/秒）、内存（KB/客户端）、goroutine（个/客户端）
+
+认证方式：
+- 默认使用已有凭据走挑战-响应（HMAC-SHA256），与客户端重连时相同；本地模式经 Management API 预先注册
+- --anonymous 使用首次连接（new-client）分配凭据；server 对匿名握手按源 IP 限速（默认 10/s），
+  需要配合 --source-ips 分散到多个回环地址
+
+用法:
+    ./control_sim.py --local --levels 100,1000,10000 --hold 30
+    ./control_sim.py --local --levels 100,5000,20000,50000 --workers 8 --source-ips 4
+    ./control_sim.py --target 10.0.0.5:8000 --credentials clients.json --server-pid 12345
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from common import (
+    CONFIG_FILE, log_info, log_success, log_warning, log_error, log_header, load_config, parse_address,
+)
+from histogram import LatencyHistogram
+from packet_codec import COMPRESSED, HANDSHAKE, HANDSHAKE_RESP, HEARTBEAT, FrameDecoder, encode_packet
+
+PROTOCOL_VERSION = "3.0"
+# internal/client/control_connection_keepalive.go 中的心跳间隔
+HEARTBEAT_INTERVAL = 5.0
+DEFAULT_LEVELS = (100, 500, 1000, 5000, 10000, 20000, 50000)
+# 单个源地址可用的临时端口有限，超过该数量时建议使用更多源地址
+CONNECTIONS_PER_SOURCE = 20000
+
+def challenge_response(secret_key, challenge):
+    """HMAC-SHA256(SecretKey, Challenge)，与 control_connection_handshake.go 一致"""
+    return hmac.new(secret_key.encode(), challenge.encode(), hashlib.sha256).hexdigest()
+
+# ---------- 模拟客户端 ----------
+
+class WorkerStats:
+    def __init__(self):
+        self.handshake = LatencyHistogram()
+        self.failures = Counter()
+        self.connected = 0
+        self.dropped = 0
+        self.heartbeats = 0
+        self.packets_in = 0
+        self.heartbeat_late_ns = 0
+
+class ControlClient(asyncio.BufferedProtocol):
+    """一条控制连接：握手、心跳、丢弃 server 下发的包"""
+
+    def __init__(self, credentials, stats, heartbeat, compress):
+        self.credentials = credentials
+        self.stats = stats
+        self.heartbeat = heartbeat
+        self.compress = compress
+        self.loop = asyncio.get_running_loop()
+        self.done = self.loop.create_future()
+        # 每个客户端一个小缓冲区，握手响应和心跳都很小
+        self.decoder = FrameDecoder(capacity=1024, min_read=256)
+        self.transport = None
+        self.authenticated = False
+        self.timer = None
+        self.started = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.started = time.perf_counter_ns()
+        if self.credentials:
+            request = {"client_id": self.credentials["client_id"], "token": self.credentials["secret_key"]}
+        else:
+            request = {"client_id": 0, "token": "new-client"}
+        self.send_handshake({**request, "version": PROTOCOL_VERSION, "protocol": "tcp",
+                             "connection_type": "control"})
+
+    def send_handshake(self, request):
+        self.transport.write(encode_packet(HANDSHAKE, json.dumps(request).encode(), self.compress))
+
+    def get_buffer(self, sizehint):
+        return self.decoder.get_buffer(sizehint)
+
+    def buffer_updated(self, nbytes):
+        self.decoder.buffer_updated(nbytes)
+        for frame in self.decoder.frames():
+            self.stats.packets_in += 1
+            if frame.base_type == HANDSHAKE_RESP and not self.authenticated:
+                self.on_handshake_response(frame.json())
+
+    def on_handshake_response(self, resp):
+        if resp.get("need_response") and resp.get("challenge"):
+            if not self.credentials:
+                self.fail("challenge-without-credentials")
+                return
+            self.send_handshake({
+                "client_id": self.credentials["client_id"],
+                "version": PROTOCOL_VERSION,
+                "protocol": "tcp",
+                "connection_type": "control",
+                "challenge_response": challenge_response(self.credentials["secret_key"], resp["challenge"]),
+            })
+            return
+        if not resp.get("success"):
+            self.fail(resp.get("error") or "handshake-failed")
+            return
+        self.authenticated = True
+        self.stats.handshake.record_since(self.started)
+        self.stats.connected += 1
+        # 心跳相位随机分布，避免所有客户端同一时刻发心跳
+        self.schedule_heartbeat(random.uniform(0, self.heartbeat))
+        if not self.done.done():
+            self.done.set_result(True)
+
+    def schedule_heartbeat(self, delay):
+        due = self.loop.time() + delay
+        self.timer = self.loop.call_at(due, self.send_heartbeat, due)
+
+    def send_heartbeat(self, due):
+        late = int((self.loop.time() - due) * 1e9)
+        if late > self.stats.heartbeat_late_ns:
+            self.stats.heartbeat_late_ns = late
+        # 与真实客户端相同：心跳带压缩标志位，没有长度和包体
+        self.transport.write(bytes([HEARTBEAT | COMPRESSED if self.compress else HEARTBEAT]))
+        self.stats.heartbeats += 1
+        self.schedule_heartbeat(self.heartbeat)
+
+    def fail(self, reason):
+        if not self.done.done():
+            self.stats.failures[reason] += 1
+            self.done.set_result(False)
+        self.transport.close()
+
+    def connection_lost(self, exc):
+        if self.timer is not None:
+            self.timer.cancel()
+        if self.authenticated:
+            self.stats.connected -= 1
+            self.stats.dropped += 1
+        elif not self.done.done():
+            self.stats.failures["closed-during-handshake"] += 1
+            self.done.set_result(False)
+
+    def close(self):
+        self.authenticated = False
+        if self.timer is not None:
+            self.timer.cancel()
+        if self.transport is not None:
+            self.transport.close()
+
+class Worker:
+    """单个模拟进程：按控制命令增加客户端并汇报统计"""
+
+    def __init__(self, address, source_ips, heartbeat, compress, max_pending, timeout):
+        self.address = address
+        self.source_ips = source_ips
+        self.heartbeat = heartbeat
+        self.compress = compress
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.stats = WorkerStats()
+        self.clients = []
+        self.opened = 0
+
+    async def open_client(self, credentials, pending):
+        loop = asyncio.get_running_loop()
+        source = self.source_ips[self.opened % len(self.source_ips)]
+        self.opened += 1
+        client = None
+        try:
+            _, client = await asyncio.wait_for(loop.create_connection(
+                lambda: ControlClient(credentials, self.stats, self.heartbeat, self.compress),
+                *self.address, local_addr=(source, 0) if source else None), self.timeout)
+            if await asyncio.wait_for(asyncio.shield(client.done), self.timeout):
+                # 只跟踪认证成功的客户端，失败的连接不占用 clients 列表
+                self.clients.append(client)
+                client = None
+        except asyncio.TimeoutError:
+            self.stats.failures["timeout"] += 1
+        except OSError as e:
+            self.stats.failures[f"{type(e).__name__}({e.errno})"] += 1
+        finally:
+            if client is not None:
+                # 握手失败或超时：先结束 done，避免 connection_lost 再记一次失败，再关闭连接
+                if not client.done.done():
+                    client.done.set_result(False)
+                client.close()
+            pending.release()
+
+    async def grow(self, credentials, rate):
+        pending = asyncio.Semaphore(self.max_pending)
+        tasks = []
+        interval = 1.0 / rate if rate else 0
+        next_at = time.monotonic()
+        for cred in credentials:
+            await pending.acquire()
+            tasks.append(asyncio.ensure_future(self.open_client(cred, pending)))
+            if interval:
+                next_at += interval
+                delay = next_at - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+        await asyncio.gather(*tasks)
+        self.clients = [c for c in self.clients if c.authenticated]
+
+    def snapshot(self, reset=False):
+        s = self.stats
+        snap = {
+            "connected": s.connected,
+            "dropped": s.dropped,
+            "failures": dict(s.failures),
+            "heartbeats": s.heartbeats,
+            "packets_in": s.packets_in,
+            "heartbeat_late_ms": s.heartbeat_late_ns / 1e6,
+            "handshake": s.handshake.encode(),
+        }
+        if reset:
+            s.handshake.reset()
+            s.failures.clear()
+            s.heartbeat_late_ns = 0
+        return snap
+
+    async def run(self, control):
+        loop = asyncio.get_running_loop()
+        commands = asyncio.Queue()
+        loop.add_reader(control.fileno(), lambda: commands.put_nowait(control.recv()))
+        while True:
+            cmd, *params = await commands.get()
+            if cmd == "grow":
+                await self.grow(*params)
+                control.send(self.snapshot(reset=True))
+            elif cmd == "snapshot":
+                control.send(self.snapshot(reset=True))
+            elif cmd == "stop":
+                for client in self.clients:
+                    client.close()
+                await asyncio.sleep(0.1)
+                control.send(self.snapshot())
+                return
+
+def worker_main(address, source_ips, heartbeat, compress, max_pending, timeout, control):
+    worker = Worker(address, source_ips, heartbeat, compress, max_pending, timeout)
+    asyncio.run(worker.run(control))
+
+class WorkerPool:
+    def __init__(self, count, address, source_ips, args):
+        self.workers = []
+        for _ in range(count):
+            parent, child = multiprocessing.Pipe()
+            proc = multiprocessing.Process(
+                target=worker_main,
+                args=(address, source_ips, args.heartbeat, not args.no_compress, args.max_pending,
+                      args.timeout, child),
+                daemon=True,
+            )
+            proc.start()
+            self.workers.append((proc, parent))
+
+    def grow(self, credentials, rate):
+        """把新增客户端均分给各进程，返回汇总后的统计"""
+        n = len(self.workers)
+        for i, (_, pipe) in enumerate(self.workers):
+            pipe.send(("grow", credentials[i::n], rate / n))
+        return self.collect()
+
+    def snapshot(self):
+        for _, pipe in self.workers:
+            pipe.send(("snapshot",))
+        return self.collect()
+
+    def collect(self):
+        total = {"connected": 0, "dropped": 0, "failures": Counter(), "heartbeats": 0, "packets_in": 0,
+                 "heartbeat_late_ms": 0.0, "handshake": LatencyHistogram()}
+        for _, pipe in self.workers:
+            part = pipe.recv()
+            for key in ("connected", "dropped", "heartbeats", "packets_in"):
+                total[key] += part[key]
+            total["failures"].update(part["failures"])
+            total["heartbeat_late_ms"] = max(total["heartbeat_late_ms"], part["heartbeat_late_ms"])
+            total["handshake"].merge(LatencyHistogram.decode(part["handshake"]))
+        return total
+
+    def stop(self):
+        for proc, pipe in self.workers:
+            try:
+                pipe.send(("stop",))
+                if pipe.poll(10):
+                    pipe.recv()
+            except (BrokenPipeError, EOFError, OSError):
+                pass
+            proc.join(timeout=5)
+            if proc.is_alive():
+                proc.terminate()
+
+# ---------- server 资源采样 ----------
+
+def measure_server(pid, goroutines, seconds):
+    """在 seconds 内以 1 秒间隔采样 server 进程，返回资源摘要"""
+    from proc_sampler import ProcSampler
+
+    with ProcSampler(lambda: {"server": pid}, interval=1.0) as sampler:
+        time.sleep(seconds)
+    summary = sampler.summary().get("server") or {}
+    result = {
+        "cpu_pct": summary.get("cpu_avg_pct"),
+        "rss": summary.get("rss_end"),
+        "threads": summary.get("threads_peak"),
+        "fds": summary.get("fds_end"),
+        "ctx_switches_per_s": ((summary.get("ctx_vol", 0) + summary.get("ctx_invol", 0)) / summary["seconds"]
+                               if summary.get("seconds") else None),
+        "goroutines": None,
+    }
+    if goroutines is not None:
+        try:
+            result["goroutines"] = goroutines()
+        except Exception as e:
+            log_warning(f"读取 goroutine 数失败: {e}")
+    return result
+
+def per_client(level, base, clients):
+    """相对空载基线折算到每个客户端的成本"""
+    if clients <= 0:
+        return {}
+    cost = {}
+    if level.get("cpu_pct") is not None and base.get("cpu_pct") is not None:
+        cost["cpu_us_per_client_s"] = (level["cpu_pct"] - base["cpu_pct"]) / 100 * 1e6 / clients
+    if level.get("rss") is not None and base.get("rss") is not None:
+        cost["rss_kb_per_client"] = (level["rss"] - base["rss"]) / 1024 / clients
+    if level.get("goroutines") is not None and base.get("goroutines") is not None:
+        cost["goroutines_per_client"] = (level["goroutines"] - base["goroutines"]) / clients
+    if level.get("fds") is not None and base.get("fds") is not None:
+        cost["fds_per_client"] = (level["fds"] - base["fds"]) / clients
+    return cost
+
+# ---------- 测试流程 ----------
+
+def register_clients(api, count, threads=32):
+    """经 Management API 注册 count 个客户端并获取 SecretKey"""
+    def register(i):
+        client = api.create_client(f"control-sim-{i}")
+        creds = api.reset_credentials(client["id"])
+        return {"client_id": client["id"], "secret_key": creds["secret_key"]}
+
+    log_info(f"经 Management API 注册 {count} 个客户端...")
+    start = time.monotonic()
+    with ThreadPoolExecutor(threads) as pool:
+        credentials = list(pool.map(register, range(count)))
+    log_success(f"注册完成，耗时 {time.monotonic() - start:.1f}s")
+    return credentials
+
+def run_levels(address, credentials, server_pid, goroutines, source_ips, args):
+    base = None
+    if server_pid:
+        log_info(f"采样空载基线 {args.hold}s...")
+        base = measure_server(server_pid, goroutines, args.hold)
+    pool = WorkerPool(args.workers, address, source_ips, args)
+    levels = []
+    current = 0
+    try:
+        for level in args.levels:
+            batch = credentials[current:level] if credentials else [None] * (level - current)
+            log_info(f"增加到 {level} 个客户端（+{len(batch)}，速率 {args.connect_rate:.0f}/s）...")
+            start = time.monotonic()
+            grown = pool.grow(batch, args.connect_rate)
+            ramp_seconds = time.monotonic() - start
+            current = level
+            if grown["failures"]:
+                log_warning("握手失败: " + ", ".join(f"{k}={v}" for k, v in grown["failures"].most_common(5)))
+            # 等待至少一个心跳周期，让所有客户端进入稳定的心跳节奏
+            time.sleep(args.settle)
+            server = measure_server(server_pid, goroutines, args.hold) if server_pid else {}
+            steady = pool.snapshot()
+            result = {
+                "name": f"n{level}",
+                "clients": level,
+                "connected": steady["connected"],
+                "failed": sum(grown["failures"].values()),
+                "failures": dict(grown["failures"]),
+                "dropped": steady["dropped"],
+                "ramp_seconds": ramp_seconds,
+                "handshake_latency_ms": grown["handshake"].summary_ms(),
+                "heartbeat_late_ms": steady["heartbeat_late_ms"],
+                "server": server,
+            }
+            if base:
+                result.update(per_client(server, base, steady["connected"]))
+            levels.append(result)
+            if steady["heartbeat_late_ms"] > args.heartbeat * 1000 / 2:
+                log_warning(f"模拟端心跳最多延迟 {steady['heartbeat_late_ms']:.0f}ms，"
+                            "模拟进程可能过载，可增加 --workers")
+            if steady["connected"] < level * 0.99 and not args.keep_going:
+                log_error(f"只有 {steady['connected']}/{level} 个客户端在线，停止加压")
+                break
+    finally:
+        pool.stop()
+    return {"baseline": base or {}, "levels": levels}
+
+def print_report(result):
+    log_header("控制面规模测试结果")
+    base = result["baseline"]
+    if base:
+        print(f"空载基线: CPU {base['cpu_pct']:.2f}%  RSS {base['rss'] / 1024**2:.1f}MB"
+              + (f"  goroutines {base['goroutines']}" if base.get("goroutines") is not None else ""))
+    print(f"{'客户端':>8}{'在线':>8}{'失败':>7}{'握手p50':>9}{'握手p99':>9}{'CPU%':>8}{'µs/客户端/s':>13}"
+          f"{'RSS(MB)':>9}{'KB/客户端':>10}{'goroutine':>10}{'个/客户端':>10}{'fds':>8}")
+    for r in result["levels"]:
+        s = r["server"]
+        h = r["handshake_latency_ms"]
+        fmt = lambda v, spec: format(v, spec) if v is not None else "-"
+        print(f"{r['clients']:>8}{r['connected']:>8}{r['failed']:>7}{fmt(h.get('p50'), '.2f'):>9}"
+              f"{fmt(h.get('p99'), '.2f'):>9}{fmt(s.get('cpu_pct'), '.2f'):>8}"
+              f"{fmt(r.get('cpu_us_per_client_s'), '.2f'):>13}"
+              f"{fmt(s['rss'] / 1024**2 if s.get('rss') else None, '.1f'):>9}"
+              f"{fmt(r.get('rss_kb_per_client'), '.2f'):>10}{fmt(s.get('goroutines'), 'd'):>10}"
+              f"{fmt(r.get('goroutines_per_client'), '.2f'):>10}{fmt(s.get('fds'), 'd'):>8}")
+    if not base:
+        print("\n未指定 server 进程（--server-pid），只输出模拟端统计。")
+
+def source_addresses(args, total):
+    if args.source_ips:
+        count = args.source_ips
+    else:
+        count = max(1, -(-total // CONNECTIONS_PER_SOURCE))
+    if count == 1 and not args.local:
+        return [None]
+    # 回环网段内的任意地址都可以直接作为源地址
+    return [f"127.0.{i // 250}.{i % 250 + 1}" for i in range(count)]
+
+def run_local(config, args):
+    from local_stack import LocalStack
+
+    with LocalStack(config, transport="tcp", pprof=True) as stack:
+        stack.prepare()
+        stack.start_server()
+        credentials = None if args.anonymous else register_clients(stack.api, max(args.levels))
+        server_pid = stack.supervisor.get("server").pid
+        address = ("127.0.0.1", stack.ports["tcp"])
+        sources = source_addresses(args, max(args.levels))
+        return run_levels(address, credentials, server_pid, stack.api.goroutine_count, sources, args)
+
+def load_credentials(path):
+    with open(path) as f:
+        data = json.load(f)
+    return [{"client_id": int(c["client_id"]), "secret_key": c["secret_key"]} for c in data]
+
+def parse_levels(text):
+    levels = sorted(int(s) for s in text.split(",") if s.strip())
+    if not levels or levels[0] <= 0:
+        raise argparse.ArgumentTypeError(f"无效的客户端数: {text}")
+    return levels
+
+def main():
+    parser = argparse.ArgumentParser(description="控制面规模模拟（大量空闲客户端的握手与心跳）")
+    parser.add_argument('--config', default=str(CONFIG_FILE), help='配置文件路径（--local 时读取 local 段）')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--target', help='server 的 TCP 控制端口 host:port')
+    target.add_argument('--local', action='store_true', help='启动本地 server（开启 pprof）')
+    parser.add_argument('--levels', type=parse_levels, default=list(DEFAULT_LEVELS), help='逗号分隔的客户端数')
+    parser.add_argument('--hold', type=float, default=30, help='每级稳定后的采样时长（秒）')
+    parser.add_argument('--settle', type=float, default=HEARTBEAT_INTERVAL, help='每级连上后等待稳定的时间（秒）')
+    parser.add_argument('--heartbeat', type=float, default=HEARTBEAT_INTERVAL, help='心跳间隔（秒）')
+    parser.add_argument('--connect-rate', type=float, default=2000, help='新建连接速率（所有进程合计，个/秒）')
+    parser.add_argument('--max-pending', type=int, default=256, help='每个进程同时进行中的握手数上限')
+    parser.add_argument('--timeout', type=float, default=30, help='连接与握手超时（秒）')
+    parser.add_argument('--workers', type=int, default=min(os.cpu_count() or 1, 8), help='模拟进程数')
+    parser.add_argument('--source-ips', type=int,
+                        help=f'使用的回环源地址数（默认每 {CONNECTIONS_PER_SOURCE} 个连接一个）')
+    parser.add_argument('--anonymous', action='store_true', help='使用首次连接握手（受 server 匿名限速影响）')
+    parser.add_argument('--credentials', help='--target 模式的凭据文件（[{"client_id", "secret_key"}]）')
+    parser.add_argument('--server-pid', type=int, help='--target 模式下 server 进程 PID（同机时采样资源）')
+    parser.add_argument('--no-compress', action='store_true', help='握手包不压缩（真实客户端会压缩）')
+    parser.add_argument('--keep-going', action='store_true', help='有客户端未连上时继续加压')
+    parser.add_argument('--results-db', help='测试结果库路径（默认 ~/tunnox-test/results.db）')
+    parser.add_argument('--no-store', action='store_true', help='不把结果写入结果库')
+    args = parser.parse_args()
+
+    # 每个模拟客户端占用一个文件描述符，server 作为子进程继承该限制
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = min(hard, max(args.levels) + 4096)
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+    if wanted < max(args.levels):
+        log_warning(f"文件描述符上限 {hard} 小于最大客户端数 {max(args.levels)}")
+
+    config = {}
+    try:
+        if args.local:
+            config = load_config(args.config) if Path(args.config).exists() else {}
+            result = run_local(config, args)
+        else:
+            if not args.anonymous and not args.credentials:
+                parser.error("--target 模式需要 --credentials 或 --anonymous")
+            credentials = None if args.anonymous else load_credentials(args.credentials)
+            if credentials and len(credentials) < max(args.levels):
+                parser.error(f"凭据只有 {len(credentials)} 个，少于最大客户端数 {max(args.levels)}")
+            result = run_levels(parse_address(args.target), credentials, args.server_pid, None,
+                                source_addresses(args, max(args.levels)), args)
+    except KeyboardInterrupt:
+        log_error("测试被用户中断")
+        return 130
+
+    print_report(result)
+    passed = bool(result["levels"]) and all(r["connected"] >= r["clients"] * 0.99 for r in result["levels"])
+    if not args.no_store:
+        from results_store import DEFAULT_DB, ResultsStore
+        with ResultsStore(args.results_db or DEFAULT_DB) as store:
+            run_id = store.record_run("control", result, transport="tcp", config=config, passed=passed)
+        log_info(f"结果已写入结果库 (运行 #{run_id})")
+
+    if not passed:
+        log_error("存在未能全部连上的级别")
+        return 1
+    log_success("控制面规模测试完成")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
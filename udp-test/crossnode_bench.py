@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+跨节点转发基准
+
+在本机启动两个 server 节点（共享 Redis），把客户端按节点放置：
+
+    节点 A: listen-client                       ─┐
+    节点 B: target-client、local-listen-client   │  target-client → tcp_sink
+                                                  │
+    same-node 映射:  local-listen-client(B) → target-client(B)
+    cross-node 映射: listen-client(A) ──跨节点连接── target-client(B)
+
+两条映射的目标端相同，区别只在于 listen 端所在节点，分别测量：
+- 隧道建立延迟（connect → 首个回显字节）和小包往返延迟（echo）
+- 多流批量吞吐（sink，复用 bulk_throughput.run_bulk）
+
+每个节点的跨节点端口前插入一个旁路代理（CROSS_NODE_ADDR 指向代理），用 crossnode_codec 解析经过的帧，
+报告帧数、帧/秒和数据帧相对 64KB 上限的平均填充率。专用连接模型下 TargetReady 之后是原始字节流，
+此时改为统计代理每次读取到的数据段（长度取决于对端写出粒度和读取时机，io.Copy 每次最多写 32KB）。
+
+两个节点共享的 Redis 默认由 redis_standin.py 提供，也可用 --redis 或 config.yaml 的 local.redis 指定真实 Redis。
+
+用法:
+    ./crossnode_bench.py
+    ./crossnode_bench.py --transport quic --streams 8 --size-mb 128
+    ./crossnode_bench.py --redis 127.0.0.1:6379
+"""
+
+import argparse
+import socket
+import sys
+import threading
+import time
+from pathlib import Path
+
+from bulk_throughput import run_bulk
+from common import CONFIG_FILE, log_info, log_success, log_warning, log_error, log_header, load_config
+from crossnode_codec import MAX_FRAME_SIZE, TARGET_READY, CrossFrameDecoder, FrameError, FrameStats
+from histogram import LatencyHistogram, now_ns
+from tcp_sink import MODE_ECHO
+
+# 节点 A 放 listen-client，节点 B 放 target-client 和同节点对照用的 local-listen-client
+PLACEMENT = {"listen-client": 0, "target-client": 1, "local-listen-client": 1}
+CLIENT_ROLES = ("target-client", "listen-client", "local-listen-client")
+RAW_READ_SIZE = 256 * 1024
+
+class PumpStats:
+    """单方向的统计：分帧阶段的帧，以及切换为原始字节流之后的读取段"""
+
+    def __init__(self):
+        self.frames = FrameStats()
+        self.raw_bytes = 0
+        self.raw_segments = 0
+
+class CrossNodeTap:
+    """跨节点连接的旁路代理：listen_port → 节点真实的跨节点端口，转发的同时解析帧"""
+
+    def __init__(self, name, listen_port, target_port):
+        self.name = name
+        self.listen_port = listen_port
+        self.target_port = target_port
+        self.lock = threading.Lock()
+        self.pumps = []
+        self.connections = 0
+        self.tunnels = 0
+        self.errors = 0
+        self.sock = None
+
+    def start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", self.listen_port))
+        self.sock.listen(256)
+        threading.Thread(target=self._accept_loop, name=f"tap-{self.name}", daemon=True).start()
+        log_info(f"{self.name} 跨节点旁路代理: 127.0.0.1:{self.listen_port} → 127.0.0.1:{self.target_port}")
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def reset(self):
+        with self.lock:
+            self.pumps = []
+            self.connections = self.tunnels = self.errors = 0
+
+    def _accept_loop(self):
+        while True:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            try:
+                upstream = socket.create_connection(("127.0.0.1", self.target_port), timeout=5)
+                upstream.settimeout(None)
+            except OSError as e:
+                log_warning(f"{self.name} 旁路代理连接节点失败: {e}")
+                client.close()
+                continue
+            for s in (client, upstream):
+                s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            state = {"raw": False, "open": 2}
+            with self.lock:
+                self.connections += 1
+            for src, dst in ((client, upstream), (upstream, client)):
+                stats = PumpStats()
+                with self.lock:
+                    self.pumps.append(stats)
+                threading.Thread(target=self._pump, args=(src, dst, state, stats), daemon=True).start()
+
+    def _pump(self, src, dst, state, stats):
+        """先按帧解析再转发（保证 TargetReady 送达对端之前已切换为原始字节流模式）"""
+        decoder = CrossFrameDecoder()
+        raw_buf = memoryview(bytearray(RAW_READ_SIZE))
+        try:
+            while True:
+                if state["raw"]:
+                    n = src.recv_into(raw_buf)
+                    if n == 0:
+                        break
+                    stats.raw_bytes += n
+                    stats.raw_segments += 1
+                    dst.sendall(raw_buf[:n])
+                    continue
+                target = decoder.get_buffer()
+                n = src.recv_into(target)
+                if n == 0:
+                    break
+                decoder.buffer_updated(n)
+                # 阻塞在 recv 期间另一方向可能已收到 TargetReady，此时读到的已是原始字节流
+                if not state["raw"]:
+                    now = time.monotonic()
+                    try:
+                        for frame in decoder.frames():
+                            stats.frames.add(frame, now)
+                            if frame.type == TARGET_READY:
+                                state["raw"] = True
+                                with self.lock:
+                                    self.tunnels += 1
+                                break
+                    except FrameError:
+                        # 不是帧格式，之后不再解析
+                        state["raw"] = True
+                if state["raw"]:
+                    rest = decoder.take_remaining()
+                    if rest:
+                        stats.raw_bytes += len(rest)
+                        stats.raw_segments += 1
+                dst.sendall(target[:n])
+        except OSError:
+            with self.lock:
+                self.errors += 1
+        finally:
+            try:
+                dst.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+            with self.lock:
+                state["open"] -= 1
+                done = state["open"] == 0
+            if done:
+                src.close()
+                dst.close()
+
+    def snapshot(self, elapsed):
+        """汇总所有方向的统计；elapsed 为计算帧/秒使用的时长"""
+        with self.lock:
+            pumps = list(self.pumps)
+            connections, tunnels, errors = self.connections, self.tunnels, self.errors
+        frames = FrameStats()
+        raw_bytes = raw_segments = 0
+        for stats in pumps:
+            frames.merge(stats.frames)
+            raw_bytes += stats.raw_bytes
+            raw_segments += stats.raw_segments
+        avg_segment = raw_bytes / raw_segments if raw_segments else 0
+        return {
+            "connections": connections,
+            "tunnels": tunnels,
+            "errors": errors,
+            **frames.summary(elapsed),
+            "raw_bytes": raw_bytes,
+            "raw_segments": raw_segments,
+            "raw_segments_per_s": raw_segments / elapsed if elapsed > 0 else 0,
+            "avg_raw_segment": avg_segment,
+            "raw_fill_pct": avg_segment / MAX_FRAME_SIZE * 100,
+        }
+
+def merge_snapshots(snapshots):
+    """多个节点旁路代理的结果相加，比例类指标按加权重新计算"""
+    total = {key: 0 for key in ("connections", "tunnels", "errors", "frames", "frames_per_s",
+                                "data_frames", "raw_bytes", "raw_segments", "raw_segments_per_s")}
+    data_bytes = 0
+    by_type = {}
+    for snap in snapshots:
+        for key in total:
+            total[key] += snap[key]
+        data_bytes += snap["avg_data_frame"] * snap["data_frames"]
+        for name, count in snap["by_type"].items():
+            by_type[name] = by_type.get(name, 0) + count
+    total["avg_data_frame"] = data_bytes / total["data_frames"] if total["data_frames"] else 0
+    total["fill_pct"] = total["avg_data_frame"] / MAX_FRAME_SIZE * 100
+    total["avg_raw_segment"] = total["raw_bytes"] / total["raw_segments"] if total["raw_segments"] else 0
+    total["raw_fill_pct"] = total["avg_raw_segment"] / MAX_FRAME_SIZE * 100
+    total["by_type"] = by_type
+    return total
+
+# ---------- 延迟 ----------
+
+def open_echo(port, payload):
+    """建立连接并进入 echo 模式，返回 (socket, 建立耗时 ns)：以收到第一份回显为隧道就绪"""
+    start = now_ns()
+    sock = socket.create_connection(("127.0.0.1", port), timeout=30)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.sendall(MODE_ECHO + payload)
+    recv_exact(sock, len(payload))
+    return sock, now_ns() - start
+
+def recv_exact(sock, size):
+    buf = bytearray(size)
+    view = memoryview(buf)
+    got = 0
+    while got < size:
+        n = sock.recv_into(view[got:])
+        if n == 0:
+            raise ConnectionError("连接被关闭")
+        got += n
+    return buf
+
+def measure_latency(port, setups, pings, payload_size):
+    """setups 次隧道建立 + 一条连接上 pings 次往返"""
+    payload = b"x" * payload_size
+    setup = LatencyHistogram()
+    rtt = LatencyHistogram()
+    errors = 0
+    for _ in range(setups):
+        try:
+            sock, elapsed = open_echo(port, payload)
+        except OSError as e:
+            errors += 1
+            log_warning(f"建立连接失败: {e}")
+            continue
+        setup.record(elapsed)
+        sock.close()
+    sock, elapsed = open_echo(port, payload)
+    setup.record(elapsed)
+    try:
+        for _ in range(pings):
+            start = now_ns()
+            sock.sendall(payload)
+            recv_exact(sock, payload_size)
+            rtt.record(now_ns() - start)
+    finally:
+        sock.close()
+    return {
+        "setup_ms": setup.summary_ms(),
+        "latency_ms": rtt.summary_ms(),
+        "setup_errors": errors,
+        "payload_bytes": payload_size,
+    }
+
+# ---------- 测试流程 ----------
+
+def run_path(name, port, args, taps):
+    """一条路径：先测延迟，再测批量吞吐；旁路代理统计只覆盖本路径"""
+    log_header(f"{name} 路径 (127.0.0.1:{port})")
+    for tap in taps:
+        tap.reset()
+    started = time.monotonic()
+    latency = measure_latency(port, args.setups, args.pings, args.payload)
+    log_info(f"隧道建立: {latency['setup_ms']['p50']:.2f}ms (p50)  往返: {latency['latency_ms']['p50']:.3f}ms (p50)")
+    bulk = run_bulk("127.0.0.1", port, args.streams, args.size, "sink")
+    elapsed = time.monotonic() - started
+    result = {"latency": latency, "bulk": bulk}
+    if taps:
+        # 帧速率按整条路径的测试时长计算，原始字节流的读取段速率只看批量阶段
+        snap = merge_snapshots([tap.snapshot(elapsed) for tap in taps])
+        snap["raw_segments_per_s"] = (snap["raw_segments"] / bulk["elapsed_seconds"]
+                                      if bulk["elapsed_seconds"] else 0)
+        result["frames"] = snap
+    return result
+
+def run(config, args):
+    from local_stack import LocalStack, find_free_port
+    from readiness import tcp_accept_probe
+
+    stack = LocalStack(config, transport=args.transport, nodes=2, placement=PLACEMENT, redis=args.redis)
+    taps = []
+    with stack:
+        stack.prepare()
+        if not args.no_tap:
+            for node in stack.nodes:
+                tap = CrossNodeTap(node["name"], find_free_port("tcp"), node["ports"]["cross-node"])
+                node["advertise"] = tap.listen_port
+                tap.start()
+                taps.append(tap)
+        try:
+            stack.start_servers()
+            stack.start_clients(CLIENT_ROLES)
+            sink_port = find_free_port("tcp")
+            stack.start_service("tcp-sink", "tcp_sink.py", ["--port", sink_port, "--workers", args.sink_workers],
+                                tcp_accept_probe("127.0.0.1", sink_port))
+            same_port = find_free_port("tcp")
+            cross_port = find_free_port("tcp")
+            stack.create_mapping("same-node", "tcp", same_port, "127.0.0.1", sink_port,
+                                 listen="local-listen-client")
+            stack.create_mapping("cross-node", "tcp", cross_port, "127.0.0.1", sink_port)
+
+            results = {
+                "same_node": run_path("same-node", same_port, args, []),
+                "cross_node": run_path("cross-node", cross_port, args, taps),
+            }
+        finally:
+            for tap in taps:
+                tap.close()
+    same, cross = results["same_node"]["bulk"], results["cross_node"]["bulk"]
+    results["cross_node_ratio"] = cross["aggregate_mb_s"] / same["aggregate_mb_s"] if same["aggregate_mb_s"] else 0
+    return stack.transport, results
+
+def print_report(results):
+    log_header("跨节点 vs 同节点")
+    rows = (
+        ("吞吐 MB/s", lambda r: f"{r['bulk']['aggregate_mb_s']:.1f}"),
+        ("Jain 指数", lambda r: f"{r['bulk']['jain_index']:.4f}" if r["bulk"]["jain_index"] else "-"),
+        ("失败流", lambda r: str(r["bulk"]["failed_streams"])),
+        ("建立 p50 ms", lambda r: f"{r['latency']['setup_ms']['p50']:.2f}"),
+        ("建立 p99 ms", lambda r: f"{r['latency']['setup_ms']['p99']:.2f}"),
+        ("往返 p50 ms", lambda r: f"{r['latency']['latency_ms']['p50']:.3f}"),
+        ("往返 p99 ms", lambda r: f"{r['latency']['latency_ms']['p99']:.3f}"),
+    )
+    print(f"{'':<14}{'same-node':>12}{'cross-node':>12}")
+    for label, fmt in rows:
+        print(f"{label:<14}{fmt(results['same_node']):>12}{fmt(results['cross_node']):>12}")
+    print(f"\n跨节点吞吐为同节点的 {results['cross_node_ratio'] * 100:.1f}%")
+
+    frames = results["cross_node"].get("frames")
+    if not frames:
+        return
+    log_header("跨节点连接（旁路代理）")
+    print(f"连接 {frames['connections']}  隧道 {frames['tunnels']}  错误 {frames['errors']}")
+    types = "  ".join(f"{name}={count}" for name, count in sorted(frames["by_type"].items())) or "-"
+    print(f"帧:       {frames['frames']} ({frames['frames_per_s']:.1f} 帧/秒)  {types}")
+    if frames["data_frames"]:
+        print(f"数据帧:   {frames['data_frames']}  平均 {frames['avg_data_frame']:.0f} 字节"
+              f"  填充率 {frames['fill_pct']:.1f}% (上限 {MAX_FRAME_SIZE})")
+    if frames["raw_segments"]:
+        print(f"原始流:   {frames['raw_bytes'] / 1024**2:.1f} MB  {frames['raw_segments']} 段"
+              f" ({frames['raw_segments_per_s']:.0f} 段/秒)  平均 {frames['avg_raw_segment']:.0f} 字节"
+              f"  相对 64KB {frames['raw_fill_pct']:.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="跨节点转发基准（本地双节点，同节点对照）")
+    parser.add_argument('--config', default=str(CONFIG_FILE), help='配置文件路径（读取 local 段）')
+    parser.add_argument('--redis', help='两个节点共享的 Redis 地址 host:port（默认启动 redis_standin.py）')
+    parser.add_argument('--transport', choices=['tcp', 'websocket', 'quic', 'kcp'], default='tcp',
+                        help='客户端连接协议')
+    parser.add_argument('--streams', type=int, default=4, help='批量吞吐的并发流数量')
+    parser.add_argument('--size-mb', type=float, default=64, help='每条流发送的数据量（MB）')
+    parser.add_argument('--setups', type=int, default=50, help='测量隧道建立延迟的连接次数')
+    parser.add_argument('--pings', type=int, default=2000, help='单连接往返次数')
+    parser.add_argument('--payload', type=int, default=64, help='往返测试的消息字节数')
+    parser.add_argument('--sink-workers', type=int, default=2, help='tcp_sink 进程数')
+    parser.add_argument('--no-tap', action='store_true', help='不插入旁路代理（不统计帧，排除代理本身的开销）')
+    parser.add_argument('--results-db', help='测试结果库路径（默认 ~/tunnox-test/results.db）')
+    parser.add_argument('--no-store', action='store_true', help='不把结果写入结果库')
+    args = parser.parse_args()
+    args.size = int(args.size_mb * 1024 * 1024)
+
+    config = load_config(args.config) if Path(args.config).exists() else {}
+    try:
+        transport, results = run(config, args)
+    except KeyboardInterrupt:
+        log_error("测试被用户中断")
+        return 130
+    except (RuntimeError, ValueError, FileNotFoundError) as e:
+        log_error(str(e))
+        return 1
+
+    print_report(results)
+    failed = results["same_node"]["bulk"]["failed_streams"] + results["cross_node"]["bulk"]["failed_streams"]
+
+    if not args.no_store:
+        from results_store import DEFAULT_DB, ResultsStore
+        with ResultsStore(args.results_db or DEFAULT_DB) as store:
+            run_id = store.record_run("crossnode", results, transport=transport, config=config,
+                                      passed=failed == 0)
+        log_info(f"结果已写入结果库 (运行 #{run_id})")
+
+    if failed:
+        log_error(f"{failed} 条流失败")
+        return 1
+    log_success("跨节点基准完成")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
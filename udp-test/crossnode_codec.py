@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+tunnox 跨节点帧编解码（internal/protocol/session/crossnode/frame.go）
+
+帧格式: 16 字节 TunnelID + 1 字节帧类型 + 4 字节大端长度 + 数据，单帧数据不超过 64KB。
+TunnelID 是隧道 ID 字符串的前 16 字节，不足补 0（TunnelIDFromString / TunnelIDToString）。
+
+- CrossFrameDecoder 复用 packet_codec.FrameDecoder 的缓冲区管理（recv_into / get_buffer 直接写入），
+  只替换帧头解析；CrossFrame.data 同样是指向缓冲区的 memoryview
+- CrossFrameWriter 把帧头和数据交给 sendmsg 一次写出，与 Go 端 WriteFrame 的 net.Buffers 一致；
+  write_data 按 64KB 分片，与 FrameStream.Write 一致
+- FrameStats 统计各类型帧数、字节数以及数据帧相对 64KB 上限的平均填充率
+
+注意专用连接模型（TunnelConnectionManager）下，跨节点连接只用 TargetReady 帧建立隧道，
+之后两端直接 io.Copy 原始字节流，不再分帧；FrameStream（连接池模型）才使用 Data 帧。
+
+用法:
+    decoder = CrossFrameDecoder()
+    decoder.recv_into(sock)
+    for frame in decoder.frames():
+        print(frame.tunnel, frame.type_name, len(frame.data))
+
+    writer = CrossFrameWriter(sock)
+    writer.write_target_ready("tunnel-1234", "node-0002")
+    writer.write_data("tunnel-1234", payload)
+    writer.flush()
+
+    ./crossnode_codec.py --frames 200000        # 编解码微基准（帧/秒、填充率）
+"""
+
+import argparse
+import socket
+import struct
+import sys
+import threading
+import time
+
+from packet_codec import FrameDecoder, FrameError, ScatterWriter
+
+# 帧类型（crossnode/frame.go）
+DATA = 0x01
+TARGET_READY = 0x02
+CLOSE = 0x03
+ACK = 0x04
+HTTP_PROXY = 0x05
+HTTP_RESPONSE = 0x06
+DNS_QUERY = 0x07
+DNS_RESPONSE = 0x08
+EOF = 0x09
+COMMAND = 0x10
+COMMAND_RESPONSE = 0x11
+
+FRAME_TYPE_NAMES = {
+    DATA: "data",
+    TARGET_READY: "target-ready",
+    CLOSE: "close",
+    ACK: "ack",
+    HTTP_PROXY: "http-proxy",
+    HTTP_RESPONSE: "http-response",
+    DNS_QUERY: "dns-query",
+    DNS_RESPONSE: "dns-response",
+    EOF: "eof",
+    COMMAND: "command",
+    COMMAND_RESPONSE: "command-response",
+}
+
+TUNNEL_ID_SIZE = 16
+HEADER = struct.Struct(">16sBI")
+HEADER_SIZE = HEADER.size
+MAX_FRAME_SIZE = 64 * 1024
+
+def tunnel_id_from_string(tunnel_id):
+    """隧道 ID 字符串 → 16 字节（截断或补 0）"""
+    raw = tunnel_id.encode() if isinstance(tunnel_id, str) else bytes(tunnel_id)
+    return raw[:TUNNEL_ID_SIZE].ljust(TUNNEL_ID_SIZE, b"\0")
+
+def tunnel_id_to_string(raw):
+    """16 字节 → 字符串（到第一个 0 字节为止）"""
+    raw = bytes(raw)
+    end = raw.find(b"\0")
+    return (raw if end < 0 else raw[:end]).decode(errors="replace")
+
+def encode_target_ready(tunnel_id, target_node_id):
+    """TargetReady 帧的数据：tunnelID|targetNodeID（使用完整隧道 ID，不截断）"""
+    return f"{tunnel_id}|{target_node_id}".encode()
+
+def decode_target_ready(data):
+    tunnel_id, sep, target_node_id = bytes(data).decode().partition("|")
+    if not sep:
+        raise FrameError("TargetReady 消息格式错误")
+    return tunnel_id, target_node_id
+
+class CrossFrame:
+    """一个已解析的跨节点帧；data 在下一次向解码器写入数据前有效"""
+
+    __slots__ = ("tunnel_id", "type", "data")
+
+    def __init__(self, tunnel_id, ftype, data):
+        self.tunnel_id = tunnel_id
+        self.type = ftype
+        self.data = data
+
+    @property
+    def tunnel(self):
+        return tunnel_id_to_string(self.tunnel_id)
+
+    @property
+    def type_name(self):
+        return FRAME_TYPE_NAMES.get(self.type, f"0x{self.type:02x}")
+
+    def target_ready(self):
+        """TargetReady 帧的 (完整隧道 ID, 目标节点 ID)"""
+        if self.type != TARGET_READY:
+            raise FrameError(f"{self.type_name} 不是 TargetReady 帧")
+        return decode_target_ready(self.data)
+
+    def detach(self):
+        if isinstance(self.data, memoryview):
+            self.data = self.data.tobytes()
+        return self
+
+    def __len__(self):
+        return HEADER_SIZE + len(self.data)
+
+    def __repr__(self):
+        return f"CrossFrame(tunnel={self.tunnel!r}, type={self.type_name}, data={len(self.data)}B)"
+
+class CrossFrameDecoder(FrameDecoder):
+    """在可复用缓冲区上增量解析跨节点帧（接口与 FrameDecoder 相同）"""
+
+    def __init__(self, capacity=256 * 1024, max_frame=MAX_FRAME_SIZE, min_read=16 * 1024):
+        super().__init__(capacity, max_body=max_frame, min_read=min_read)
+        self.need = HEADER_SIZE
+
+    def frames(self):
+        """产出缓冲区中所有完整的帧"""
+        buf, view = self.buf, self.view
+        pos, end = self.start, self.end
+        try:
+            while end - pos >= HEADER_SIZE:
+                tunnel_id, ftype, length = HEADER.unpack_from(buf, pos)
+                if length > self.max_body:
+                    raise FrameError(f"帧长度 {length} 超过上限 {self.max_body}")
+                frame_end = pos + HEADER_SIZE + length
+                if frame_end > end:
+                    self.need = HEADER_SIZE + length
+                    return
+                data = view[pos + HEADER_SIZE:frame_end]
+                pos = frame_end
+                self.frames_decoded += 1
+                self.bytes_decoded += HEADER_SIZE + length
+                yield CrossFrame(tunnel_id, ftype, data)
+            self.need = HEADER_SIZE
+        finally:
+            self.start = pos
+            if pos == end:
+                self.start = self.end = 0
+
+    def take_remaining(self):
+        """取出尚未解析的字节并清空缓冲区（连接切换为原始字节流时使用）"""
+        rest = bytes(self.view[self.start:self.end])
+        self.start = self.end = 0
+        self.need = HEADER_SIZE
+        return rest
+
+def encode_frame(tunnel_id, ftype, data=b""):
+    """返回 [帧头, 数据] 两个缓冲区，供 sendmsg 直接使用"""
+    if len(data) > MAX_FRAME_SIZE:
+        raise FrameError(f"帧长度 {len(data)} 超过上限 {MAX_FRAME_SIZE}")
+    header = HEADER.pack(tunnel_id_from_string(tunnel_id), ftype, len(data))
+    return [header, data] if len(data) else [header]
+
+def split_data(tunnel_id, data, ftype=DATA):
+    """按 64KB 分片编码（FrameStream.Write 的行为），产出每帧的缓冲区列表"""
+    view = memoryview(data)
+    tid = tunnel_id_from_string(tunnel_id)
+    for pos in range(0, len(view), MAX_FRAME_SIZE):
+        chunk = view[pos:pos + MAX_FRAME_SIZE]
+        yield [HEADER.pack(tid, ftype, len(chunk)), chunk]
+
+class CrossFrameWriter(ScatterWriter):
+    """跨节点帧的 sendmsg 批量写出"""
+
+    def write(self, tunnel_id, ftype, data=b""):
+        self.queue(encode_frame(tunnel_id, ftype, data))
+
+    def write_data(self, tunnel_id, data):
+        for parts in split_data(tunnel_id, data):
+            self.queue(parts)
+
+    def write_target_ready(self, tunnel_id, target_node_id):
+        self.write(tunnel_id, TARGET_READY, encode_target_ready(tunnel_id, target_node_id))
+
+class FrameStats:
+    """按帧类型累计帧数和字节数，计算帧速率与数据帧填充率"""
+
+    def __init__(self):
+        self.frames = {}
+        self.bytes = {}
+        self.started = None
+        self.last = None
+
+    def add(self, frame, now=None):
+        now = time.monotonic() if now is None else now
+        if self.started is None:
+            self.started = now
+        self.last = now
+        name = frame.type_name
+        self.frames[name] = self.frames.get(name, 0) + 1
+        self.bytes[name] = self.bytes.get(name, 0) + len(frame.data)
+
+    def merge(self, other):
+        for name, count in other.frames.items():
+            self.frames[name] = self.frames.get(name, 0) + count
+            self.bytes[name] = self.bytes.get(name, 0) + other.bytes[name]
+        if other.started is not None:
+            self.started = other.started if self.started is None else min(self.started, other.started)
+            self.last = other.last if self.last is None else max(self.last, other.last)
+
+    @property
+    def total_frames(self):
+        return sum(self.frames.values())
+
+    def summary(self, elapsed=None):
+        """帧数、帧/秒、数据帧平均长度和相对 64KB 的填充率"""
+        if elapsed is None:
+            elapsed = (self.last - self.started) if self.started is not None else 0
+        data_frames = self.frames.get("data", 0)
+        data_bytes = self.bytes.get("data", 0)
+        avg = data_bytes / data_frames if data_frames else 0
+        return {
+            "frames": self.total_frames,
+            "frames_per_s": self.total_frames / elapsed if elapsed > 0 else 0,
+            "data_frames": data_frames,
+            "avg_data_frame": avg,
+            "fill_pct": avg / MAX_FRAME_SIZE * 100,
+            "by_type": dict(self.frames),
+        }
+
+# ---------- 微基准 ----------
+
+def bench_roundtrip(sizes, count, chunk):
+    """编码 count 帧（数据长度在 sizes 间轮换）后按 chunk 分段解码，返回各阶段耗时"""
+    payloads = {size: bytes(i % 251 for i in range(size)) for size in sizes}
+    tunnel = "tun-0123456789abcdef"
+    start = time.perf_counter()
+    frames = [encode_frame(tunnel, DATA, payloads[sizes[i % len(sizes)]]) for i in range(count)]
+    encode_s = time.perf_counter() - start
+    stream = b"".join(part for parts in frames for part in parts)
+
+    decoder = CrossFrameDecoder()
+    stats = FrameStats()
+    view = memoryview(stream)
+    start = time.perf_counter()
+    for pos in range(0, len(view), chunk):
+        piece = view[pos:pos + chunk]
+        decoder.get_buffer(len(piece))[:len(piece)] = piece
+        decoder.buffer_updated(len(piece))
+        for frame in decoder.frames():
+            stats.add(frame, now=0)
+    decode_s = time.perf_counter() - start
+    return frames, stream, encode_s, decode_s, stats
+
+def bench_socket(frames):
+    """socketpair 上 sendmsg 写出、recv_into 解析，返回 (帧数, 秒)"""
+    a, b = socket.socketpair()
+    expected = len(frames)
+    result = {}
+
+    def receive():
+        decoder = CrossFrameDecoder()
+        count = 0
+        while count < expected:
+            if decoder.recv_into(b) == 0:
+                break
+            for _ in decoder.frames():
+                count += 1
+        result["frames"] = count
+
+    reader = threading.Thread(target=receive, daemon=True)
+    writer = CrossFrameWriter(a)
+    start = time.perf_counter()
+    reader.start()
+    for i in range(0, expected, 64):
+        for parts in frames[i:i + 64]:
+            writer.queue(parts)
+        writer.flush()
+    reader.join()
+    elapsed = time.perf_counter() - start
+    a.close()
+    b.close()
+    return result.get("frames", 0), elapsed
+
+def parse_sizes(text):
+    sizes = [int(s) for s in text.split(",") if s]
+    for size in sizes:
+        if not 0 < size <= MAX_FRAME_SIZE:
+            raise argparse.ArgumentTypeError(f"帧长度需在 1..{MAX_FRAME_SIZE} 之间: {size}")
+    return sizes
+
+def main():
+    parser = argparse.ArgumentParser(description="tunnox 跨节点帧编解码微基准")
+    parser.add_argument('--frames', type=int, default=200000, help='每组帧数（64KB 组自动减少）')
+    parser.add_argument('--sizes', type=parse_sizes, action='append',
+                        help='数据帧长度组，逗号分隔（可重复），默认 512 / 4096 / 32768 / 65536')
+    parser.add_argument('--chunk', type=int, default=64 * 1024, help='解码时每次写入的字节数（模拟单次 recv）')
+    args = parser.parse_args()
+
+    groups = args.sizes or [[512], [4096], [32768], [65536]]
+    print(f"{'数据帧长度':<18}{'填充率':>8}{'编码 帧/秒':>14}{'解码 帧/秒':>14}{'socket 帧/秒':>14}{'socket MB/s':>13}")
+    for sizes in groups:
+        count = max(args.frames * 512 // max(sizes), 2000)
+        frames, stream, encode_s, decode_s, stats = bench_roundtrip(sizes, count, args.chunk)
+        if stats.total_frames != count:
+            print(f"解码帧数不符: {stats.total_frames} != {count}")
+            return 1
+        sent, socket_s = bench_socket(frames)
+        if sent != count:
+            print(f"socketpair 帧数不符: {sent} != {count}")
+            return 1
+        fill = stats.summary(elapsed=1)["fill_pct"]
+        label = ",".join(str(s) for s in sizes)
+        print(f"{label:<18}{fill:>7.1f}%{count / encode_s:>14.0f}{count / decode_s:>14.0f}"
+              f"{count / socket_s:>14.0f}{len(stream) / 1024**2 / socket_s:>13.1f}")
+    print(f"帧头 {HEADER_SIZE} 字节，单帧上限 {MAX_FRAME_SIZE} 字节")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
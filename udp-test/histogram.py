@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+对数-线性延迟直方图（HDR 风格）
+
+- 以纳秒为单位记录，配合 time.perf_counter_ns() 使用
+- 桶数量只取决于精度和可记录的最大值，与样本数量无关（内存固定）
+- 相同参数的直方图可以合并（每个 worker 各自记录，结束时汇总）
+- 可序列化为 JSON 字典或紧凑字符串，便于保存后再比较
+
+分桶方式：小于 2^p 的值每个值一个桶；之后每个 2 的幂区间均分为 2^(p-1) 个桶，
+因此任意值的相对误差不超过 1/2^(p-1)（默认 p=8，约 0.8%）。
+
+用法:
+    hist = LatencyHistogram()
+    start = time.perf_counter_ns()
+    ...
+    hist.record(time.perf_counter_ns() - start)
+    print(hist.summary_ms())
+"""
+
+import base64
+import math
+import time
+import zlib
+
+# 默认可记录的最大值：1 小时
+DEFAULT_HIGHEST_NS = 3600 * 10**9
+DEFAULT_PRECISION_BITS = 8
+
+# 报告中默认输出的分位数
+DEFAULT_PERCENTILES = (50, 90, 99, 99.9)
+
+now_ns = time.perf_counter_ns
+
+class LatencyHistogram:
+    """固定内存的对数-线性直方图"""
+
+    __slots__ = ("precision_bits", "highest", "counts", "count", "total",
+                 "min", "max", "overflow", "_linear", "_half", "_half_bits")
+
+    def __init__(self, highest=DEFAULT_HIGHEST_NS, precision_bits=DEFAULT_PRECISION_BITS):
+        if precision_bits < 2 or precision_bits > 16:
+            raise ValueError("precision_bits 取值范围为 2~16")
+        self.precision_bits = precision_bits
+        self.highest = int(highest)
+        self._linear = 1 << precision_bits
+        self._half_bits = precision_bits - 1
+        self._half = 1 << self._half_bits
+        self.counts = [0] * (self._index(self.highest) + 1)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        self.overflow = 0
+
+    # ---------- 分桶 ----------
+
+    def _index(self, value):
+        if value < self._linear:
+            return value
+        shift = value.bit_length() - self.precision_bits
+        return self._linear + ((shift - 1) << self._half_bits) + ((value >> shift) - self._half)
+
+    def _bounds(self, index):
+        """桶 index 覆盖的取值范围 [low, high]"""
+        if index < self._linear:
+            return index, index
+        j = index - self._linear
+        shift = (j >> self._half_bits) + 1
+        m = (j & (self._half - 1)) + self._half
+        return m << shift, ((m + 1) << shift) - 1
+
+    # ---------- 记录 ----------
+
+    def record(self, value_ns, n=1):
+        """记录一个耗时（纳秒）；超过上限的值计入最后一个桶并累计 overflow"""
+        v = int(value_ns)
+        if v < 0:
+            v = 0
+        if v > self.highest:
+            self.overflow += n
+            v = self.highest
+        self.counts[self._index(v)] += n
+        self.count += n
+        self.total += v * n
+        if self.min is None or v < self.min:
+            self.min = v
+        if self.max is None or v > self.max:
+            self.max = v
+
+    def record_since(self, start_ns):
+        """记录从 start_ns（perf_counter_ns）到现在的耗时"""
+        elapsed = now_ns() - start_ns
+        self.record(elapsed)
+        return elapsed
+
+    def merge(self, other):
+        """合并另一个参数相同的直方图（原地修改并返回 self）"""
+        if (other.precision_bits, other.highest) != (self.precision_bits, self.highest):
+            raise ValueError("只能合并精度和上限相同的直方图")
+        counts = self.counts
+        for i, c in enumerate(other.counts):
+            if c:
+                counts[i] += c
+        self.count += other.count
+        self.total += other.total
+        self.overflow += other.overflow
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        if other.max is not None:
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    @classmethod
+    def merged(cls, histograms, **kwargs):
+        result = cls(**kwargs)
+        for h in histograms:
+            result.merge(h)
+        return result
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.count = self.total = self.overflow = 0
+        self.min = self.max = None
+
+    # ---------- 统计 ----------
+
+    def percentile(self, q):
+        """q 分位数（0~100）；返回所在桶的上界（不超过实际最大值）"""
+        if self.count == 0:
+            return None
+        target = max(1, math.ceil(q / 100.0 * self.count))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            if c:
+                seen += c
+                if seen >= target:
+                    return min(self._bounds(i)[1], self.max)
+        return self.max
+
+    def percentiles(self, qs=DEFAULT_PERCENTILES):
+        """一次遍历计算多个分位数，返回 {q: 纳秒}"""
+        if self.count == 0:
+            return {q: None for q in qs}
+        targets = sorted((max(1, math.ceil(q / 100.0 * self.count)), q) for q in qs)
+        result = {}
+        seen = 0
+        k = 0
+        for i, c in enumerate(self.counts):
+            if not c:
+                continue
+            seen += c
+            while k < len(targets) and seen >= targets[k][0]:
+                result[targets[k][1]] = min(self._bounds(i)[1], self.max)
+                k += 1
+            if k == len(targets):
+                break
+        return result
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def summary(self, qs=DEFAULT_PERCENTILES):
+        """{count, min, mean, p.., max}，单位纳秒"""
+        result = {"count": self.count, "min": self.min, "mean": self.mean}
+        for q, v in self.percentiles(qs).items():
+            result[f"p{q:g}"] = v
+        result["max"] = self.max
+        if self.overflow:
+            result["overflow"] = self.overflow
+        return result
+
+    def summary_ms(self, qs=DEFAULT_PERCENTILES):
+        """与 summary() 相同，耗时换算为毫秒"""
+        return {
+            k: (v / 1e6 if v is not None and k not in ("count", "overflow") else v)
+            for k, v in self.summary(qs).items()
+        }
+
+    def format_ms(self, qs=DEFAULT_PERCENTILES):
+        """单行文本: p50=1.23ms p90=... max=..."""
+        s = self.summary_ms(qs)
+        parts = [f"{k}={s[k]:.2f}ms" if s[k] is not None else f"{k}=-"
+                 for k in [f"p{q:g}" for q in qs] + ["max"]]
+        return "  ".join(parts)
+
+    # ---------- 序列化 ----------
+
+    def to_dict(self):
+        """JSON 友好的稀疏表示"""
+        return {
+            "precision_bits": self.precision_bits,
+            "highest": self.highest,
+            "count": self.count,
+            "total": self.total,
+            "min": self.min,
+            "max": self.max,
+            "overflow": self.overflow,
+            "counts": [[i, c] for i, c in enumerate(self.counts) if c],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        h = cls(highest=data["highest"], precision_bits=data["precision_bits"])
+        for i, c in data["counts"]:
+            h.counts[i] = c
+        h.count = data["count"]
+        h.total = data["total"]
+        h.min = data["min"]
+        h.max = data["max"]
+        h.overflow = data.get("overflow", 0)
+        return h
+
+    def encode(self):
+        """紧凑字符串：稀疏桶（索引差值 + 计数）varint 编码后 zlib 压缩再 base64"""
+        out = bytearray()
+        for v in (self.precision_bits, self.highest, self.overflow,
+                  self.min or 0, self.max or 0, self.total):
+            _put_varint(out, v)
+        prev = 0
+        for i, c in enumerate(self.counts):
+            if c:
+                _put_varint(out, i - prev)
+                _put_varint(out, c)
+                prev = i
+        return base64.b64encode(zlib.compress(bytes(out), 9)).decode("ascii")
+
+    @classmethod
+    def decode(cls, text):
+        data = zlib.decompress(base64.b64decode(text))
+        pos = 0
+        header = []
+        for _ in range(6):
+            v, pos = _get_varint(data, pos)
+            header.append(v)
+        precision_bits, highest, overflow, vmin, vmax, total = header
+        h = cls(highest=highest, precision_bits=precision_bits)
+        idx = 0
+        while pos < len(data):
+            delta, pos = _get_varint(data, pos)
+            c, pos = _get_varint(data, pos)
+            idx += delta
+            h.counts[idx] = c
+            h.count += c
+        h.total = total
+        h.overflow = overflow
+        if h.count:
+            h.min, h.max = vmin, vmax
+        return h
+
+def _put_varint(out, v):
+    while v >= 0x80:
+        out.append((v & 0x7f) | 0x80)
+        v >>= 7
+    out.append(v)
+
+def _get_varint(data, pos):
+    result = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        result |= (b & 0x7f) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+HTTP 域名代理压测
+
+用 asyncio 维护一组 HTTP/1.1 keep-alive 连接，向 server 的域名代理
+（internal/httpservice/modules/domainproxy，监听在 Management API 端口）发送请求，
+按 Host 头路由到各个子域名映射，目标端为 http_origin.py。每种响应体大小输出：
+
+- RPS、吞吐（MB/s）、状态码与错误统计
+- 总耗时与首字节耗时（收到响应头）的分位数
+- 连接复用率：1 - 新建连接数 / 请求数
+
+域名代理对 GET 等小请求使用命令模式（经控制连接整体转发响应），大响应体的首字节耗时
+接近总耗时说明响应在 server 端被完整缓冲后才开始下发。
+
+用法:
+    ./http_bench.py --local --sizes 1k,64k,1m,8m --connections 32
+    ./http_bench.py --local --subdomains 8 --transport quic
+    ./http_bench.py --target 127.0.0.1:9000 --host app.tunnox.net --host api.tunnox.net
+"""
+
+import argparse
+import asyncio
+import socket
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+from common import (
+    CONFIG_FILE, log_info, log_success, log_warning, log_error, log_header, load_config, parse_address, error_key,
+)
+from histogram import LatencyHistogram
+from local_stack import add_cluster_arguments, add_impair_arguments, network_label
+
+DEFAULT_SIZES = ("1k", "64k", "1m", "8m")
+DEFAULT_BASE_DOMAIN = "bench.tunnox.local"
+READ_SIZE = 256 * 1024
+HEADER_LIMIT = 64 * 1024
+SIZE_UNITS = {"": 1, "k": 1024, "m": 1024**2}
+
+def parse_size(text):
+    text = text.strip().lower().rstrip("b")
+    unit = text[-1] if text and text[-1] in SIZE_UNITS else ""
+    return int(float(text[:len(text) - len(unit)]) * SIZE_UNITS[unit])
+
+def format_size(n):
+    for unit, scale in (("m", 1024**2), ("k", 1024)):
+        if n >= scale and n % scale == 0:
+            return f"{n // scale}{unit}"
+    return str(n)
+
+class PhaseStats:
+    """单个响应体大小的统计"""
+
+    def __init__(self):
+        self.total = LatencyHistogram()
+        self.ttfb = LatencyHistogram()
+        self.statuses = Counter()
+        self.errors = Counter()
+        self.requests = 0
+        self.reused = 0
+        self.connections = 0
+        self.bytes = 0
+
+async def read_body(reader, headers):
+    """读取并丢弃响应体，返回字节数"""
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        total = 0
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            if size == 0:
+                # 跳过 trailer
+                while await reader.readuntil(b"\r\n") != b"\r\n":
+                    pass
+                return total
+            remaining = size
+            while remaining:
+                remaining -= len(await reader.readexactly(min(remaining, READ_SIZE)))
+            await reader.readexactly(2)
+            total += size
+    if "content-length" in headers:
+        remaining = total = int(headers["content-length"])
+        while remaining:
+            data = await reader.read(min(remaining, READ_SIZE))
+            if not data:
+                raise asyncio.IncompleteReadError(b"", remaining)
+            remaining -= len(data)
+        return total
+    # 既无长度也非 chunked：读到连接关闭
+    total = 0
+    while data := await reader.read(READ_SIZE):
+        total += len(data)
+    headers["connection"] = "close"
+    return total
+
+class HTTPConnection:
+    """一条 keep-alive 连接，断开后自动重连"""
+
+    def __init__(self, address, stats, timeout):
+        self.address = address
+        self.stats = stats
+        self.timeout = timeout
+        self.reader = self.writer = None
+        self.used = False
+
+    async def request(self, path, host):
+        """发送 GET 请求，返回 (status, body_bytes)"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(*self.address, limit=HEADER_LIMIT), self.timeout)
+            self.writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.stats.connections += 1
+            self.used = False
+        elif self.used:
+            self.stats.reused += 1
+
+        start = time.perf_counter_ns()
+        self.writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: keep-alive\r\n"
+                          f"User-Agent: tunnox-http-bench\r\n\r\n".encode("latin-1"))
+        head = await asyncio.wait_for(self.reader.readuntil(b"\r\n\r\n"), self.timeout)
+        self.stats.ttfb.record_since(start)
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ", 2)[1])
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        size = await asyncio.wait_for(read_body(self.reader, headers), self.timeout)
+        self.stats.total.record_since(start)
+        self.used = True
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, size
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+async def worker(index, address, hosts, path, deadline, remaining, stats, timeout):
+    conn = HTTPConnection(address, stats, timeout)
+    n = index
+    try:
+        while time.monotonic() < deadline and remaining[0] != 0:
+            if remaining[0] > 0:
+                remaining[0] -= 1
+            host = hosts[n % len(hosts)]
+            n += 1
+            try:
+                status, size = await conn.request(path, host)
+            except Exception as e:
+                stats.errors[error_key(e)] += 1
+                conn.close()
+                await asyncio.sleep(0.01)
+                continue
+            stats.requests += 1
+            stats.statuses[status] += 1
+            stats.bytes += size
+    finally:
+        conn.close()
+
+async def run_phase_async(address, hosts, size, connections, duration, count, timeout):
+    stats = PhaseStats()
+    deadline = time.monotonic() + duration if duration else float("inf")
+    remaining = [count if count else -1]
+    path = f"/bytes/{size}"
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i, address, hosts, path, deadline, remaining, stats, timeout)
+                           for i in range(connections)))
+    return stats, time.perf_counter() - start
+
+def run_phase(address, hosts, size, connections, duration=10, count=None, timeout=30):
+    """以指定响应体大小压测一轮，返回结果"""
+    log_info(f"响应体 {format_size(size)}，{connections} 条连接，{len(hosts)} 个 Host，"
+             + (f"{duration}s" if duration else f"{count} 个请求") + f" → {address[0]}:{address[1]}")
+    stats, elapsed = asyncio.run(run_phase_async(address, hosts, size, connections, duration, count, timeout))
+    ok = stats.statuses.get(200, 0)
+    failed = stats.requests - ok + sum(stats.errors.values())
+    attempts = stats.requests + sum(stats.errors.values())
+    return {
+        "name": format_size(size),
+        "size": size,
+        "connections": connections,
+        "elapsed_seconds": elapsed,
+        "requests": stats.requests,
+        "qps": ok / elapsed if elapsed > 0 else 0.0,
+        "throughput_mb_s": stats.bytes / 1024**2 / elapsed if elapsed > 0 else 0.0,
+        "error_rate": failed / attempts if attempts else 0.0,
+        "connections_opened": stats.connections,
+        "reuse_ratio": stats.reused / stats.requests if stats.requests else 0.0,
+        "latency_ms": stats.total.summary_ms(),
+        "ttfb_ms": stats.ttfb.summary_ms(),
+        "latency_histogram": stats.total.encode(),
+        "statuses": {str(k): v for k, v in sorted(stats.statuses.items())},
+        "errors": dict(stats.errors),
+    }
+
+def print_report(results):
+    log_header("HTTP 域名代理压测结果")
+    print(f"{'大小':>6}{'请求':>9}{'RPS':>9}{'MB/s':>9}{'复用率':>8}{'错误率':>8}"
+          f"{'首字节p50':>10}{'首字节p99':>10}{'总p50':>9}{'总p99':>9}{'总max':>9}{'首字节/总':>10}")
+    for r in results:
+        t, l = r["ttfb_ms"], r["latency_ms"]
+        cells = [f"{d[k]:.2f}" if d.get(k) is not None else "-"
+                 for d, k in ((t, "p50"), (t, "p99"), (l, "p50"), (l, "p99"), (l, "max"))]
+        ratio = f"{t['p50'] / l['p50'] * 100:.0f}%" if t.get("p50") and l.get("p50") else "-"
+        print(f"{r['name']:>6}{r['requests']:>9}{r['qps']:>9.0f}{r['throughput_mb_s']:>9.1f}"
+              f"{r['reuse_ratio'] * 100:>7.1f}%{r['error_rate'] * 100:>7.2f}%"
+              f"{cells[0]:>10}{cells[1]:>10}{cells[2]:>9}{cells[3]:>9}{cells[4]:>9}{ratio:>10}")
+    print("\n首字节为收到完整响应头的时刻；首字节/总接近 100% 说明响应体在代理端被整体缓冲。")
+    for r in results:
+        other = {k: v for k, v in r["statuses"].items() if k != "200"}
+        if other or r["errors"]:
+            detail = [f"HTTP {k}={v}" for k, v in other.items()] + [f"{k}={v}" for k, v in sorted(r["errors"].items())]
+            print(f"[{r['name']}] " + ", ".join(detail))
+
+def run_sizes(address, hosts, args):
+    return [run_phase(address, hosts, size, args.connections, args.duration, args.count, args.timeout)
+            for size in args.sizes]
+
+def run_local(config, args):
+    from local_stack import LocalStack, cluster_options, find_free_port
+    from readiness import http_health_probe, tcp_accept_probe
+
+    with LocalStack(config, transport=args.transport, **cluster_options(args)) as stack:
+        stack.start_tunnel()
+        origin_port = find_free_port("tcp")
+        stack.start_service("http-origin", "http_origin.py", ["--port", origin_port, "--workers", args.origin_workers],
+                            tcp_accept_probe("127.0.0.1", origin_port))
+        proxy_port = stack.ports["management"]
+        hosts = []
+        for i in range(args.subdomains):
+            subdomain = f"bench{i}"
+            host = f"{subdomain}.{args.base_domain}"
+            stack.create_mapping(
+                f"http-{subdomain}", "http", 0, "127.0.0.1", origin_port,
+                probe=http_health_probe(f"http://127.0.0.1:{proxy_port}/health", host=host),
+                http_subdomain=subdomain, http_base_domain=args.base_domain,
+            )
+            hosts.append(host)
+        return stack.transport, run_sizes(("127.0.0.1", proxy_port), hosts, args)
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP 域名代理压测（keep-alive 连接池）")
+    parser.add_argument('--config', default=str(CONFIG_FILE), help='配置文件路径（--local 时读取 local 段）')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--target', help='域名代理地址 host:port（server 的 Management API 端口）')
+    target.add_argument('--local', action='store_true', help='启动本地栈、HTTP 源站替身并新建域名映射')
+    parser.add_argument('--transport', choices=['tcp', 'websocket', 'quic', 'kcp'], help='本地模式的连接协议')
+    parser.add_argument('--host', action='append', default=[],
+                        help='请求使用的 Host 头（可重复，请求在各 Host 间轮转；--target 模式必填）')
+    parser.add_argument('--subdomains', type=int, default=4, help='本地模式创建的子域名映射数')
+    parser.add_argument('--base-domain', default=DEFAULT_BASE_DOMAIN, help='本地模式使用的基础域名')
+    parser.add_argument('--sizes', type=lambda s: [parse_size(x) for x in s.split(",") if x.strip()],
+                        default=[parse_size(s) for s in DEFAULT_SIZES], help='逗号分隔的响应体大小，如 1k,64k,1m')
+    parser.add_argument('--connections', type=int, default=16, help='keep-alive 连接数（并发）')
+    parser.add_argument('--duration', type=float, default=10, help='每种大小的压测时长（秒）')
+    parser.add_argument('--count', type=int, help='每种大小的请求总数（指定后不限时长）')
+    parser.add_argument('--timeout', type=float, default=30, help='单个请求超时（秒）')
+    parser.add_argument('--origin-workers', type=int, default=2, help='本地模式 HTTP 源站替身进程数')
+    parser.add_argument('--results-db', help='测试结果库路径（默认 ~/tunnox-test/results.db）')
+    parser.add_argument('--no-store', action='store_true', help='不把结果写入结果库')
+    add_cluster_arguments(parser)
+    add_impair_arguments(parser)
+    args = parser.parse_args()
+    if args.count:
+        args.duration = None
+
+    config = {}
+    try:
+        if args.local:
+            config = load_config(args.config) if Path(args.config).exists() else {}
+            transport, results = run_local(config, args)
+        else:
+            if not args.host:
+                parser.error("--target 模式需要至少一个 --host")
+            transport, results = None, run_sizes(parse_address(args.target), args.host, args)
+    except KeyboardInterrupt:
+        log_error("测试被用户中断")
+        return 130
+
+    print_report(results)
+    passed = all(r["requests"] > 0 and r["error_rate"] < 0.01 for r in results)
+    if not args.no_store:
+        from results_store import DEFAULT_DB, ResultsStore
+        with ResultsStore(args.results_db or DEFAULT_DB) as store:
+            run_id = store.record_run("http", {"sizes": results}, transport=transport, config=config,
+                                      label=network_label(args), passed=passed)
+        log_info(f"结果已写入结果库 (运行 #{run_id})")
+
+    if not passed:
+        log_error("存在没有完成请求或错误率超过 1% 的响应体大小")
+        return 1
+    if any(r["reuse_ratio"] < 0.9 for r in results if r["requests"] >= 10 * r["connections"]):
+        log_warning("连接复用率低于 90%，代理可能在响应后关闭了连接")
+    log_success("HTTP 域名代理压测完成")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
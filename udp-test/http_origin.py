@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+HTTP 源站替身服务
+
+作为 HTTP 域名映射的目标端，供域名代理压测使用。HTTP/1.1，支持 keep-alive：
+
+- GET  /bytes/<n>   返回 n 字节的响应体（Content-Length）
+- POST /echo        原样返回请求体
+- GET  /health      返回 ok
+
+每个响应都带 X-Origin-Host 头，内容为收到的 Host（经隧道后为映射的目标地址）。
+
+用法:
+    ./http_origin.py --port 18080
+    ./http_origin.py --port 18080 --workers 4
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import signal
+import socket
+import sys
+
+CHUNK_SIZE = 256 * 1024
+MAX_BODY = 1 << 30
+# 响应体由同一块数据重复拼接，避免每个请求都生成随机数据
+BODY_BLOCK = bytes(i % 251 for i in range(CHUNK_SIZE))
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large"}
+
+async def read_request(reader):
+    """返回 (method, path, headers, body)；连接关闭时返回 None"""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    lines = head.decode("latin-1").split("\r\n")
+    method, path, _ = lines[0].split(" ", 2)
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            key, value = line.split(":", 1)
+            headers[key.strip().lower()] = value.strip()
+    body = b""
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        parts = []
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            if size == 0:
+                await reader.readuntil(b"\r\n")
+                break
+            parts.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        body = b"".join(parts)
+    elif "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    return method, path, headers, body
+
+async def write_response(writer, status, headers, body_len, body=None, keep_alive=True):
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+             f"Content-Length: {body_len}",
+             "Content-Type: application/octet-stream",
+             "Connection: " + ("keep-alive" if keep_alive else "close")]
+    lines += [f"{k}: {v}" for k, v in headers.items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+    if body is not None:
+        writer.write(body)
+    else:
+        remaining = body_len
+        while remaining > 0:
+            n = min(remaining, CHUNK_SIZE)
+            writer.write(BODY_BLOCK[:n])
+            remaining -= n
+            await writer.drain()
+    await writer.drain()
+
+async def handle(reader, writer):
+    sock = writer.get_extra_info("socket")
+    if sock is not None:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    try:
+        while True:
+            request = await read_request(reader)
+            if request is None:
+                break
+            method, path, headers, body = request
+            keep_alive = headers.get("connection", "").lower() != "close"
+            extra = {"X-Origin-Host": headers.get("host", "")}
+            if path.startswith("/bytes/") and method in ("GET", "HEAD"):
+                try:
+                    size = int(path[len("/bytes/"):].split("?")[0])
+                except ValueError:
+                    await write_response(writer, 400, extra, 0, b"", keep_alive)
+                    continue
+                if size > MAX_BODY:
+                    await write_response(writer, 413, extra, 0, b"", keep_alive)
+                    continue
+                await write_response(writer, 200, extra, size, b"" if method == "HEAD" else None, keep_alive)
+            elif path == "/echo":
+                if method != "POST":
+                    await write_response(writer, 405, extra, 0, b"", keep_alive)
+                    continue
+                await write_response(writer, 200, extra, len(body), body, keep_alive)
+            elif path == "/health":
+                await write_response(writer, 200, extra, 2, b"ok", keep_alive)
+            else:
+                await write_response(writer, 404, extra, 0, b"", keep_alive)
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+def make_socket(host, port, reuse_port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(4096)
+    sock.setblocking(False)
+    return sock
+
+async def serve(sock):
+    server = await asyncio.start_server(handle, sock=sock)
+    loop = asyncio.get_running_loop()
+    stop = loop.create_future()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set_result, None)
+    async with server:
+        await stop
+
+def run_worker(host, port, reuse_port):
+    asyncio.run(serve(make_socket(host, port, reuse_port)))
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP 源站替身服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--workers", type=int, default=1, help="进程数（>1 时使用 SO_REUSEPORT）")
+    args = parser.parse_args()
+
+    print(f"HTTP 源站替身监听 {args.host}:{args.port}，{args.workers} 个进程", flush=True)
+    if args.workers <= 1:
+        run_worker(args.host, args.port, False)
+        return 0
+
+    workers = [
+        multiprocessing.Process(target=run_worker, args=(args.host, args.port, True), daemon=True)
+        for _ in range(args.workers)
+    ]
+    for w in workers:
+        w.start()
+    # SIGTERM 会发给整个进程组：主进程忽略它，等待 worker 各自退出
+    signal.signal(signal.SIGTERM, lambda *_: None)
+    try:
+        for w in workers:
+            w.join()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
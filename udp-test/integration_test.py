@@ -3,7 +3,7 @@
 Tunnox UDP 集成测试脚本
 
 功能：
-1. 初始化环境（停止服务、编译、部署）
+1. 初始化环境（停止服务、编译、部署；--local 模式下在本机启动全部进程）
 2. 启动服务端和客户端
 3. 执行 MySQL 连接测试（3次）
 4. 生成测试报告
@@ -11,8 +11,9 @@ Tunnox UDP 集成测试脚本
 
 import os
 import sys
+import json
 import time
-import yaml
+import argparse
 import subprocess
 import signal
 from pathlib import Path
@@ -24,45 +25,19 @@ except ImportError:
     print("❌ 缺少 pymysql 模块，请安装: pip3 install pymysql")
     sys.exit(1)
 
-# 配置文件路径
-CONFIG_FILE = Path(__file__).parent / "config.yaml"
-PROJECT_ROOT = Path(__file__).parent.parent
-
-class Colors:
-    """终端颜色"""
-    HEADER = '\033[95m'
-    BLUE = '\033[94m'
-    CYAN = '\033[96m'
-    GREEN = '\033[92m'
-    YELLOW = '\033[93m'
-    RED = '\033[91m'
-    END = '\033[0m'
-    BOLD = '\033[1m'
-
-def log_info(msg):
-    print(f"{Colors.CYAN}ℹ {msg}{Colors.END}")
-
-def log_success(msg):
-    print(f"{Colors.GREEN}✓ {msg}{Colors.END}")
-
-def log_warning(msg):
-    print(f"{Colors.YELLOW}⚠ {msg}{Colors.END}")
-
-def log_error(msg):
-    print(f"{Colors.RED}✗ {msg}{Colors.END}")
-
-def log_header(msg):
-    print(f"\n{Colors.BOLD}{Colors.HEADER}{'='*60}{Colors.END}")
-    print(f"{Colors.BOLD}{Colors.HEADER}{msg}{Colors.END}")
-    print(f"{Colors.BOLD}{Colors.HEADER}{'='*60}{Colors.END}\n")
-
-def load_config():
-    """加载配置文件"""
-    log_info(f"加载配置文件: {CONFIG_FILE}")
-    with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f)
-    log_success("配置文件加载成功")
-    return config
+from common import (
+    CONFIG_FILE, PROJECT_ROOT, Colors,
+    log_info, log_success, log_warning, log_error, log_header, load_config,
+)
+from build_cache import BuildTarget, build_targets
+from local_stack import add_impair_arguments
+from pipeline import PhaseRunner
+from proc_sampler import ProcSampler, find_pids_by_exe
+from results_store import DEFAULT_DB, ResultsStore
+from readiness import (
+    CLIENT_HANDSHAKE_PATTERN, ReadinessTracker,
+    http_health_probe, tcp_accept_probe, log_line_probe,
+)
 
 def run_command(cmd, cwd=None, check=True, capture_output=False, timeout=30):
     """执行命令"""
@@ -151,11 +126,8 @@ def stop_service_with_timeout(config, timeout=10):
             log_error(f"强制停止失败: {e}")
             return False
 
-def stop_processes(config):
-    """停止所有相关进程"""
-    log_header("步骤 1: 停止现有进程")
-    
-    # 停止远程服务器上的服务
+def stop_remote_server(config):
+    """停止远程服务器上的服务"""
     log_info("停止远程服务器上的 tunnox 服务...")
     try:
         stop_service_with_timeout(config, timeout=10)
@@ -171,8 +143,9 @@ def stop_processes(config):
     except Exception as e:
         log_error(f"停止远程服务失败: {e}")
         raise
-    
-    # 停止本地客户端进程
+
+def stop_local_clients(config):
+    """停止本地客户端进程"""
     log_info("停止本地客户端进程...")
     try:
         run_command("pkill -f 'tunnox.*client' || true", check=False, timeout=10)
@@ -190,24 +163,20 @@ def stop_processes(config):
         log_error(f"停止本地进程失败: {e}")
         raise
 
-def build_binaries():
-    """编译 server 和 client"""
-    log_header("步骤 2: 编译二进制文件")
-    
-    # 编译 server (Linux amd64)
-    log_info("编译 server (Linux amd64)...")
-    run_command("GOOS=linux GOARCH=amd64 go build -o bin/server ./cmd/server", cwd=PROJECT_ROOT, timeout=120)
-    log_success("server 编译完成")
-    
-    # 编译 client (本地平台)
-    log_info("编译 client (本地平台)...")
-    run_command("go build -o bin/client ./cmd/client", cwd=PROJECT_ROOT, timeout=120)
-    log_success("client 编译完成")
+def build_binaries(local=False, force=False):
+    """编译 server 和 client（源码未变化时复用构建缓存，否则并发编译）"""
+    bin_dir = PROJECT_ROOT / "bin"
+    targets = [
+        # 本地模式下 server 也在本机运行，使用本地平台编译；否则为 Linux amd64
+        BuildTarget("server", "./cmd/server", bin_dir / "server",
+                    goos="" if local else "linux", goarch="" if local else "amd64"),
+        # client 始终使用本地平台
+        BuildTarget("client", "./cmd/client", bin_dir / "client"),
+    ]
+    return build_targets(targets, force=force)
 
 def deploy_server(config):
     """部署 server 到远程服务器"""
-    log_header("步骤 3: 部署 server")
-    
     ssh_config = config['server']['ssh']
     server_config = config['server']['tunnox-server']
     ssh_key = Path(__file__).parent / ssh_config['ssh-key']
@@ -232,35 +201,25 @@ def deploy_server(config):
     ssh_command(config, "chmod +x /opt/tunnox/tunnox-server")
     log_success("权限设置完成")
 
-def deploy_clients(config):
+def deploy_client(config, role):
     """部署客户端到本地目录"""
-    log_header("步骤 4: 部署客户端")
-    
     client_bin = PROJECT_ROOT / "bin" / "client"
     
-    # 部署 listen-client
-    listen_folder = Path(config['listen-client']['folder']).expanduser()
-    log_info(f"部署 listen-client 到 {listen_folder}...")
-    listen_folder.mkdir(parents=True, exist_ok=True)
-    run_command(f"cp {client_bin} {listen_folder}/client")
-    log_success("listen-client 部署完成")
-    
-    # 部署 target-client
-    target_folder = Path(config['target-client']['folder']).expanduser()
-    log_info(f"部署 target-client 到 {target_folder}...")
-    target_folder.mkdir(parents=True, exist_ok=True)
-    run_command(f"cp {client_bin} {target_folder}/client")
-    log_success("target-client 部署完成")
-
-def generate_client_config(folder, client_id, secret_key, server_addr, server_port):
-    """生成客户端配置文件"""
+    folder = Path(config[role]['folder']).expanduser()
+    log_info(f"部署 {role} 到 {folder}...")
+    folder.mkdir(parents=True, exist_ok=True)
+    run_command(f"cp {client_bin} {folder}/client")
+    log_success(f"{role} 部署完成")
+
+def generate_client_config(folder, client_id, secret_key, server_addr, server_port, protocol="kcp"):
+    """生成客户端配置文件（protocol: tcp / websocket / quic / kcp）"""
     config_content = f"""# Tunnox Client Configuration
 client_id: {client_id}
 auth_token: "{secret_key}"
 anonymous: false
 
 server:
-  protocol: udp
+  protocol: {protocol}
   address: {server_addr}:{server_port}
 
 log:
@@ -269,63 +228,56 @@ log:
   output: file
 """
     
-    config_file = Path(folder).expanduser() / "client-config.yaml"
+    folder_path = Path(folder).expanduser()
+    folder_path.mkdir(parents=True, exist_ok=True)
+    
+    config_file = folder_path / "client-config.yaml"
     with open(config_file, 'w') as f:
         f.write(config_content)
     
     log_success(f"配置文件已生成: {config_file}")
 
-def generate_configs(config):
-    """生成所有配置文件"""
-    log_header("步骤 5: 生成配置文件")
-    
+def generate_config(config, role, protocol=None):
+    """生成指定客户端的配置文件"""
     server_config = config['server']['tunnox-server']
-    server_addr = server_config['domain']
-    server_port = server_config['port']
+    # 客户端已不支持 udp 协议，未指定时使用同样基于 UDP 的 kcp
+    protocol = protocol or server_config.get('protocol', 'kcp')
     
-    # 生成 listen-client 配置
-    log_info("生成 listen-client 配置...")
+    log_info(f"生成 {role} 配置 (协议 {protocol})...")
     generate_client_config(
-        config['listen-client']['folder'],
-        config['listen-client']['client-id'],
-        config['listen-client']['secret-key'],
-        server_addr,
-        server_port
-    )
-    
-    # 生成 target-client 配置
-    log_info("生成 target-client 配置...")
-    generate_client_config(
-        config['target-client']['folder'],
-        config['target-client']['client-id'],
-        config['target-client']['secret-key'],
-        server_addr,
-        server_port
+        config[role]['folder'],
+        config[role]['client-id'],
+        config[role]['secret-key'],
+        server_config['domain'],
+        server_config['port'],
+        protocol=protocol
     )
 
-def start_server(config):
+def start_server(config, readiness):
     """启动远程服务器"""
-    log_header("步骤 6: 启动服务器")
+    server_config = config['server']['tunnox-server']
+    health_url = server_config.get('health-url') or (
+        f"http://{server_config['domain']}:{server_config.get('management-port', 9000)}/tunnox/health"
+    )
     
     log_info("启动 tunnox.service...")
+    started_at = time.monotonic()
     ssh_command(config, "systemctl start tunnox.service")
-    time.sleep(3)
     
-    # 检查服务状态
-    log_info("检查服务状态...")
-    status = ssh_command(config, "systemctl is-active tunnox.service", check=False)
-    
-    if status == "active":
-        log_success("服务器启动成功")
-    else:
-        log_error(f"服务器启动失败，状态: {status}")
+    # 轮询健康检查接口，代替固定等待
+    log_info(f"等待服务器就绪: {health_url}")
+    try:
+        readiness.wait("server", http_health_probe(health_url), timeout=60, started_at=started_at)
+    except TimeoutError as e:
+        status = ssh_command(config, "systemctl is-active tunnox.service", check=False)
+        log_error(f"服务器启动失败，状态: {status} ({e})")
         # 显示日志
         logs = ssh_command(config, "journalctl -u tunnox.service -n 20 --no-pager", check=False)
         log_error(f"服务日志:\n{logs}")
         raise Exception("服务器启动失败")
 
-def start_client(folder, name, daemon=True):
-    """启动客户端"""
+def start_client(folder, name, readiness, daemon=True):
+    """启动客户端，等待日志中出现握手完成行"""
     client_path = Path(folder).expanduser() / "client"
     config_path = Path(folder).expanduser() / "client-config.yaml"
     log_path = Path(folder).expanduser() / "logs" / "client.log"
@@ -336,42 +288,33 @@ def start_client(folder, name, daemon=True):
     # 确保 logs 目录存在
     log_path.parent.mkdir(parents=True, exist_ok=True)
     
+    # 先记录日志偏移再启动，只匹配本次启动后的握手行
+    handshake = log_line_probe(log_path, CLIENT_HANDSHAKE_PATTERN)
+    started_at = time.monotonic()
+    
     if daemon:
         # 后台运行，但保留 stderr 到错误日志文件
         # 同时切换到客户端目录，确保工作目录正确
         folder_path = Path(folder).expanduser()
-        cmd = f"cd {folder_path} && nohup ./client -config {config_path} -daemon > /dev/null 2> {error_log_path} &"
+        cmd = f"cd {folder_path} && nohup ./client -config {config_path} -daemon -log {log_path} > /dev/null 2> {error_log_path} &"
         run_command(cmd, check=False)
     else:
         # 前台运行（用于调试）
-        cmd = f"{client_path} -config {config_path} -daemon"
+        cmd = f"{client_path} -config {config_path} -daemon -log {log_path}"
         run_command(cmd)
     
-    time.sleep(2)
-    log_success(f"{name} 启动完成")
+    readiness.wait(name, handshake, timeout=60, started_at=started_at)
 
-def start_clients(config):
-    """启动所有客户端"""
-    log_header("步骤 7: 启动客户端")
-    
-    # 启动 target-client
-    start_client(
-        config['target-client']['folder'],
-        "target-client"
-    )
-    
-    # 等待 target-client 连接
-    time.sleep(3)
-    
-    # 启动 listen-client
-    start_client(
-        config['listen-client']['folder'],
-        "listen-client"
+def wait_mapping_listen(config, readiness, started_at=None):
+    """等待服务器推送映射，listen-client 的 MySQL 端口开始 accept"""
+    mysql_config = config['listen-client']['mysql-listen']
+    log_info(f"等待映射端口 {mysql_config['port']} 开始监听...")
+    readiness.wait(
+        "mysql-listen",
+        tcp_accept_probe(mysql_config['address'], mysql_config['port']),
+        timeout=60,
+        started_at=started_at
     )
-    
-    # 等待客户端建立连接
-    log_info("等待客户端建立连接...")
-    time.sleep(5)
 
 def test_mysql_connection(config, round_num, total_rounds):
     """测试 MySQL 连接"""
@@ -403,10 +346,10 @@ def test_mysql_connection(config, round_num, total_rounds):
         sql = mysql_config['sql-script']
         log_info(f"执行查询: {sql}")
         
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
         cursor.execute(sql)
         results = cursor.fetchall()
-        elapsed = time.time() - start_time
+        elapsed = (time.perf_counter_ns() - start_ns) / 1e9
         
         log_success(f"查询成功! 返回 {len(results)} 行，耗时 {elapsed:.2f}s")
         
@@ -426,10 +369,8 @@ def test_mysql_connection(config, round_num, total_rounds):
         traceback.print_exc()
         return False
 
-def run_mysql_tests(config):
+def run_mysql_tests(config, stack=None):
     """运行 MySQL 测试（3次）"""
-    log_header("步骤 8: 执行 MySQL 连接测试")
-    
     total_rounds = 3
     
     for i in range(total_rounds):
@@ -438,7 +379,7 @@ def run_mysql_tests(config):
         else:
             log_error(f"✗ 第 {i + 1} 轮测试失败")
             log_error(f"测试在第 {i + 1} 轮失败，立即退出")
-            show_logs(config)
+            show_logs(config, stack)
             return False
         
         # 轮次之间等待更长时间，让 UDP 会话完全清理
@@ -449,10 +390,43 @@ def run_mysql_tests(config):
     log_success(f"所有 {total_rounds} 轮测试通过! ✓")
     return True
 
-def show_logs(config):
+def run_mysql_load(config, args):
+    """MySQL 并发压测（--load-connections 指定时执行）"""
+    from mysql_load import run_load, print_report
+    
+    result = run_load(
+        config['listen-client']['mysql-listen'],
+        args.load_connections,
+        duration=args.load_duration if args.load_queries is None else None,
+        queries=args.load_queries,
+        sql=args.load_sql,
+    )
+    print_report(result)
+    if result['queries_ok'] == 0:
+        raise Exception("压测没有成功的查询")
+    if result['error_rate'] > args.load_max_error_rate:
+        raise Exception(
+            f"压测错误率 {result['error_rate'] * 100:.2f}% 超过阈值 {args.load_max_error_rate * 100:.2f}%"
+        )
+    return result
+
+def show_local_logs(stack):
+    """显示本地模式下各组件的日志"""
+    for name, log_path in stack.log_paths().items():
+        log_info(f"\n{name} 日志 (最后 20 行):")
+        if log_path.exists():
+            run_command(f"tail -n 20 {log_path}", check=False)
+        else:
+            log_warning(f"日志文件不存在: {log_path}")
+
+def show_logs(config, stack=None):
     """显示相关日志"""
     log_header("查看日志")
     
+    if stack is not None:
+        show_local_logs(stack)
+        return
+    
     # 服务器日志
     log_info("服务器日志 (最后 20 行):")
     try:
@@ -493,8 +467,188 @@ def show_logs(config):
     else:
         log_info("无错误日志")
 
+def add_load_phase(runner, config, args):
+    """功能测试通过后追加并发压测阶段"""
+    if not args.load_connections:
+        return
+    
+    def mysql_load():
+        if not runner.result("mysql_tests"):
+            log_warning("MySQL 连接测试未通过，跳过并发压测")
+            return None
+        return run_mysql_load(config, args)
+    runner.add("mysql_load", mysql_load, deps=("mysql_tests",), title="MySQL 并发压测")
+
+def run_local(config, args, readiness, runner, sampler=None):
+    """本地回环模式：server 和两个客户端都作为本机子进程运行"""
+    from local_stack import LocalStack
+    
+    # SIGTERM 与 Ctrl+C 一样走清理流程，保证子进程被回收
+    def _raise_interrupt(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    
+    stack = LocalStack(config, transport=args.transport, readiness=readiness, impair=args.impair)
+    with stack:
+        # 清理残留进程、分配端口与编译互不依赖
+        runner.add("prepare", stack.prepare, title="准备本地环境")
+        build_deps = ()
+        if not args.skip_build:
+            runner.add("build", lambda: build_binaries(local=True, force=args.rebuild), title="编译二进制文件")
+            build_deps = ("build",)
+        runner.add("start_server", stack.start_server, deps=("prepare",) + build_deps, title="启动本地服务器")
+        runner.add("start_clients", stack.start_clients, deps=("start_server",), title="启动本地客户端")
+        runner.add("start_standin", stack.start_mysql_standin, deps=("prepare",), title="启动 MySQL 替身服务")
+        runner.add("create_mapping", stack.create_mysql_mapping, deps=("start_clients", "start_standin"),
+                   title="创建端口映射")
+        runner.add("mysql_tests", lambda: run_mysql_tests(config, stack), deps=("create_mapping",),
+                   title="执行 MySQL 连接测试")
+        add_load_phase(runner, config, args)
+        
+        # 采样 supervisor 启动的全部进程（server、客户端、MySQL 替身），须在进程停止前结束采样
+        if sampler is not None:
+            sampler.pids_source = lambda: stack.supervisor.pids
+            args.resources_out = args.resources_out or str(stack.work_dir / "resources.json.gz")
+            sampler.start()
+        try:
+            runner.run()
+        finally:
+            if sampler is not None:
+                sampler.stop()
+        log_info(f"进程 PID: {stack.supervisor.pids}")
+    # 损伤代理的最终计数在测试栈停止后才写出
+    args.impairment = stack.impair_summary
+    return runner.result("mysql_tests")
+
+def run_remote(config, args, readiness, runner, sampler=None):
+    """远程模式：部署 server 到远程服务器，客户端在本地运行
+
+    阶段依赖：
+      stop_remote ─┬─ deploy_server ── start_server ─┐
+      build ───────┤                                  ├─ start_target ── start_listen ── mysql_tests
+      stop_local ──┴─ deploy_target / deploy_listen ──┤
+      config_target / config_listen ──────────────────┘
+    """
+    runner.add("stop_remote", lambda: stop_remote_server(config), title="停止远程服务器")
+    runner.add("stop_local", lambda: stop_local_clients(config), title="停止本地客户端")
+    runner.add("build", lambda: build_binaries(force=args.rebuild), title="编译二进制文件")
+    runner.add("config_target", lambda: generate_config(config, "target-client", args.transport), title="生成 target-client 配置")
+    runner.add("config_listen", lambda: generate_config(config, "listen-client", args.transport), title="生成 listen-client 配置")
+    
+    runner.add("deploy_server", lambda: deploy_server(config), deps=("stop_remote", "build"), title="部署 server")
+    runner.add("deploy_target", lambda: deploy_client(config, "target-client"), deps=("stop_local", "build"),
+               title="部署 target-client")
+    runner.add("deploy_listen", lambda: deploy_client(config, "listen-client"), deps=("stop_local", "build"),
+               title="部署 listen-client")
+    
+    runner.add("start_server", lambda: start_server(config, readiness), deps=("deploy_server",), title="启动服务器")
+    # target-client 握手完成后再启动 listen-client
+    runner.add("start_target",
+               lambda: start_client(config['target-client']['folder'], "target-client", readiness),
+               deps=("start_server", "deploy_target", "config_target"), title="启动 target-client")
+    
+    def start_listen():
+        started_at = time.monotonic()
+        start_client(config['listen-client']['folder'], "listen-client", readiness)
+        wait_mapping_listen(config, readiness, started_at=started_at)
+    runner.add("start_listen", start_listen, deps=("start_target", "deploy_listen", "config_listen"),
+               title="启动 listen-client")
+    
+    runner.add("mysql_tests", lambda: run_mysql_tests(config), deps=("start_listen",), title="执行 MySQL 连接测试")
+    add_load_phase(runner, config, args)
+    
+    # server 在远程主机上，只能采样本机的两个客户端（nohup 启动，按可执行文件路径查找 PID）
+    if sampler is not None:
+        clients = {role: Path(config[role]['folder']).expanduser() / "client"
+                   for role in ("target-client", "listen-client")}
+        sampler.pids_source = lambda: find_pids_by_exe(clients)
+        args.resources_out = args.resources_out or str(
+            Path(config['listen-client']['folder']).expanduser() / "logs" / "resources.json.gz")
+        sampler.start()
+    try:
+        runner.run()
+    finally:
+        if sampler is not None:
+            sampler.stop()
+    return runner.result("mysql_tests")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Tunnox UDP 集成测试")
+    parser.add_argument('--config', default=str(CONFIG_FILE), help='配置文件路径')
+    parser.add_argument('--local', action='store_true',
+                        help='本地回环模式：在本机启动 server 和客户端，不依赖远程服务器')
+    parser.add_argument('--transport', choices=['tcp', 'websocket', 'quic', 'kcp'],
+                        help='客户端连接协议（本地模式默认取 local.transport，远程模式默认取 '
+                             'server.tunnox-server.protocol，均未配置时为 kcp）')
+    parser.add_argument('--skip-build', action='store_true', help='跳过编译，直接使用 bin/ 下已有的二进制')
+    parser.add_argument('--load-connections', type=int, default=0,
+                        help='功能测试通过后，用 N 个并发连接对 MySQL 映射压测（0 表示不压测）')
+    parser.add_argument('--load-duration', type=float, default=30, help='压测时长（秒）')
+    parser.add_argument('--load-queries', type=int, help='压测查询总数（指定后忽略 --load-duration）')
+    parser.add_argument('--load-sql', help='压测 SQL（默认使用 mysql-listen.sql-script）')
+    parser.add_argument('--load-max-error-rate', type=float, default=0.01, help='压测允许的最大错误率')
+    parser.add_argument('--rebuild', action='store_true', help='忽略构建缓存，强制重新编译')
+    parser.add_argument('--metrics-out', help='将组件就绪耗时、阶段耗时等指标保存为 JSON 文件')
+    parser.add_argument('--sample-interval', type=float, default=0.5,
+                        help='进程资源采样间隔（秒，最小 0.1 即 10Hz；0 表示不采样）')
+    parser.add_argument('--resources-out',
+                        help='资源采样文件路径（默认本地模式为 <work-dir>/resources.json.gz，'
+                             '远程模式为 listen-client 的 logs/resources.json.gz）')
+    parser.add_argument('--results-db', default=str(DEFAULT_DB), help='测试结果库（SQLite）路径')
+    parser.add_argument('--no-store', action='store_true', help='不把本次运行写入结果库')
+    parser.add_argument('--label', help='写入结果库时附加的标签')
+    add_impair_arguments(parser)
+    args = parser.parse_args()
+    if args.impair and not args.local:
+        parser.error("--impair 只能用于 --local 模式")
+    return args
+
+def resolve_transport(config, args):
+    """本次运行客户端使用的连接协议"""
+    if args.transport:
+        return args.transport
+    if args.local:
+        return (config.get('local') or {}).get('transport', 'kcp')
+    return config['server']['tunnox-server'].get('protocol', 'kcp')
+
+def report_metrics(args, readiness, runner, sampler=None, config=None, passed=None):
+    """输出就绪耗时、阶段耗时与进程资源，按需保存为 JSON 并写入结果库"""
+    readiness.print_summary()
+    runner.print_table()
+    samples = {}
+    if sampler is not None and sampler.series:
+        sampler.print_summary()
+        samples["resources"] = sampler.save(args.resources_out).read_bytes()
+
+    metrics = {"readiness": readiness.results, "pipeline": runner.timings()}
+    if sampler is not None:
+        metrics["resources"] = sampler.summary()
+    if "mysql_load" in runner.phases and runner.result("mysql_load"):
+        metrics["load"] = runner.result("mysql_load")
+        samples["load.latency_histogram"] = metrics["load"]["latency_histogram"]
+    if getattr(args, "impairment", None):
+        metrics["impairment"] = args.impairment
+
+    if args.metrics_out:
+        path = Path(args.metrics_out)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(metrics, indent=2, ensure_ascii=False))
+        log_info(f"指标已保存: {path}")
+
+    if not args.no_store and config is not None:
+        try:
+            with ResultsStore(args.results_db) as store:
+                run_id = store.record_run(
+                    "integration", metrics, transport=resolve_transport(config, args), config=config,
+                    label=args.label or args.impair, passed=passed, samples=samples,
+                )
+            log_info(f"结果已写入 {args.results_db} (运行 #{run_id})")
+        except Exception as e:
+            log_warning(f"写入结果库失败: {e}")
+
 def main():
     """主函数"""
+    args = parse_args()
     start_time = datetime.now()
     
     print(f"{Colors.BOLD}{Colors.BLUE}")
@@ -503,36 +657,23 @@ def main():
     print("╚════════════════════════════════════════════════════════════╝")
     print(f"{Colors.END}")
     
+    readiness = ReadinessTracker()
+    runner = PhaseRunner()
+    sampler = ProcSampler(interval=args.sample_interval) if args.sample_interval > 0 else None
+    config = None
+    
     try:
         # 加载配置
-        config = load_config()
-        
-        # 1. 停止现有进程
-        stop_processes(config)
+        config = load_config(args.config)
         
-        # 2. 编译二进制文件
-        build_binaries()
-        
-        # 3. 部署 server
-        deploy_server(config)
-        
-        # 4. 部署客户端
-        deploy_clients(config)
-        
-        # 5. 生成配置文件
-        generate_configs(config)
-        
-        # 6. 启动服务器
-        start_server(config)
-        
-        # 7. 启动客户端
-        start_clients(config)
-        
-        # 8. 执行 MySQL 测试
-        test_passed = run_mysql_tests(config)
+        if args.local:
+            test_passed = run_local(config, args, readiness, runner, sampler)
+        else:
+            test_passed = run_remote(config, args, readiness, runner, sampler)
         
         # 测试结果
         elapsed = datetime.now() - start_time
+        report_metrics(args, readiness, runner, sampler, config=config, passed=bool(test_passed))
         log_header("测试完成")
         log_info(f"总耗时: {elapsed.total_seconds():.2f}s")
         
@@ -548,6 +689,7 @@ def main():
         return 130
     except Exception as e:
         log_error(f"测试执行失败: {e}")
+        report_metrics(args, readiness, runner, sampler, config=config, passed=False)
         import traceback
         traceback.print_exc()
         return 1
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+本地多节点集群
+
+在回环地址上启动 N 个 server 节点（各自独立的 tcp/kcp/quic/management/跨节点端口），
+共享一个 Redis（默认 redis_standin.py）作为存储和消息代理，客户端按 --place 放到指定节点。
+
+两种用法：
+
+- 保持运行：启动集群和客户端后把各节点地址、客户端 ID 写入 <work-dir>/cluster.json，
+  供其他负载工具或手工测试使用，Ctrl+C 结束时回收所有进程。
+  各负载工具的 --local 模式也可以直接用 --nodes / --place / --redis 启动多节点（见 local_stack.add_cluster_arguments）
+- 扩展性对比（--scale 1,2,4,8）：依次启动不同节点数的集群，每次创建 --pairs 对客户端，
+  listen 端按序号轮流放到各节点，target 端放到下一个节点（--layout cross，节点数大于 1 时全部为跨节点转发）
+  或同一节点（--layout same），所有映射同时压测，并排输出吞吐、扩展效率、延迟和 server CPU；
+  包括单节点在内的每个级别都使用共享 Redis，存储后端不随节点数变化
+
+用法:
+    ./local_cluster.py --nodes 4 --place listen-client=0 --place target-client=3
+    ./local_cluster.py --scale 1,2,4,8 --pairs 8 --size-mb 32
+    ./local_cluster.py --scale 1,2,4 --layout same --transport quic
+"""
+
+import argparse
+import asyncio
+import json
+import signal
+import sys
+import time
+from pathlib import Path
+
+from bulk_throughput import run_bulk_async
+from common import CONFIG_FILE, log_info, log_success, log_warning, log_error, log_header, load_config
+from crossnode_bench import measure_latency
+from local_stack import DEFAULT_CLIENT_ROLES, add_cluster_arguments, cluster_options
+
+def parse_levels(text):
+    levels = sorted({int(x) for x in text.split(",") if x})
+    if not levels or levels[0] < 1:
+        raise argparse.ArgumentTypeError(f"节点数必须为正整数: {text}")
+    return levels
+
+def describe(stack):
+    """集群描述（cluster.json）：各节点的连接地址和客户端所在节点"""
+    nodes = []
+    for node in stack.nodes:
+        ports = node["ports"]
+        nodes.append({
+            "name": node["name"],
+            "node_id": node["node_id"],
+            "management": node["api"].base_url,
+            "server": {
+                "tcp": f"127.0.0.1:{ports['tcp']}",
+                "kcp": f"127.0.0.1:{ports['kcp']}",
+                "quic": f"127.0.0.1:{ports['quic']}",
+                "websocket": f"ws://127.0.0.1:{ports['management']}/_tunnox",
+            },
+            "cross_node": f"127.0.0.1:{ports['cross-node']}" if "cross-node" in ports else None,
+        })
+    return {
+        "transport": stack.transport,
+        "redis": stack.redis,
+        "api_token": stack.api_token,
+        "nodes": nodes,
+        "clients": {
+            role: {"node": stack.node_of(role), "client_id": client["client_id"]}
+            for role, client in stack.clients.items()
+        },
+    }
+
+def run_hold(config, args):
+    """启动集群并保持运行，直到 Ctrl+C / SIGTERM"""
+    from local_stack import LocalStack
+
+    options = cluster_options(args)
+    roles = list(DEFAULT_CLIENT_ROLES) + [r for r in options["placement"] if r not in DEFAULT_CLIENT_ROLES]
+    with LocalStack(config, transport=args.transport, **options) as stack:
+        stack.prepare()
+        stack.start_servers()
+        stack.start_clients(roles)
+        info = describe(stack)
+        path = stack.work_dir / "cluster.json"
+        path.write_text(json.dumps(info, indent=2, ensure_ascii=False))
+
+        log_header(f"本地集群已就绪（{len(stack.nodes)} 个节点）")
+        for node in info["nodes"]:
+            print(f"{node['name']:<10}{node['node_id']:<12}{node['server'][stack.transport]:<24}{node['management']}")
+        print()
+        for role, client in info["clients"].items():
+            print(f"{role:<24}节点 {client['node']}  ClientID={client['client_id']}")
+        print(f"\nRedis: {stack.redis}   Management token: {stack.api_token}")
+        log_success(f"集群描述已写入 {path}，按 Ctrl+C 停止")
+        while True:
+            time.sleep(1)
+            stack.supervisor.check_alive()
+
+def pair_placement(nodes, pairs, layout):
+    """listen-i 放在节点 i % N，target-i 放在同一节点或下一个节点"""
+    shift = 1 if layout == "cross" and nodes > 1 else 0
+    placement = {}
+    for i in range(pairs):
+        placement[f"listen-{i}"] = i % nodes
+        placement[f"target-{i}"] = (i + shift) % nodes
+    return placement
+
+async def run_pairs(ports, streams, size_bytes):
+    """所有映射同时压测，返回 (各映射结果, 墙钟耗时)"""
+    start = time.perf_counter()
+    results = await asyncio.gather(*(run_bulk_async("127.0.0.1", port, streams, size_bytes, "sink")
+                                     for port in ports))
+    return [r for r, _ in results], time.perf_counter() - start
+
+def run_level(config, args, nodes):
+    """一个节点数级别：启动集群、创建映射、测延迟和并发吞吐，同时采样各 server 进程"""
+    from local_stack import LocalStack, find_free_port
+    from proc_sampler import ProcSampler
+    from readiness import tcp_accept_probe
+
+    placement = pair_placement(nodes, args.pairs, args.layout)
+    roles = [role for i in range(args.pairs) for role in (f"target-{i}", f"listen-{i}")]
+    # 单节点级别也使用共享 Redis，各级别的存储后端一致，曲线只反映节点数的变化
+    stack = LocalStack(config, transport=args.transport, nodes=nodes, placement=placement, redis=args.redis,
+                       shared_storage=True)
+    with stack:
+        stack.prepare()
+        stack.start_servers()
+        stack.start_clients(roles)
+        sink_port = find_free_port("tcp")
+        stack.start_service("tcp-sink", "tcp_sink.py", ["--port", sink_port, "--workers", args.sink_workers],
+                            tcp_accept_probe("127.0.0.1", sink_port))
+        ports = []
+        for i in range(args.pairs):
+            port = find_free_port("tcp")
+            stack.create_mapping(f"scale-{i}", "tcp", port, "127.0.0.1", sink_port,
+                                 listen=f"listen-{i}", target=f"target-{i}")
+            ports.append(port)
+
+        latency = measure_latency(ports[-1], args.setups, args.pings, args.payload)
+        servers = [node["name"] for node in stack.nodes]
+        pids = stack.supervisor.pids
+        log_info(f"{args.pairs} 条映射 × {args.streams} 条流 × {args.size_mb:g} MB 并发压测...")
+        with ProcSampler(lambda: {name: pids[name] for name in servers}, interval=0.5) as sampler:
+            per_pair, elapsed = asyncio.run(run_pairs(ports, args.streams, args.size))
+        summary = sampler.summary()
+
+    total_bytes = sum(r["bytes"] for results in per_pair for r in results if r["error"] is None)
+    failed = sum(1 for results in per_pair for r in results if r["error"] is not None)
+    cpu_seconds = sum(s.get("cpu_seconds", 0) for s in summary.values())
+    gb = total_bytes / 1024**3
+    return {
+        "name": f"n{nodes}",
+        "nodes": nodes,
+        "pairs": args.pairs,
+        "cross_pairs": sum(1 for i in range(args.pairs) if placement[f"listen-{i}"] != placement[f"target-{i}"]),
+        "elapsed_seconds": elapsed,
+        "total_bytes": total_bytes,
+        "aggregate_mb_s": total_bytes / 1024**2 / elapsed if elapsed > 0 else 0.0,
+        "failed_streams": failed,
+        "setup_ms": latency["setup_ms"],
+        "latency_ms": latency["latency_ms"],
+        "server_cpu_seconds": cpu_seconds,
+        "cpu_seconds_per_gb": cpu_seconds / gb if gb > 0 else None,
+        "server_rss_peak": sum(s.get("rss_peak", 0) for s in summary.values()),
+        "per_node_cpu_pct": {name: s.get("cpu_avg_pct") for name, s in summary.items()},
+    }
+
+def fmt_ms(value, digits=2):
+    return f"{value:.{digits}f}ms" if value is not None else "-"
+
+def print_scale_report(levels):
+    log_header("节点数扩展对比")
+    base = levels[0]["aggregate_mb_s"] / levels[0]["nodes"] if levels[0]["aggregate_mb_s"] else None
+    print(f"{'节点':>4}{'跨节点对':>8}{'吞吐 MB/s':>12}{'扩展效率':>10}{'建立 p50':>10}{'往返 p50':>10}"
+          f"{'往返 p99':>10}{'CPU s/GB':>10}{'失败流':>8}")
+    for level in levels:
+        efficiency = level["aggregate_mb_s"] / (base * level["nodes"]) if base else None
+        cpu = f"{level['cpu_seconds_per_gb']:.2f}" if level["cpu_seconds_per_gb"] is not None else "-"
+        print(f"{level['nodes']:>4}{level['cross_pairs']:>8}{level['aggregate_mb_s']:>12.1f}"
+              f"{(f'{efficiency * 100:.0f}%' if efficiency is not None else '-'):>10}"
+              f"{fmt_ms(level['setup_ms']['p50']):>10}{fmt_ms(level['latency_ms']['p50'], 3):>10}"
+              f"{fmt_ms(level['latency_ms']['p99'], 3):>10}{cpu:>10}{level['failed_streams']:>8}")
+    print("\n扩展效率 = 吞吐 / (单节点吞吐 × 节点数)；本机所有节点共享 CPU，效率反映的是转发开销而非可用容量")
+    for level in levels:
+        usage = "  ".join(f"{name}={pct:.0f}%" for name, pct in level["per_node_cpu_pct"].items() if pct is not None)
+        print(f"  n{level['nodes']} 各节点 CPU: {usage or '-'}")
+
+def run_scale(config, args):
+    levels = []
+    for nodes in args.scale:
+        log_header(f"{nodes} 个节点")
+        levels.append(run_level(config, args, nodes))
+    return levels
+
+def main():
+    parser = argparse.ArgumentParser(description="本地多节点集群（保持运行或节点数扩展对比）")
+    parser.add_argument('--config', default=str(CONFIG_FILE), help='配置文件路径（读取 local 段）')
+    parser.add_argument('--transport', choices=['tcp', 'websocket', 'quic', 'kcp'], default='tcp',
+                        help='客户端连接协议')
+    parser.add_argument('--scale', type=parse_levels, help='扩展对比的节点数列表，如 1,2,4,8（不指定则启动集群并保持运行）')
+    parser.add_argument('--pairs', type=int, default=8, help='扩展对比中的客户端对（映射）数量')
+    parser.add_argument('--layout', choices=['cross', 'same'], default='cross',
+                        help='target 端放在 listen 端的下一个节点（cross）或同一节点（same）')
+    parser.add_argument('--streams', type=int, default=2, help='每条映射的并发流数量')
+    parser.add_argument('--size-mb', type=float, default=32, help='每条流发送的数据量（MB）')
+    parser.add_argument('--setups', type=int, default=20, help='测量隧道建立延迟的连接次数')
+    parser.add_argument('--pings', type=int, default=1000, help='单连接往返次数')
+    parser.add_argument('--payload', type=int, default=64, help='往返测试的消息字节数')
+    parser.add_argument('--sink-workers', type=int, default=4, help='tcp_sink 进程数')
+    parser.add_argument('--results-db', help='测试结果库路径（默认 ~/tunnox-test/results.db）')
+    parser.add_argument('--no-store', action='store_true', help='不把结果写入结果库')
+    add_cluster_arguments(parser)
+    args = parser.parse_args()
+    args.size = int(args.size_mb * 1024 * 1024)
+    if args.pairs < 1:
+        parser.error("--pairs 必须大于 0")
+
+    # SIGTERM 与 Ctrl+C 一样走清理流程，保证子进程被回收
+    def _raise_interrupt(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+
+    config = load_config(args.config) if Path(args.config).exists() else {}
+    try:
+        if not args.scale:
+            run_hold(config, args)
+            return 0
+        if args.nodes != 1 or args.place:
+            log_warning("--scale 模式按 --pairs / --layout 放置客户端，忽略 --nodes 和 --place")
+        levels = run_scale(config, args)
+    except KeyboardInterrupt:
+        log_info("已停止")
+        return 130 if args.scale else 0
+    except (RuntimeError, ValueError, FileNotFoundError) as e:
+        log_error(str(e))
+        return 1
+
+    print_scale_report(levels)
+    failed = sum(level["failed_streams"] for level in levels)
+    if not args.no_store:
+        from results_store import DEFAULT_DB, ResultsStore
+        with ResultsStore(args.results_db or DEFAULT_DB) as store:
+            run_id = store.record_run("cluster", {"levels": levels}, transport=args.transport, config=config,
+                                      label=f"{args.layout} ×{args.pairs}", passed=failed == 0)
+        log_info(f"结果已写入结果库 (运行 #{run_id})")
+
+    if failed:
+        log_error(f"{failed} 条流失败")
+        return 1
+    log_success("扩展对比完成")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
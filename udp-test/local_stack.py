@@ -0,0 +1,818 @@
+#!/usr/bin/env python3
+"""
+Tunnox 本地回环测试栈
+
+在本机启动 server、target-client、listen-client 三个子进程（全部监听 127.0.0.1），
+通过 Management API 创建客户端和端口映射，不依赖远程服务器和 SSH。
+
+nodes > 1 时启动多个 server 节点（server、server-1、server-2 ...），各节点端口互不冲突，
+通过共享的 Redis 交换路由和消息（未指定 Redis 时启动 redis_standin.py），客户端按 placement 连接到指定节点。
+
+impair 指定网络损伤参数时（仅 kcp / quic），每个节点的 UDP 端口前放一个 udp_impair.py，客户端连接代理端口。
+bdp 指定链路参数时（仅 tcp / websocket），每个节点的 TCP 端口前放一个 tcp_bdp_relay.py，模拟瓶颈速率和时延。
+
+所有子进程都运行在独立的进程组中，PID 记录在工作目录的 pids.json，
+测试结束（或下次启动时发现残留）会统一回收。
+"""
+
+import argparse
+import json
+import os
+import secrets
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+import yaml
+
+from common import PROJECT_ROOT, log_info, log_success, log_warning, log_error
+from readiness import (
+    CLIENT_HANDSHAKE_PATTERN, ReadinessTracker,
+    http_health_probe, tcp_accept_probe, log_line_probe,
+)
+from tcp_bdp_relay import parse_spec as parse_link_spec
+from udp_impair import PROFILES, parse_spec
+
+# 本地模式默认配置（可在 config.yaml 的 local 段覆盖）
+DEFAULT_WORK_DIR = "~/tunnox-test/local"
+DEFAULT_TRANSPORT = "kcp"
+DEFAULT_MYSQL_TARGET = {"address": "127.0.0.1", "port": 3306}
+DEFAULT_MYSQL_STANDIN = {"enabled": True, "rows": 10000, "columns": "int,varchar:64,datetime,double,text:256"}
+DEFAULT_CLIENT_ROLES = ("target-client", "listen-client")
+
+# 客户端支持的连接协议（internal/client/transport）
+SUPPORTED_TRANSPORTS = ("tcp", "websocket", "quic", "kcp")
+# 基于 UDP 的连接协议，可以插入网络损伤代理
+UDP_TRANSPORTS = ("kcp", "quic")
+IMPAIR_READY_PATTERN = r"\[udp-impair\] 已启动"
+# 基于 TCP 的连接协议，可以插入带宽时延积模拟中继
+TCP_TRANSPORTS = ("tcp", "websocket")
+BDP_READY_PATTERN = r"\[tcp-bdp\] 已启动"
+
+def find_free_port(kind="tcp"):
+    """向内核申请一个空闲端口（仅用于生成配置，存在极小的竞争窗口）"""
+    sock_type = socket.SOCK_STREAM if kind == "tcp" else socket.SOCK_DGRAM
+    with socket.socket(socket.AF_INET, sock_type) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def find_free_dual_port(attempts=20):
+    """申请一个 TCP 和 UDP 同时空闲的端口（server 的 tcp 与 kcp 共用端口）"""
+    for _ in range(attempts):
+        port = find_free_port("tcp")
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+                s.bind(("127.0.0.1", port))
+            return port
+        except OSError:
+            continue
+    raise RuntimeError("无法找到 TCP/UDP 同时空闲的端口")
+
+def parse_placement(text):
+    """--place 参数：角色=节点序号，如 target-client=1"""
+    role, sep, index = text.partition("=")
+    if not sep or not role or not index.isdigit():
+        raise argparse.ArgumentTypeError(f"格式应为 角色=节点序号: {text}")
+    return role, int(index)
+
+def add_cluster_arguments(parser):
+    """本地模式的多节点参数，供各负载工具共用（配合 cluster_options）"""
+    group = parser.add_argument_group("多节点（本地模式）")
+    group.add_argument('--nodes', type=int, default=1, help='启动的 server 节点数')
+    group.add_argument('--place', type=parse_placement, action='append', default=[], metavar='ROLE=NODE',
+                       help='把客户端放到指定节点（序号从 0 开始），如 target-client=1，可重复')
+    group.add_argument('--redis', help='多节点共享的 Redis 地址（默认启动 redis_standin.py）')
+    return group
+
+def add_impair_arguments(parser):
+    """本地模式的网络损伤参数，供各负载工具共用（由 cluster_options 一并传给 LocalStack）"""
+    group = parser.add_argument_group("网络损伤（本地模式）")
+    group.add_argument('--impair', metavar='SPEC',
+                       help=f"kcp / quic：客户端与 server 之间的 UDP 损伤，预设 {'/'.join(PROFILES)} 或 "
+                            "'wan,loss=2%%,up.rate=2000'（见 udp_impair.py）")
+    group.add_argument('--bdp', metavar='SPEC',
+                       help="tcp / websocket：客户端与 server 之间的瓶颈链路，如 "
+                            "'rate=100000,delay=75,window=512k'（见 tcp_bdp_relay.py）")
+    return group
+
+def network_label(args):
+    """网络损伤参数作为结果库的 label"""
+    return getattr(args, "impair", None) or getattr(args, "bdp", None)
+
+def cluster_options(args):
+    """add_cluster_arguments / add_impair_arguments 解析结果 → LocalStack 的 nodes / placement / redis / impair / bdp 参数"""
+    return {"nodes": args.nodes, "placement": dict(args.place), "redis": args.redis,
+            "impair": getattr(args, "impair", None), "bdp": getattr(args, "bdp", None)}
+
+class ManagedProcess:
+    """被测试栈托管的子进程"""
+
+    def __init__(self, name, cmd, cwd, log_path, env=None):
+        self.name = name
+        self.cmd = [str(c) for c in cmd]
+        self.cwd = Path(cwd)
+        self.log_path = Path(log_path)
+        self.env = env
+        self.proc = None
+
+    @property
+    def pid(self):
+        return self.proc.pid if self.proc else None
+
+    def start(self):
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        log_file = open(self.log_path, "ab")
+        try:
+            self.proc = subprocess.Popen(
+                self.cmd,
+                cwd=self.cwd,
+                stdin=subprocess.DEVNULL,
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                env=self.env,
+                # 独立进程组，便于整组回收
+                start_new_session=True,
+            )
+        finally:
+            log_file.close()
+        log_info(f"{self.name} 已启动 (PID {self.proc.pid})")
+        return self.proc.pid
+
+    def is_running(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def stop(self, timeout=10):
+        """先 SIGTERM 整个进程组，超时后 SIGKILL"""
+        if not self.is_running():
+            return self.proc.returncode if self.proc else None
+        _signal_group(self.proc.pid, signal.SIGTERM)
+        try:
+            return self.proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            log_warning(f"{self.name} 优雅退出超时（{timeout}s），强制 kill...")
+            _signal_group(self.proc.pid, signal.SIGKILL)
+            return self.proc.wait(timeout=5)
+
+    def tail(self, lines=20):
+        """返回日志文件最后若干行"""
+        if not self.log_path.exists():
+            return ""
+        with open(self.log_path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - 64 * 1024))
+            data = f.read().decode("utf-8", errors="replace")
+        return "\n".join(data.splitlines()[-lines:])
+
+def _signal_group(pid, sig):
+    try:
+        os.killpg(pid, sig)
+    except ProcessLookupError:
+        pass
+    except PermissionError:
+        # 进程组已被回收并复用，退回到只处理单个进程
+        try:
+            os.kill(pid, sig)
+        except ProcessLookupError:
+            pass
+
+class ProcessSupervisor:
+    """托管多个子进程：记录 PID、检测异常退出、逆序回收"""
+
+    def __init__(self, pid_file):
+        self.pid_file = Path(pid_file)
+        self.processes = []
+
+    def cleanup_stale(self):
+        """回收上一次运行残留的进程（根据 pids.json）"""
+        if not self.pid_file.exists():
+            return
+        try:
+            stale = json.loads(self.pid_file.read_text())
+        except (OSError, ValueError):
+            stale = {}
+        for name, pid in stale.items():
+            if _pid_alive(pid):
+                log_warning(f"发现残留进程 {name} (PID {pid})，强制 kill...")
+                _signal_group(pid, signal.SIGKILL)
+        self.pid_file.unlink(missing_ok=True)
+
+    def spawn(self, name, cmd, cwd, log_path, env=None):
+        proc = ManagedProcess(name, cmd, cwd, log_path, env=env)
+        proc.start()
+        self.processes.append(proc)
+        self._write_pid_file()
+        return proc
+
+    def get(self, name):
+        for proc in self.processes:
+            if proc.name == name:
+                return proc
+        return None
+
+    @property
+    def pids(self):
+        return {p.name: p.pid for p in self.processes if p.pid}
+
+    def check_alive(self):
+        """任一子进程提前退出时抛出异常，并附带其日志"""
+        for proc in self.processes:
+            if not proc.is_running():
+                raise RuntimeError(
+                    f"{proc.name} 意外退出 (exit={proc.proc.returncode})，日志:\n{proc.tail()}"
+                )
+
+    def stop_all(self, timeout=10):
+        for proc in reversed(self.processes):
+            code = proc.stop(timeout=timeout)
+            if code is not None:
+                log_info(f"{proc.name} 已停止 (exit={code})")
+        self.processes = []
+        self.pid_file.unlink(missing_ok=True)
+
+    def _write_pid_file(self):
+        self.pid_file.parent.mkdir(parents=True, exist_ok=True)
+        self.pid_file.write_text(json.dumps(self.pids, indent=2))
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+class ManagementAPI:
+    """Management API 的最小客户端（/tunnox/*）"""
+
+    def __init__(self, base_url, token=None, timeout=10):
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method)
+        req.add_header("Content-Type", "application/json")
+        if self.token:
+            req.add_header("Authorization", f"Bearer {self.token}")
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                payload = json.loads(resp.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode("utf-8", errors="replace")
+            raise RuntimeError(f"{method} {path} 失败: HTTP {e.code} {detail}") from e
+        if not payload.get("success", False):
+            raise RuntimeError(f"{method} {path} 失败: {payload.get('error')}")
+        return payload.get("data")
+
+    def create_client(self, name):
+        return self.request("POST", "/tunnox/clients", {"name": name})
+
+    def reset_credentials(self, client_id):
+        return self.request("POST", f"/tunnox/clients/{client_id}/reset-credentials")
+
+    def get_client(self, client_id):
+        return self.request("GET", f"/tunnox/clients/{client_id}")
+
+    def create_mapping(self, **fields):
+        return self.request("POST", "/tunnox/mappings", fields)
+
+    def goroutine_count(self):
+        """server 当前的 goroutine 数（需要开启 pprof）"""
+        req = urllib.request.Request(self.base_url + "/tunnox/debug/pprof/goroutine?debug=1")
+        if self.token:
+            req.add_header("Authorization", f"Bearer {self.token}")
+        with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+            first = resp.readline().decode("utf-8", errors="replace")
+        # 首行格式: goroutine profile: total 123
+        return int(first.rsplit(" ", 1)[-1])
+
+class LocalStack:
+    """本地回环测试栈：server + target-client + listen-client"""
+
+    def __init__(self, config, transport=None, readiness=None, pprof=False,
+                 nodes=1, placement=None, redis=None, impair=None, bdp=None, shared_storage=False):
+        local_config = config.get("local") or {}
+        self.config = config
+        self.transport = transport or local_config.get("transport", DEFAULT_TRANSPORT)
+        if self.transport not in SUPPORTED_TRANSPORTS:
+            raise ValueError(f"不支持的协议: {self.transport} (可选: {', '.join(SUPPORTED_TRANSPORTS)})")
+
+        self.work_dir = Path(local_config.get("work-dir", DEFAULT_WORK_DIR)).expanduser()
+        self.mysql_target = {**DEFAULT_MYSQL_TARGET, **(local_config.get("mysql-target") or {})}
+        self.mysql_standin = {**DEFAULT_MYSQL_STANDIN, **(local_config.get("mysql-standin") or {})}
+        self.mysql_listen_port = ((config.get("listen-client") or {}).get("mysql-listen") or {}).get("port")
+
+        self.server_bin = PROJECT_ROOT / "bin" / "server"
+        self.client_bin = PROJECT_ROOT / "bin" / "client"
+        self.supervisor = ProcessSupervisor(self.work_dir / "pids.json")
+        self.readiness = readiness or ReadinessTracker()
+        self.pprof = pprof
+
+        # 多节点：placement 为 {角色: 节点序号}，未指定的角色连接节点 0
+        self.node_count = nodes
+        self.placement = dict(placement or {})
+        if self.node_count < 1:
+            raise ValueError(f"节点数必须大于 0: {self.node_count}")
+        self.redis = redis or local_config.get("redis")
+        # 多节点（或 shared_storage 要求单节点也使用 Redis）且未指定 Redis 时，由测试栈启动 Redis 协议替身
+        self.redis_standin = (self.node_count > 1 or shared_storage) and not self.redis
+        for role, index in self.placement.items():
+            if not 0 <= index < self.node_count:
+                raise ValueError(f"{role} 的节点序号 {index} 超出范围 (共 {self.node_count} 个节点)")
+        self.nodes = []
+
+        # 网络损伤代理：先解析一次，参数错误在启动任何进程之前报出
+        self.impair = impair
+        self.impair_summary = None
+        if self.impair:
+            if self.transport not in UDP_TRANSPORTS:
+                raise ValueError(f"网络损伤代理只支持 UDP 协议 ({', '.join(UDP_TRANSPORTS)})，当前为 {self.transport}")
+            parse_spec(self.impair)
+        self.bdp = bdp
+        self.bdp_summary = None
+        if self.bdp:
+            if self.transport not in TCP_TRANSPORTS:
+                raise ValueError(f"带宽时延积中继只支持 TCP 协议 ({', '.join(TCP_TRANSPORTS)})，当前为 {self.transport}")
+            parse_link_spec(self.bdp)
+
+        self.ports = {}
+        self.api_token = secrets.token_hex(16)
+        self.api = None
+        self.clients = {}
+        self.mapping = None
+        self.mappings = {}
+
+    # ---------- 准备 ----------
+
+    def prepare(self):
+        """创建工作目录、清理残留进程并分配端口（不检查二进制文件，可与编译并行）"""
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        self.supervisor.cleanup_stale()
+
+        self.nodes = []
+        for index in range(self.node_count):
+            ports = {
+                "tcp": find_free_dual_port(),
+                "quic": find_free_port("udp"),
+                "management": find_free_port("tcp"),
+            }
+            # tcp 与 kcp 共用一个端口号（与服务端默认配置一致）
+            ports["kcp"] = ports["tcp"]
+            if self.node_count > 1:
+                ports["cross-node"] = find_free_port("tcp")
+            if self.impair:
+                ports["impair"] = find_free_port("udp")
+            if self.bdp:
+                ports["bdp"] = find_free_port("tcp")
+            self.nodes.append({
+                "index": index,
+                "name": "server" if index == 0 else f"server-{index}",
+                "node_id": f"node-{index + 1:04d}",
+                "ports": ports,
+                # 注册到路由表的跨节点地址，默认即监听端口；需要在节点间插入代理时由调用方修改
+                "advertise": ports.get("cross-node"),
+                "api": ManagementAPI(f"http://127.0.0.1:{ports['management']}", token=self.api_token),
+            })
+        # 节点 0 兼作单节点模式下的 server
+        self.ports = self.nodes[0]["ports"]
+        if self.redis_standin:
+            self.ports["redis-standin"] = find_free_port("tcp")
+            self.redis = f"127.0.0.1:{self.ports['redis-standin']}"
+        if self.mysql_standin["enabled"]:
+            # 使用 MySQL 协议替身时，映射目标指向替身服务
+            self.ports["mysql-standin"] = find_free_port("tcp")
+            self.mysql_target = {"address": "127.0.0.1", "port": self.ports["mysql-standin"]}
+        self.api = self.nodes[0]["api"]
+        log_info(f"工作目录: {self.work_dir}")
+        if self.node_count > 1:
+            for node in self.nodes:
+                log_info(f"{node['name']} ({node['node_id']}) 端口分配: {node['ports']}")
+        else:
+            log_info(f"端口分配: {self.ports}")
+
+    def server_dir(self, node=0):
+        return self.work_dir / self.nodes[node]["name"] if self.nodes else self.work_dir / "server"
+
+    def client_dir(self, role):
+        return self.work_dir / role
+
+    def node_of(self, role):
+        """角色所连接的节点序号"""
+        return self.placement.get(role, 0)
+
+    def server_address(self, node=0):
+        """客户端连接 server 使用的地址"""
+        ports = self.nodes[node]["ports"]
+        if self.transport == "websocket":
+            return f"ws://127.0.0.1:{ports['bdp' if self.bdp else 'management']}/_tunnox"
+        if self.bdp:
+            return f"127.0.0.1:{ports['bdp']}"
+        if self.impair:
+            return f"127.0.0.1:{ports['impair']}"
+        return f"127.0.0.1:{ports[self.transport]}"
+
+    # ---------- server ----------
+
+    def write_server_config(self, node=0):
+        server_dir = self.server_dir(node)
+        server_dir.mkdir(parents=True, exist_ok=True)
+        ports = self.nodes[node]["ports"]
+        server_config = {
+            "server": {
+                "protocols": {
+                    "tcp": {"enabled": True, "port": ports["tcp"], "host": "127.0.0.1"},
+                    "kcp": {"enabled": True, "port": ports["kcp"], "host": "127.0.0.1"},
+                    "quic": {"enabled": True, "port": ports["quic"], "host": "127.0.0.1"},
+                    "websocket": {"enabled": True},
+                },
+            },
+            "management": {
+                "listen": f"127.0.0.1:{ports['management']}",
+                "auth": {"type": "bearer", "token": self.api_token},
+                "pprof": {"enabled": self.pprof},
+            },
+            "log": {"level": "info", "file": str(server_dir / "logs" / "server.log")},
+            "persistence": {"enabled": False},
+        }
+        if self.redis:
+            # 多节点共享路由表、客户端状态和消息代理
+            server_config["redis"] = {"enabled": True, "addr": self.redis}
+        config_path = server_dir / "config.yaml"
+        with open(config_path, "w") as f:
+            yaml.safe_dump(server_config, f, sort_keys=False)
+        log_success(f"{self.nodes[node]['name']} 配置已生成: {config_path}")
+        return config_path
+
+    def server_env(self, node=0):
+        """多节点时固定 NODE_ID，并为每个节点分配独立的跨节点端口"""
+        if self.node_count == 1:
+            return None
+        info = self.nodes[node]
+        return {
+            **os.environ,
+            "NODE_ID": info["node_id"],
+            "CROSS_NODE_PORT": str(info["ports"]["cross-node"]),
+            "CROSS_NODE_ADDR": f"127.0.0.1:{info['advertise']}",
+        }
+
+    @staticmethod
+    def require_binary(binary):
+        if not binary.exists():
+            raise FileNotFoundError(f"二进制文件不存在: {binary}（请先编译）")
+
+    def start_server(self, timeout=30, node=0):
+        self.require_binary(self.server_bin)
+        config_path = self.write_server_config(node)
+        name = self.nodes[node]["name"]
+        started_at = time.monotonic()
+        self.supervisor.spawn(
+            name,
+            [self.server_bin, "-config", config_path],
+            cwd=self.server_dir(node),
+            log_path=self.server_dir(node) / "logs" / "server-console.log",
+            env=self.server_env(node),
+        )
+        self.readiness.wait(
+            name,
+            http_health_probe(f"{self.nodes[node]['api'].base_url}/tunnox/health", token=self.api_token),
+            timeout=timeout,
+            started_at=started_at,
+            guard=self.supervisor.check_alive,
+        )
+        if self.impair:
+            self.start_impair(node)
+        if self.bdp:
+            self.start_bdp_relay(node)
+
+    def start_servers(self, timeout=30):
+        if self.redis_standin:
+            self.start_redis_standin()
+        for node in range(self.node_count):
+            self.start_server(timeout=timeout, node=node)
+
+    # ---------- 替身服务 ----------
+
+    def start_service(self, name, script, args, probe, timeout=10):
+        """启动 udp-test 目录下的 Python 辅助服务（替身、sink 等），等待 probe 就绪
+
+        日志写入 <work-dir>/<name>/<name>.log。
+        """
+        started_at = time.monotonic()
+        proc = self.supervisor.spawn(
+            name,
+            [sys.executable, Path(__file__).parent / script, *args],
+            cwd=self.work_dir,
+            log_path=self.work_dir / name / f"{name}.log",
+        )
+        self.readiness.wait(
+            name,
+            probe,
+            timeout=timeout,
+            started_at=started_at,
+            guard=self.supervisor.check_alive,
+        )
+        return proc
+
+    def start_redis_standin(self, timeout=10):
+        """启动 Redis 协议替身服务（redis_standin.py），作为多节点共享的存储和消息代理"""
+        port = self.ports["redis-standin"]
+        self.start_service("redis-standin", "redis_standin.py", ["--port", port, "--stats", 60],
+                           tcp_accept_probe("127.0.0.1", port), timeout=timeout)
+
+    def impair_name(self, node=0):
+        return "udp-impair" if node == 0 else f"udp-impair-{node}"
+
+    def start_impair(self, node=0, timeout=10):
+        """在节点的 UDP 端口前启动网络损伤代理（udp_impair.py），统计写入 <work-dir>/<name>/stats.json"""
+        name = self.impair_name(node)
+        ports = self.nodes[node]["ports"]
+        service_dir = self.work_dir / name
+        service_dir.mkdir(parents=True, exist_ok=True)
+        (service_dir / "stats.json").unlink(missing_ok=True)
+        self.start_service(
+            name,
+            "udp_impair.py",
+            [
+                "--listen", f"127.0.0.1:{ports['impair']}",
+                "--upstream", f"127.0.0.1:{ports[self.transport]}",
+                "--profile", self.impair,
+                "--seed", node + 1,
+                "--stats-file", service_dir / "stats.json",
+                "--stats", 10,
+            ],
+            log_line_probe(service_dir / f"{name}.log", IMPAIR_READY_PATTERN),
+            timeout=timeout,
+        )
+
+    def read_impair_stats(self):
+        """汇总各节点损伤代理的 stats.json：{参数, up/down 合计}"""
+        totals = {}
+        params = None
+        for node in self.nodes:
+            path = self.work_dir / self.impair_name(node["index"]) / "stats.json"
+            if not path.exists():
+                continue
+            data = json.loads(path.read_text())
+            params = params or data["params"]
+            for direction in ("up", "down"):
+                merged = totals.setdefault(direction, {})
+                for key, value in data["totals"][direction].items():
+                    if key == "max_queue_ms":
+                        merged[key] = max(merged.get(key, 0.0), value)
+                    elif key != "loss_rate":
+                        merged[key] = merged.get(key, 0) + value
+        if not totals:
+            return None
+        for merged in totals.values():
+            dropped = merged["lost"] + merged["burst_lost"] + merged["queue_dropped"]
+            merged["loss_rate"] = dropped / merged["packets"] if merged["packets"] else 0.0
+        return {"profile": self.impair, "params": params, **totals}
+
+    def bdp_name(self, node=0):
+        return "tcp-bdp" if node == 0 else f"tcp-bdp-{node}"
+
+    def start_bdp_relay(self, node=0, timeout=10):
+        """在节点的 TCP 端口（websocket 为 management 端口）前启动带宽时延积中继（tcp_bdp_relay.py）
+
+        统计写入 <work-dir>/<name>/stats.json。
+        """
+        name = self.bdp_name(node)
+        ports = self.nodes[node]["ports"]
+        upstream = ports["management" if self.transport == "websocket" else "tcp"]
+        service_dir = self.work_dir / name
+        service_dir.mkdir(parents=True, exist_ok=True)
+        (service_dir / "stats.json").unlink(missing_ok=True)
+        self.start_service(
+            name,
+            "tcp_bdp_relay.py",
+            [
+                "--listen", f"127.0.0.1:{ports['bdp']}",
+                "--upstream", f"127.0.0.1:{upstream}",
+                "--link", self.bdp,
+                "--stats-file", service_dir / "stats.json",
+                "--stats", 10,
+            ],
+            log_line_probe(service_dir / f"{name}.log", BDP_READY_PATTERN),
+            timeout=timeout,
+        )
+
+    def read_bdp_stats(self):
+        """汇总各节点中继的 stats.json：{参数, up/down 合计}"""
+        totals = {}
+        params = None
+        for node in self.nodes:
+            path = self.work_dir / self.bdp_name(node["index"]) / "stats.json"
+            if not path.exists():
+                continue
+            data = json.loads(path.read_text())
+            params = params or data["params"]
+            for direction in ("up", "down"):
+                merged = totals.setdefault(direction, {})
+                for key, value in data["totals"][direction].items():
+                    if key == "max_queue_ms":
+                        merged[key] = max(merged.get(key, 0.0), value)
+                    elif key != "window_limited":
+                        merged[key] = merged.get(key, 0) + value
+        if not totals:
+            return None
+        for merged in totals.values():
+            busy = merged["busy_seconds"]
+            merged["window_limited"] = min(merged["window_stall_seconds"] / busy, 1.0) if busy else 0.0
+        return {"link": self.bdp, "params": params, **totals}
+
+    def start_mysql_standin(self, timeout=10):
+        """启动 MySQL 协议替身服务（mysql_standin.py），作为映射的目标端"""
+        if not self.mysql_standin["enabled"]:
+            log_info(f"使用外部 MySQL: {self.mysql_target['address']}:{self.mysql_target['port']}")
+            return
+        self.start_service(
+            "mysql-standin",
+            "mysql_standin.py",
+            [
+                "--port", self.ports["mysql-standin"],
+                "--rows", self.mysql_standin["rows"],
+                "--columns", self.mysql_standin["columns"],
+            ],
+            tcp_accept_probe("127.0.0.1", self.ports["mysql-standin"]),
+            timeout=timeout,
+        )
+
+    # ---------- 客户端 ----------
+
+    def provision_clients(self, roles=DEFAULT_CLIENT_ROLES):
+        """通过 Management API 创建客户端并获取明文密钥"""
+        for role in roles:
+            client = self.api.create_client(f"local-{role}")
+            creds = self.api.reset_credentials(client["id"])
+            self.clients[role] = {"client_id": client["id"], "secret_key": creds["secret_key"]}
+            log_success(f"{role} 已注册: ClientID={client['id']}")
+
+    def write_client_config(self, role):
+        client_dir = self.client_dir(role)
+        client_dir.mkdir(parents=True, exist_ok=True)
+        client_config = {
+            "client_id": self.clients[role]["client_id"],
+            "secret_key": self.clients[role]["secret_key"],
+            "server": {"address": self.server_address(self.node_of(role)), "protocol": self.transport},
+            "tls": {"insecure_skip_verify": True},
+            "log": {"level": "info", "format": "text", "file": str(client_dir / "logs" / "client.log")},
+        }
+        config_path = client_dir / "client-config.yaml"
+        with open(config_path, "w") as f:
+            yaml.safe_dump(client_config, f, sort_keys=False)
+        if self.node_count > 1:
+            log_success(f"{role} 配置已生成: {config_path} (连接 {self.nodes[self.node_of(role)]['name']})")
+        else:
+            log_success(f"{role} 配置已生成: {config_path}")
+        return config_path
+
+    def start_client(self, role, timeout=30):
+        self.require_binary(self.client_bin)
+        config_path = self.write_client_config(role)
+        client_dir = self.client_dir(role)
+        log_path = client_dir / "logs" / "client.log"
+        # 先记录日志偏移再启动进程，只匹配本次运行的握手行
+        handshake = log_line_probe(log_path, CLIENT_HANDSHAKE_PATTERN)
+        started_at = time.monotonic()
+        self.supervisor.spawn(
+            role,
+            [self.client_bin, "-config", config_path, "-daemon", "-log", log_path],
+            cwd=client_dir,
+            log_path=client_dir / "logs" / "client-console.log",
+        )
+        self.readiness.wait(
+            role,
+            handshake,
+            timeout=timeout,
+            started_at=started_at,
+            guard=self.supervisor.check_alive,
+        )
+
+    def start_clients(self, roles=DEFAULT_CLIENT_ROLES):
+        self.provision_clients(roles)
+        for role in roles:
+            self.start_client(role)
+
+    # ---------- 映射 ----------
+
+    def create_mapping(self, name, protocol, source_port, target_host, target_port,
+                       probe=None, timeout=30, listen="listen-client", target="target-client", **extra):
+        """listen-client:source_port → target-client → target_host:target_port
+
+        name 同时作为 Management API 中的映射名称和就绪记录的组件名；
+        tcp 映射默认等待本地端口可以 accept，其他协议需要时传入 probe。
+        listen / target 指定映射两端的客户端角色（多节点时可跨节点组合）。
+        """
+        started_at = time.monotonic()
+        mapping = self.api.create_mapping(
+            listen_client_id=self.clients[listen]["client_id"],
+            target_client_id=self.clients[target]["client_id"],
+            protocol=protocol,
+            source_port=source_port,
+            target_host=target_host,
+            target_port=target_port,
+            name=name,
+            **extra,
+        )
+        self.mappings[name] = mapping
+        log_success(
+            f"{protocol} 映射已创建: 127.0.0.1:{source_port} → "
+            f"{target_host}:{target_port} (ID={mapping['id']})"
+        )
+        if probe is None and protocol == "tcp":
+            probe = tcp_accept_probe("127.0.0.1", source_port)
+        if probe is not None:
+            self.readiness.wait(
+                name,
+                probe,
+                timeout=timeout,
+                started_at=started_at,
+                guard=self.supervisor.check_alive,
+            )
+        return mapping
+
+    def create_mysql_mapping(self, timeout=30):
+        """listen-client:mysql-listen 端口 → target-client → mysql-target"""
+        self.mapping = self.create_mapping(
+            "mysql-listen", "tcp", self.mysql_listen_port,
+            self.mysql_target["address"], self.mysql_target["port"], timeout=timeout,
+        )
+        return self.mapping
+
+    # ---------- 生命周期 ----------
+
+    def start_tunnel(self):
+        """只启动 server 和两个客户端，映射与目标服务由调用方自行创建"""
+        self.prepare()
+        self.start_servers()
+        self.start_clients()
+        return self
+
+    def start(self):
+        self.prepare()
+        self.start_mysql_standin()
+        self.start_servers()
+        self.start_clients()
+        self.create_mysql_mapping()
+        return self
+
+    def stop(self):
+        if self.supervisor.processes:
+            log_info("停止本地测试进程...")
+            self.supervisor.stop_all()
+            log_success("本地测试进程已全部停止")
+        if self.impair and self.nodes:
+            # 代理退出时写出最终统计
+            self.impair_summary = self.read_impair_stats()
+            if self.impair_summary:
+                for direction in ("up", "down"):
+                    t = self.impair_summary[direction]
+                    log_info(f"网络损伤 {direction}: {t['packets']} 包，丢弃 {t['loss_rate'] * 100:.2f}%，"
+                             f"乱序 {t['reordered']}，重复 {t['duplicated']}，最大排队 {t['max_queue_ms']:.1f}ms")
+        if self.bdp and self.nodes:
+            self.bdp_summary = self.read_bdp_stats()
+            if self.bdp_summary:
+                for direction in ("up", "down"):
+                    t = self.bdp_summary[direction]
+                    log_info(f"瓶颈链路 {direction}: {t['bytes'] / 1024**2:.1f}MB，"
+                             f"窗口受限 {t['window_limited'] * 100:.0f}%，最大排队 {t['max_queue_ms']:.1f}ms")
+
+    def log_paths(self):
+        """各组件的日志文件（用于失败时输出）"""
+        paths = {
+            node["name"]: self.server_dir(node["index"]) / "logs" / "server.log"
+            for node in self.nodes
+        } or {"server": self.work_dir / "server" / "logs" / "server.log"}
+        for role in self.clients or DEFAULT_CLIENT_ROLES:
+            paths[role] = self.client_dir(role) / "logs" / "client.log"
+        if self.mysql_standin["enabled"]:
+            paths["mysql-standin"] = self.work_dir / "mysql-standin" / "mysql-standin.log"
+        if self.redis_standin:
+            paths["redis-standin"] = self.work_dir / "redis-standin" / "redis-standin.log"
+        if self.impair:
+            for node in self.nodes:
+                name = self.impair_name(node["index"])
+                paths[name] = self.work_dir / name / f"{name}.log"
+        if self.bdp:
+            for node in self.nodes:
+                name = self.bdp_name(node["index"])
+                paths[name] = self.work_dir / name / f"{name}.log"
+        return paths
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            self.stop()
+        except Exception as e:
+            log_error(f"停止本地测试进程失败: {e}")
+        return False
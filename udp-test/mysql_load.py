@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+MySQL 并发压测
+
+通过 listen-client 的 MySQL 映射端口，用 N 个并发 pymysql 连接（每个 worker 持有一个长连接，
+出错后重连，模拟连接池）持续执行查询，直到达到指定时长或查询总数。
+
+输出 QPS、查询延迟分位数（p50/p90/p99/p99.9，由 histogram.LatencyHistogram 统计）和按类型统计的错误。
+
+用法:
+    ./mysql_load.py --connections 64 --duration 30
+    ./mysql_load.py --connections 200 --queries 100000 --sql "select 1"
+"""
+
+import argparse
+import itertools
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import pymysql
+except ImportError:
+    print("❌ 缺少 pymysql 模块，请安装: pip3 install pymysql")
+    sys.exit(1)
+
+from common import CONFIG_FILE, log_info, log_success, log_error, log_header, load_config
+from histogram import LatencyHistogram
+
+# 连续建连失败达到该次数时 worker 退出，避免只指定 --queries 时目标不可达导致无限重试
+MAX_CONNECT_FAILURES = 50
+
+def error_key(e):
+    """错误分类：异常类型 + MySQL 错误码"""
+    code = e.args[0] if getattr(e, "args", None) and isinstance(e.args[0], int) else None
+    return f"{type(e).__name__}({code})" if code is not None else type(e).__name__
+
+class LoadWorker:
+    """持有一个连接的压测 worker"""
+
+    def __init__(self, mysql_config, sql, connect_timeout=15, read_timeout=30):
+        self.mysql_config = mysql_config
+        self.sql = sql
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.conn = None
+        self.latency = LatencyHistogram()
+        self.errors = Counter()
+        self.connects = 0
+        self.connect_failures = 0
+
+    def connect(self):
+        self.conn = pymysql.connect(
+            host=self.mysql_config['address'],
+            port=self.mysql_config['port'],
+            user=self.mysql_config['user-name'],
+            password=self.mysql_config['password'],
+            connect_timeout=self.connect_timeout,
+            read_timeout=self.read_timeout,
+            write_timeout=self.connect_timeout,
+            autocommit=True,
+        )
+        self.connects += 1
+
+    def close(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+
+    def run(self, should_continue, take_query):
+        """should_continue 判断时长是否用完；take_query 在连接可用、即将执行查询时领取查询配额"""
+        failures = 0
+        try:
+            while should_continue():
+                if self.conn is None:
+                    try:
+                        self.connect()
+                        failures = 0
+                    except Exception as e:
+                        self.errors[f"connect:{error_key(e)}"] += 1
+                        self.connect_failures += 1
+                        failures += 1
+                        if failures >= MAX_CONNECT_FAILURES:
+                            break
+                        time.sleep(0.1)
+                        continue
+                # 建连失败不消耗配额，配额只按实际执行的查询计数
+                if not take_query():
+                    break
+                start = time.perf_counter_ns()
+                try:
+                    with self.conn.cursor() as cursor:
+                        cursor.execute(self.sql)
+                        cursor.fetchall()
+                    self.latency.record_since(start)
+                except Exception as e:
+                    self.errors[f"query:{error_key(e)}"] += 1
+                    self.close()
+        finally:
+            self.close()
+
+def run_load(mysql_config, connections, duration=None, queries=None, sql=None):
+    """运行并发压测，返回统计结果"""
+    if duration is None and queries is None:
+        raise ValueError("duration 和 queries 至少指定一个")
+    sql = sql or mysql_config['sql-script']
+
+    deadline = time.monotonic() + duration if duration else None
+    budget = itertools.count() if queries else None
+    budget_lock = threading.Lock()
+
+    def should_continue():
+        return deadline is None or time.monotonic() < deadline
+
+    def take_query():
+        if budget is None:
+            return True
+        with budget_lock:
+            return next(budget) < queries
+
+    workers = [LoadWorker(mysql_config, sql) for _ in range(connections)]
+    log_info(f"并发连接 {connections}，"
+             + (f"时长 {duration}s" if duration else f"查询总数 {queries}")
+             + f"，SQL: {sql[:60]}")
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=connections) as pool:
+        for future in [pool.submit(w.run, should_continue, take_query) for w in workers]:
+            future.result()
+    elapsed = time.monotonic() - start
+
+    latency = LatencyHistogram.merged(w.latency for w in workers)
+    errors = Counter()
+    for w in workers:
+        errors.update(w.errors)
+    ok = latency.count
+    failed = sum(v for k, v in errors.items() if k.startswith("query:"))
+    connect_failures = sum(w.connect_failures for w in workers)
+    # 错误率按尝试次数计算：失败的查询和建连失败都算作一次失败的尝试
+    attempts = ok + failed + connect_failures
+
+    return {
+        "connections": connections,
+        "elapsed_seconds": elapsed,
+        "queries_ok": ok,
+        "queries_failed": failed,
+        "qps": ok / elapsed if elapsed > 0 else 0.0,
+        "error_rate": (failed + connect_failures) / attempts if attempts else 0.0,
+        "connects": sum(w.connects for w in workers),
+        "connect_failures": connect_failures,
+        "latency_ms": {
+            k: v for k, v in latency.summary_ms().items() if k.startswith("p") or k == "max"
+        },
+        "latency_histogram": latency.encode(),
+        "errors": dict(errors),
+    }
+
+def print_report(result):
+    log_header("MySQL 并发压测结果")
+    print(f"并发连接:   {result['connections']}  (建立连接 {result['connects']} 次，"
+          f"失败 {result['connect_failures']} 次)")
+    print(f"运行时长:   {result['elapsed_seconds']:.2f}s")
+    print(f"成功查询:   {result['queries_ok']}")
+    print(f"失败查询:   {result['queries_failed']}  (错误率 {result['error_rate'] * 100:.2f}%，含建连失败)")
+    print(f"QPS:        {result['qps']:.1f}")
+    latency = "  ".join(
+        f"{name}={v:.2f}ms" if v is not None else f"{name}=-"
+        for name, v in result['latency_ms'].items()
+    )
+    print(f"查询延迟:   {latency}")
+    if result['errors']:
+        print("错误分布:")
+        for key, count in sorted(result['errors'].items(), key=lambda kv: -kv[1]):
+            print(f"  {key:<40}{count:>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description="MySQL 并发压测（通过 listen-client 映射端口）")
+    parser.add_argument('--config', default=str(CONFIG_FILE), help='配置文件路径')
+    parser.add_argument('--connections', type=int, default=32, help='并发连接数')
+    parser.add_argument('--duration', type=float, help='运行时长（秒）')
+    parser.add_argument('--queries', type=int, help='查询总数')
+    parser.add_argument('--sql', help='执行的 SQL（默认使用 mysql-listen.sql-script）')
+    args = parser.parse_args()
+
+    if args.duration is None and args.queries is None:
+        args.duration = 30
+
+    config = load_config(args.config)
+    result = run_load(config['listen-client']['mysql-listen'], args.connections,
+                      duration=args.duration, queries=args.queries, sql=args.sql)
+    print_report(result)
+
+    if result['queries_ok'] == 0:
+        log_error("没有成功的查询")
+        return 1
+    log_success("压测完成")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
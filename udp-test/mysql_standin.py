@@ -0,0 +1,403 @@
+#!/usr/bin/env python3
+"""
+MySQL 协议替身服务（asyncio）
+
+实现 MySQL 客户端/服务器协议中测试需要的最小子集，用于在没有真实 MySQL 的机器上
+驱动隧道数据通路：
+- 握手（Handshake V10 + mysql_native_password，必要时发送 AuthSwitchRequest）
+- COM_QUERY: SELECT 返回可配置行数、列类型和列宽的结果集，其余语句返回 OK
+- COM_PING / COM_INIT_DB / COM_QUIT
+
+结果集按行懒生成、分批写出（每批写满后 await drain），内存占用与行数无关。
+同样的列定义和行数每次产生完全相同的字节流，便于精确测量隧道吞吐。
+
+用法:
+    ./mysql_standin.py --port 3306 --rows 10000 --columns "int,varchar:64,datetime,double,text:512"
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import re
+import struct
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+# 能力标志（只声明实现了的部分）
+CLIENT_LONG_PASSWORD = 0x00000001
+CLIENT_FOUND_ROWS = 0x00000002
+CLIENT_LONG_FLAG = 0x00000004
+CLIENT_CONNECT_WITH_DB = 0x00000008
+CLIENT_PROTOCOL_41 = 0x00000200
+CLIENT_TRANSACTIONS = 0x00002000
+CLIENT_SECURE_CONNECTION = 0x00008000
+CLIENT_MULTI_RESULTS = 0x00020000
+CLIENT_PLUGIN_AUTH = 0x00080000
+CLIENT_PLUGIN_AUTH_LENENC_CLIENT_DATA = 0x00200000
+
+SERVER_CAPABILITIES = (
+    CLIENT_LONG_PASSWORD | CLIENT_FOUND_ROWS | CLIENT_LONG_FLAG | CLIENT_CONNECT_WITH_DB
+    | CLIENT_PROTOCOL_41 | CLIENT_TRANSACTIONS | CLIENT_SECURE_CONNECTION
+    | CLIENT_MULTI_RESULTS | CLIENT_PLUGIN_AUTH | CLIENT_PLUGIN_AUTH_LENENC_CLIENT_DATA
+)
+
+SERVER_STATUS_AUTOCOMMIT = 0x0002
+SERVER_VERSION = b"8.0.36-tunnox-standin"
+AUTH_PLUGIN = b"mysql_native_password"
+
+COM_QUIT = 0x01
+COM_INIT_DB = 0x02
+COM_QUERY = 0x03
+COM_PING = 0x0e
+
+CHARSET_UTF8MB4 = 45
+CHARSET_BINARY = 63
+
+MAX_PACKET = 0xFFFFFF
+# 写缓冲达到该大小时刷新到 socket
+FLUSH_THRESHOLD = 64 * 1024
+
+# 列类型: 名称 → (MySQL 类型码, 字符集, 默认宽度, 列标志)
+COLUMN_TYPES = {
+    "int": (0x08, CHARSET_BINARY, 20, 0x0001 | 0x0020),       # LONGLONG, NOT NULL | UNSIGNED
+    "double": (0x05, CHARSET_BINARY, 22, 0x0001),             # DOUBLE
+    "datetime": (0x0c, CHARSET_BINARY, 19, 0x0001),           # DATETIME
+    "varchar": (0xfd, CHARSET_UTF8MB4, 64, 0x0001),           # VAR_STRING
+    "text": (0xfc, CHARSET_UTF8MB4, 1024, 0x0010),            # BLOB (TEXT)
+}
+
+LIMIT_RE = re.compile(r"\blimit\s+(?:\d+\s*,\s*)?(\d+)", re.IGNORECASE)
+SELECT_CONST_RE = re.compile(r"^\s*select\s+(\d+)(?:\s+as\s+(\w+))?\s*;?\s*$", re.IGNORECASE)
+SELECT_VAR_RE = re.compile(r"^\s*select\s+@@(\w+)", re.IGNORECASE)
+
+DATETIME_BASE = datetime(2024, 1, 1)
+# 字符串列的填充内容（按行号偏移截取，保证确定性且相邻行内容不同）
+FILLER = (b"tunnox-standin-0123456789-abcdefghijklmnopqrstuvwxyz-ABCDEFGHIJKLMNOPQRSTUVWXYZ-" * 64)
+
+@dataclass
+class Column:
+    name: str
+    kind: str
+    width: int
+
+def parse_columns(spec):
+    """解析列定义，如 "int,varchar:64,datetime,double,text:512" """
+    columns = []
+    for i, item in enumerate(x.strip() for x in spec.split(",") if x.strip()):
+        kind, _, width = item.partition(":")
+        kind = kind.lower()
+        if kind not in COLUMN_TYPES:
+            raise ValueError(f"不支持的列类型: {kind} (可选: {', '.join(COLUMN_TYPES)})")
+        columns.append(Column(f"c{i}_{kind}", kind, int(width) if width else COLUMN_TYPES[kind][2]))
+    if not columns:
+        raise ValueError("至少需要一列")
+    return columns
+
+# ---------- 编码 ----------
+
+def lenenc_int(n):
+    if n < 251:
+        return bytes((n,))
+    if n < 1 << 16:
+        return b"\xfc" + struct.pack("<H", n)
+    if n < 1 << 24:
+        return b"\xfd" + struct.pack("<I", n)[:3]
+    return b"\xfe" + struct.pack("<Q", n)
+
+def lenenc_str(b):
+    return lenenc_int(len(b)) + b
+
+def read_lenenc_int(data, pos):
+    first = data[pos]
+    if first < 251:
+        return first, pos + 1
+    if first == 0xfc:
+        return struct.unpack_from("<H", data, pos + 1)[0], pos + 3
+    if first == 0xfd:
+        return int.from_bytes(data[pos + 1:pos + 4], "little"), pos + 4
+    return struct.unpack_from("<Q", data, pos + 1)[0], pos + 9
+
+def ok_packet(affected=0, status=SERVER_STATUS_AUTOCOMMIT):
+    return b"\x00" + lenenc_int(affected) + lenenc_int(0) + struct.pack("<HH", status, 0)
+
+def eof_packet(status=SERVER_STATUS_AUTOCOMMIT):
+    return b"\xfe" + struct.pack("<HH", 0, status)
+
+def err_packet(code, message, sqlstate=b"HY000"):
+    return b"\xff" + struct.pack("<H", code) + b"#" + sqlstate + message.encode()
+
+def column_definition(column, table=b"standin", schema=b"standin"):
+    type_code, charset, _, flags = COLUMN_TYPES[column.kind]
+    name = column.name.encode()
+    decimals = 0x1f if column.kind == "double" else 0
+    return (
+        lenenc_str(b"def") + lenenc_str(schema) + lenenc_str(table) + lenenc_str(table)
+        + lenenc_str(name) + lenenc_str(name)
+        + b"\x0c" + struct.pack("<HIBHB", charset, column.width, type_code, flags, decimals) + b"\x00\x00"
+    )
+
+def encode_value(column, row):
+    if column.kind == "int":
+        return str(row + 1).encode()
+    if column.kind == "double":
+        return f"{row * 1.25:.4f}".encode()
+    if column.kind == "datetime":
+        return (DATETIME_BASE + timedelta(seconds=row)).strftime("%Y-%m-%d %H:%M:%S").encode()
+    # 字符串列：从填充内容中按行号偏移截取固定宽度
+    start = (row * 7) % 97
+    data = FILLER[start:start + column.width]
+    while len(data) < column.width:
+        data += FILLER[:column.width - len(data)]
+    return data
+
+def encode_row(columns, row):
+    return b"".join(lenenc_str(encode_value(c, row)) for c in columns)
+
+def result_set_payloads(columns, rows):
+    """按顺序生成结果集的各个包负载（懒生成）"""
+    yield lenenc_int(len(columns))
+    for column in columns:
+        yield column_definition(column)
+    yield eof_packet()
+    for row in range(rows):
+        yield encode_row(columns, row)
+    yield eof_packet()
+
+def result_set_wire_bytes(columns, rows):
+    """结果集在线路上的精确字节数（含 4 字节包头，不含请求）"""
+    total = 0
+    for payload in result_set_payloads(columns, rows):
+        n = len(payload)
+        total += n + 4 * (n // MAX_PACKET + 1)
+    return total
+
+def native_password_scramble(password, salt):
+    """mysql_native_password: SHA1(pw) XOR SHA1(salt + SHA1(SHA1(pw)))"""
+    if not password:
+        return b""
+    stage1 = hashlib.sha1(password.encode()).digest()
+    stage2 = hashlib.sha1(stage1).digest()
+    mix = hashlib.sha1(salt + stage2).digest()
+    return bytes(a ^ b for a, b in zip(stage1, mix))
+
+# ---------- 连接处理 ----------
+
+class PacketStream:
+    """MySQL 包读写（维护序列号，写出时合并小包）"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.seq = 0
+        self.buffer = bytearray()
+        self.bytes_out = 0
+
+    async def read_packet(self):
+        payload = b""
+        while True:
+            header = await self.reader.readexactly(4)
+            length = int.from_bytes(header[:3], "little")
+            self.seq = (header[3] + 1) & 0xff
+            payload += await self.reader.readexactly(length)
+            if length < MAX_PACKET:
+                return payload
+
+    async def write_packet(self, payload):
+        view = memoryview(payload)
+        while True:
+            chunk = view[:MAX_PACKET]
+            self.buffer += len(chunk).to_bytes(3, "little") + bytes((self.seq,))
+            self.buffer += chunk
+            self.seq = (self.seq + 1) & 0xff
+            view = view[MAX_PACKET:]
+            if len(chunk) < MAX_PACKET:
+                break
+        if len(self.buffer) >= FLUSH_THRESHOLD:
+            await self.flush()
+
+    async def flush(self):
+        if self.buffer:
+            self.writer.write(bytes(self.buffer))
+            self.bytes_out += len(self.buffer)
+            self.buffer.clear()
+        await self.writer.drain()
+
+class StandinServer:
+    """MySQL 协议替身服务"""
+
+    def __init__(self, columns, rows, user=None, password=None, verbose=True):
+        self.columns = columns
+        self.rows = rows
+        self.user = user
+        self.password = password
+        self.verbose = verbose
+        self.next_conn_id = 1
+        self.stats = {"connections": 0, "queries": 0, "rows": 0, "bytes_out": 0}
+
+    def log(self, msg):
+        if self.verbose:
+            print(f"[standin] {msg}", flush=True)
+
+    async def handle(self, reader, writer):
+        conn_id = self.next_conn_id
+        self.next_conn_id += 1
+        self.stats["connections"] += 1
+        stream = PacketStream(reader, writer)
+        try:
+            if await self.handshake(stream, conn_id):
+                await self.command_loop(stream)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.stats["bytes_out"] += stream.bytes_out
+            writer.close()
+
+    async def handshake(self, stream, conn_id):
+        salt = os.urandom(20).replace(b"\x00", b"\x01")
+        greeting = (
+            b"\x0a" + SERVER_VERSION + b"\x00"
+            + struct.pack("<I", conn_id)
+            + salt[:8] + b"\x00"
+            + struct.pack("<H", SERVER_CAPABILITIES & 0xffff)
+            + bytes((CHARSET_UTF8MB4,))
+            + struct.pack("<H", SERVER_STATUS_AUTOCOMMIT)
+            + struct.pack("<H", SERVER_CAPABILITIES >> 16)
+            + bytes((21,)) + b"\x00" * 10
+            + salt[8:] + b"\x00"
+            + AUTH_PLUGIN + b"\x00"
+        )
+        stream.seq = 0
+        await stream.write_packet(greeting)
+        await stream.flush()
+
+        data = await stream.read_packet()
+        caps = struct.unpack_from("<I", data, 0)[0]
+        pos = 32
+        end = data.index(b"\x00", pos)
+        user = data[pos:end].decode(errors="replace")
+        pos = end + 1
+        if caps & CLIENT_PLUGIN_AUTH_LENENC_CLIENT_DATA:
+            n, pos = read_lenenc_int(data, pos)
+        else:
+            n, pos = data[pos], pos + 1
+        auth = data[pos:pos + n]
+        pos += n
+        if caps & CLIENT_CONNECT_WITH_DB and pos < len(data):
+            end = data.index(b"\x00", pos)
+            pos = end + 1
+        plugin = AUTH_PLUGIN
+        if caps & CLIENT_PLUGIN_AUTH and pos < len(data):
+            plugin = data[pos:].split(b"\x00", 1)[0]
+
+        if plugin != AUTH_PLUGIN:
+            # 客户端使用了其他认证插件，切换到 mysql_native_password
+            await stream.write_packet(b"\xfe" + AUTH_PLUGIN + b"\x00" + salt + b"\x00")
+            await stream.flush()
+            auth = await stream.read_packet()
+
+        if self.user is not None and user != self.user:
+            await self._deny(stream, user)
+            return False
+        if self.password is not None and auth != native_password_scramble(self.password, salt):
+            await self._deny(stream, user)
+            return False
+
+        await stream.write_packet(ok_packet())
+        await stream.flush()
+        return True
+
+    async def _deny(self, stream, user):
+        await stream.write_packet(err_packet(1045, f"Access denied for user '{user}'", b"28000"))
+        await stream.flush()
+
+    async def command_loop(self, stream):
+        while True:
+            stream.seq = 0
+            packet = await stream.read_packet()
+            command = packet[0]
+            if command == COM_QUIT:
+                return
+            if command == COM_QUERY:
+                await self.handle_query(stream, packet[1:].decode("utf-8", errors="replace"))
+            elif command in (COM_PING, COM_INIT_DB):
+                await stream.write_packet(ok_packet())
+            else:
+                await stream.write_packet(err_packet(1047, f"Unknown command {command}", b"08S01"))
+            await stream.flush()
+
+    async def handle_query(self, stream, sql):
+        self.stats["queries"] += 1
+        if not sql.lstrip().lower().startswith("select"):
+            # SET / USE / BEGIN 等语句统一返回 OK
+            await stream.write_packet(ok_packet())
+            return
+
+        m = SELECT_CONST_RE.match(sql)
+        if m:
+            column = Column(m.group(2) or m.group(1), "int", 20)
+            await self.send_simple(stream, column, m.group(1).encode())
+            return
+        m = SELECT_VAR_RE.match(sql)
+        if m:
+            value = SERVER_VERSION if "version" in m.group(1).lower() else b""
+            await self.send_simple(stream, Column(f"@@{m.group(1)}", "varchar", 64), value)
+            return
+
+        m = LIMIT_RE.search(sql)
+        rows = int(m.group(1)) if m else self.rows
+        start = time.monotonic()
+        bytes_before = stream.bytes_out
+        for payload in result_set_payloads(self.columns, rows):
+            await stream.write_packet(payload)
+        await stream.flush()
+        elapsed = time.monotonic() - start
+        sent = stream.bytes_out - bytes_before
+        self.stats["rows"] += rows
+        self.log(f"SELECT 返回 {rows} 行, {sent} 字节, 耗时 {elapsed * 1000:.1f}ms")
+
+    async def send_simple(self, stream, column, value):
+        await stream.write_packet(lenenc_int(1))
+        await stream.write_packet(column_definition(column))
+        await stream.write_packet(eof_packet())
+        await stream.write_packet(lenenc_str(value))
+        await stream.write_packet(eof_packet())
+
+async def serve(host, port, server):
+    srv = await asyncio.start_server(server.handle, host, port)
+    addrs = ", ".join(str(s.getsockname()) for s in srv.sockets)
+    server.log(f"监听 {addrs}，默认 {server.rows} 行，列: "
+               f"{', '.join(f'{c.kind}:{c.width}' for c in server.columns)}")
+    server.log(f"默认结果集线路字节数: {result_set_wire_bytes(server.columns, server.rows)}")
+    async with srv:
+        await srv.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description="MySQL 协议替身服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=3306, help="监听端口")
+    parser.add_argument("--rows", type=int, default=10000, help="SELECT 未带 LIMIT 时返回的行数")
+    parser.add_argument("--columns", default="int,varchar:64,datetime,double,text:256",
+                        help="列定义，逗号分隔，类型: int/double/datetime/varchar:宽度/text:宽度")
+    parser.add_argument("--user", help="只接受该用户名（默认接受任意用户）")
+    parser.add_argument("--password", help="校验 mysql_native_password 密码（默认不校验）")
+    parser.add_argument("--quiet", action="store_true", help="不输出每次查询的统计")
+    args = parser.parse_args()
+
+    try:
+        columns = parse_columns(args.columns)
+    except ValueError as e:
+        print(f"✗ {e}", file=sys.stderr)
+        return 2
+
+    server = StandinServer(columns, args.rows, user=args.user, password=args.password, verbose=not args.quiet)
+    try:
+        asyncio.run(serve(args.host, args.port, server))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
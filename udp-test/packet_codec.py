@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+tunnox 包格式编解码（internal/packet、internal/stream/stream_processor_*.go）
+
+帧格式: 1 字节类型 + 4 字节大端长度 + 包体；心跳只有类型字节。
+类型字节的低 6 位为包类型，0x40 表示包体经 gzip 压缩，0x80 表示加密（由 transform 模块处理，这里不支持）。
+
+- FrameDecoder 在一块可复用的 bytearray 上增量解析：recv_into / 协议的 get_buffer 直接写入缓冲区，
+  解析出的 Frame.body 是指向缓冲区的 memoryview，不复制包体。
+  Frame 只在下一次向解码器写入数据之前有效，需要保留时调用 Frame.detach()
+- JsonCommand / CommandResp 的 JSON 在第一次访问 Frame.command 时才解析，只转发不读内容的帧没有解析开销
+- FrameWriter 把帧头和包体作为独立的缓冲区交给 sendmsg 一次性写出（scatter-gather），不拼接包体
+
+注意 Go 端 WritePacket 对包体为空的非心跳包只写类型字节；这里编码空包体时总是写出长度 0，
+与 builder.BuildPacket 和 ReadPacket 一致。
+
+用法:
+    decoder = FrameDecoder()
+    n = sock.recv_into(decoder.get_buffer())
+    decoder.buffer_updated(n)
+    for frame in decoder.frames():
+        if frame.is_command:
+            print(frame.command["CommandType"])
+
+    writer = FrameWriter(sock)
+    writer.write_command(JSON_COMMAND, CommandType, body)
+    writer.flush()
+
+    ./packet_codec.py --frames 200000          # 编解码微基准（帧/秒）
+"""
+
+import argparse
+import gzip
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+# internal/packet/packet.go
+HANDSHAKE = 0x01
+HANDSHAKE_RESP = 0x02
+HEARTBEAT = 0x03
+JSON_COMMAND = 0x10
+COMMAND_RESP = 0x11
+TUNNEL_OPEN = 0x20
+TUNNEL_OPEN_ACK = 0x21
+TUNNEL_DATA = 0x22
+TUNNEL_CLOSE = 0x23
+DATA_STREAM_EOF = 0x24
+COMPRESSED = 0x40
+ENCRYPTED = 0x80
+TYPE_MASK = 0x3F
+
+PACKET_TYPE_NAMES = {
+    HANDSHAKE: "Handshake",
+    HANDSHAKE_RESP: "HandshakeResp",
+    HEARTBEAT: "Heartbeat",
+    JSON_COMMAND: "JsonCommand",
+    COMMAND_RESP: "CommandResp",
+    TUNNEL_OPEN: "TunnelOpen",
+    TUNNEL_OPEN_ACK: "TunnelOpenAck",
+    TUNNEL_DATA: "TunnelData",
+    TUNNEL_CLOSE: "TunnelClose",
+    DATA_STREAM_EOF: "DataStreamEOF",
+}
+
+# internal/constants/constants.go
+MAX_BODY_SIZE = 16 * 1024 * 1024
+LENGTH = struct.Struct(">I")
+HEADER_SIZE = 1 + LENGTH.size
+HEADER = struct.Struct(">BI")
+IOV_MAX = os.sysconf("SC_IOV_MAX") if hasattr(os, "sysconf") else 1024
+# 每次读取至少预留的空闲空间
+MIN_READ = 16 * 1024
+
+class FrameError(Exception):
+    pass
+
+def type_name(ptype):
+    """包类型名称（忽略压缩/加密标志）"""
+    base = ptype & TYPE_MASK
+    return PACKET_TYPE_NAMES.get(base, f"0x{base:02x}")
+
+class Frame:
+    """一个已解析的帧；body 在下一次向解码器写入数据前有效"""
+
+    __slots__ = ("type", "body", "_payload", "_command")
+
+    def __init__(self, ptype, body):
+        self.type = ptype
+        self.body = body
+        self._payload = None
+        self._command = None
+
+    @property
+    def base_type(self):
+        return self.type & TYPE_MASK
+
+    @property
+    def type_name(self):
+        return type_name(self.type)
+
+    @property
+    def compressed(self):
+        return bool(self.type & COMPRESSED)
+
+    @property
+    def is_command(self):
+        return self.base_type in (JSON_COMMAND, COMMAND_RESP)
+
+    @property
+    def payload(self):
+        """解压后的包体；未压缩时直接返回 body（不复制）"""
+        if self._payload is None:
+            if self.type & ENCRYPTED:
+                raise FrameError("不支持加密包（Encrypted 0x80）")
+            self._payload = gzip.decompress(self.body) if self.compressed else self.body
+        return self._payload
+
+    def json(self):
+        """把包体解析为 JSON（握手请求/响应等）"""
+        return json.loads(bytes(self.payload))
+
+    @property
+    def command(self):
+        """CommandPacket 字典（CommandType、CommandId、Token、SenderId、ReceiverId、CommandBody），首次访问时解析"""
+        if self._command is None:
+            if not self.is_command:
+                raise FrameError(f"0x{self.type:02x} 不是命令包")
+            self._command = self.json()
+        return self._command
+
+    def command_body(self):
+        """CommandBody 字段本身也是 JSON 字符串，按需再解析一层"""
+        body = self.command.get("CommandBody")
+        return json.loads(body) if body else None
+
+    def detach(self):
+        """复制包体，使帧在解码器复用缓冲区后仍然有效"""
+        if isinstance(self.body, memoryview):
+            self.body = self.body.tobytes()
+            if self._payload is not None and isinstance(self._payload, memoryview):
+                self._payload = self.body
+        return self
+
+    def __len__(self):
+        return 1 if self.base_type == HEARTBEAT else HEADER_SIZE + len(self.body)
+
+    def __repr__(self):
+        return f"Frame(type=0x{self.type:02x}, body={len(self.body)}B)"
+
+class FrameDecoder:
+    """在可复用缓冲区上增量解析帧
+
+    与 asyncio.BufferedProtocol 的接口一致：get_buffer() 返回可写入的 memoryview，
+    buffer_updated(n) 提交写入的字节数，frames() 逐个产出完整的帧。
+    """
+
+    def __init__(self, capacity=256 * 1024, max_body=MAX_BODY_SIZE, min_read=MIN_READ):
+        self.buf = bytearray(capacity)
+        self.min_read = min(min_read, capacity)
+        self.view = memoryview(self.buf)
+        self.start = 0
+        self.end = 0
+        self.need = HEADER_SIZE
+        self.max_body = max_body
+        self.frames_decoded = 0
+        self.bytes_decoded = 0
+
+    def get_buffer(self, sizehint=-1):
+        """返回可写入的空闲区域（至少 sizehint 字节）
+
+        空闲区域不够时先把未解析的数据移到缓冲区开头，仍不够再换一块更大的缓冲区。
+        """
+        pending = self.end - self.start
+        want = max(self.need - pending, sizehint, self.min_read)
+        if len(self.buf) - self.end < want:
+            if len(self.buf) - pending < want:
+                # 换新缓冲区而不是原地扩容：已交给调用方的 memoryview 仍指向旧缓冲区
+                size = len(self.buf)
+                while size - pending < want:
+                    size *= 2
+                buf = bytearray(size)
+                buf[:pending] = self.view[self.start:self.end]
+                self.buf = buf
+                self.view = memoryview(buf)
+            else:
+                self.view[:pending] = self.view[self.start:self.end]
+            self.start, self.end = 0, pending
+        return self.view[self.end:]
+
+    def buffer_updated(self, nbytes):
+        self.end += nbytes
+
+    def feed(self, data):
+        """写入一段已读取的数据（会复制一次；能用 recv_into 时优先使用 recv_into）"""
+        data = memoryview(data)
+        while data:
+            target = self.get_buffer(len(data))
+            n = min(len(target), len(data))
+            target[:n] = data[:n]
+            self.buffer_updated(n)
+            data = data[n:]
+
+    def recv_into(self, sock):
+        """从 socket 直接读入缓冲区，返回读取的字节数（0 表示对端关闭）"""
+        n = sock.recv_into(self.get_buffer())
+        self.buffer_updated(n)
+        return n
+
+    def frames(self):
+        """产出缓冲区中所有完整的帧"""
+        buf, view = self.buf, self.view
+        pos, end = self.start, self.end
+        try:
+            while pos < end:
+                ptype = buf[pos]
+                if ptype & TYPE_MASK == HEARTBEAT:
+                    pos += 1
+                    self.frames_decoded += 1
+                    self.bytes_decoded += 1
+                    yield Frame(ptype, view[pos:pos])
+                    continue
+                if end - pos < HEADER_SIZE:
+                    self.need = HEADER_SIZE
+                    return
+                _, length = HEADER.unpack_from(buf, pos)
+                if length > self.max_body:
+                    raise FrameError(f"包体长度 {length} 超过上限 {self.max_body}")
+                frame_end = pos + HEADER_SIZE + length
+                if frame_end > end:
+                    self.need = HEADER_SIZE + length
+                    return
+                body = view[pos + HEADER_SIZE:frame_end]
+                pos = frame_end
+                self.frames_decoded += 1
+                self.bytes_decoded += HEADER_SIZE + length
+                yield Frame(ptype, body)
+            self.need = HEADER_SIZE
+        finally:
+            self.start = pos
+            if pos == end:
+                # 全部解析完时从头复用缓冲区
+                self.start = self.end = 0
+
+    def take_remaining(self):
+        """取出尚未解析的字节并清空缓冲区（连接切换为原始字节流时使用）"""
+        rest = bytes(self.view[self.start:self.end])
+        self.start = self.end = 0
+        self.need = HEADER_SIZE
+        return rest
+
+def command_json(command_type, body="", command_id="", token="", sender_id="", receiver_id=""):
+    """CommandPacket 的 JSON 编码（Go 结构体无 json tag，字段名即键名）"""
+    if not isinstance(body, str):
+        body = json.dumps(body, separators=(",", ":"))
+    return json.dumps({
+        "CommandType": command_type,
+        "CommandId": command_id,
+        "Token": token,
+        "SenderId": sender_id,
+        "ReceiverId": receiver_id,
+        "CommandBody": body,
+    }, separators=(",", ":")).encode()
+
+def encode_frame(ptype, body=b"", compress=False):
+    """返回 [帧头, 包体] 两个缓冲区（心跳只有类型字节），供 sendmsg 直接使用"""
+    if ptype & TYPE_MASK == HEARTBEAT:
+        return [bytes([ptype | COMPRESSED if compress else ptype])]
+    if compress:
+        ptype |= COMPRESSED
+        body = gzip.compress(body, compresslevel=6)
+    if len(body) > MAX_BODY_SIZE:
+        raise FrameError(f"包体长度 {len(body)} 超过上限 {MAX_BODY_SIZE}")
+    header = HEADER.pack(ptype, len(body))
+    return [header, body] if len(body) else [header]
+
+def encode_packet(ptype, body=b"", compress=False):
+    """编码为一段连续的 bytes（小包或不需要 scatter-gather 时使用）"""
+    return b"".join(encode_frame(ptype, body, compress))
+
+class ScatterWriter:
+    """把待发送的缓冲区排队，用 sendmsg 一次写出（不拼接）
+
+    非阻塞 socket 写不完时保留剩余部分，flush() 返回 False，等可写后再次调用。
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.pending = []
+        self.pending_bytes = 0
+        self.bytes_sent = 0
+        self.syscalls = 0
+
+    def queue(self, parts):
+        for part in parts:
+            self.pending.append(part)
+            self.pending_bytes += len(part)
+
+    def flush(self):
+        """写出排队的数据，全部写完返回 True"""
+        pending = self.pending
+        while pending:
+            try:
+                sent = self.sock.sendmsg(pending[:IOV_MAX])
+            except (BlockingIOError, InterruptedError):
+                return False
+            self.syscalls += 1
+            self.bytes_sent += sent
+            self.pending_bytes -= sent
+            # 丢弃已写完的缓冲区，部分写出的缓冲区改为 memoryview 切片（不复制）
+            i = 0
+            while i < len(pending) and sent >= len(pending[i]):
+                sent -= len(pending[i])
+                i += 1
+            del pending[:i]
+            if sent:
+                pending[0] = memoryview(pending[0])[sent:]
+        return True
+
+class FrameWriter(ScatterWriter):
+    """把帧的各个缓冲区排队，用 sendmsg 一次写出多个帧"""
+
+    def __init__(self, sock, compress=False):
+        super().__init__(sock)
+        self.compress = compress
+
+    def write(self, ptype, body=b""):
+        self.queue(encode_frame(ptype, body, self.compress))
+
+    def write_command(self, ptype, command_type, body="", **fields):
+        self.write(ptype, command_json(command_type, body, **fields))
+
+    def write_heartbeat(self):
+        self.write(HEARTBEAT)
+
+# ---------- 微基准 ----------
+
+def make_workload(count, mix, compress):
+    """按比例生成一组帧的编码参数"""
+    command = command_json(52, {"mapping_id": "pm_0001", "bytes_sent": 123456, "bytes_received": 654321},
+                           command_id="cmd-000001", sender_id="10000001", receiver_id="0")
+    data = {size: bytes(i % 251 for i in range(size)) for size in (1024, 16 * 1024, 64 * 1024)}
+    kinds = []
+    for name, weight in mix:
+        kinds += [name] * weight
+    workload = []
+    for i in range(count):
+        kind = kinds[i % len(kinds)]
+        if kind == "heartbeat":
+            workload.append((HEARTBEAT, b""))
+        elif kind == "command":
+            workload.append((JSON_COMMAND, command))
+        else:
+            workload.append((TUNNEL_DATA, data[int(kind)]))
+    return workload
+
+def bench_encode(workload, compress):
+    start = time.perf_counter()
+    frames = [encode_frame(ptype, body, compress) for ptype, body in workload]
+    return frames, time.perf_counter() - start
+
+def bench_decode(stream, chunk, lazy):
+    """把连续字节流按 chunk 大小分段写入解码器（模拟 recv_into）"""
+    decoder = FrameDecoder()
+    view = memoryview(stream)
+    start = time.perf_counter()
+    for pos in range(0, len(view), chunk):
+        piece = view[pos:pos + chunk]
+        decoder.get_buffer(len(piece))[:len(piece)] = piece
+        decoder.buffer_updated(len(piece))
+        for frame in decoder.frames():
+            if not lazy and frame.is_command:
+                frame.command
+    return decoder.frames_decoded, time.perf_counter() - start
+
+def bench_decode_copying(stream, chunk):
+    """对照组：bytes 拼接 + 切片复制包体的朴素解析"""
+    pending = b""
+    frames = 0
+    start = time.perf_counter()
+    for pos in range(0, len(stream), chunk):
+        pending += stream[pos:pos + chunk]
+        while pending:
+            if pending[0] & TYPE_MASK == HEARTBEAT:
+                pending = pending[1:]
+                frames += 1
+                continue
+            if len(pending) < HEADER_SIZE:
+                break
+            (length,) = LENGTH.unpack_from(pending, 1)
+            if len(pending) < HEADER_SIZE + length:
+                break
+            _ = pending[HEADER_SIZE:HEADER_SIZE + length]
+            pending = pending[HEADER_SIZE + length:]
+            frames += 1
+    return frames, time.perf_counter() - start
+
+def bench_socket(frames, batch):
+    """socketpair 上 sendmsg 批量发送、recv_into 解析，返回 (帧数, 字节数, 秒, 系统调用次数)"""
+    a, b = socket.socketpair()
+    for s in (a, b):
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    expected = len(frames)
+    result = {}
+
+    def receive():
+        decoder = FrameDecoder()
+        count = 0
+        while count < expected:
+            if decoder.recv_into(b) == 0:
+                break
+            for _ in decoder.frames():
+                count += 1
+        result["frames"] = count
+        result["bytes"] = decoder.bytes_decoded
+
+    reader = threading.Thread(target=receive, daemon=True)
+    writer = FrameWriter(a)
+    start = time.perf_counter()
+    reader.start()
+    for i in range(0, expected, batch):
+        for parts in frames[i:i + batch]:
+            writer.queue(parts)
+        writer.flush()
+    reader.join()
+    elapsed = time.perf_counter() - start
+    a.close()
+    b.close()
+    return result.get("frames", 0), result.get("bytes", 0), elapsed, writer.syscalls
+
+MIXES = {
+    "control": [("heartbeat", 6), ("command", 4)],
+    "mixed": [("heartbeat", 2), ("command", 4), ("1024", 3), ("16384", 1)],
+    "bulk": [("command", 1), ("65536", 9)],
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="tunnox 包格式编解码微基准")
+    parser.add_argument('--frames', type=int, default=200000, help='每种负载的帧数')
+    parser.add_argument('--mix', choices=sorted(MIXES), action='append',
+                        help='负载组成（可重复）：control 心跳+命令，mixed 含 1K/16K 数据包，bulk 以 64K 数据包为主')
+    parser.add_argument('--chunk', type=int, default=64 * 1024, help='解码时每次写入的字节数（模拟单次 recv）')
+    parser.add_argument('--batch', type=int, default=64, help='socketpair 测试中每次 sendmsg 的帧数')
+    parser.add_argument('--compress', action='store_true', help='包体使用 gzip 压缩')
+    args = parser.parse_args()
+
+    print(f"{'负载':<9}{'阶段':<22}{'帧/秒':>12}{'MB/s':>10}")
+    for mix in args.mix or ["control", "mixed", "bulk"]:
+        count = args.frames if mix != "bulk" else max(args.frames // 20, 1000)
+        workload = make_workload(count, MIXES[mix], args.compress)
+        frames, seconds = bench_encode(workload, args.compress)
+        stream = b"".join(part for parts in frames for part in parts)
+        size_mb = len(stream) / 1024**2
+        rows = [("编码", count, seconds)]
+        decoded, seconds = bench_decode(stream, args.chunk, lazy=True)
+        rows.append(("解码（延迟解析）", decoded, seconds))
+        decoded_json, seconds_json = bench_decode(stream, args.chunk, lazy=False)
+        rows.append(("解码 + 解析命令 JSON", decoded_json, seconds_json))
+        copied, seconds = bench_decode_copying(stream, args.chunk)
+        rows.append(("对照：复制包体解析", copied, seconds))
+        sent, nbytes, seconds, syscalls = bench_socket(frames, args.batch)
+        rows.append(("socketpair sendmsg", sent, seconds))
+        for name, n, s in rows:
+            if n != count:
+                print(f"{mix:<9}{name:<22}帧数不符: {n} != {count}")
+                return 1
+            print(f"{mix:<9}{name:<22}{n / s:>12.0f}{size_mb / s:>10.1f}")
+        print(f"{'':<9}平均帧 {len(stream) / count:.0f} 字节，sendmsg 调用 {syscalls} 次")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+基于 asyncio 的测试阶段编排
+
+每个阶段声明自己依赖的阶段，依赖全部完成后立即调度，互不依赖的阶段并发执行。
+阶段函数可以是协程函数，也可以是普通（阻塞）函数——后者在线程池中运行，
+不会阻塞事件循环。
+
+运行结束后输出每个阶段的开始时间、耗时和状态（控制台表格；timings() 随测试结果写入结果库的 pipeline 指标），
+用于分析测试流程的时间花在哪里。
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+
+from common import Colors, log_header, log_error
+
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_SKIPPED = "skipped"
+
+@dataclass
+class Phase:
+    """一个测试阶段"""
+    name: str
+    func: object
+    deps: tuple = ()
+    title: str = ""
+    # 运行结果
+    status: str = ""
+    result: object = None
+    error: BaseException = None
+    started: float = None
+    finished: float = None
+
+    @property
+    def duration(self):
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+class PhaseError(Exception):
+    """阶段执行失败"""
+
+    def __init__(self, phase):
+        super().__init__(f"阶段 {phase.name} 失败: {phase.error}")
+        self.phase = phase
+
+class PhaseRunner:
+    """按依赖关系并发执行阶段，并记录每个阶段的墙钟耗时"""
+
+    def __init__(self):
+        self.phases = {}
+        self.t0 = None
+        self.t_end = None
+
+    def add(self, name, func, deps=(), title=""):
+        if name in self.phases:
+            raise ValueError(f"重复的阶段: {name}")
+        for dep in deps:
+            if dep not in self.phases:
+                raise ValueError(f"阶段 {name} 依赖未定义的阶段 {dep}（请先添加依赖）")
+        self.phases[name] = Phase(name, func, tuple(deps), title or name)
+        return self
+
+    def result(self, name):
+        return self.phases[name].result
+
+    def run(self):
+        """执行所有阶段；依赖失败阶段的后续阶段被跳过，最后抛出 PhaseError"""
+        return asyncio.run(self.run_async())
+
+    async def run_async(self):
+        self.t0 = time.monotonic()
+        done_events = {name: asyncio.Event() for name in self.phases}
+        tasks = [
+            asyncio.ensure_future(self._run_phase(phase, done_events))
+            for phase in self.phases.values()
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            self.t_end = time.monotonic()
+
+        failed = [p for p in self.phases.values() if p.status == STATUS_FAILED]
+        if failed:
+            raise PhaseError(failed[0])
+        return {name: p.result for name, p in self.phases.items()}
+
+    async def _run_phase(self, phase, done_events):
+        for dep in phase.deps:
+            await done_events[dep].wait()
+        try:
+            if any(self.phases[dep].status != STATUS_OK for dep in phase.deps):
+                phase.status = STATUS_SKIPPED
+                return
+
+            phase.started = time.monotonic() - self.t0
+            log_header(phase.title)
+            try:
+                if asyncio.iscoroutinefunction(phase.func):
+                    phase.result = await phase.func()
+                else:
+                    loop = asyncio.get_running_loop()
+                    phase.result = await loop.run_in_executor(None, phase.func)
+                phase.status = STATUS_OK
+            except Exception as e:
+                phase.status = STATUS_FAILED
+                phase.error = e
+                log_error(f"阶段 {phase.name} 失败: {e}")
+            finally:
+                phase.finished = time.monotonic() - self.t0
+        finally:
+            done_events[phase.name].set()
+
+    # ---------- 报告 ----------
+
+    def timings(self):
+        """每个阶段的时间线（相对 run() 开始的秒数）"""
+        phases = []
+        for p in self.phases.values():
+            phases.append({
+                "name": p.name,
+                "deps": list(p.deps),
+                "status": p.status or STATUS_SKIPPED,
+                "start": p.started,
+                "end": p.finished,
+                "seconds": p.duration,
+                "error": str(p.error) if p.error else None,
+            })
+        total = (self.t_end - self.t0) if self.t0 is not None and self.t_end is not None else None
+        serial = sum(p.duration or 0 for p in self.phases.values())
+        return {"total_seconds": total, "serial_seconds": serial, "phases": phases}
+
+    def print_table(self):
+        data = self.timings()
+        if data["total_seconds"] is None:
+            return
+        log_header("阶段耗时")
+        total = data["total_seconds"] or 1e-9
+        width = 30
+        print(f"{'阶段':<22}{'状态':<9}{'开始(s)':>9}{'耗时(s)':>9}  时间线")
+        for p in data["phases"]:
+            if p["start"] is None:
+                print(f"{p['name']:<22}{p['status']:<9}{'-':>9}{'-':>9}")
+                continue
+            a = int(p["start"] / total * width)
+            b = max(a + 1, int(p["end"] / total * width))
+            bar = " " * a + "█" * (b - a)
+            color = Colors.GREEN if p["status"] == STATUS_OK else Colors.RED
+            print(f"{p['name']:<22}{color}{p['status']:<9}{Colors.END}"
+                  f"{p['start']:>9.2f}{p['seconds']:>9.2f}  |{bar:<{width}}|")
+        print(f"\n墙钟总耗时 {data['total_seconds']:.2f}s，"
+              f"各阶段串行累计 {data['serial_seconds']:.2f}s")
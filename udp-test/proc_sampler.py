@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+进程资源采样
+
+后台线程按固定间隔（最快 10 Hz）读取被测进程的 /proc/<pid>/stat、status、io 和 fd/，
+记录 CPU 时间、RSS、线程数、FD 数、上下文切换次数和读写字节数。
+
+采样结果按列存储（每个进程一组等长数组），结束时写入 gzip 压缩的 JSON 文件，
+并输出每个进程的汇总：CPU 占用（平均/峰值）、RSS 增长、FD/线程峰值、IO 量。
+
+用法:
+    sampler = ProcSampler(lambda: stack.supervisor.pids, interval=0.1)
+    sampler.start()
+    ...
+    sampler.stop()
+    sampler.save(work_dir / "resources.json.gz")
+    sampler.print_summary()
+
+    ./proc_sampler.py resources.json.gz      # 查看已保存文件的汇总
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from array import array
+from pathlib import Path
+
+from common import log_info, log_warning, log_header
+
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+MIN_INTERVAL = 0.1
+
+# 列名 -> array 类型码（t 为相对采样开始的秒数，其余均为累计值或瞬时值）
+COLUMNS = {
+    "t": "d",
+    "cpu_s": "d",          # utime + stime
+    "rss": "q",            # 字节
+    "threads": "q",
+    "fds": "q",
+    "ctx_vol": "q",        # voluntary_ctxt_switches
+    "ctx_invol": "q",      # nonvoluntary_ctxt_switches
+    "read_bytes": "q",     # /proc/<pid>/io 的 rchar（含 socket 读）
+    "write_bytes": "q",    # /proc/<pid>/io 的 wchar（含 socket 写）
+}
+
+def read_proc(pid):
+    """读取一次进程资源，进程不存在时返回 None"""
+    base = f"/proc/{pid}"
+    try:
+        with open(f"{base}/stat", "rb") as f:
+            stat = f.read()
+        with open(f"{base}/status", "rb") as f:
+            status = f.read()
+    except (FileNotFoundError, ProcessLookupError):
+        return None
+
+    # comm 字段可能包含空格和括号，从最后一个 ')' 之后开始解析
+    fields = stat[stat.rindex(b")") + 2:].split()
+    sample = {
+        "cpu_s": (int(fields[11]) + int(fields[12])) / CLK_TCK,
+        "threads": int(fields[17]),
+        "rss": int(fields[21]) * PAGE_SIZE,
+        "ctx_vol": 0,
+        "ctx_invol": 0,
+        "read_bytes": 0,
+        "write_bytes": 0,
+        "fds": 0,
+    }
+    for line in status.splitlines():
+        if line.startswith(b"voluntary_ctxt_switches:"):
+            sample["ctx_vol"] = int(line.split()[1])
+        elif line.startswith(b"nonvoluntary_ctxt_switches:"):
+            sample["ctx_invol"] = int(line.split()[1])
+
+    try:
+        with open(f"{base}/io", "rb") as f:
+            for line in f:
+                if line.startswith(b"rchar:"):
+                    sample["read_bytes"] = int(line.split()[1])
+                elif line.startswith(b"wchar:"):
+                    sample["write_bytes"] = int(line.split()[1])
+    except (PermissionError, FileNotFoundError, ProcessLookupError):
+        pass
+    try:
+        sample["fds"] = len(os.listdir(f"{base}/fd"))
+    except (PermissionError, FileNotFoundError, ProcessLookupError):
+        pass
+    return sample
+
+def find_pids_by_exe(paths):
+    """按可执行文件路径查找进程，返回 {名称: pid}；paths 为 {名称: 路径}"""
+    wanted = {str(Path(p).expanduser().resolve()): name for name, p in paths.items()}
+    found = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            exe = os.readlink(f"/proc/{entry}/exe")
+        except OSError:
+            continue
+        name = wanted.get(exe)
+        if name and name not in found:
+            found[name] = int(entry)
+    return found
+
+class ProcessSeries:
+    """单个进程的列式采样数据"""
+
+    def __init__(self, name, pid):
+        self.name = name
+        self.pid = pid
+        self.columns = {col: array(code) for col, code in COLUMNS.items()}
+
+    def append(self, t, sample):
+        cols = self.columns
+        cols["t"].append(t)
+        for col in COLUMNS:
+            if col != "t":
+                cols[col].append(sample[col])
+
+    def __len__(self):
+        return len(self.columns["t"])
+
+    def to_dict(self):
+        return {"pid": self.pid, "columns": {col: list(arr) for col, arr in self.columns.items()}}
+
+    @classmethod
+    def from_dict(cls, name, data):
+        series = cls(name, data["pid"])
+        for col, values in data["columns"].items():
+            if col in series.columns:
+                series.columns[col].extend(values)
+        return series
+
+    def summary(self):
+        cols = self.columns
+        n = len(self)
+        if n == 0:
+            return {"pid": self.pid, "samples": 0}
+        t, cpu, rss = cols["t"], cols["cpu_s"], cols["rss"]
+        span = t[-1] - t[0]
+        peak_cpu = 0.0
+        for i in range(1, n):
+            dt = t[i] - t[i - 1]
+            if dt > 0:
+                peak_cpu = max(peak_cpu, (cpu[i] - cpu[i - 1]) / dt)
+        return {
+            "pid": self.pid,
+            "samples": n,
+            "seconds": span,
+            "cpu_seconds": cpu[-1] - cpu[0],
+            "cpu_avg_pct": (cpu[-1] - cpu[0]) / span * 100 if span > 0 else 0.0,
+            "cpu_peak_pct": peak_cpu * 100,
+            "rss_start": rss[0],
+            "rss_end": rss[-1],
+            "rss_peak": max(rss),
+            "rss_growth": rss[-1] - rss[0],
+            "threads_peak": max(cols["threads"]),
+            "fds_peak": max(cols["fds"]),
+            "fds_end": cols["fds"][-1],
+            "ctx_vol": cols["ctx_vol"][-1] - cols["ctx_vol"][0],
+            "ctx_invol": cols["ctx_invol"][-1] - cols["ctx_invol"][0],
+            "read_bytes": cols["read_bytes"][-1] - cols["read_bytes"][0],
+            "write_bytes": cols["write_bytes"][-1] - cols["write_bytes"][0],
+        }
+
+class ProcSampler:
+    """后台采样线程
+
+    pids_source 是返回 {名称: pid} 的函数，每次采样前调用，
+    因此采样开始后才启动的进程也会被纳入；同名进程 PID 变化（重启）时记为新序列。
+    """
+
+    def __init__(self, pids_source=None, interval=0.5):
+        self.pids_source = pids_source or dict
+        self.interval = max(float(interval), MIN_INTERVAL)
+        self.series = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self.t0 = None
+
+    def start(self):
+        self.t0 = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="proc-sampler", daemon=True)
+        self._thread.start()
+        log_info(f"资源采样已启动，间隔 {self.interval * 1000:.0f}ms")
+        return self
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        # 停止前再采一次，保证最后一个点覆盖到测试结束
+        self.sample_once()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _run(self):
+        next_at = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.sample_once()
+            except Exception as e:
+                log_warning(f"资源采样失败: {e}")
+            next_at += self.interval
+            delay = next_at - time.monotonic()
+            if delay < 0:
+                # 采样跟不上时丢弃落后的时间点，不做补采
+                next_at = time.monotonic()
+                delay = 0
+            self._stop.wait(delay)
+
+    def sample_once(self):
+        t = time.monotonic() - self.t0
+        for name, pid in self.pids_source().items():
+            key = name
+            series = self.series.get(key)
+            if series is not None and series.pid != pid:
+                key = f"{name}#{pid}"
+                series = self.series.get(key)
+            sample = read_proc(pid)
+            if sample is None:
+                continue
+            if series is None:
+                series = self.series[key] = ProcessSeries(key, pid)
+            series.append(t, sample)
+
+    # ---------- 结果 ----------
+
+    def summary(self):
+        return {name: s.summary() for name, s in self.series.items()}
+
+    def save(self, path):
+        """写入 gzip 压缩的列式 JSON"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "interval": self.interval,
+            "clk_tck": CLK_TCK,
+            "processes": {name: s.to_dict() for name, s in self.series.items()},
+        }
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        log_info(f"资源采样已保存: {path}")
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        sampler = cls(interval=data["interval"])
+        for name, proc in data["processes"].items():
+            sampler.series[name] = ProcessSeries.from_dict(name, proc)
+        return sampler
+
+    def print_summary(self):
+        if not self.series:
+            return
+        log_header("进程资源汇总")
+        print(f"{'进程':<18}{'采样':>6}{'CPU(s)':>9}{'CPU均值':>9}{'CPU峰值':>9}"
+              f"{'RSS峰值':>10}{'RSS增长':>10}{'线程':>6}{'FD':>6}{'切换(自/被)':>16}{'读/写':>20}")
+        for name, s in self.summary().items():
+            if not s["samples"]:
+                continue
+            print(f"{name:<18}{s['samples']:>6}{s['cpu_seconds']:>9.2f}"
+                  f"{s['cpu_avg_pct']:>8.1f}%{s['cpu_peak_pct']:>8.1f}%"
+                  f"{_fmt_bytes(s['rss_peak']):>10}{_fmt_bytes(s['rss_growth'], signed=True):>10}"
+                  f"{s['threads_peak']:>6}{s['fds_peak']:>6}"
+                  f"{s['ctx_vol']:>8}/{s['ctx_invol']:<7}"
+                  f"{_fmt_bytes(s['read_bytes']):>10}/{_fmt_bytes(s['write_bytes']):<9}")
+
+def _fmt_bytes(n, signed=False):
+    sign = "+" if signed and n > 0 else ("-" if n < 0 else "")
+    n = abs(n)
+    for unit in ("B", "K", "M", "G"):
+        if n < 1024 or unit == "G":
+            return f"{sign}{n:.0f}{unit}" if unit == "B" else f"{sign}{n:.1f}{unit}"
+        n /= 1024
+
+def main():
+    parser = argparse.ArgumentParser(description="查看资源采样文件汇总，或对指定 PID 采样")
+    parser.add_argument('file', nargs='?', help='ProcSampler.save() 写出的文件')
+    parser.add_argument('--pid', type=int, action='append', help='直接采样指定 PID（可重复）')
+    parser.add_argument('--interval', type=float, default=0.5, help='采样间隔（秒，最小 0.1）')
+    parser.add_argument('--duration', type=float, default=10, help='采样时长（秒）')
+    parser.add_argument('--out', help='采样结果保存路径')
+    args = parser.parse_args()
+
+    if args.file:
+        ProcSampler.load(args.file).print_summary()
+        return 0
+    if not args.pid:
+        parser.error("需要指定采样文件或 --pid")
+
+    pids = {str(pid): pid for pid in args.pid}
+    sampler = ProcSampler(lambda: pids, interval=args.interval)
+    with sampler:
+        time.sleep(args.duration)
+    if args.out:
+        sampler.save(args.out)
+    sampler.print_summary()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -62,10 +62,10 @@ def test_mysql_connection(config, round_num):
         sql = mysql_config['sql-script']
         log_info(f"执行查询: {sql[:50]}...")
         
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
         cursor.execute(sql)
         results = cursor.fetchall()
-        elapsed = time.time() - start_time
+        elapsed = (time.perf_counter_ns() - start_ns) / 1e9
         
         log_success(f"查询成功! 返回 {len(results)} 行，耗时 {elapsed:.2f}s")
         
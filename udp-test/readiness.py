@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+组件就绪探测
+
+用事件驱动的探测代替固定 sleep：
+- server: 轮询 Management API 的 /tunnox/health
+- 客户端: 监视客户端日志中的握手完成行
+- 映射: 检查 listen-client 的映射端口是否可以 accept
+
+每个组件从启动到就绪的耗时记录在 ReadinessTracker 中，作为测试指标输出。
+"""
+
+import re
+import socket
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from common import log_success, log_header
+
+# 客户端握手完成后输出的日志行（internal/client/control_connection_handshake.go）
+CLIENT_HANDSHAKE_PATTERN = r"Client: authenticated successfully, ClientID=(\d+)"
+
+def http_health_probe(url, token=None, timeout=1.0, host=None):
+    """url 返回 200 视为就绪；host 用于按 Host 头路由的域名映射"""
+    def probe():
+        req = urllib.request.Request(url, method="GET")
+        if token:
+            req.add_header("Authorization", f"Bearer {token}")
+        if host:
+            req.add_header("Host", host)
+        try:
+            with urllib.request.urlopen(req, timeout=timeout) as resp:
+                return resp.status == 200
+        except (urllib.error.URLError, OSError):
+            return False
+    probe.desc = f"GET {url}" + (f" (Host: {host})" if host else "")
+    return probe
+
+def tcp_accept_probe(host, port, timeout=0.5):
+    """端口可以完成 TCP 握手视为就绪"""
+    def probe():
+        try:
+            with socket.create_connection((host, port), timeout=timeout):
+                return True
+        except OSError:
+            return False
+    probe.desc = f"tcp://{host}:{port}"
+    return probe
+
+def udp_echo_probe(host, port, timeout=0.2):
+    """发送一个数据报并收到回显视为就绪（目标端为 echo 服务）"""
+    def probe():
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.settimeout(timeout)
+            try:
+                sock.sendto(b"ping", (host, port))
+                return sock.recv(16) == b"ping"
+            except OSError:
+                return False
+    probe.desc = f"udp://{host}:{port}"
+    return probe
+
+class LogWatcher:
+    """增量读取日志文件并匹配指定行
+
+    创建时记录文件当前末尾位置，只匹配之后新写入的内容，
+    避免把上一次运行留下的日志行误判为就绪。
+    """
+
+    def __init__(self, path, pattern):
+        self.path = Path(path)
+        self.regex = re.compile(pattern)
+        self.offset = self.path.stat().st_size if self.path.exists() else 0
+        self.partial = b""
+        self.match = None
+
+    def poll(self):
+        if self.match is not None:
+            return True
+        if not self.path.exists():
+            return False
+        size = self.path.stat().st_size
+        if size < self.offset:
+            # 日志被截断或轮转，从头开始读
+            self.offset = 0
+            self.partial = b""
+        if size == self.offset:
+            return False
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            chunk = f.read(size - self.offset)
+        self.offset += len(chunk)
+        lines = (self.partial + chunk).split(b"\n")
+        self.partial = lines.pop()
+        for line in lines:
+            m = self.regex.search(line.decode("utf-8", errors="replace"))
+            if m:
+                self.match = m
+                return True
+        return False
+
+def log_line_probe(path, pattern):
+    """日志中出现匹配行视为就绪（需在启动进程之前创建）"""
+    watcher = LogWatcher(path, pattern)
+    probe = lambda: watcher.poll()
+    probe.desc = f"{Path(path).name} ~ /{pattern}/"
+    probe.watcher = watcher
+    return probe
+
+class ReadinessTracker:
+    """等待组件就绪并记录 time-to-ready"""
+
+    def __init__(self):
+        self.results = {}
+
+    def wait(self, name, probe, timeout=30, started_at=None, guard=None,
+             initial_interval=0.01, max_interval=0.25):
+        """轮询 probe 直到返回 True
+
+        started_at 为组件启动时刻（time.monotonic()），默认从调用时开始计时；
+        guard 在每次轮询前调用，可用于检测进程提前退出（抛出异常即中止等待）。
+        轮询间隔从 initial_interval 开始指数增长到 max_interval。
+        """
+        start = started_at if started_at is not None else time.monotonic()
+        deadline = time.monotonic() + timeout
+        interval = initial_interval
+        polls = 0
+        while True:
+            if guard is not None:
+                guard()
+            polls += 1
+            if probe():
+                elapsed = time.monotonic() - start
+                self.results[name] = {"seconds": elapsed, "polls": polls, "probe": getattr(probe, "desc", "")}
+                log_success(f"{name} 就绪，耗时 {elapsed * 1000:.0f}ms")
+                return elapsed
+            if time.monotonic() >= deadline:
+                self.results[name] = {"seconds": None, "polls": polls, "probe": getattr(probe, "desc", "")}
+                raise TimeoutError(f"等待 {name} 就绪超时 ({timeout}s): {getattr(probe, 'desc', '')}")
+            time.sleep(interval)
+            interval = min(interval * 2, max_interval)
+
+    def metrics(self):
+        """{组件: 就绪耗时(秒)}，未就绪的组件为 None"""
+        return {name: r["seconds"] for name, r in self.results.items()}
+
+    def print_summary(self):
+        if not self.results:
+            return
+        log_header("组件就绪耗时")
+        print(f"{'组件':<24}{'耗时(ms)':>12}{'探测次数':>10}  探测方式")
+        for name, r in self.results.items():
+            ms = f"{r['seconds'] * 1000:.0f}" if r["seconds"] is not None else "超时"
+            print(f"{name:<24}{ms:>12}{r['polls']:>10}  {r['probe']}")
@@ -0,0 +1,710 @@
+#!/usr/bin/env python3
+"""
+Redis 协议替身服务（asyncio，RESP2）
+
+在没有 redis-server 的机器上为多节点本地集群提供共享存储和消息代理。
+只实现 server 实际使用的命令（internal/core/storage/redis、internal/broker/redis_broker.go）：
+
+- 字符串: GET SET（EX/PX/EXAT/PXAT/NX/XX/KEEPTTL/GET）SETNX INCR INCRBY DECR DECRBY
+- 键: DEL EXISTS EXPIRE PEXPIRE TTL PTTL PERSIST KEYS TYPE DBSIZE FLUSHDB FLUSHALL
+- 列表: RPUSH LPUSH LRANGE LLEN LREM
+- 哈希: HSET HGET HGETALL HDEL HLEN HEXISTS
+- 有序集合: ZADD ZREM ZSCORE ZCARD ZRANGEBYSCORE ZREMRANGEBYSCORE
+- 发布订阅: PUBLISH SUBSCRIBE UNSUBSCRIBE
+- EVAL 只识别 storage.CompareAndSwap 使用的脚本（按脚本特征匹配），其他脚本返回错误
+- 连接: PING ECHO AUTH SELECT CLIENT QUIT；HELLO 返回错误，go-redis 随即回退到 RESP2
+
+所有数据库共用一个键空间（SELECT 只做应答）。单线程事件循环执行命令，命令天然原子。
+过期键在访问时检查，并由后台任务按到期时间堆定期清理。
+
+用法:
+    ./redis_standin.py --port 6379
+    ./redis_standin.py --port 6379 --stats 10     # 每 10 秒输出命令统计
+"""
+
+import argparse
+import asyncio
+import fnmatch
+import heapq
+import math
+import signal
+import sys
+import time
+from collections import Counter
+
+READ_LIMIT = 1024 * 1024
+
+class RedisError(Exception):
+    """作为 RESP 错误回复给客户端"""
+
+WRONGTYPE = RedisError("WRONGTYPE Operation against a key holding the wrong kind of value")
+NOT_INTEGER = RedisError("ERR value is not an integer or out of range")
+NOT_FLOAT = RedisError("ERR value is not a valid float")
+SYNTAX = RedisError("ERR syntax error")
+
+# ---------- RESP 编码 ----------
+
+OK = b"+OK\r\n"
+NULL = b"$-1\r\n"
+
+def integer(n):
+    return b":%d\r\n" % n
+
+def bulk(value):
+    if value is None:
+        return NULL
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+def array(items):
+    """items 为已编码的元素"""
+    return b"*%d\r\n" % len(items) + b"".join(items)
+
+def bulk_array(values):
+    return array([bulk(v) for v in values])
+
+def error(message):
+    return b"-" + message.encode() + b"\r\n"
+
+def format_score(score):
+    if score == math.inf:
+        return b"inf"
+    if score == -math.inf:
+        return b"-inf"
+    if score == int(score) and abs(score) < 1e17:
+        return b"%d" % int(score)
+    return repr(score).encode()
+
+def parse_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        raise NOT_INTEGER from None
+
+def parse_float(value):
+    try:
+        score = float(value)
+    except ValueError:
+        raise NOT_FLOAT from None
+    if math.isnan(score):
+        raise NOT_FLOAT
+    return score
+
+def parse_range_bound(value):
+    """ZRANGEBYSCORE 的边界："(" 前缀表示开区间，支持 inf / +inf / -inf"""
+    text = value.decode()
+    exclusive = text.startswith("(")
+    if exclusive:
+        text = text[1:]
+    try:
+        return float(text), exclusive
+    except ValueError:
+        raise RedisError("ERR min or max is not a float") from None
+
+# ---------- 数据 ----------
+
+class Keyspace:
+    """键空间：值为 bytes / list / dict（哈希）/ ZSet，过期时间单独记录"""
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.heap = []
+        self.expired = 0
+
+    def _alive(self, key):
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.time():
+            self.delete(key)
+            self.expired += 1
+            return False
+        return key in self.data
+
+    def get(self, key, kind=None):
+        if not self._alive(key):
+            return None
+        value = self.data[key]
+        if kind is not None and type(value) is not kind:
+            raise WRONGTYPE
+        return value
+
+    def get_or_create(self, key, kind):
+        value = self.get(key, kind)
+        if value is None:
+            value = self.data[key] = kind()
+        return value
+
+    def set(self, key, value, deadline=None, keep_ttl=False):
+        self.data[key] = value
+        if deadline is not None:
+            self.expire_at(key, deadline)
+        elif not keep_ttl:
+            self.expires.pop(key, None)
+
+    def delete(self, key):
+        self.expires.pop(key, None)
+        return self.data.pop(key, None) is not None
+
+    def drop_if_empty(self, key):
+        if not self.data.get(key, True):
+            self.delete(key)
+
+    def expire_at(self, key, deadline):
+        self.expires[key] = deadline
+        heapq.heappush(self.heap, (deadline, key))
+
+    def ttl(self, key):
+        """剩余秒数（浮点）；-1 不过期，-2 不存在"""
+        if not self._alive(key):
+            return -2
+        deadline = self.expires.get(key)
+        return -1 if deadline is None else deadline - time.time()
+
+    def keys(self, pattern):
+        pattern = pattern.decode(errors="surrogateescape")
+        return [k for k in list(self.data) if self._alive(k)
+                and fnmatch.fnmatchcase(k.decode(errors="surrogateescape"), pattern)]
+
+    def sweep(self, budget=10000):
+        """清理到期的键；堆中过时的条目（过期时间已修改或已删除）直接丢弃"""
+        now = time.time()
+        heap = self.heap
+        while heap and heap[0][0] <= now and budget > 0:
+            deadline, key = heapq.heappop(heap)
+            budget -= 1
+            if self.expires.get(key) == deadline:
+                self.delete(key)
+                self.expired += 1
+
+    def flush(self):
+        self.data.clear()
+        self.expires.clear()
+        self.heap.clear()
+
+class ZSet(dict):
+    """成员 → 分数；范围查询时排序（测试规模下足够）"""
+
+    def ordered(self):
+        return sorted(self.items(), key=lambda item: (item[1], item[0]))
+
+    def in_range(self, low, high):
+        (lo, lo_ex), (hi, hi_ex) = low, high
+        for member, score in self.ordered():
+            if score < lo or (lo_ex and score == lo):
+                continue
+            if score > hi or (hi_ex and score == hi):
+                break
+            yield member, score
+
+# ---------- 连接与命令 ----------
+
+class Connection:
+    __slots__ = ("writer", "channels", "peer")
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.channels = set()
+        self.peer = writer.get_extra_info("peername")
+
+# storage.CompareAndSwap 的 Lua 脚本特征
+CAS_SCRIPT_MARKERS = ("current_value == old_value", "redis.call('GET', key)")
+
+# 订阅状态下允许的命令（RESP2）
+SUBSCRIBED_COMMANDS = {b"SUBSCRIBE", b"UNSUBSCRIBE", b"PING", b"QUIT"}
+
+class StandinServer:
+    """Redis 协议替身服务"""
+
+    def __init__(self, verbose=True):
+        self.keyspace = Keyspace()
+        self.channels = {}
+        self.verbose = verbose
+        self.stats = Counter()
+        self.clients = set()
+        self.published = 0
+        self.delivered = 0
+        self.commands = {
+            name[4:].upper().encode(): getattr(self, name)
+            for name in dir(self) if name.startswith("cmd_")
+        }
+
+    def log(self, msg):
+        if self.verbose:
+            print(f"[redis-standin] {msg}", flush=True)
+
+    # ---------- 协议 ----------
+
+    async def read_command(self, reader):
+        line = await reader.readuntil(b"\r\n")
+        if not line.startswith(b"*"):
+            # 内联命令（redis-cli / telnet 手工调试）
+            return line.split()
+        count = int(line[1:-2])
+        args = []
+        for _ in range(count):
+            header = await reader.readuntil(b"\r\n")
+            if not header.startswith(b"$"):
+                raise RedisError("ERR Protocol error: expected '$'")
+            size = int(header[1:-2])
+            args.append((await reader.readexactly(size + 2))[:-2])
+        return args
+
+    async def handle(self, reader, writer):
+        conn = Connection(writer)
+        self.clients.add(conn)
+        try:
+            while True:
+                args = await self.read_command(reader)
+                if not args:
+                    continue
+                name = args[0].upper()
+                self.stats[name.decode(errors="replace")] += 1
+                if name == b"QUIT":
+                    writer.write(OK)
+                    break
+                writer.write(self.execute(conn, name, args[1:]))
+                await writer.drain()
+        except (RedisError, ValueError) as e:
+            # 协议格式错误：回复后断开
+            writer.write(error(str(e) if isinstance(e, RedisError) else "ERR Protocol error"))
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            self.unsubscribe_all(conn)
+            self.clients.discard(conn)
+            writer.close()
+
+    def execute(self, conn, name, args):
+        handler = self.commands.get(name)
+        if handler is None:
+            return error(f"ERR unknown command '{name.decode(errors='replace')}'")
+        if conn.channels and name not in SUBSCRIBED_COMMANDS:
+            return error(f"ERR Can't execute '{name.decode().lower()}': only (P|S)SUBSCRIBE / "
+                         "(P|S)UNSUBSCRIBE / PING / QUIT / RESET are allowed in this context")
+        try:
+            return handler(conn, args)
+        except RedisError as e:
+            return error(str(e))
+        except (IndexError, ValueError):
+            return error(f"ERR wrong number of arguments for '{name.decode().lower()}' command")
+
+    # ---------- 连接 ----------
+
+    def cmd_ping(self, conn, args):
+        if conn.channels:
+            return bulk_array([b"pong", args[0] if args else b""])
+        return bulk(args[0]) if args else b"+PONG\r\n"
+
+    def cmd_echo(self, conn, args):
+        return bulk(args[0])
+
+    def cmd_hello(self, conn, args):
+        # 不支持 RESP3；go-redis 收到错误回复后改用 RESP2
+        raise RedisError("ERR unknown command 'HELLO'")
+
+    def cmd_auth(self, conn, args):
+        return OK
+
+    def cmd_select(self, conn, args):
+        parse_int(args[0])
+        return OK
+
+    def cmd_client(self, conn, args):
+        sub = args[0].upper() if args else b""
+        if sub == b"ID":
+            return integer(id(conn) & 0x7FFFFFFF)
+        if sub == b"GETNAME":
+            return NULL
+        return OK
+
+    def cmd_info(self, conn, args):
+        text = (f"# Server\r\nredis_version:7.0.0-standin\r\n"
+                f"# Clients\r\nconnected_clients:{len(self.clients)}\r\n"
+                f"# Keyspace\r\ndb0:keys={len(self.keyspace.data)},expires={len(self.keyspace.expires)}\r\n")
+        return bulk(text.encode())
+
+    def cmd_command(self, conn, args):
+        return array([])
+
+    def cmd_config(self, conn, args):
+        return array([]) if args and args[0].upper() == b"GET" else OK
+
+    # ---------- 键 ----------
+
+    def cmd_del(self, conn, args):
+        return integer(sum(1 for key in args if self.keyspace._alive(key) and self.keyspace.delete(key)))
+
+    cmd_unlink = cmd_del
+
+    def cmd_exists(self, conn, args):
+        return integer(sum(1 for key in args if self.keyspace._alive(key)))
+
+    def cmd_type(self, conn, args):
+        value = self.keyspace.get(args[0])
+        kind = {bytes: b"string", list: b"list", dict: b"hash", ZSet: b"zset"}.get(type(value), b"none")
+        return b"+" + kind + b"\r\n"
+
+    def _expire(self, key, deadline):
+        if not self.keyspace._alive(key):
+            return integer(0)
+        if deadline <= time.time():
+            self.keyspace.delete(key)
+        else:
+            self.keyspace.expire_at(key, deadline)
+        return integer(1)
+
+    def cmd_expire(self, conn, args):
+        return self._expire(args[0], time.time() + parse_int(args[1]))
+
+    def cmd_pexpire(self, conn, args):
+        return self._expire(args[0], time.time() + parse_int(args[1]) / 1000)
+
+    def cmd_expireat(self, conn, args):
+        return self._expire(args[0], parse_int(args[1]))
+
+    def cmd_ttl(self, conn, args):
+        ttl = self.keyspace.ttl(args[0])
+        return integer(ttl if ttl < 0 else round(ttl))
+
+    def cmd_pttl(self, conn, args):
+        ttl = self.keyspace.ttl(args[0])
+        return integer(ttl if ttl < 0 else round(ttl * 1000))
+
+    def cmd_persist(self, conn, args):
+        if not self.keyspace._alive(args[0]):
+            return integer(0)
+        return integer(1 if self.keyspace.expires.pop(args[0], None) is not None else 0)
+
+    def cmd_keys(self, conn, args):
+        return bulk_array(self.keyspace.keys(args[0]))
+
+    def cmd_dbsize(self, conn, args):
+        self.keyspace.sweep()
+        return integer(len(self.keyspace.data))
+
+    def cmd_flushdb(self, conn, args):
+        self.keyspace.flush()
+        return OK
+
+    cmd_flushall = cmd_flushdb
+
+    # ---------- 字符串 ----------
+
+    def cmd_get(self, conn, args):
+        return bulk(self.keyspace.get(args[0], bytes))
+
+    def cmd_set(self, conn, args):
+        key, value = args[0], args[1]
+        deadline = None
+        keep_ttl = nx = xx = get = False
+        options = iter(args[2:])
+        for option in options:
+            option = option.upper()
+            if option == b"EX":
+                deadline = time.time() + parse_int(next(options))
+            elif option == b"PX":
+                deadline = time.time() + parse_int(next(options)) / 1000
+            elif option == b"EXAT":
+                deadline = parse_int(next(options))
+            elif option == b"PXAT":
+                deadline = parse_int(next(options)) / 1000
+            elif option == b"NX":
+                nx = True
+            elif option == b"XX":
+                xx = True
+            elif option == b"KEEPTTL":
+                keep_ttl = True
+            elif option == b"GET":
+                get = True
+            else:
+                raise SYNTAX
+        old = self.keyspace.get(key, bytes) if get else None
+        exists = self.keyspace._alive(key)
+        if (nx and exists) or (xx and not exists):
+            return bulk(old) if get else NULL
+        self.keyspace.set(key, value, deadline, keep_ttl)
+        return bulk(old) if get else OK
+
+    def cmd_setnx(self, conn, args):
+        if self.keyspace._alive(args[0]):
+            return integer(0)
+        self.keyspace.set(args[0], args[1])
+        return integer(1)
+
+    def cmd_setex(self, conn, args):
+        self.keyspace.set(args[0], args[2], time.time() + parse_int(args[1]))
+        return OK
+
+    def _incr(self, key, delta):
+        current = self.keyspace.get(key, bytes)
+        value = (parse_int(current) if current is not None else 0) + delta
+        self.keyspace.set(key, b"%d" % value, keep_ttl=True)
+        return integer(value)
+
+    def cmd_incr(self, conn, args):
+        return self._incr(args[0], 1)
+
+    def cmd_incrby(self, conn, args):
+        return self._incr(args[0], parse_int(args[1]))
+
+    def cmd_decr(self, conn, args):
+        return self._incr(args[0], -1)
+
+    def cmd_decrby(self, conn, args):
+        return self._incr(args[0], -parse_int(args[1]))
+
+    # ---------- 列表 ----------
+
+    def cmd_rpush(self, conn, args):
+        items = self.keyspace.get_or_create(args[0], list)
+        items.extend(args[1:])
+        return integer(len(items))
+
+    def cmd_lpush(self, conn, args):
+        items = self.keyspace.get_or_create(args[0], list)
+        for value in args[1:]:
+            items.insert(0, value)
+        return integer(len(items))
+
+    def cmd_lrange(self, conn, args):
+        items = self.keyspace.get(args[0], list) or []
+        start, stop = parse_int(args[1]), parse_int(args[2])
+        n = len(items)
+        start = max(start + n if start < 0 else start, 0)
+        stop = stop + n if stop < 0 else min(stop, n - 1)
+        return bulk_array(items[start:stop + 1] if start <= stop else [])
+
+    def cmd_llen(self, conn, args):
+        return integer(len(self.keyspace.get(args[0], list) or []))
+
+    def cmd_lrem(self, conn, args):
+        key, count, value = args[0], parse_int(args[1]), args[2]
+        items = self.keyspace.get(key, list)
+        if not items:
+            return integer(0)
+        limit = abs(count) or len(items)
+        indexes = [i for i, item in enumerate(items) if item == value]
+        indexes = indexes[-limit:] if count < 0 else indexes[:limit]
+        for i in reversed(indexes):
+            del items[i]
+        self.keyspace.drop_if_empty(key)
+        return integer(len(indexes))
+
+    # ---------- 哈希 ----------
+
+    def cmd_hset(self, conn, args):
+        if len(args) < 3 or len(args) % 2 == 0:
+            raise ValueError
+        fields = self.keyspace.get_or_create(args[0], dict)
+        added = 0
+        for i in range(1, len(args), 2):
+            added += args[i] not in fields
+            fields[args[i]] = args[i + 1]
+        return integer(added)
+
+    def cmd_hget(self, conn, args):
+        return bulk((self.keyspace.get(args[0], dict) or {}).get(args[1]))
+
+    def cmd_hgetall(self, conn, args):
+        fields = self.keyspace.get(args[0], dict) or {}
+        return bulk_array([part for item in fields.items() for part in item])
+
+    def cmd_hdel(self, conn, args):
+        fields = self.keyspace.get(args[0], dict)
+        if not fields:
+            return integer(0)
+        removed = sum(1 for field in args[1:] if fields.pop(field, None) is not None)
+        self.keyspace.drop_if_empty(args[0])
+        return integer(removed)
+
+    def cmd_hlen(self, conn, args):
+        return integer(len(self.keyspace.get(args[0], dict) or {}))
+
+    def cmd_hexists(self, conn, args):
+        return integer(int(args[1] in (self.keyspace.get(args[0], dict) or {})))
+
+    # ---------- 有序集合 ----------
+
+    def cmd_zadd(self, conn, args):
+        key = args[0]
+        flags = set()
+        i = 1
+        while args[i].upper() in (b"NX", b"XX", b"GT", b"LT", b"CH"):
+            flags.add(args[i].upper())
+            i += 1
+        pairs = args[i:]
+        if not pairs or len(pairs) % 2:
+            raise SYNTAX
+        zset = self.keyspace.get_or_create(key, ZSet)
+        added = changed = 0
+        for j in range(0, len(pairs), 2):
+            score, member = parse_float(pairs[j]), pairs[j + 1]
+            old = zset.get(member)
+            if (b"NX" in flags and old is not None) or (b"XX" in flags and old is None):
+                continue
+            if old is not None and ((b"GT" in flags and score <= old) or (b"LT" in flags and score >= old)):
+                continue
+            zset[member] = score
+            added += old is None
+            changed += old is None or old != score
+        self.keyspace.drop_if_empty(key)
+        return integer(changed if b"CH" in flags else added)
+
+    def cmd_zrem(self, conn, args):
+        zset = self.keyspace.get(args[0], ZSet)
+        if not zset:
+            return integer(0)
+        removed = sum(1 for member in args[1:] if zset.pop(member, None) is not None)
+        self.keyspace.drop_if_empty(args[0])
+        return integer(removed)
+
+    def cmd_zscore(self, conn, args):
+        score = (self.keyspace.get(args[0], ZSet) or {}).get(args[1])
+        return bulk(None if score is None else format_score(score))
+
+    def cmd_zcard(self, conn, args):
+        return integer(len(self.keyspace.get(args[0], ZSet) or {}))
+
+    def cmd_zrangebyscore(self, conn, args):
+        zset = self.keyspace.get(args[0], ZSet) or ZSet()
+        low, high = parse_range_bound(args[1]), parse_range_bound(args[2])
+        with_scores = False
+        offset, count = 0, -1
+        i = 3
+        while i < len(args):
+            option = args[i].upper()
+            if option == b"WITHSCORES":
+                with_scores = True
+                i += 1
+            elif option == b"LIMIT":
+                offset, count = parse_int(args[i + 1]), parse_int(args[i + 2])
+                i += 3
+            else:
+                raise SYNTAX
+        items = list(zset.in_range(low, high))[offset:]
+        if count >= 0:
+            items = items[:count]
+        if with_scores:
+            return bulk_array([part for member, score in items for part in (member, format_score(score))])
+        return bulk_array([member for member, _ in items])
+
+    def cmd_zremrangebyscore(self, conn, args):
+        zset = self.keyspace.get(args[0], ZSet)
+        if not zset:
+            return integer(0)
+        members = [m for m, _ in zset.in_range(parse_range_bound(args[1]), parse_range_bound(args[2]))]
+        for member in members:
+            del zset[member]
+        self.keyspace.drop_if_empty(args[0])
+        return integer(len(members))
+
+    # ---------- 脚本 ----------
+
+    def cmd_eval(self, conn, args):
+        script, numkeys = args[0].decode(errors="replace"), parse_int(args[1])
+        keys, argv = args[2:2 + numkeys], args[2 + numkeys:]
+        if all(marker in script for marker in CAS_SCRIPT_MARKERS) and len(keys) == 1 and len(argv) == 3:
+            return integer(self.compare_and_swap(keys[0], argv[0], argv[1], parse_int(argv[2])))
+        raise RedisError("ERR redis-standin 只支持 CompareAndSwap 脚本")
+
+    def compare_and_swap(self, key, old_value, new_value, ttl):
+        """与 storage.CompareAndSwap 的 Lua 脚本语义一致：旧值为空串表示键必须不存在"""
+        current = self.keyspace.get(key, bytes)
+        if (current is None and old_value != b"") or (current is not None and current != old_value):
+            return 0
+        self.keyspace.set(key, new_value, time.time() + ttl if ttl > 0 else None)
+        return 1
+
+    # ---------- 发布订阅 ----------
+
+    def cmd_publish(self, conn, args):
+        channel, payload = args[0], args[1]
+        subscribers = self.channels.get(channel, ())
+        message = bulk_array([b"message", channel, payload])
+        for sub in subscribers:
+            sub.writer.write(message)
+        self.published += 1
+        self.delivered += len(subscribers)
+        return integer(len(subscribers))
+
+    def cmd_subscribe(self, conn, args):
+        replies = []
+        for channel in args:
+            conn.channels.add(channel)
+            self.channels.setdefault(channel, set()).add(conn)
+            replies.append(array([bulk(b"subscribe"), bulk(channel), integer(len(conn.channels))]))
+        return b"".join(replies)
+
+    def cmd_unsubscribe(self, conn, args):
+        channels = args or sorted(conn.channels)
+        if not channels:
+            return array([bulk(b"unsubscribe"), NULL, integer(0)])
+        replies = []
+        for channel in channels:
+            self._unsubscribe(conn, channel)
+            replies.append(array([bulk(b"unsubscribe"), bulk(channel), integer(len(conn.channels))]))
+        return b"".join(replies)
+
+    def _unsubscribe(self, conn, channel):
+        conn.channels.discard(channel)
+        subscribers = self.channels.get(channel)
+        if subscribers is not None:
+            subscribers.discard(conn)
+            if not subscribers:
+                del self.channels[channel]
+
+    def unsubscribe_all(self, conn):
+        for channel in list(conn.channels):
+            self._unsubscribe(conn, channel)
+
+    # ---------- 统计 ----------
+
+    def summary(self):
+        top = ", ".join(f"{name}={count}" for name, count in self.stats.most_common(8))
+        return (f"连接 {len(self.clients)}，键 {len(self.keyspace.data)}，已过期 {self.keyspace.expired}，"
+                f"发布 {self.published}（投递 {self.delivered}），命令: {top or '-'}")
+
+async def expire_loop(keyspace, interval=0.1):
+    while True:
+        await asyncio.sleep(interval)
+        keyspace.sweep()
+
+async def stats_loop(server, interval):
+    while True:
+        await asyncio.sleep(interval)
+        server.log(server.summary())
+
+async def serve(host, port, server, stats_interval=0):
+    srv = await asyncio.start_server(server.handle, host, port, limit=READ_LIMIT)
+    addrs = ", ".join(str(s.getsockname()) for s in srv.sockets)
+    server.log(f"监听 {addrs}")
+    loop = asyncio.get_running_loop()
+    stop = loop.create_future()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set_result, None)
+    tasks = [asyncio.ensure_future(expire_loop(server.keyspace))]
+    if stats_interval > 0:
+        tasks.append(asyncio.ensure_future(stats_loop(server, stats_interval)))
+    async with srv:
+        await stop
+        for task in tasks:
+            task.cancel()
+        server.log(server.summary())
+        # 主动关闭客户端连接，让各连接的处理协程正常结束
+        for conn in list(server.clients):
+            conn.writer.close()
+        await asyncio.sleep(0.1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Redis 协议替身服务")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=6379, help="监听端口")
+    parser.add_argument("--stats", type=float, default=0, help="每隔若干秒输出命令统计（0 为只在退出时输出）")
+    parser.add_argument("--quiet", action="store_true", help="不输出日志")
+    args = parser.parse_args()
+
+    server = StandinServer(verbose=not args.quiet)
+    asyncio.run(serve(args.host, args.port, server, args.stats))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
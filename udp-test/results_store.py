@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+"""
+测试结果库与基线回归检查
+
+每次运行的指标都写入本地 SQLite（默认 ~/tunnox-test/results.db），以下列字段区分：
+- git_sha: 被测代码版本（含未提交修改时标记 dirty）
+- transport: 客户端连接协议
+- config_hash: 测试配置的哈希
+- host: 主机指纹（CPU 型号、核数、内存、内核）
+
+标量指标按展开后的名称存储（如 load.latency_ms.p99、resources.server.rss_peak），
+完整的原始指标 JSON 和采样数据（延迟直方图、资源采样文件）也一并保存。
+
+基线是一组命名的运行记录。compare 将一次运行与基线逐项比较：
+变化超过阈值（且基线有 3 次以上运行时超过 2 倍标准差）视为回归，退出码非 0。
+
+用法:
+    ./results_store.py list
+    ./results_store.py show 12
+    ./results_store.py baseline add main 10 11 12
+    ./results_store.py compare latest --baseline main
+    ./results_store.py compare 13 --baseline main --threshold 'load.qps=5' --threshold 'resources.*.rss_peak=30'
+"""
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from common import PROJECT_ROOT, Colors, log_success, log_warning, log_error, log_header
+
+DEFAULT_DB = Path("~/tunnox-test/results.db").expanduser()
+
+# 指标方向与默认阈值（百分比）：按顺序匹配第一个规则，未匹配的指标只展示不判定
+#   higher: 越大越好（下降超过阈值为回归）
+#   lower:  越小越好（上升超过阈值为回归）
+DEFAULT_RULES = [
+    ("*qps", "higher", 10),
+    ("*throughput_mb_s", "higher", 10),
+    ("*aggregate_mb_s", "higher", 10),
+    ("*rate_per_s", "higher", 10),
+    ("*jain_index", "higher", 5),
+    ("*cross_node_ratio", "higher", 10),
+    ("*setup_ms.p*", "lower", 20),
+    ("*latency_ms.*", "lower", 20),
+    ("*error_rate", "lower", 50),
+    ("*loss_rate", "lower", 50),
+    ("*cpu_seconds_per_gb", "lower", 15),
+    ("*rss_peak*", "lower", 20),
+    ("*cpu_seconds", "lower", 20),
+    ("*_per_client*", "lower", 20),
+    ("readiness.*.seconds", "lower", 50),
+    ("pipeline.total_seconds", "lower", 30),
+]
+
+# 基线运行次数达到该值时，额外要求变化超过 2 倍标准差
+MIN_RUNS_FOR_STDDEV = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at REAL NOT NULL,
+    kind TEXT NOT NULL,
+    label TEXT,
+    git_sha TEXT,
+    git_dirty INTEGER,
+    transport TEXT,
+    config_hash TEXT,
+    host TEXT,
+    host_info TEXT,
+    passed INTEGER,
+    raw TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_key ON runs (kind, transport, config_hash, host);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (run_id, name)
+);
+CREATE TABLE IF NOT EXISTS samples (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (run_id, name)
+);
+CREATE TABLE IF NOT EXISTS baselines (
+    name TEXT NOT NULL,
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    PRIMARY KEY (name, run_id)
+);
+"""
+
+# ---------- 运行环境 ----------
+
+def git_revision(root=PROJECT_ROOT):
+    """(sha, dirty)；不在 git 仓库中时返回 (None, None)"""
+    try:
+        sha = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True,
+                             text=True, check=True, timeout=10).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+                                capture_output=True, text=True, check=True, timeout=30).stdout
+        return sha, bool(status.strip())
+    except (OSError, subprocess.SubprocessError):
+        return None, None
+
+def config_hash(config):
+    """配置内容的哈希（键排序后的 JSON）"""
+    canonical = json.dumps(config, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:12]
+
+def host_info():
+    info = {
+        "machine": platform.machine(),
+        "kernel": platform.release(),
+        "cpus": os.cpu_count(),
+        "cpu_model": None,
+        "mem_total_kb": None,
+    }
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    info["cpu_model"] = line.split(":", 1)[1].strip()
+                    break
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    info["mem_total_kb"] = int(line.split()[1])
+                    break
+    except OSError:
+        pass
+    return info
+
+def host_fingerprint(info=None):
+    """主机指纹：硬件与内核相同的机器得到相同的值（不含主机名）"""
+    info = info or host_info()
+    return hashlib.sha256(json.dumps(info, sort_keys=True).encode()).hexdigest()[:12]
+
+def flatten_metrics(data, prefix=""):
+    """把嵌套的指标展开为 {名称: 数值}
+
+    带 name 字段的字典列表（如 pipeline.phases）以 name 作为键；非数值的叶子被忽略。
+    """
+    flat = {}
+    if isinstance(data, dict):
+        items = data.items()
+    elif isinstance(data, list) and all(isinstance(x, dict) and "name" in x for x in data):
+        items = ((x["name"], {k: v for k, v in x.items() if k != "name"}) for x in data)
+    else:
+        return flat
+    for key, value in items:
+        name = f"{prefix}.{key}" if prefix else str(key)
+        if isinstance(value, bool):
+            continue
+        if isinstance(value, (int, float)):
+            flat[name] = float(value)
+        elif isinstance(value, (dict, list)):
+            flat.update(flatten_metrics(value, name))
+    return flat
+
+# ---------- 结果库 ----------
+
+class ResultsStore:
+    """SQLite 结果库"""
+
+    def __init__(self, path=DEFAULT_DB):
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record_run(self, kind, metrics, transport=None, config=None, label=None,
+                   passed=None, samples=None):
+        """保存一次运行，返回 run id
+
+        metrics 为嵌套的指标字典（原样保存并展开为标量）；
+        samples 为 {名称: bytes/str}，保存直方图、资源采样文件等原始数据。
+        """
+        sha, dirty = git_revision()
+        info = host_info()
+        with self.db:
+            cur = self.db.execute(
+                "INSERT INTO runs (created_at, kind, label, git_sha, git_dirty, transport, config_hash,"
+                " host, host_info, passed, raw) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), kind, label, sha, None if dirty is None else int(dirty), transport,
+                 config_hash(config) if config is not None else None, host_fingerprint(info),
+                 json.dumps(info), None if passed is None else int(passed),
+                 json.dumps(metrics, ensure_ascii=False, default=str)),
+            )
+            run_id = cur.lastrowid
+            self.db.executemany(
+                "INSERT INTO metrics (run_id, name, value) VALUES (?, ?, ?)",
+                [(run_id, name, value) for name, value in flatten_metrics(metrics).items()],
+            )
+            for name, data in (samples or {}).items():
+                if isinstance(data, str):
+                    data = data.encode()
+                self.db.execute("INSERT INTO samples (run_id, name, data) VALUES (?, ?, ?)",
+                                (run_id, name, data))
+        return run_id
+
+    def run(self, run_id):
+        row = self.db.execute("SELECT * FROM runs WHERE id = ?", (run_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"运行记录不存在: {run_id}")
+        return row
+
+    def latest_run(self, kind=None, transport=None, passed_only=False):
+        sql, params = "SELECT * FROM runs WHERE 1=1", []
+        if passed_only:
+            sql += " AND passed = 1"
+        if kind:
+            sql += " AND kind = ?"
+            params.append(kind)
+        if transport:
+            sql += " AND transport = ?"
+            params.append(transport)
+        row = self.db.execute(sql + " ORDER BY id DESC LIMIT 1", params).fetchone()
+        if row is None:
+            raise KeyError("没有匹配的运行记录")
+        return row
+
+    def runs(self, limit=20, kind=None):
+        sql, params = "SELECT * FROM runs", []
+        if kind:
+            sql += " WHERE kind = ?"
+            params.append(kind)
+        return self.db.execute(sql + " ORDER BY id DESC LIMIT ?", params + [limit]).fetchall()
+
+    def metrics(self, run_id):
+        rows = self.db.execute("SELECT name, value FROM metrics WHERE run_id = ? ORDER BY name", (run_id,))
+        return {r["name"]: r["value"] for r in rows}
+
+    def sample_names(self, run_id):
+        rows = self.db.execute("SELECT name, length(data) AS size FROM samples WHERE run_id = ?", (run_id,))
+        return {r["name"]: r["size"] for r in rows}
+
+    def add_baseline(self, name, run_ids):
+        with self.db:
+            for run_id in run_ids:
+                if self.run(run_id)["passed"] == 0:
+                    raise ValueError(f"运行 #{run_id} 未通过，不能加入基线")
+                self.db.execute("INSERT OR IGNORE INTO baselines (name, run_id) VALUES (?, ?)", (name, run_id))
+
+    def remove_baseline(self, name, run_ids=None):
+        with self.db:
+            if run_ids:
+                self.db.executemany("DELETE FROM baselines WHERE name = ? AND run_id = ?",
+                                    [(name, r) for r in run_ids])
+            else:
+                self.db.execute("DELETE FROM baselines WHERE name = ?", (name,))
+
+    def baseline_runs(self, name):
+        rows = self.db.execute(
+            "SELECT runs.* FROM baselines JOIN runs ON runs.id = baselines.run_id"
+            " WHERE baselines.name = ? ORDER BY runs.id", (name,)).fetchall()
+        if not rows:
+            raise KeyError(f"基线不存在或为空: {name}")
+        return rows
+
+    def baselines(self):
+        return self.db.execute(
+            "SELECT name, COUNT(*) AS runs, MIN(run_id) AS first, MAX(run_id) AS last"
+            " FROM baselines GROUP BY name ORDER BY name").fetchall()
+
+# ---------- 回归比较 ----------
+
+def parse_thresholds(specs):
+    """--threshold 'PATTERN=PCT' 或 'PATTERN=higher:PCT' / 'PATTERN=lower:PCT'"""
+    rules = []
+    for spec in specs or []:
+        pattern, _, value = spec.partition("=")
+        if not value:
+            raise ValueError(f"阈值格式错误: {spec}（应为 PATTERN=PCT）")
+        direction = None
+        if ":" in value:
+            direction, value = value.split(":", 1)
+            if direction not in ("higher", "lower"):
+                raise ValueError(f"阈值方向只能是 higher 或 lower: {spec}")
+        rules.append((pattern.strip(), direction, float(value.rstrip("%"))))
+    return rules
+
+def resolve_rule(name, overrides):
+    """返回 (direction, threshold_pct)；没有方向的指标返回 (None, None)"""
+    default = next(((d, t) for p, d, t in DEFAULT_RULES if fnmatch.fnmatchcase(name, p)), (None, None))
+    for pattern, direction, threshold in overrides:
+        if fnmatch.fnmatchcase(name, pattern):
+            return direction or default[0] or "lower", threshold
+    return default
+
+def compare_metrics(current, baseline_values, overrides=()):
+    """逐项比较，返回 [{name, current, baseline, change_pct, direction, threshold, status}]
+
+    baseline_values 为 {名称: [基线各次运行的值]}
+    """
+    rows = []
+    for name in sorted(set(current) | set(baseline_values)):
+        values = baseline_values.get(name) or []
+        cur = current.get(name)
+        direction, threshold = resolve_rule(name, overrides)
+        row = {"name": name, "current": cur, "direction": direction, "threshold": threshold,
+               "baseline": statistics.fmean(values) if values else None, "change_pct": None,
+               "status": "info"}
+        rows.append(row)
+        if cur is None or not values:
+            # 有判定规则的指标在本次运行中缺失（基线中存在）视为回归，否则只是新增或不可比较
+            row["status"] = "regression" if cur is None and values and direction is not None else "missing"
+            continue
+        base = row["baseline"]
+        if base != 0:
+            row["change_pct"] = (cur - base) / abs(base) * 100
+        elif cur != 0:
+            row["change_pct"] = float("inf") if cur > 0 else float("-inf")
+        else:
+            row["change_pct"] = 0.0
+        if direction is None:
+            continue
+
+        worse = row["change_pct"] < -threshold if direction == "higher" else row["change_pct"] > threshold
+        if worse and len(values) >= MIN_RUNS_FOR_STDDEV:
+            # 基线本身波动较大时，变化在 2 倍标准差以内不算回归
+            worse = abs(cur - base) > 2 * statistics.stdev(values)
+        better = row["change_pct"] > threshold if direction == "higher" else row["change_pct"] < -threshold
+        row["status"] = "regression" if worse else ("improved" if better else "ok")
+    return rows
+
+def print_comparison(run, baseline_name, baseline_runs, rows, show_all=False):
+    log_header(f"运行 #{run['id']} 对比基线 {baseline_name}")
+    print(f"运行:  #{run['id']}  {run['kind']}  transport={run['transport']}  "
+          f"git={(run['git_sha'] or '-')[:10]}{'+dirty' if run['git_dirty'] else ''}  host={run['host']}")
+    print(f"基线:  {len(baseline_runs)} 次运行 ({', '.join('#' + str(r['id']) for r in baseline_runs)})")
+    for key in ("kind", "transport", "config_hash", "host"):
+        differing = {r[key] for r in baseline_runs if r[key] != run[key]}
+        if differing:
+            log_warning(f"{key} 与基线不一致: {run[key]} vs {', '.join(map(str, differing))}")
+    if run["passed"] == 0:
+        log_error(f"运行 #{run['id']} 本身未通过")
+    print(f"\n{'指标':<48}{'基线':>14}{'本次':>14}{'变化':>10}  {'阈值':<12}状态")
+    colors = {"regression": Colors.RED, "improved": Colors.GREEN}
+    for r in rows:
+        if not show_all and r["status"] in ("info", "missing"):
+            continue
+        base = f"{r['baseline']:.4g}" if r["baseline"] is not None else "-"
+        cur = f"{r['current']:.4g}" if r["current"] is not None else "-"
+        change = f"{r['change_pct']:+.1f}%" if r["change_pct"] is not None else "-"
+        rule = f"{r['direction']} {r['threshold']:g}%" if r["direction"] else "-"
+        color = colors.get(r["status"], "")
+        print(f"{r['name']:<48}{base:>14}{cur:>14}{change:>10}  {rule:<12}"
+              f"{color}{r['status']}{Colors.END if color else ''}")
+
+def compare_run(store, run_ref, baseline, overrides=(), show_all=False):
+    """比较运行与基线，返回回归的指标列表"""
+    baseline_runs = store.baseline_runs(baseline)
+    if run_ref == "latest":
+        ref = baseline_runs[-1]
+        run = store.latest_run(kind=ref["kind"], transport=ref["transport"], passed_only=True)
+    else:
+        run = store.run(int(run_ref))
+
+    # 只用通过的运行作为基线
+    failed = [r for r in baseline_runs if r["passed"] != 1]
+    if failed:
+        log_warning(f"基线 {baseline} 中未通过的运行不参与比较: {', '.join('#' + str(r['id']) for r in failed)}")
+        baseline_runs = [r for r in baseline_runs if r["passed"] == 1]
+
+    baseline_values = {}
+    for r in baseline_runs:
+        if r["id"] == run["id"]:
+            continue
+        for name, value in store.metrics(r["id"]).items():
+            baseline_values.setdefault(name, []).append(value)
+    if not baseline_values:
+        raise ValueError("基线中除本次运行外没有其他运行记录")
+
+    rows = compare_metrics(store.metrics(run["id"]), baseline_values, overrides)
+    if run["passed"] == 0:
+        # 本次运行未通过时指标可能不完整，直接判定为回归
+        rows.insert(0, {"name": "passed", "current": 0, "baseline": 1, "change_pct": None,
+                        "direction": None, "threshold": None, "status": "regression"})
+    print_comparison(run, baseline, baseline_runs, rows, show_all=show_all)
+    return [r for r in rows if r["status"] == "regression"]
+
+# ---------- 命令行 ----------
+
+def cmd_list(store, args):
+    print(f"{'ID':>5}  {'时间':<19}  {'类型':<12}{'协议':<11}{'git':<13}{'配置':<14}{'主机':<14}{'结果':<6}标签")
+    for r in store.runs(limit=args.limit, kind=args.kind):
+        when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(r["created_at"]))
+        sha = (r["git_sha"] or "-")[:10] + ("+" if r["git_dirty"] else "")
+        passed = {1: "通过", 0: "失败"}.get(r["passed"], "-")
+        print(f"{r['id']:>5}  {when:<19}  {r['kind']:<12}{r['transport'] or '-':<11}{sha:<13}"
+              f"{r['config_hash'] or '-':<14}{r['host']:<14}{passed:<6}{r['label'] or ''}")
+    return 0
+
+def cmd_show(store, args):
+    run = store.run(args.run_id)
+    for key in ("id", "kind", "label", "git_sha", "git_dirty", "transport", "config_hash", "host", "passed"):
+        print(f"{key:<12} {run[key]}")
+    print(f"{'host_info':<12} {run['host_info']}")
+    samples = store.sample_names(run["id"])
+    if samples:
+        print("采样数据:   " + ", ".join(f"{n} ({s} B)" for n, s in samples.items()))
+    print()
+    for name, value in store.metrics(run["id"]).items():
+        print(f"{name:<56}{value:>16.6g}")
+    return 0
+
+def cmd_baseline(store, args):
+    if args.action == "add":
+        store.add_baseline(args.name, args.run_ids)
+        log_success(f"基线 {args.name} 已添加运行: {', '.join(map(str, args.run_ids))}")
+    elif args.action == "remove":
+        store.remove_baseline(args.name, args.run_ids)
+        log_success(f"基线 {args.name} 已更新")
+    else:
+        for b in store.baselines():
+            print(f"{b['name']:<24}{b['runs']:>4} 次运行  (#{b['first']} ~ #{b['last']})")
+    return 0
+
+def cmd_compare(store, args):
+    regressions = compare_run(store, args.run, args.baseline,
+                              overrides=parse_thresholds(args.threshold), show_all=args.all)
+    if regressions:
+        log_error(f"发现 {len(regressions)} 项回归: {', '.join(r['name'] for r in regressions)}")
+        return 1
+    log_success("没有发现回归")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="测试结果库与基线回归检查")
+    parser.add_argument('--db', default=str(DEFAULT_DB), help='SQLite 结果库路径')
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("list", help="列出最近的运行")
+    p.add_argument('--limit', type=int, default=20)
+    p.add_argument('--kind', help='按类型过滤（integration / matrix）')
+    p.set_defaults(func=cmd_list)
+
+    p = sub.add_parser("show", help="查看一次运行的全部指标")
+    p.add_argument('run_id', type=int)
+    p.set_defaults(func=cmd_show)
+
+    p = sub.add_parser("baseline", help="管理命名基线")
+    p.add_argument('action', choices=["add", "remove", "list"])
+    p.add_argument('name', nargs='?')
+    p.add_argument('run_ids', type=int, nargs='*')
+    p.set_defaults(func=cmd_baseline)
+
+    p = sub.add_parser("compare", help="与基线比较，发现回归时退出码为 1")
+    p.add_argument('run', help='运行 ID，或 latest（与基线同类型、同协议的最新一次通过的运行）')
+    p.add_argument('--baseline', required=True, help='基线名称')
+    p.add_argument('--threshold', action='append',
+                   help="覆盖阈值: 'PATTERN=PCT' 或 'PATTERN=higher:PCT'（可重复，支持通配符）")
+    p.add_argument('--all', action='store_true', help='同时显示没有判定规则的指标')
+    p.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args()
+    if args.command == "baseline" and args.action != "list" and not args.name:
+        parser.error("baseline add/remove 需要指定基线名称")
+    if args.command == "baseline" and args.action == "add" and not args.run_ids:
+        parser.error("baseline add 需要至少一个运行 ID")
+
+    try:
+        with ResultsStore(args.db) as store:
+            return args.func(store, args)
+    except (KeyError, ValueError) as e:
+        log_error(str(e).strip("'\""))
+        return 2
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+批量灌入测试数据
+
+经 Management API 按固定形状创建 用户 × 每用户客户端数 × 每客户端映射数：
+
+- 多条 keep-alive 连接并发，每条连接上使用 HTTP/1.1 流水线（连续发出多个请求再依次读取响应）
+- 以用户为单位分批：先创建一批用户，再创建这些用户的客户端，最后创建映射
+- 名称、端口、协议等全部由 --seed 和用户序号决定，与并发度和完成顺序无关
+- 每完成一批就把成功的用户追加到检查点文件（JSON Lines），中断后用同一检查点重跑会跳过已完成的用户；
+  中断时正在创建的用户可能留下部分客户端或映射
+
+本地 server 上数量级为每秒数千到上万对象，100 万对象在几分钟内完成。
+
+用法:
+    ./seed_data.py --target 127.0.0.1:9000 --token $TOKEN --users 10000 --clients-per-user 4 --mappings-per-client 2
+    ./seed_data.py --target 127.0.0.1:9000 --token $TOKEN --objects 1m --checkpoint seed.jsonl
+    ./seed_data.py --local --objects 100k           # 只测灌数速度
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import socket
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+from common import (
+    CONFIG_FILE, log_info, log_success, log_warning, log_error, log_header, load_config, parse_address, error_key,
+)
+from histogram import LatencyHistogram
+
+DEFAULT_CHECKPOINT = Path("~/tunnox-test/seed.jsonl").expanduser()
+HEADER_LIMIT = 64 * 1024
+PROTOCOLS = ("tcp", "tcp", "tcp", "udp")
+BASE_PORT = 20000
+
+def parse_count(text):
+    text = text.strip().lower()
+    units = {"k": 1000, "m": 1000**2}
+    if text[-1:] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+def format_count(n):
+    for unit, value in (("m", 1000**2), ("k", 1000)):
+        if n >= value and n % value == 0:
+            return f"{n // value}{unit}"
+    return str(n)
+
+class Shape:
+    """数据集形状与确定性的对象内容"""
+
+    def __init__(self, seed, clients_per_user, mappings_per_client, prefix="seed"):
+        self.seed = seed
+        self.clients_per_user = clients_per_user
+        self.mappings_per_client = mappings_per_client
+        self.prefix = prefix
+
+    @property
+    def objects_per_user(self):
+        return 1 + self.clients_per_user * (1 + self.mappings_per_client)
+
+    def to_dict(self):
+        return {"seed": self.seed, "clients_per_user": self.clients_per_user,
+                "mappings_per_client": self.mappings_per_client, "prefix": self.prefix}
+
+    def user(self, index):
+        name = f"{self.prefix}-{self.seed}-u{index}"
+        return {"username": name, "email": f"{name}@seed.tunnox.local"}
+
+    def client(self, index, user_id, c):
+        return {"user_id": user_id, "name": f"{self.prefix}-{self.seed}-u{index}-c{c}"}
+
+    def mappings(self, index, user_id, client_ids):
+        # 每个用户一个独立的随机序列，结果不依赖其它用户的创建顺序
+        rng = random.Random(self.seed * 1_000_003 + index)
+        out = []
+        n = len(client_ids)
+        for c, listen in enumerate(client_ids):
+            for m in range(self.mappings_per_client):
+                target = client_ids[(c + 1 + rng.randrange(max(n - 1, 1))) % n] if n > 1 else listen
+                out.append({
+                    "listen_client_id": listen,
+                    "target_client_id": target,
+                    "protocol": rng.choice(PROTOCOLS),
+                    "source_port": BASE_PORT + c * self.mappings_per_client + m,
+                    "target_host": f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}",
+                    "target_port": rng.randrange(1024, 65536),
+                    "user_id": user_id,
+                    "name": f"{self.prefix}-{self.seed}-u{index}-c{c}-m{m}",
+                })
+        return out
+
+class SeedStats:
+    def __init__(self):
+        self.latency = {"user": LatencyHistogram(), "client": LatencyHistogram(), "mapping": LatencyHistogram()}
+        self.created = Counter()
+        self.errors = Counter()
+        self.users_done = 0
+        self.users_failed = 0
+        self.connections = 0
+
+class PipelinedConnection:
+    """一条 keep-alive 连接，按批流水线发送 JSON 请求"""
+
+    def __init__(self, address, token, depth, timeout, stats):
+        self.address = address
+        self.token = token
+        self.depth = depth
+        self.timeout = timeout
+        self.stats = stats
+        self.reader = self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(*self.address, limit=HEADER_LIMIT), self.timeout)
+        self.writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.stats.connections += 1
+
+    def encode(self, method, path, body):
+        data = json.dumps(body, separators=(",", ":")).encode()
+        head = (f"{method} {path} HTTP/1.1\r\nHost: {self.address[0]}\r\nConnection: keep-alive\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n")
+        if self.token:
+            head += f"Authorization: Bearer {self.token}\r\n"
+        return head.encode("latin-1") + b"\r\n" + data
+
+    async def read_response(self):
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ", 2)[1])
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            parts = []
+            while True:
+                size = int((await self.reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                if size == 0:
+                    while await self.reader.readuntil(b"\r\n") != b"\r\n":
+                        pass
+                    break
+                parts.append(await self.reader.readexactly(size))
+                await self.reader.readexactly(2)
+            body = b"".join(parts)
+        else:
+            body = await self.reader.readexactly(int(headers.get("content-length", 0)))
+        return status, body
+
+    async def call_many(self, kind, path, bodies):
+        """流水线发送一组 POST，按顺序返回每个请求的 data（失败的为 None）"""
+        if self.writer is None:
+            await self.connect()
+        results = []
+        hist = self.stats.latency[kind]
+        for i in range(0, len(bodies), self.depth):
+            window = bodies[i:i + self.depth]
+            start = time.perf_counter_ns()
+            self.writer.write(b"".join(self.encode("POST", path, b) for b in window))
+            for _ in window:
+                status, payload = await asyncio.wait_for(self.read_response(), self.timeout)
+                # 流水线内的请求依次完成，延迟按批次起点计算
+                hist.record_since(start)
+                try:
+                    result = json.loads(payload or b"{}")
+                except ValueError:
+                    result = {}
+                if status < 300 and result.get("success"):
+                    self.stats.created[kind] += 1
+                    results.append(result.get("data"))
+                else:
+                    self.stats.errors[f"{kind}: HTTP {status} {str(result.get('error', ''))[:60]}"] += 1
+                    results.append(None)
+        return results
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+class Checkpoint:
+    """JSON Lines 检查点：首行为参数，之后每行一个已完成的用户"""
+
+    def __init__(self, path, params):
+        self.path = Path(path) if path else None
+        self.params = params
+        self.done = {}
+        self.file = None
+
+    def open(self):
+        if self.path is None:
+            return
+        if self.path.exists() and self.path.stat().st_size:
+            with open(self.path) as f:
+                header = json.loads(f.readline())
+                if header != self.params:
+                    raise ValueError(f"检查点 {self.path} 的参数与本次不一致: {header}")
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # 中断时写了一半的行
+                        continue
+                    self.done[entry["i"]] = entry
+            self.file = open(self.path, "a")
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.file = open(self.path, "w")
+            self.file.write(json.dumps(self.params) + "\n")
+        self.file.flush()
+
+    def add(self, entries):
+        for entry in entries:
+            self.done[entry["i"]] = entry
+        if self.file is not None:
+            self.file.write("".join(json.dumps(e, separators=(",", ":")) + "\n" for e in entries))
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+async def seed_batch(conn, shape, indices, stats):
+    """创建一批用户及其客户端、映射，返回完整成功的检查点条目"""
+    users = await conn.call_many("user", "/tunnox/users", [shape.user(i) for i in indices])
+    created = [(i, u["id"]) for i, u in zip(indices, users) if u]
+    bodies = [shape.client(i, uid, c) for i, uid in created for c in range(shape.clients_per_user)]
+    clients = await conn.call_many("client", "/tunnox/clients", bodies)
+    per_user = shape.clients_per_user
+    units = []
+    bodies = []
+    for k, (i, uid) in enumerate(created):
+        ids = [c["id"] if c else None for c in clients[k * per_user:(k + 1) * per_user]]
+        if None in ids:
+            continue
+        units.append((i, uid, ids))
+        bodies.extend(shape.mappings(i, uid, ids))
+    mappings = await conn.call_many("mapping", "/tunnox/mappings", bodies)
+    per_mappings = per_user * shape.mappings_per_client
+    entries = []
+    for k, (i, uid, ids) in enumerate(units):
+        ms = mappings[k * per_mappings:(k + 1) * per_mappings]
+        if all(ms):
+            entries.append({"i": i, "user": uid, "clients": ids, "mappings": [m["id"] for m in ms]})
+    stats.users_done += len(entries)
+    stats.users_failed += len(indices) - len(entries)
+    return entries
+
+async def worker(address, token, shape, queue, checkpoint, stats, args):
+    conn = PipelinedConnection(address, token, args.pipeline, args.timeout, stats)
+    try:
+        while not queue.empty():
+            indices = []
+            while len(indices) < args.batch and not queue.empty():
+                indices.append(queue.get_nowait())
+            try:
+                checkpoint.add(await seed_batch(conn, shape, indices, stats))
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+                # 连接出错时整批视为失败（POST 不重试，避免重复创建），重跑时按检查点补齐
+                stats.errors[error_key(e)] += 1
+                stats.users_failed += len(indices)
+                conn.close()
+    finally:
+        conn.close()
+
+async def report_progress(stats, total, start, interval):
+    while True:
+        await asyncio.sleep(interval)
+        elapsed = time.monotonic() - start
+        objects = sum(stats.created.values())
+        log_info(f"已完成 {stats.users_done}/{total} 个用户，{objects} 个对象，{objects / elapsed:.0f} 个/秒"
+                 + (f"，失败 {stats.users_failed}" if stats.users_failed else ""))
+
+async def seed_async(address, token, shape, indices, checkpoint, args):
+    stats = SeedStats()
+    queue = asyncio.Queue()
+    for i in indices:
+        queue.put_nowait(i)
+    start = time.monotonic()
+    progress = asyncio.ensure_future(report_progress(stats, len(indices), start, args.progress_interval))
+    try:
+        await asyncio.gather(*(worker(address, token, shape, queue, checkpoint, stats, args)
+                               for _ in range(args.connections)))
+    finally:
+        progress.cancel()
+    return stats, time.monotonic() - start
+
+def seed(address, token, shape, users, args, checkpoint=None, start_index=0):
+    """创建序号 [start_index, users) 中检查点之外的用户，返回结果和检查点"""
+    checkpoint = checkpoint or Checkpoint(None, None)
+    pending = [i for i in range(start_index, users) if i not in checkpoint.done]
+    if not pending:
+        log_info("检查点中所有用户均已完成")
+    stats, elapsed = asyncio.run(seed_async(address, token, shape, pending, checkpoint, args))
+    objects = sum(stats.created.values())
+    result = {
+        "users": users,
+        "users_created": stats.users_done,
+        "users_failed": stats.users_failed,
+        "users_skipped": users - start_index - len(pending),
+        "objects": objects,
+        "created": dict(stats.created),
+        "seconds": elapsed,
+        "objects_rate_per_s": objects / elapsed if elapsed > 0 else 0.0,
+        "connections": args.connections,
+        "pipeline": args.pipeline,
+        "connections_opened": stats.connections,
+        "latency_ms": {kind: h.summary_ms() for kind, h in stats.latency.items() if h.count},
+        "errors": dict(stats.errors),
+    }
+    return result
+
+def print_report(result):
+    log_header("测试数据灌入结果")
+    created = result["created"]
+    print(f"用户:   {created.get('user', 0)}（完成 {result['users_created']}，失败 {result['users_failed']}，"
+          f"检查点跳过 {result['users_skipped']}）")
+    print(f"客户端: {created.get('client', 0)}")
+    print(f"映射:   {created.get('mapping', 0)}")
+    print(f"耗时:   {result['seconds']:.1f}s，{result['objects_rate_per_s']:.0f} 个对象/秒"
+          f"（{result['connections']} 条连接 × 流水线深度 {result['pipeline']}）")
+    for kind, lat in result["latency_ms"].items():
+        print(f"{kind:<8} 批内延迟 p50 {lat['p50']:.2f}ms  p99 {lat['p99']:.2f}ms")
+    if result["errors"]:
+        print("\n错误:")
+        for key, count in sorted(result["errors"].items(), key=lambda kv: -kv[1])[:10]:
+            print(f"  {count:>8}  {key}")
+
+def add_seed_arguments(parser):
+    """流水线与并发参数，供其它使用 seed() 的脚本复用"""
+    parser.add_argument('--connections', type=int, default=16, help='keep-alive 连接数')
+    parser.add_argument('--pipeline', type=int, default=16, help='每条连接的流水线深度')
+    parser.add_argument('--batch', type=int, default=16, help='每条连接每批处理的用户数')
+    parser.add_argument('--timeout', type=float, default=60, help='单个响应超时（秒）')
+    parser.add_argument('--progress-interval', type=float, default=5, help='进度输出间隔（秒）')
+
+def main():
+    parser = argparse.ArgumentParser(description="经 Management API 批量灌入用户、客户端和映射")
+    parser.add_argument('--config', default=str(CONFIG_FILE), help='配置文件路径（--local 时读取 local 段）')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--target', help='Management API 地址 host:port')
+    target.add_argument('--local', action='store_true', help='启动本地 server（只测灌数速度，不写检查点）')
+    parser.add_argument('--token', help='--target 模式的 Management API Bearer token')
+    size = parser.add_mutually_exclusive_group(required=True)
+    size.add_argument('--users', type=parse_count, help='用户数')
+    size.add_argument('--objects', type=parse_count, help='对象总数（按形状换算为用户数）')
+    parser.add_argument('--clients-per-user', type=int, default=4, help='每个用户的客户端数')
+    parser.add_argument('--mappings-per-client', type=int, default=2, help='每个客户端（作为监听端）的映射数')
+    parser.add_argument('--seed', type=int, default=1, help='随机种子（决定名称、端口、协议）')
+    parser.add_argument('--prefix', default='seed', help='对象名称前缀')
+    parser.add_argument('--checkpoint', default=str(DEFAULT_CHECKPOINT), help='检查点文件（--target 模式）')
+    parser.add_argument('--fresh', action='store_true', help='删除已有检查点，从头开始')
+    add_seed_arguments(parser)
+    parser.add_argument('--results-db', help='测试结果库路径（默认 ~/tunnox-test/results.db）')
+    parser.add_argument('--no-store', action='store_true', help='不把结果写入结果库')
+    args = parser.parse_args()
+    if args.clients_per_user < 1 or args.mappings_per_client < 0:
+        parser.error("--clients-per-user 至少为 1，--mappings-per-client 不能为负")
+
+    shape = Shape(args.seed, args.clients_per_user, args.mappings_per_client, args.prefix)
+    users = args.users if args.users is not None else -(-args.objects // shape.objects_per_user)
+    log_info(f"形状: {users} 用户 × {shape.clients_per_user} 客户端 × {shape.mappings_per_client} 映射，"
+             f"共 {users * shape.objects_per_user} 个对象")
+
+    config = {}
+    try:
+        if args.local:
+            from local_stack import LocalStack
+            config = load_config(args.config) if Path(args.config).exists() else {}
+            with LocalStack(config) as stack:
+                stack.prepare()
+                stack.start_server()
+                result = seed(("127.0.0.1", stack.ports["management"]), stack.api_token, shape, users, args)
+        else:
+            if args.fresh:
+                Path(args.checkpoint).unlink(missing_ok=True)
+            checkpoint = Checkpoint(args.checkpoint, {"target": args.target, **shape.to_dict()})
+            try:
+                checkpoint.open()
+            except ValueError as e:
+                log_error(f"{e}（换一个 --checkpoint 或使用 --fresh）")
+                return 1
+            if checkpoint.done:
+                log_info(f"从检查点恢复: 已完成 {len(checkpoint.done)} 个用户")
+            try:
+                result = seed(parse_address(args.target), args.token, shape, users, args, checkpoint)
+            finally:
+                checkpoint.close()
+    except KeyboardInterrupt:
+        log_error("灌数被用户中断" + ("，重跑时将从检查点继续" if not args.local else ""))
+        return 130
+
+    print_report(result)
+    passed = result["users_failed"] == 0
+    if not args.no_store:
+        from results_store import DEFAULT_DB, ResultsStore
+        with ResultsStore(args.results_db or DEFAULT_DB) as store:
+            run_id = store.record_run("seed", {**result, "shape": shape.to_dict()}, config=config, passed=passed)
+        log_info(f"结果已写入结果库 (运行 #{run_id})")
+
+    if not passed:
+        log_warning(f"{result['users_failed']} 个用户未完整创建" + ("，重跑可按检查点补齐" if not args.local else ""))
+        return 1
+    log_success("测试数据灌入完成")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
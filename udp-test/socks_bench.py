@@ -0,0 +1,498 @@
+#!/usr/bin/env python3
+"""
+SOCKS5 映射并发测试
+
+用 asyncio 模拟一批 SOCKS5 用户，逐级增加并发会话数，测量 listen-client 上 SOCKS5 监听器
+（internal/client/socks5）在不同并发下的表现：
+
+- CONNECT：每个会话完成握手后保持连接，按固定间隔做小包往返（echo），最后并发传输一段数据
+  统计握手耗时（connect → CONNECT 成功应答）、往返延迟分位数、单会话吞吐与总吞吐
+- UDP ASSOCIATE：每个会话建立 UDP relay（udp_relay.go），经 relay 向 UDP echo 目标发包
+  统计握手耗时、往返延迟、丢包率
+
+以第一级并发的往返延迟为基准，往返 p99 超过基准的 --degrade-factor 倍、或错误率/丢包率超过 1%
+即视为退化，输出延迟未退化时能保持的最大并发会话数。各级会话同时发起握手，握手耗时反映的是
+突发建连时的排队情况，只输出不参与退化判断。
+
+用法:
+    ./socks_bench.py --local --levels 1,32,128,256,512
+    ./socks_bench.py --local --mode udp --levels 1,16,64
+    ./socks_bench.py --target 127.0.0.1:1080 --connect-target 10.0.0.5:19000 --udp-target 10.0.0.5:19100
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import os
+import resource
+import socket
+import struct
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+from common import (
+    CONFIG_FILE, log_info, log_success, log_warning, log_error, log_header, load_config, parse_address,
+)
+from common import error_key as common_error_key
+from histogram import LatencyHistogram
+from local_stack import add_cluster_arguments, add_impair_arguments, network_label
+from tcp_sink import MODE_ECHO, READ_SIZE
+
+SOCKS_VERSION = 0x05
+AUTH_NONE = 0x00
+CMD_CONNECT = 0x01
+CMD_UDP_ASSOCIATE = 0x03
+ATYP_IPV4 = 0x01
+ATYP_DOMAIN = 0x03
+ATYP_IPV6 = 0x04
+REPLIES = {
+    0x01: "general failure",
+    0x02: "not allowed",
+    0x03: "network unreachable",
+    0x04: "host unreachable",
+    0x05: "connection refused",
+    0x06: "TTL expired",
+    0x07: "command not supported",
+    0x08: "address type not supported",
+}
+UDP_SEQ = struct.Struct(">Q")
+DEFAULT_LEVELS = (1, 16, 64, 128, 256, 512)
+# 错误率超过该值的并发级别视为退化
+MAX_ERROR_RATE = 0.01
+
+class Socks5Error(Exception):
+    def __init__(self, rep):
+        super().__init__(f"REP={rep} ({REPLIES.get(rep, 'unknown')})")
+        self.rep = rep
+
+def error_key(e):
+    """SOCKS5 应答错误按 REP 码分类，其余交给 common.error_key"""
+    if isinstance(e, Socks5Error):
+        return f"rep-{e.rep}"
+    return common_error_key(e)
+
+def encode_address(host, port):
+    """SOCKS5 ATYP + DST.ADDR + DST.PORT"""
+    try:
+        ip = ipaddress.ip_address(host)
+    except ValueError:
+        raw = host.encode()
+        return bytes([ATYP_DOMAIN, len(raw)]) + raw + struct.pack(">H", port)
+    atyp = ATYP_IPV4 if ip.version == 4 else ATYP_IPV6
+    return bytes([atyp]) + ip.packed + struct.pack(">H", port)
+
+async def read_address(reader):
+    atyp = (await reader.readexactly(1))[0]
+    if atyp == ATYP_IPV4:
+        host = socket.inet_ntoa(await reader.readexactly(4))
+    elif atyp == ATYP_IPV6:
+        host = socket.inet_ntop(socket.AF_INET6, await reader.readexactly(16))
+    elif atyp == ATYP_DOMAIN:
+        length = (await reader.readexactly(1))[0]
+        host = (await reader.readexactly(length)).decode()
+    else:
+        raise ValueError(f"未知地址类型: {atyp}")
+    (port,) = struct.unpack(">H", await reader.readexactly(2))
+    return host, port
+
+async def socks5_open(proxy, cmd, dst_host, dst_port):
+    """完成 SOCKS5 握手，返回 (reader, writer, bind_addr)"""
+    reader, writer = await asyncio.open_connection(*proxy)
+    try:
+        writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        writer.write(bytes([SOCKS_VERSION, 1, AUTH_NONE]))
+        version, method = await reader.readexactly(2)
+        if version != SOCKS_VERSION or method != AUTH_NONE:
+            raise ValueError(f"不支持的认证方式: version={version} method={method}")
+        writer.write(bytes([SOCKS_VERSION, cmd, 0x00]) + encode_address(dst_host, dst_port))
+        version, rep, _ = await reader.readexactly(3)
+        if rep != 0x00:
+            raise Socks5Error(rep)
+        bind = await read_address(reader)
+        return reader, writer, bind
+    except BaseException:
+        writer.close()
+        raise
+
+def udp_header(host, port):
+    """SOCKS5 UDP 请求头：RSV(2) FRAG ATYP DST.ADDR DST.PORT"""
+    return b"\x00\x00\x00" + encode_address(host, port)
+
+class UDPClient(asyncio.DatagramProtocol):
+    """经 UDP relay 收发数据报，按序号匹配回显"""
+
+    def __init__(self, header_len):
+        self.header_len = header_len
+        self.pending = {}
+        self.late = 0
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if len(data) < self.header_len + UDP_SEQ.size:
+            return
+        (seq,) = UDP_SEQ.unpack_from(data, self.header_len)
+        waiter = self.pending.pop(seq, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+        else:
+            self.late += 1
+
+class LevelStats:
+    """单个并发级别的统计"""
+
+    def __init__(self):
+        self.handshake = LatencyHistogram()
+        self.rtt = LatencyHistogram()
+        self.errors = Counter()
+        self.exchanges = 0
+        self.lost = 0
+        self.session_rates = []
+        self.bulk_bytes = 0
+        self.bulk_seconds = 0.0
+        self.ping_seconds = 0.0
+
+# ---------- CONNECT ----------
+
+async def open_connect_session(proxy, target, stats, timeout):
+    start = time.perf_counter_ns()
+    try:
+        reader, writer, _ = await asyncio.wait_for(socks5_open(proxy, CMD_CONNECT, *target), timeout)
+    except Exception as e:
+        stats.errors[f"handshake:{error_key(e)}"] += 1
+        return None
+    stats.handshake.record_since(start)
+    # 目标端为 tcp_sink.py，首字节选择 echo 模式
+    writer.write(MODE_ECHO)
+    return reader, writer
+
+async def connect_ping(session, payload, deadline, interval, stats, timeout):
+    reader, writer = session
+    while time.monotonic() < deadline:
+        start = time.perf_counter_ns()
+        try:
+            writer.write(payload)
+            await asyncio.wait_for(reader.readexactly(len(payload)), timeout)
+        except Exception as e:
+            stats.errors[f"echo:{error_key(e)}"] += 1
+            return False
+        stats.rtt.record_since(start)
+        stats.exchanges += 1
+        if interval:
+            await asyncio.sleep(interval)
+    return True
+
+async def connect_bulk(session, chunk, total, stats, timeout):
+    reader, writer = session
+
+    async def read_back():
+        got = 0
+        while got < total:
+            data = await reader.read(READ_SIZE)
+            if not data:
+                raise asyncio.IncompleteReadError(b"", total - got)
+            got += len(data)
+
+    start = time.perf_counter()
+    reading = asyncio.ensure_future(read_back())
+    try:
+        sent = 0
+        while sent < total:
+            n = min(len(chunk), total - sent)
+            writer.write(chunk[:n])
+            await writer.drain()
+            sent += n
+        await asyncio.wait_for(reading, timeout)
+    except Exception as e:
+        reading.cancel()
+        stats.errors[f"bulk:{error_key(e)}"] += 1
+        return
+    elapsed = time.perf_counter() - start
+    stats.session_rates.append(total / elapsed)
+    stats.bulk_bytes += total
+
+async def run_connect_level(proxy, target, sessions, args):
+    stats = LevelStats()
+    opened = await asyncio.gather(*(open_connect_session(proxy, target, stats, args.timeout)
+                                     for _ in range(sessions)))
+    live = [s for s in opened if s is not None]
+    try:
+        payload = os.urandom(args.request_size)
+        ping_start = time.perf_counter()
+        deadline = time.monotonic() + args.duration
+        await asyncio.gather(*(connect_ping(s, payload, deadline, args.interval, stats, args.timeout)
+                               for s in live))
+        stats.ping_seconds = time.perf_counter() - ping_start
+        if args.session_kb:
+            chunk = memoryview(os.urandom(64 * 1024))
+            bulk_start = time.perf_counter()
+            await asyncio.gather(*(connect_bulk(s, chunk, args.session_kb * 1024, stats, args.timeout * 6)
+                                   for s in live))
+            stats.bulk_seconds = time.perf_counter() - bulk_start
+    finally:
+        for _, writer in live:
+            writer.close()
+    return stats, len(live)
+
+# ---------- UDP ASSOCIATE ----------
+
+async def open_udp_session(proxy, target, stats, timeout):
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter_ns()
+    try:
+        # DST 填 0.0.0.0:0：客户端发包地址在握手时未知
+        reader, writer, bind = await asyncio.wait_for(socks5_open(proxy, CMD_UDP_ASSOCIATE, "0.0.0.0", 0),
+                                                      timeout)
+    except Exception as e:
+        stats.errors[f"handshake:{error_key(e)}"] += 1
+        return None
+    stats.handshake.record_since(start)
+    relay_host = proxy[0] if bind[0] in ("0.0.0.0", "::") else bind[0]
+    header = udp_header(*target)
+    try:
+        transport, protocol = await loop.create_datagram_endpoint(
+            lambda: UDPClient(len(header)), remote_addr=(relay_host, bind[1]))
+    except OSError as e:
+        stats.errors[f"udp:{error_key(e)}"] += 1
+        writer.close()
+        return None
+    # relay 的生命周期跟随 TCP 控制连接，测试期间保持 writer 打开
+    return writer, transport, protocol, header
+
+async def udp_ping(session, size, deadline, interval, stats, timeout):
+    _, transport, protocol, header = session
+    loop = asyncio.get_running_loop()
+    padding = os.urandom(max(size - UDP_SEQ.size, 0))
+    seq = 0
+    while time.monotonic() < deadline:
+        waiter = loop.create_future()
+        protocol.pending[seq] = waiter
+        start = time.perf_counter_ns()
+        transport.sendto(header + UDP_SEQ.pack(seq) + padding)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+            stats.rtt.record_since(start)
+            stats.exchanges += 1
+        except asyncio.TimeoutError:
+            protocol.pending.pop(seq, None)
+            stats.lost += 1
+        seq += 1
+        if interval:
+            await asyncio.sleep(interval)
+
+async def run_udp_level(proxy, target, sessions, args):
+    stats = LevelStats()
+    opened = await asyncio.gather(*(open_udp_session(proxy, target, stats, args.timeout)
+                                     for _ in range(sessions)))
+    live = [s for s in opened if s is not None]
+    try:
+        ping_start = time.perf_counter()
+        deadline = time.monotonic() + args.duration
+        await asyncio.gather(*(udp_ping(s, args.request_size, deadline, args.interval, stats, args.udp_timeout)
+                               for s in live))
+        stats.ping_seconds = time.perf_counter() - ping_start
+    finally:
+        for writer, transport, _, _ in live:
+            transport.close()
+            writer.close()
+    return stats, len(live)
+
+# ---------- 逐级测试 ----------
+
+def summarize_level(kind, sessions, stats, opened, elapsed, cpu_seconds):
+    failed = sum(stats.errors.values())
+    attempts = stats.exchanges + stats.lost + failed
+    result = {
+        "name": f"s{sessions}",
+        "sessions": sessions,
+        "opened": opened,
+        "handshake_latency_ms": stats.handshake.summary_ms(),
+        "latency_ms": stats.rtt.summary_ms(),
+        "exchanges": stats.exchanges,
+        "rate_per_s": stats.exchanges / stats.ping_seconds if stats.ping_seconds > 0 else 0.0,
+        "error_rate": failed / attempts if attempts else 0.0,
+        "errors": dict(stats.errors),
+        "client_cpu_ratio": cpu_seconds / elapsed if elapsed > 0 else 0.0,
+    }
+    if kind == "udp":
+        sent = stats.exchanges + stats.lost
+        result["loss_rate"] = stats.lost / sent if sent else 0.0
+    if stats.session_rates:
+        rates = stats.session_rates
+        result["session_mb_s"] = {
+            "min": min(rates) / 1024**2,
+            "mean": sum(rates) / len(rates) / 1024**2,
+            "max": max(rates) / 1024**2,
+        }
+        result["aggregate_mb_s"] = stats.bulk_bytes / 1024**2 / stats.bulk_seconds if stats.bulk_seconds else 0.0
+    return result
+
+def degraded(result, base, factor):
+    """与第一级相比是否退化，返回原因或 None"""
+    if result["error_rate"] > MAX_ERROR_RATE:
+        return f"错误率 {result['error_rate'] * 100:.1f}%"
+    if result.get("loss_rate", 0) > MAX_ERROR_RATE:
+        return f"丢包率 {result['loss_rate'] * 100:.1f}%"
+    cur, ref = result["latency_ms"].get("p99"), base["latency_ms"].get("p99")
+    if cur is not None and ref and cur > ref * factor:
+        return f"往返 p99 {cur:.2f}ms > {factor:g} × {ref:.2f}ms"
+    return None
+
+def run_sweep(kind, proxy, target, args):
+    runner = run_connect_level if kind == "connect" else run_udp_level
+    levels = []
+    max_stable = None
+    for sessions in args.levels:
+        log_info(f"[{kind}] {sessions} 个并发会话，{args.duration}s → {target[0]}:{target[1]}")
+        cpu_before = sum(resource.getrusage(resource.RUSAGE_SELF)[:2])
+        start = time.perf_counter()
+        stats, opened = asyncio.run(runner(proxy, target, sessions, args))
+        elapsed = time.perf_counter() - start
+        cpu_seconds = sum(resource.getrusage(resource.RUSAGE_SELF)[:2]) - cpu_before
+        result = summarize_level(kind, sessions, stats, opened, elapsed, cpu_seconds)
+        # 第一级只检查错误率与丢包率
+        result["degraded"] = reason = degraded(result, levels[0] if levels else result, args.degrade_factor)
+        levels.append(result)
+        if reason is None and all(not r["degraded"] for r in levels):
+            max_stable = sessions
+        if reason:
+            log_warning(f"[{kind}] {sessions} 个会话时延迟退化: {reason}")
+        if result["client_cpu_ratio"] > 0.8:
+            log_warning(f"[{kind}] 压测端 CPU 占用 {result['client_cpu_ratio'] * 100:.0f}%，结果可能受压测端限制")
+        if reason and not args.keep_going:
+            break
+    return {"levels": levels, "max_stable_sessions": max_stable}
+
+def print_report(kind, result):
+    log_header(f"SOCKS5 {kind.upper()} 测试结果")
+    print(f"{'会话':>6}{'建立':>6}{'握手p50':>9}{'握手p99':>9}{'往返p50':>9}{'往返p99':>9}{'往返max':>9}"
+          f"{'次/秒':>9}{'错误率':>8}{'丢包率' if kind == 'udp' else '单会话MB/s':>10}  退化")
+    for r in result["levels"]:
+        h, l = r["handshake_latency_ms"], r["latency_ms"]
+        cells = [f"{d[k]:.2f}" if d.get(k) is not None else "-"
+                 for d, k in ((h, "p50"), (h, "p99"), (l, "p50"), (l, "p99"), (l, "max"))]
+        if kind == "udp":
+            extra = f"{r['loss_rate'] * 100:.2f}%"
+        else:
+            extra = f"{r['session_mb_s']['mean']:.1f}" if "session_mb_s" in r else "-"
+        print(f"{r['sessions']:>6}{r['opened']:>6}{cells[0]:>9}{cells[1]:>9}{cells[2]:>9}{cells[3]:>9}"
+              f"{cells[4]:>9}{r['rate_per_s']:>9.0f}{r['error_rate'] * 100:>7.2f}%{extra:>10}  {r['degraded'] or ''}")
+    for r in result["levels"]:
+        if r["errors"]:
+            print(f"[{r['sessions']}] 错误: " + ", ".join(f"{k}={v}" for k, v in sorted(r["errors"].items())))
+    if result["max_stable_sessions"] is None:
+        log_error("第一级并发即出现错误")
+    else:
+        log_info(f"延迟未退化时的最大并发会话数: {result['max_stable_sessions']}")
+
+def run_modes(proxy, connect_target, udp_target, args):
+    results = {}
+    if args.mode in ("connect", "both"):
+        results["connect"] = run_sweep("connect", proxy, connect_target, args)
+    if args.mode in ("udp", "both"):
+        results["udp"] = run_sweep("udp", proxy, udp_target, args)
+    return results
+
+def run_local(config, args):
+    from local_stack import LocalStack, cluster_options, find_free_port
+    from readiness import tcp_accept_probe, udp_echo_probe
+
+    with LocalStack(config, transport=args.transport, **cluster_options(args)) as stack:
+        stack.start_tunnel()
+        echo_port = find_free_port("tcp")
+        stack.start_service("tcp-sink", "tcp_sink.py", ["--port", echo_port, "--workers", 2],
+                            tcp_accept_probe("127.0.0.1", echo_port))
+        udp_port = find_free_port("udp")
+        stack.start_service("udp-echo", "udp_echo.py", ["--port", udp_port],
+                            udp_echo_probe("127.0.0.1", udp_port))
+        listen_port = args.listen_port or find_free_port("tcp")
+        # SOCKS5 映射的目标由每个请求指定，target_host/target_port 仅为占位
+        stack.create_mapping("socks-bench", "socks", listen_port, "127.0.0.1", echo_port,
+                             probe=tcp_accept_probe("127.0.0.1", listen_port))
+        return stack.transport, run_modes(("127.0.0.1", listen_port), ("127.0.0.1", echo_port),
+                                          ("127.0.0.1", udp_port), args)
+
+def parse_levels(text):
+    levels = [int(s) for s in text.split(",") if s.strip()]
+    if not levels or any(n <= 0 for n in levels):
+        raise argparse.ArgumentTypeError(f"无效的并发级别: {text}")
+    return levels
+
+def main():
+    parser = argparse.ArgumentParser(description="SOCKS5 映射并发测试（CONNECT 与 UDP ASSOCIATE）")
+    parser.add_argument('--config', default=str(CONFIG_FILE), help='配置文件路径（--local 时读取 local 段）')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--target', help='SOCKS5 映射的本地地址 host:port')
+    target.add_argument('--local', action='store_true', help='启动本地栈、echo 服务并新建 SOCKS5 映射')
+    parser.add_argument('--transport', choices=['tcp', 'websocket', 'quic', 'kcp'], help='本地模式的连接协议')
+    parser.add_argument('--connect-target', help='CONNECT 目标 host:port（target-client 视角，须运行 tcp_sink.py）')
+    parser.add_argument('--udp-target', help='UDP ASSOCIATE 目标 host:port（target-client 视角，须运行 udp_echo.py）')
+    parser.add_argument('--mode', choices=['connect', 'udp', 'both'], default='both', help='测试的 SOCKS5 命令')
+    parser.add_argument('--levels', type=parse_levels, default=list(DEFAULT_LEVELS),
+                        help='逗号分隔的并发会话数')
+    parser.add_argument('--duration', type=float, default=10, help='每级往返测试时长（秒）')
+    parser.add_argument('--interval', type=float, default=0.05,
+                        help='每个会话两次往返之间的间隔（秒），模拟交互式用户；0 表示不间断')
+    parser.add_argument('--request-size', type=int, default=64, help='往返请求大小（字节）')
+    parser.add_argument('--session-kb', type=int, default=256,
+                        help='CONNECT 每个会话最后并发传输的数据量（KB），0 表示不测吞吐')
+    parser.add_argument('--timeout', type=float, default=10, help='握手与 TCP 往返超时（秒）')
+    parser.add_argument('--udp-timeout', type=float, default=1.0, help='UDP 往返超时（秒），超时记为丢包')
+    parser.add_argument('--degrade-factor', type=float, default=2.0, help='p99 超过第一级的多少倍视为退化')
+    parser.add_argument('--keep-going', action='store_true', help='退化后继续测试更高的并发级别')
+    parser.add_argument('--listen-port', type=int, help='本地模式映射监听端口（默认自动分配）')
+    parser.add_argument('--results-db', help='测试结果库路径（默认 ~/tunnox-test/results.db）')
+    parser.add_argument('--no-store', action='store_true', help='不把结果写入结果库')
+    add_cluster_arguments(parser)
+    add_impair_arguments(parser)
+    args = parser.parse_args()
+
+    # 每个会话至少占用一个文件描述符（UDP 会话两个）
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = min(hard, max(args.levels) * 4 + 256)
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+    config = {}
+    try:
+        if args.local:
+            config = load_config(args.config) if Path(args.config).exists() else {}
+            transport, results = run_local(config, args)
+        else:
+            if args.mode in ("connect", "both") and not args.connect_target:
+                parser.error("--target 模式测试 CONNECT 需要 --connect-target")
+            if args.mode in ("udp", "both") and not args.udp_target:
+                parser.error("--target 模式测试 UDP ASSOCIATE 需要 --udp-target")
+            transport = None
+            results = run_modes(
+                parse_address(args.target),
+                parse_address(args.connect_target) if args.connect_target else None,
+                parse_address(args.udp_target) if args.udp_target else None,
+                args,
+            )
+    except KeyboardInterrupt:
+        log_error("测试被用户中断")
+        return 130
+
+    for kind, result in results.items():
+        print_report(kind, result)
+    passed = all(r["max_stable_sessions"] is not None for r in results.values())
+    if not args.no_store:
+        from results_store import DEFAULT_DB, ResultsStore
+        with ResultsStore(args.results_db or DEFAULT_DB) as store:
+            run_id = store.record_run("socks", results, transport=transport, config=config, label=network_label(args),
+                                      passed=passed)
+        log_info(f"结果已写入结果库 (运行 #{run_id})")
+
+    if not passed:
+        log_error("存在第一级并发即失败的测试")
+        return 1
+    log_success("SOCKS5 测试完成")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
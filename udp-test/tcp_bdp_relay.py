@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+"""
+TCP 带宽时延积（BDP）模拟中继（用户态，不需要 root 和 tc）
+
+放在客户端和 server 的 TCP 端口（tcp 协议端口，或 websocket 使用的 management 端口）之间，
+两个方向各自模拟一条瓶颈链路：up 为 client→server，down 为 server→client。
+
+- rate：瓶颈速率（kbit/s），同一方向的所有连接共享，按字节计算串行化时间
+- delay：单向传播时延（毫秒）
+- queue：瓶颈队列长度（毫秒，按 rate 折算）。TCP 字节流不能丢弃数据，
+  队列满时中继停止读取（反压），发送端的内核缓冲区随之填满
+- window：每条连接每个方向允许的在途字节数（支持 k / m 后缀，0 为不限制）
+
+中继在本地终结 TCP，两侧的内核连接都只看到回环时延，它们的 socket 缓冲区不会因为
+模拟出的 RTT 而限制吞吐。window 用来显式模拟这种限制：读入但未被对端"确认"的字节
+不超过 window，确认时刻为数据送达后再经过反方向的 delay，即在途字节按完整 RTT 释放。
+window 代表假设的每连接接收窗口，window=512k 取 cmd/perftest 显式设置的 512KB socket 缓冲区
+作为参照值（实际窗口取决于两端内核的缓冲区自动调整）；window=0 时只剩下速率、时延和队列，
+用来观察隧道本身（iocopy 缓冲区、websocket 分帧等）能否填满链路。
+中继自己的 socket 缓冲区由 --sockbuf 限制（默认 64KB），以免引入额外的隐性缓冲。
+
+连接建立时不额外计入时延（中继立即接受连接并连接上游），只有数据受链路模型影响。
+
+参数写成 '键=值,...'，键加 up. / down. 前缀时只作用于一个方向：
+    rate=100000,delay=75
+    rate=100000,delay=75,queue=50,window=512k
+    rate=20000,delay=10,down.rate=100000
+
+--stats-file 每秒和退出时写出 JSON（参数、各方向合计），local_stack 在本地模式下读取它。
+
+用法:
+    ./tcp_bdp_relay.py --listen 127.0.0.1:18000 --upstream 127.0.0.1:8000 --link "rate=100000,delay=75"
+    ./tcp_bdp_relay.py --listen 127.0.0.1:18000 --upstream 127.0.0.1:8000 \\
+        --link "rate=100000,delay=75,window=512k" --stats 5
+"""
+
+import argparse
+import asyncio
+import json
+import signal
+import socket
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+from common import parse_address
+
+DEFAULTS = {"rate": 0.0, "delay": 0.0, "queue": 100.0, "window": 0}
+DIRECTIONS = ("up", "down")
+COUNTER_KEYS = ("connections", "bytes", "window_stall_seconds", "queue_stall_seconds", "busy_seconds",
+                "errors")
+
+DEFAULT_SOCKBUF = 64 * 1024
+MAX_CHUNK = 64 * 1024
+MIN_CHUNK = 4 * 1024
+SIZE_SUFFIXES = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+
+def parse_size(text):
+    """'512k' / '4m' / '65536' → 字节数"""
+    text = text.strip().lower().rstrip("b")
+    scale = SIZE_SUFFIXES.get(text[-1:], 1)
+    value = float(text[:-1] if scale > 1 else text) * scale
+    if value < 0:
+        raise ValueError(f"大小取值无效: {text}")
+    return int(value)
+
+def format_size(n):
+    """字节数 → '512k' 这样的短写法（parse_size 的逆运算）"""
+    if not n:
+        return "0"
+    for suffix, scale in (("g", 1024 ** 3), ("m", 1024 ** 2), ("k", 1024)):
+        if n % scale == 0:
+            return f"{n // scale}{suffix}"
+    return str(n)
+
+def parse_spec(spec):
+    """'键=值,...' → {"up": 参数, "down": 参数}"""
+    params = {d: dict(DEFAULTS) for d in DIRECTIONS}
+    for item in (x.strip() for x in (spec or "").split(",")):
+        if not item:
+            continue
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"参数格式应为 键=值: {item}")
+        directions = DIRECTIONS
+        prefix, dot, rest = key.partition(".")
+        if dot and prefix in DIRECTIONS:
+            directions, key = (prefix,), rest
+        if key not in DEFAULTS:
+            raise ValueError(f"未知的参数: {key}（可选: {', '.join(DEFAULTS)}）")
+        try:
+            parsed = parse_size(value) if key == "window" else float(value)
+        except ValueError:
+            raise ValueError(f"{key} 取值无效: {value}") from None
+        if parsed < 0:
+            raise ValueError(f"{key} 取值无效: {value}")
+        for d in directions:
+            params[d][key] = parsed
+    return params
+
+def describe(params):
+    """单个方向参数的简短描述"""
+    parts = []
+    if params["rate"]:
+        parts.append(f"{params['rate']:g}kbit/s 队列 {params['queue']:g}ms")
+    if params["delay"]:
+        parts.append(f"单向 {params['delay']:g}ms")
+    if params["window"]:
+        parts.append(f"窗口 {format_size(params['window'])}")
+    return " ".join(parts) or "不限速"
+
+def bdp_bytes(rate_kbit, rtt_ms):
+    """带宽时延积（字节）"""
+    return rate_kbit * 1000 / 8 * rtt_ms / 1000
+
+class Link:
+    """一个方向的瓶颈链路：速率、队列与传播时延，同一方向的所有连接共享"""
+
+    def __init__(self, params, ack_delay):
+        self.delay = params["delay"] / 1000
+        # 数据送达后经过反方向的传播时延才算被确认，在途字节按完整 RTT 释放
+        self.ack_delay = ack_delay / 1000
+        # kbit/s → 秒/字节
+        self.byte_time = 8 / (params["rate"] * 1000) if params["rate"] else 0.0
+        self.queue = params["queue"] / 1000
+        self.window = params["window"]
+        # 每次读取约 1ms 链路时间的数据，低速链路上送达不至于过于成块
+        rate_bytes = params["rate"] * 1000 / 8
+        self.chunk = int(min(max(rate_bytes / 1000, MIN_CHUNK), MAX_CHUNK)) if rate_bytes else MAX_CHUNK
+        self.free_at = 0.0
+        self.max_queue_delay = 0.0
+
+    def backlog(self, now):
+        """瓶颈队列中尚未发出的数据对应的时间（秒）"""
+        return max(self.free_at - now, 0.0)
+
+    def schedule(self, size, now):
+        """返回这批数据到达对端的时刻"""
+        if not self.byte_time:
+            return now + self.delay
+        start = max(now, self.free_at)
+        self.max_queue_delay = max(self.max_queue_delay, start - now)
+        self.free_at = start + size * self.byte_time
+        return self.free_at + self.delay
+
+class Pipe:
+    """一条连接的一个方向：src 读入 → 链路模型 → 按到达时刻写入 dst"""
+
+    def __init__(self, link, reader, writer, counters):
+        self.link = link
+        self.reader = reader
+        self.writer = writer
+        self.counters = counters
+        self.pending = asyncio.Queue()
+        self.in_flight = 0
+        self.busy_since = None
+        self.released = asyncio.Event()
+
+    def _acquire(self, size, now):
+        if not self.in_flight:
+            self.busy_since = now
+        self.in_flight += size
+
+    def _release(self, size):
+        self.in_flight -= size
+        if not self.in_flight:
+            self.finish_busy()
+        self.released.set()
+
+    def open_busy(self, now):
+        """尚未结束的在途时段（秒），统计快照时计入 busy_seconds"""
+        return now - self.busy_since if self.busy_since is not None else 0.0
+
+    def finish_busy(self):
+        # 有数据在途的时间，作为窗口受限占比的分母（排除长连接的空闲时间）
+        if self.busy_since is not None:
+            self.counters["busy_seconds"] += asyncio.get_running_loop().time() - self.busy_since
+            self.busy_since = None
+
+    async def pump(self):
+        loop = asyncio.get_running_loop()
+        link = self.link
+        try:
+            while True:
+                if link.window:
+                    while self.in_flight >= link.window:
+                        # 瓶颈队列还有数据时链路仍在发送，吞吐受速率限制；
+                        # 只有队列排空（链路空闲）之后的等待才算窗口受限
+                        idle_from = max(loop.time(), link.free_at)
+                        self.released.clear()
+                        await self.released.wait()
+                        self.counters["window_stall_seconds"] += max(loop.time() - idle_from, 0.0)
+                if link.byte_time:
+                    backlog = link.backlog(loop.time())
+                    if backlog > link.queue:
+                        await asyncio.sleep(backlog - link.queue)
+                        self.counters["queue_stall_seconds"] += backlog - link.queue
+                size = min(link.chunk, link.window - self.in_flight) if link.window else link.chunk
+                data = await self.reader.read(size)
+                now = loop.time()
+                if not data:
+                    break
+                self._acquire(len(data), now)
+                self.pending.put_nowait((link.schedule(len(data), now), data))
+        finally:
+            # EOF（或读取出错）排在所有数据之后送达
+            self.pending.put_nowait((loop.time() + link.delay, None))
+
+    async def deliver(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            due, data = await self.pending.get()
+            wait = due - loop.time()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            if data is None:
+                if self.writer.can_write_eof():
+                    self.writer.write_eof()
+                return
+            self.writer.write(data)
+            await self.writer.drain()
+            self.counters["bytes"] += len(data)
+            if self.link.ack_delay:
+                loop.call_later(self.link.ack_delay, self._release, len(data))
+            else:
+                self._release(len(data))
+
+    async def run(self):
+        tasks = [asyncio.ensure_future(self.pump()), asyncio.ensure_future(self.deliver())]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # 任一侧出错时另一侧不再继续
+            for task in tasks:
+                task.cancel()
+            # 连接中断时在途数据不会再被确认，当前在途时段到此结束
+            self.finish_busy()
+
+def _limit_buffers(writer, size):
+    sock = writer.get_extra_info("socket")
+    if sock is not None:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, size)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, size)
+    writer.transport.set_write_buffer_limits(high=size)
+
+class BdpRelay:
+    def __init__(self, listen, upstream, params, sockbuf=DEFAULT_SOCKBUF, quiet=False):
+        self.listen = listen
+        self.upstream = upstream
+        self.params = params
+        self.links = {
+            "up": Link(params["up"], params["down"]["delay"]),
+            "down": Link(params["down"], params["up"]["delay"]),
+        }
+        self.sockbuf = sockbuf
+        self.quiet = quiet
+        self.counters = {d: Counter() for d in DIRECTIONS}
+        self.pipes = {d: set() for d in DIRECTIONS}
+        self.handlers = set()
+        self.server = None
+        self.started = None
+
+    def log(self, msg):
+        if not self.quiet:
+            print(f"[tcp-bdp] {msg}", flush=True)
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, *self.listen, limit=MAX_CHUNK)
+        self.started = time.monotonic()
+        # 就绪日志由 local_stack 的 log_line_probe 匹配，必须输出
+        print(f"[tcp-bdp] 已启动 {self.listen[0]}:{self.listen[1]} → {self.upstream[0]}:{self.upstream[1]}",
+              flush=True)
+        for d in DIRECTIONS:
+            self.log(f"{d:<4} {describe(self.params[d])}")
+        up, down = self.params["up"], self.params["down"]
+        rate = min(r for r in (up["rate"], down["rate"], float("inf")) if r)
+        if rate != float("inf") and (up["delay"] or down["delay"]):
+            rtt = up["delay"] + down["delay"]
+            self.log(f"RTT {rtt:g}ms，BDP {bdp_bytes(rate, rtt) / 1024:.0f}KB")
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+        # 仍在传输的连接直接断开
+        for task in self.handlers:
+            task.cancel()
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+
+    async def _handle(self, client_reader, client_writer):
+        peer = client_writer.get_extra_info("peername")
+        try:
+            server_reader, server_writer = await asyncio.open_connection(*self.upstream, limit=MAX_CHUNK)
+        except OSError as e:
+            self.log(f"连接上游失败 ({peer[0]}:{peer[1]}): {e}")
+            self.counters["up"]["errors"] += 1
+            client_writer.close()
+            return
+        for writer in (client_writer, server_writer):
+            _limit_buffers(writer, self.sockbuf)
+        for d in DIRECTIONS:
+            self.counters[d]["connections"] += 1
+        self.handlers.add(asyncio.current_task())
+        pipes = {
+            "up": Pipe(self.links["up"], client_reader, server_writer, self.counters["up"]),
+            "down": Pipe(self.links["down"], server_reader, client_writer, self.counters["down"]),
+        }
+        for d, p in pipes.items():
+            self.pipes[d].add(p)
+        tasks = {d: asyncio.ensure_future(p.run()) for d, p in pipes.items()}
+        try:
+            pending = set(tasks.values())
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                failed = [d for d, t in tasks.items() if t in done and t.exception() is not None]
+                if failed:
+                    # 一个方向出错（连接被重置等）时关闭整条连接，另一个方向随之结束
+                    for d in failed:
+                        self.counters[d]["errors"] += 1
+                    for t in pending:
+                        t.cancel()
+                    break
+        except asyncio.CancelledError:
+            # 中继退出时由 close() 取消；不向 start_server 的回调抛出，避免退出时打印异常
+            for t in tasks.values():
+                t.cancel()
+        finally:
+            self.handlers.discard(asyncio.current_task())
+            for d, p in pipes.items():
+                p.finish_busy()
+                self.pipes[d].discard(p)
+            for writer in (client_writer, server_writer):
+                writer.close()
+
+    # ----- 统计 -----
+
+    def snapshot(self):
+        # 默认事件循环的 loop.time() 即 time.monotonic()
+        now = time.monotonic()
+        totals = {"elapsed_seconds": now - self.started, "active_connections": len(self.handlers)}
+        for d in DIRECTIONS:
+            c = self.counters[d]
+            result = {key: c.get(key, 0) for key in COUNTER_KEYS}
+            # 仍在进行的在途时段也计入，否则长连接的最后一段不会出现在分母里
+            result["busy_seconds"] += sum(p.open_busy(now) for p in self.pipes[d])
+            busy = result["busy_seconds"]
+            # 有数据在途、瓶颈队列已空时因窗口耗尽而停止读取的时间占比，接近 1 说明吞吐受窗口限制
+            result["window_limited"] = result["window_stall_seconds"] / busy if busy else 0.0
+            result["max_queue_ms"] = self.links[d].max_queue_delay * 1000
+            totals[d] = result
+        return {
+            "params": {d: {k: v for k, v in self.params[d].items() if v} for d in DIRECTIONS},
+            "totals": totals,
+        }
+
+    def stats_line(self):
+        totals = self.snapshot()["totals"]
+        parts = []
+        for d in DIRECTIONS:
+            t = totals[d]
+            parts.append(f"{d} {t['bytes'] / 1024**2:.1f}MB 窗口受限 {t['window_limited'] * 100:.0f}% "
+                         f"最大排队 {t['max_queue_ms']:.1f}ms")
+        return f"{len(self.handlers)} 条连接  " + "  ".join(parts)
+
+def write_stats(relay, path):
+    path = Path(path)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(relay.snapshot(), indent=2, ensure_ascii=False))
+    tmp.replace(path)
+
+async def serve(args, params):
+    relay = BdpRelay(parse_address(args.listen), parse_address(args.upstream), params,
+                     sockbuf=args.sockbuf, quiet=args.quiet)
+    await relay.start()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    last_stats = time.monotonic()
+    try:
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), 1.0)
+            except asyncio.TimeoutError:
+                pass
+            if args.stats_file:
+                write_stats(relay, args.stats_file)
+            if args.stats and time.monotonic() - last_stats >= args.stats:
+                last_stats = time.monotonic()
+                relay.log(relay.stats_line())
+    finally:
+        await relay.close()
+        if args.stats_file:
+            write_stats(relay, args.stats_file)
+        relay.log(relay.stats_line())
+
+def main():
+    parser = argparse.ArgumentParser(description="TCP 带宽时延积模拟中继（瓶颈速率、单向时延、有界队列、窗口）")
+    parser.add_argument('--listen', required=True, help='监听地址 host:port（客户端的 server 地址改为这里）')
+    parser.add_argument('--upstream', required=True, help='server 的 TCP 地址 host:port（tcp 或 management 端口）')
+    parser.add_argument('--link', default='', help="链路参数，如 'rate=100000,delay=75,window=512k'")
+    parser.add_argument('--sockbuf', type=parse_size, default=DEFAULT_SOCKBUF,
+                        help='中继两侧 socket 的收发缓冲区大小（默认 64k）')
+    parser.add_argument('--stats', type=float, default=0, help='每隔若干秒输出一行统计（0 为只在退出时输出）')
+    parser.add_argument('--stats-file', help='每秒和退出时写出 JSON 统计')
+    parser.add_argument('--quiet', action='store_true', help='只输出启动行')
+    args = parser.parse_args()
+
+    try:
+        params = parse_spec(args.link)
+    except ValueError as e:
+        parser.error(str(e))
+    asyncio.run(serve(args, params))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+TCP echo / sink 目标服务
+
+作为 TCP 映射的目标端，供吞吐、连接抖动等压测使用。每个连接的第一个字节决定模式：
+
+- 'S' + 8 字节大端长度 L：读取并丢弃 L 字节，然后回复 8 字节大端的实际接收字节数（sink）
+- 'E'：原样回显收到的数据，直到对端关闭（echo）
+- 'Z' + 8 字节大端长度 L：把后续数据作为 gzip 流解压，解压出 L 字节后回复 8 字节大端的解压字节数（inflate）
+
+sink 模式不依赖半关闭（CloseWrite）在隧道中的传递，发送端收到回复即可确认数据全部到达。
+--workers 大于 1 时以 SO_REUSEPORT 启动多个进程，避免单个 Python 进程成为瓶颈。
+
+用法:
+    ./tcp_sink.py --port 19000
+    ./tcp_sink.py --port 19000 --workers 4
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import signal
+import socket
+import struct
+import sys
+import zlib
+
+MODE_SINK = b"S"
+MODE_ECHO = b"E"
+MODE_INFLATE = b"Z"
+LENGTH = struct.Struct(">Q")
+READ_SIZE = 256 * 1024
+SOCKET_BUFFER = 4 * 1024 * 1024
+
+async def handle(reader, writer):
+    sock = writer.get_extra_info("socket")
+    if sock is not None:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    try:
+        mode = await reader.readexactly(1)
+        if mode == MODE_SINK:
+            (remaining,) = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+            received = 0
+            while received < remaining:
+                data = await reader.read(min(READ_SIZE, remaining - received))
+                if not data:
+                    break
+                received += len(data)
+            writer.write(LENGTH.pack(received))
+            await writer.drain()
+            # 等待发送端关闭，避免先关闭导致回复被 RST 丢弃
+            await reader.read(1)
+        elif mode == MODE_INFLATE:
+            (remaining,) = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+            inflater = zlib.decompressobj(wbits=31)
+            inflated = 0
+            while inflated < remaining:
+                data = await reader.read(READ_SIZE)
+                if not data:
+                    break
+                inflated += len(inflater.decompress(data))
+            writer.write(LENGTH.pack(inflated))
+            await writer.drain()
+            await reader.read(1)
+        elif mode == MODE_ECHO:
+            while True:
+                data = await reader.read(READ_SIZE)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError, zlib.error):
+        pass
+    finally:
+        writer.close()
+
+def make_socket(host, port, reuse_port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+    sock.bind((host, port))
+    sock.listen(4096)
+    sock.setblocking(False)
+    return sock
+
+async def serve(sock):
+    server = await asyncio.start_server(handle, sock=sock, limit=READ_SIZE)
+    loop = asyncio.get_running_loop()
+    stop = loop.create_future()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set_result, None)
+    async with server:
+        await stop
+
+def run_worker(host, port, reuse_port):
+    asyncio.run(serve(make_socket(host, port, reuse_port)))
+
+def main():
+    parser = argparse.ArgumentParser(description="TCP echo / sink 目标服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--workers", type=int, default=1, help="进程数（>1 时使用 SO_REUSEPORT）")
+    args = parser.parse_args()
+
+    print(f"TCP echo/sink 监听 {args.host}:{args.port}，{args.workers} 个进程", flush=True)
+    if args.workers <= 1:
+        run_worker(args.host, args.port, False)
+        return 0
+
+    workers = [
+        multiprocessing.Process(target=run_worker, args=(args.host, args.port, True), daemon=True)
+        for _ in range(args.workers)
+    ]
+    for w in workers:
+        w.start()
+    # SIGTERM 会发给整个进程组：主进程忽略它，等待 worker 各自退出
+    signal.signal(signal.SIGTERM, lambda *_: None)
+    try:
+        for w in workers:
+            w.join()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,958 @@
+#!/usr/bin/env python3
+"""
+tunnox 流量录制与回放
+
+- record: 透明代理（客户端 → 代理 → server），转发的同时把每个帧的时间戳、方向、类型、长度写入紧凑的二进制轨迹。
+  TCP 按 packet_codec 的帧格式解析（握手、命令、心跳、TunnelOpen/Ack），隧道连接收到 TunnelOpenAck 后
+  切换为原始字节流（专用连接模型），之后记录每次读取到的数据段；
+  UDP（kcp / quic）的帧在 KCP / QUIC 内部无法解析，按客户端地址区分流，只记录每个数据报
+- replay: 按轨迹驱动 server，--speed 1 / 10 / max。每条连接在轨迹中的时间点（按倍速缩放）建立，
+  client→server 的记录按时间发送，server→client 的数据只读取和统计
+- info: 轨迹统计（时长、连接数、各类型帧数和字节数）
+
+轨迹格式（文件名以 .gz 结尾时 gzip 压缩）:
+    文件头: b"TNXTRACE" + 版本字节 + varint 长度 + 元数据 JSON
+    记录:   varint 距上一条记录的微秒数 + varint 连接号 + 标志字节（低 3 位为记录类型，
+            0x10 表示 server→client，0x20 表示带包体）+ 包类型字节 + varint 长度 [+ 包体]
+一条不带包体的记录通常只有 5~8 字节。--payloads 决定保存哪些包体：
+control（默认）只保存控制帧（握手、命令、TunnelOpen 等），none 都不保存，all 连同隧道数据和数据报全部保存。
+回放时没有保存的包体用同样长度的零字节代替。
+
+回放按请求/响应保持因果顺序：录制时某条 client→server 记录之前收到过 k 个响应帧
+（HandshakeResp / CommandResp / TunnelOpenAck），回放时也要等收到 k 个响应后才发送（最多等 --gate-timeout 秒），
+因此 --speed max 下隧道数据不会抢在 TunnelOpenAck 之前发出。
+握手第二阶段的 challenge_response 用本次回放收到的 Challenge 重新计算，
+SecretKey 取自轨迹中第一阶段握手的 token 字段，或由 --credentials / --secret 提供。
+UDP 轨迹的回放只重现数据报的时间和大小（KCP / QUIC 会话无法原样重放），用于在 UDP 端口上重现流量形状。
+
+注意：control / all 模式下轨迹包含握手中明文的 SecretKey（旧协议兼容的 token 字段），
+--redact 在写入轨迹前清除，此时回放需要用 --credentials 或 --secret 提供密钥。
+
+用法:
+    ./traffic_trace.py record --listen 0.0.0.0:18000 --upstream 10.0.0.5:8000 --out incident.trace.gz
+    ./traffic_trace.py record --udp --listen 0.0.0.0:18000 --upstream 10.0.0.5:8000 --out kcp.trace.gz
+    ./traffic_trace.py info incident.trace.gz
+    ./traffic_trace.py replay incident.trace.gz --target 127.0.0.1:8000 --speed 10
+    ./traffic_trace.py replay incident.trace.gz --target 127.0.0.1:8000 --speed max --secret 1001=abc...
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import signal
+import socket
+import sys
+import threading
+import time
+from collections import Counter, deque
+from pathlib import Path
+
+from common import log_info, log_success, log_warning, log_error, log_header, parse_address
+from control_sim import challenge_response, load_credentials
+from histogram import LatencyHistogram
+from packet_codec import (
+    COMMAND_RESP, COMPRESSED, ENCRYPTED, HANDSHAKE, HANDSHAKE_RESP, HEADER, HEARTBEAT, JSON_COMMAND, TUNNEL_DATA,
+    TUNNEL_OPEN, TUNNEL_OPEN_ACK, TYPE_MASK, FrameDecoder, FrameError, type_name,
+)
+
+MAGIC = b"TNXTRACE"
+VERSION = 1
+
+# 记录类型（标志字节的低 3 位）
+KIND_FRAME = 0     # 一个 tunnox 帧
+KIND_RAW = 1       # 切换为原始字节流后的一次读取
+KIND_OPEN = 2      # 连接建立
+KIND_CLOSE = 3     # 连接关闭（任一方向结束）
+KIND_DATAGRAM = 4  # 一个 UDP 数据报
+KIND_MASK = 0x07
+S2C = 0x10
+HAS_PAYLOAD = 0x20
+KIND_NAMES = {KIND_FRAME: "frame", KIND_RAW: "raw", KIND_OPEN: "open", KIND_CLOSE: "close", KIND_DATAGRAM: "datagram"}
+
+PAYLOAD_MODES = ("control", "none", "all")
+# 请求帧 → 对应的响应帧（回放时统计响应延迟）
+RESPONSE_OF = {HANDSHAKE: HANDSHAKE_RESP, JSON_COMMAND: COMMAND_RESP, TUNNEL_OPEN: TUNNEL_OPEN_ACK}
+RESPONSE_TYPES = frozenset(RESPONSE_OF.values())
+LATENCY_NAMES = {HANDSHAKE_RESP: "handshake", COMMAND_RESP: "command", TUNNEL_OPEN_ACK: "tunnel_open"}
+
+RAW_READ_SIZE = 256 * 1024
+UDP_MAX_DATAGRAM = 65535
+
+def _put_varint(out, v):
+    while v >= 0x80:
+        out.append((v & 0x7f) | 0x80)
+        v >>= 7
+    out.append(v)
+
+def _get_varint(data, pos):
+    result = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        result |= (b & 0x7f) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+def _open(path, mode):
+    path = str(path)
+    return gzip.open(path, mode) if path.endswith(".gz") else open(path, mode)
+
+# ---------- 轨迹格式 ----------
+
+class Record:
+    __slots__ = ("t_us", "conn", "flags", "ptype", "length", "payload")
+
+    def __init__(self, t_us, conn, flags, ptype, length, payload=None):
+        self.t_us = t_us
+        self.conn = conn
+        self.flags = flags
+        self.ptype = ptype
+        self.length = length
+        self.payload = payload
+
+    @property
+    def kind(self):
+        return self.flags & KIND_MASK
+
+    @property
+    def s2c(self):
+        return bool(self.flags & S2C)
+
+    @property
+    def base_type(self):
+        return self.ptype & TYPE_MASK
+
+    def __repr__(self):
+        direction = "s→c" if self.s2c else "c→s"
+        return (f"Record({self.t_us}us conn={self.conn} {direction} {KIND_NAMES[self.kind]} "
+                f"0x{self.ptype:02x} {self.length}B)")
+
+class TraceWriter:
+    """线程安全的轨迹写入器；时间戳在加锁后读取，保证记录按时间递增"""
+
+    def __init__(self, path, meta):
+        self.path = Path(path)
+        self.file = _open(self.path, "wb")
+        header = bytearray(MAGIC)
+        header.append(VERSION)
+        meta = json.dumps(meta, ensure_ascii=False).encode()
+        _put_varint(header, len(meta))
+        self.file.write(bytes(header) + meta)
+        self.lock = threading.Lock()
+        self.t0 = time.monotonic_ns()
+        self.last_us = 0
+        self.next_conn = 0
+        self.records = 0
+        self.bytes_seen = 0
+        self.by_kind = Counter()
+
+    def new_conn(self):
+        with self.lock:
+            self.next_conn += 1
+            return self.next_conn
+
+    def add(self, conn, kind, s2c=False, ptype=0, length=0, payload=None):
+        flags = kind | (S2C if s2c else 0) | (HAS_PAYLOAD if payload is not None else 0)
+        out = bytearray()
+        with self.lock:
+            t_us = max((time.monotonic_ns() - self.t0) // 1000, self.last_us)
+            _put_varint(out, t_us - self.last_us)
+            self.last_us = t_us
+            _put_varint(out, conn)
+            out.append(flags)
+            out.append(ptype)
+            _put_varint(out, length)
+            self.file.write(bytes(out))
+            if payload is not None:
+                self.file.write(payload)
+            self.records += 1
+            self.bytes_seen += length
+            self.by_kind[kind] += 1
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+def read_trace(path):
+    """读取整个轨迹，返回 (元数据, 记录列表)"""
+    with _open(path, "rb") as f:
+        data = f.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} 不是 tunnox 轨迹文件")
+    pos = len(MAGIC)
+    if data[pos] != VERSION:
+        raise ValueError(f"不支持的轨迹版本: {data[pos]}")
+    meta_len, pos = _get_varint(data, pos + 1)
+    meta = json.loads(data[pos:pos + meta_len])
+    pos += meta_len
+    records = []
+    t_us = 0
+    end = len(data)
+    try:
+        while pos < end:
+            dt, pos = _get_varint(data, pos)
+            conn, pos = _get_varint(data, pos)
+            flags, ptype = data[pos], data[pos + 1]
+            length, pos = _get_varint(data, pos + 2)
+            payload = None
+            if flags & HAS_PAYLOAD:
+                payload = data[pos:pos + length]
+                pos += length
+                if pos > end:
+                    raise IndexError
+            t_us += dt
+            records.append(Record(t_us, conn, flags, ptype, length, payload))
+    except IndexError:
+        # 录制进程被强制结束时最后一条记录可能不完整
+        log_warning(f"轨迹在第 {len(records)} 条记录处截断")
+    return meta, records
+
+def keep_payload(mode, kind, ptype):
+    """--payloads 模式下某条记录是否保存包体"""
+    if mode == "all":
+        return kind in (KIND_FRAME, KIND_RAW, KIND_DATAGRAM)
+    if mode == "control":
+        return kind == KIND_FRAME and ptype & TYPE_MASK not in (HEARTBEAT, TUNNEL_DATA)
+    return False
+
+def redact_handshake(body, ptype):
+    """清除握手请求中的 token（明文 SecretKey）；无法解析时原样返回"""
+    if ptype & ENCRYPTED:
+        return body
+    try:
+        raw = gzip.decompress(body) if ptype & COMPRESSED else body
+        request = json.loads(raw)
+    except (OSError, ValueError):
+        return body
+    if request.get("token") and request["token"] != "new-client":
+        request["token"] = ""
+    raw = json.dumps(request, separators=(",", ":")).encode()
+    return gzip.compress(raw) if ptype & COMPRESSED else raw
+
+# ---------- 录制 ----------
+
+class TcpRecorder:
+    """TCP 录制代理：listen → upstream，解析帧后再转发"""
+
+    def __init__(self, listen, upstream, writer, payloads, redact):
+        self.listen = listen
+        self.upstream = upstream
+        self.writer = writer
+        self.payloads = payloads
+        self.redact = redact
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.tunnels = 0
+        self.errors = 0
+        self.sock = None
+
+    def start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(self.listen)
+        self.sock.listen(256)
+        threading.Thread(target=self._accept_loop, name="record-accept", daemon=True).start()
+        log_info(f"TCP 录制代理: {self.listen[0]}:{self.listen[1]} → {self.upstream[0]}:{self.upstream[1]}")
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def _accept_loop(self):
+        while True:
+            try:
+                client, peer = self.sock.accept()
+            except OSError:
+                return
+            try:
+                upstream = socket.create_connection(self.upstream, timeout=5)
+                upstream.settimeout(None)
+            except OSError as e:
+                log_warning(f"连接 server 失败: {e}")
+                client.close()
+                continue
+            for s in (client, upstream):
+                s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = self.writer.new_conn()
+            self.writer.add(conn, KIND_OPEN)
+            state = {"raw": False, "open": 2, "closed": False}
+            with self.lock:
+                self.connections += 1
+            for src, dst, s2c in ((client, upstream, False), (upstream, client, True)):
+                threading.Thread(target=self._pump, args=(conn, src, dst, s2c, state), daemon=True).start()
+
+    def _record_frame(self, conn, frame, s2c):
+        payload = None
+        if keep_payload(self.payloads, KIND_FRAME, frame.type):
+            payload = bytes(frame.body)
+            if self.redact and not s2c and frame.base_type == HANDSHAKE:
+                payload = redact_handshake(payload, frame.type)
+        length = len(payload) if payload is not None else len(frame.body)
+        self.writer.add(conn, KIND_FRAME, s2c, frame.type, length, payload)
+
+    def _record_raw(self, conn, data, s2c):
+        payload = bytes(data) if self.payloads == "all" else None
+        self.writer.add(conn, KIND_RAW, s2c, 0, len(data), payload)
+
+    def _pump(self, conn, src, dst, s2c, state):
+        """先按帧解析、记录再转发（保证 TunnelOpenAck 送达客户端之前已切换为原始字节流模式）"""
+        decoder = FrameDecoder()
+        raw_buf = memoryview(bytearray(RAW_READ_SIZE))
+        try:
+            while True:
+                if state["raw"]:
+                    n = src.recv_into(raw_buf)
+                    if n == 0:
+                        break
+                    self._record_raw(conn, raw_buf[:n], s2c)
+                    dst.sendall(raw_buf[:n])
+                    continue
+                target = decoder.get_buffer()
+                n = src.recv_into(target)
+                if n == 0:
+                    break
+                decoder.buffer_updated(n)
+                # 阻塞在 recv 期间另一方向可能已收到 TunnelOpenAck，此时读到的已是原始字节流
+                if not state["raw"]:
+                    try:
+                        for frame in decoder.frames():
+                            self._record_frame(conn, frame, s2c)
+                            if s2c and frame.base_type == TUNNEL_OPEN_ACK:
+                                state["raw"] = True
+                                with self.lock:
+                                    self.tunnels += 1
+                                break
+                    except FrameError:
+                        # 不是帧格式，之后不再解析
+                        state["raw"] = True
+                if state["raw"]:
+                    rest = decoder.take_remaining()
+                    if rest:
+                        self._record_raw(conn, rest, s2c)
+                dst.sendall(target[:n])
+        except OSError:
+            with self.lock:
+                self.errors += 1
+        finally:
+            try:
+                dst.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+            with self.lock:
+                first_close = not state["closed"]
+                state["closed"] = True
+                state["open"] -= 1
+                done = state["open"] == 0
+            if first_close:
+                self.writer.add(conn, KIND_CLOSE, s2c)
+            if done:
+                src.close()
+                dst.close()
+
+    def summary(self):
+        with self.lock:
+            return {"connections": self.connections, "tunnels": self.tunnels, "errors": self.errors}
+
+class UdpRecorder:
+    """UDP 录制代理：每个客户端地址对应一个连接到 upstream 的 socket（一条流）"""
+
+    def __init__(self, listen, upstream, writer, payloads, idle_timeout):
+        self.listen = listen
+        self.upstream = upstream
+        self.writer = writer
+        self.payloads = payloads
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.flows = {}
+        self.connections = 0
+        self.errors = 0
+        self.sock = None
+
+    def start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.sock.bind(self.listen)
+        threading.Thread(target=self._client_loop, name="record-udp", daemon=True).start()
+        log_info(f"UDP 录制代理: {self.listen[0]}:{self.listen[1]} → {self.upstream[0]}:{self.upstream[1]}")
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+        with self.lock:
+            flows = list(self.flows.values())
+        for flow in flows:
+            flow["sock"].close()
+
+    def _payload(self, data):
+        return bytes(data) if self.payloads == "all" else None
+
+    def _client_loop(self):
+        buf = memoryview(bytearray(UDP_MAX_DATAGRAM))
+        while True:
+            try:
+                n, peer = self.sock.recvfrom_into(buf)
+            except OSError:
+                return
+            with self.lock:
+                flow = self.flows.get(peer)
+            if flow is None:
+                flow = self._open_flow(peer)
+            flow["last"] = time.monotonic()
+            self.writer.add(flow["conn"], KIND_DATAGRAM, False, 0, n, self._payload(buf[:n]))
+            try:
+                flow["sock"].send(buf[:n])
+            except OSError:
+                with self.lock:
+                    self.errors += 1
+
+    def _open_flow(self, peer):
+        upstream = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        upstream.connect(self.upstream)
+        upstream.settimeout(1.0)
+        flow = {"conn": self.writer.new_conn(), "sock": upstream, "last": time.monotonic()}
+        self.writer.add(flow["conn"], KIND_OPEN)
+        with self.lock:
+            self.flows[peer] = flow
+            self.connections += 1
+        threading.Thread(target=self._upstream_loop, args=(peer, flow), daemon=True).start()
+        return flow
+
+    def _upstream_loop(self, peer, flow):
+        buf = memoryview(bytearray(UDP_MAX_DATAGRAM))
+        sock = flow["sock"]
+        try:
+            while True:
+                try:
+                    n = sock.recv_into(buf)
+                except socket.timeout:
+                    if time.monotonic() - flow["last"] > self.idle_timeout:
+                        break
+                    continue
+                flow["last"] = time.monotonic()
+                self.writer.add(flow["conn"], KIND_DATAGRAM, True, 0, n, self._payload(buf[:n]))
+                self.sock.sendto(buf[:n], peer)
+        except (OSError, AttributeError):
+            # 关闭时 self.sock 已置空或 socket 已关闭
+            pass
+        finally:
+            with self.lock:
+                self.flows.pop(peer, None)
+            sock.close()
+            self.writer.add(flow["conn"], KIND_CLOSE)
+
+    def summary(self):
+        with self.lock:
+            return {"connections": self.connections, "tunnels": 0, "errors": self.errors}
+
+def cmd_record(args):
+    listen = parse_address(args.listen, "0.0.0.0")
+    upstream = parse_address(args.upstream)
+    meta = {
+        "protocol": "udp" if args.udp else "tcp",
+        "listen": args.listen,
+        "upstream": args.upstream,
+        "payloads": args.payloads,
+        "redacted": args.redact,
+        "started_at": time.time(),
+        "note": args.note,
+    }
+    writer = TraceWriter(args.out, meta)
+    if args.udp:
+        recorder = UdpRecorder(listen, upstream, writer, args.payloads, args.udp_idle)
+    else:
+        recorder = TcpRecorder(listen, upstream, writer, args.payloads, args.redact)
+    recorder.start()
+    if args.payloads != "none" and not args.redact and not args.udp:
+        log_warning("轨迹会包含握手中的明文 SecretKey，需要外发时请使用 --redact")
+    log_success(f"正在录制到 {args.out}，按 Ctrl+C 停止")
+    started = time.monotonic()
+    try:
+        while args.duration is None or time.monotonic() - started < args.duration:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        recorder.close()
+        # 等转发线程写完最后的记录
+        time.sleep(0.2)
+        writer.close()
+    elapsed = time.monotonic() - started
+    summary = recorder.summary()
+    size = writer.path.stat().st_size
+    log_header("录制结果")
+    print(f"时长 {elapsed:.1f}s，连接 {summary['connections']}，隧道 {summary['tunnels']}，转发错误 {summary['errors']}")
+    print(f"记录 {writer.records}（" + "  ".join(f"{KIND_NAMES[k]}={n}" for k, n in sorted(writer.by_kind.items())) + "）")
+    per_record = size / writer.records if writer.records else 0
+    print(f"流量 {writer.bytes_seen / 1024**2:.2f} MB，轨迹文件 {size / 1024:.1f} KB（平均每条记录 {per_record:.1f} 字节）")
+    return 0
+
+# ---------- 统计 ----------
+
+def trace_stats(records):
+    """按方向和类型汇总轨迹"""
+    by_type = {False: Counter(), True: Counter()}
+    bytes_by_type = {False: Counter(), True: Counter()}
+    conns = set()
+    per_second = Counter()
+    for rec in records:
+        conns.add(rec.conn)
+        if rec.kind in (KIND_OPEN, KIND_CLOSE):
+            continue
+        if rec.kind == KIND_FRAME:
+            name = type_name(rec.ptype)
+        else:
+            name = KIND_NAMES[rec.kind]
+        by_type[rec.s2c][name] += 1
+        bytes_by_type[rec.s2c][name] += rec.length
+        per_second[rec.t_us // 1_000_000] += 1
+    duration = records[-1].t_us / 1e6 if records else 0.0
+    return {
+        "duration_seconds": duration,
+        "connections": len(conns),
+        "records": len(records),
+        "peak_records_per_s": max(per_second.values()) if per_second else 0,
+        "c2s": {name: {"count": n, "bytes": bytes_by_type[False][name]} for name, n in by_type[False].most_common()},
+        "s2c": {name: {"count": n, "bytes": bytes_by_type[True][name]} for name, n in by_type[True].most_common()},
+    }
+
+def cmd_info(args):
+    meta, records = read_trace(args.trace)
+    stats = trace_stats(records)
+    size = Path(args.trace).stat().st_size
+    log_header(f"轨迹 {args.trace}")
+    started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(meta.get("started_at", 0)))
+    print(f"协议 {meta.get('protocol')}  {meta.get('listen')} → {meta.get('upstream')}  录制于 {started}")
+    print(f"包体 {meta.get('payloads')}{'（已清除 token）' if meta.get('redacted') else ''}"
+          f"{'  备注: ' + meta['note'] if meta.get('note') else ''}")
+    print(f"时长 {stats['duration_seconds']:.2f}s，连接 {stats['connections']}，记录 {stats['records']}"
+          f"（峰值 {stats['peak_records_per_s']}/s），文件 {size / 1024:.1f} KB")
+    for direction, label in (("c2s", "client → server"), ("s2c", "server → client")):
+        print(f"\n{label}")
+        print(f"  {'类型':<16}{'数量':>10}{'字节':>14}{'平均':>10}")
+        for name, item in stats[direction].items():
+            print(f"  {name:<16}{item['count']:>10}{item['bytes']:>14}{item['bytes'] / item['count']:>10.0f}")
+    return 0
+
+# ---------- 回放 ----------
+
+class ReplayStats:
+    def __init__(self):
+        self.connections = 0
+        self.failed_connections = 0
+        self.frames_sent = 0
+        self.bytes_sent = 0
+        self.datagrams_sent = 0
+        self.frames_received = Counter()
+        self.bytes_received = 0
+        self.datagrams_received = 0
+        self.handshake_failures = 0
+        self.tunnel_open_failures = 0
+        self.gate_timeouts = 0
+        self.skipped = 0
+        # 最后一次发送距回放开始的秒数（计算实际倍速，不含最后的等待）
+        self.send_span = 0.0
+        self.lag = LatencyHistogram()
+        self.latency = {name: LatencyHistogram() for name in LATENCY_NAMES.values()}
+
+class ConnState:
+    """一条回放连接的响应计数、待响应请求和握手信息"""
+
+    def __init__(self):
+        self.responses = 0
+        self.changed = asyncio.Event()
+        self.pending = {t: deque() for t in RESPONSE_TYPES}
+        self.challenge = None
+        self.secret = None
+        self.raw = False
+
+def plan_connections(records):
+    """按连接分组；为每条 client→server 记录计算回放前需要等到的响应数"""
+    plans = {}
+    for rec in records:
+        plan = plans.get(rec.conn)
+        if plan is None:
+            plan = plans[rec.conn] = {"open_us": rec.t_us, "close_us": None, "sends": [], "responses": 0,
+                                      "datagram": False}
+        if rec.kind == KIND_CLOSE:
+            plan["close_us"] = rec.t_us
+        elif rec.kind == KIND_DATAGRAM:
+            plan["datagram"] = True
+        if rec.s2c:
+            if rec.kind == KIND_FRAME and rec.base_type in RESPONSE_TYPES:
+                plan["responses"] += 1
+        elif rec.kind in (KIND_FRAME, KIND_RAW, KIND_DATAGRAM):
+            plan["sends"].append((rec, plan["responses"]))
+    return plans
+
+def secrets_from_trace(records):
+    """从第一阶段握手的 token 字段收集 {client_id: SecretKey}"""
+    secrets = {}
+    for rec in records:
+        if rec.s2c or rec.kind != KIND_FRAME or rec.base_type != HANDSHAKE or rec.payload is None:
+            continue
+        request = decode_json(rec.payload, rec.ptype)
+        if request and request.get("client_id") and request.get("token") not in (None, "", "new-client"):
+            secrets.setdefault(int(request["client_id"]), request["token"])
+    return secrets
+
+def decode_json(body, ptype):
+    if ptype & ENCRYPTED:
+        return None
+    try:
+        return json.loads(gzip.decompress(body) if ptype & COMPRESSED else body)
+    except (OSError, ValueError):
+        return None
+
+class Replayer:
+    def __init__(self, records, target, speed, secrets, gate_timeout, linger):
+        self.records = records
+        self.target = target
+        self.speed = speed
+        self.secrets = secrets
+        self.gate_timeout = gate_timeout
+        self.linger = linger
+        self.stats = ReplayStats()
+        self.t0 = None
+
+    def due(self, t_us):
+        """记录在回放中的计划时间（monotonic 秒）；--speed max 时立即发送"""
+        return self.t0 if self.speed is None else self.t0 + t_us / 1e6 / self.speed
+
+    async def wait_until(self, t_us):
+        delay = self.due(t_us) - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        elif self.speed is not None:
+            self.stats.lag.record(int(-delay * 1e9))
+
+    async def hold_until(self, t_us):
+        """连接保持到轨迹中的关闭时间（不计入发送滞后）"""
+        if t_us is not None:
+            delay = self.due(t_us) - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    async def run(self):
+        plans = plan_connections(self.records)
+        self.t0 = time.monotonic()
+        tasks = []
+        for conn, plan in plans.items():
+            replay = self.replay_udp if plan["datagram"] else self.replay_tcp
+            tasks.append(asyncio.ensure_future(replay(conn, plan)))
+        await asyncio.gather(*tasks)
+        return time.monotonic() - self.t0
+
+    # ----- TCP -----
+
+    def build_frame(self, rec, state):
+        """重建一个帧；握手第二阶段改用本次收到的 Challenge 计算 challenge_response"""
+        if rec.base_type == HEARTBEAT:
+            return bytes([rec.ptype])
+        body = rec.payload if rec.payload is not None else bytes(rec.length)
+        ptype = rec.ptype
+        if rec.base_type == HANDSHAKE and rec.payload is not None:
+            request = decode_json(rec.payload, rec.ptype)
+            if request is not None:
+                client_id = int(request.get("client_id") or 0)
+                state.secret = self.secrets.get(client_id, state.secret)
+                if "challenge_response" in request:
+                    if state.challenge is None or state.secret is None:
+                        return None
+                    request["challenge_response"] = challenge_response(state.secret, state.challenge)
+                    state.challenge = None
+                    body = json.dumps(request, separators=(",", ":")).encode()
+                    ptype &= ~COMPRESSED
+        return HEADER.pack(ptype, len(body)) + body
+
+    def on_frame(self, frame, state):
+        stats = self.stats
+        stats.frames_received[frame.type_name] += 1
+        base = frame.base_type
+        if base not in RESPONSE_TYPES:
+            return
+        pending = state.pending[base]
+        if pending:
+            stats.latency[LATENCY_NAMES[base]].record(time.perf_counter_ns() - pending.popleft())
+        if base in (HANDSHAKE_RESP, TUNNEL_OPEN_ACK):
+            resp = decode_json(bytes(frame.body), frame.type) or {}
+            if base == HANDSHAKE_RESP:
+                if resp.get("need_response") and resp.get("challenge"):
+                    state.challenge = resp["challenge"]
+                elif not resp.get("success"):
+                    stats.handshake_failures += 1
+            else:
+                if not resp.get("success"):
+                    stats.tunnel_open_failures += 1
+                state.raw = True
+        state.responses += 1
+        state.changed.set()
+
+    async def read_loop(self, reader, state):
+        decoder = FrameDecoder()
+        try:
+            while True:
+                data = await reader.read(RAW_READ_SIZE)
+                if not data:
+                    return
+                self.stats.bytes_received += len(data)
+                if state.raw:
+                    continue
+                decoder.feed(data)
+                try:
+                    for frame in decoder.frames():
+                        self.on_frame(frame, state)
+                        if state.raw:
+                            break
+                except FrameError:
+                    state.raw = True
+                if state.raw:
+                    decoder.take_remaining()
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            # 连接结束后不再等待响应
+            state.responses = float("inf")
+            state.changed.set()
+
+    async def wait_gate(self, state, gate):
+        deadline = time.monotonic() + self.gate_timeout
+        while state.responses < gate:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.stats.gate_timeouts += 1
+                return
+            state.changed.clear()
+            try:
+                await asyncio.wait_for(state.changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    async def replay_tcp(self, conn, plan):
+        stats = self.stats
+        await self.wait_until(plan["open_us"])
+        try:
+            reader, writer = await asyncio.open_connection(*self.target)
+        except OSError:
+            stats.failed_connections += 1
+            return
+        stats.connections += 1
+        writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        state = ConnState()
+        read_task = asyncio.ensure_future(self.read_loop(reader, state))
+        # 服务端没有返回预期的握手第二阶段时跳过的响应数，后续记录的等待数相应减少
+        shift = 0
+        try:
+            for rec, gate in plan["sends"]:
+                await self.wait_gate(state, gate - shift)
+                await self.wait_until(rec.t_us)
+                if rec.kind == KIND_RAW:
+                    data = rec.payload if rec.payload is not None else bytes(rec.length)
+                else:
+                    data = self.build_frame(rec, state)
+                    if data is None:
+                        stats.skipped += 1
+                        shift += 1
+                        continue
+                    response = RESPONSE_OF.get(rec.base_type)
+                    if response is not None:
+                        state.pending[response].append(time.perf_counter_ns())
+                    stats.frames_sent += 1
+                writer.write(data)
+                stats.bytes_sent += len(data)
+                stats.send_span = max(stats.send_span, time.monotonic() - self.t0)
+                await writer.drain()
+            await self.hold_until(plan["close_us"])
+            writer.write_eof()
+            await asyncio.wait_for(read_task, self.linger)
+        except asyncio.TimeoutError:
+            pass
+        except (ConnectionError, OSError):
+            stats.failed_connections += 1
+        finally:
+            read_task.cancel()
+            writer.close()
+
+    # ----- UDP -----
+
+    async def replay_udp(self, conn, plan):
+        stats = self.stats
+        loop = asyncio.get_running_loop()
+        await self.wait_until(plan["open_us"])
+
+        class Counting(asyncio.DatagramProtocol):
+            def datagram_received(self, data, addr):
+                stats.datagrams_received += 1
+                stats.bytes_received += len(data)
+
+        try:
+            transport, _ = await loop.create_datagram_endpoint(Counting, remote_addr=self.target)
+        except OSError:
+            stats.failed_connections += 1
+            return
+        stats.connections += 1
+        try:
+            for rec, _ in plan["sends"]:
+                await self.wait_until(rec.t_us)
+                data = rec.payload if rec.payload is not None else bytes(rec.length)
+                transport.sendto(data)
+                stats.datagrams_sent += 1
+                stats.bytes_sent += len(data)
+                stats.send_span = max(stats.send_span, time.monotonic() - self.t0)
+            await self.hold_until(plan["close_us"])
+            await asyncio.sleep(self.linger)
+        finally:
+            transport.close()
+
+def replay_results(stats, send_us, elapsed, speed):
+    """send_us 为轨迹中最后一条 client→server 记录的时间"""
+    return {
+        "speed": speed or 0,
+        "recorded_seconds": send_us / 1e6,
+        "elapsed_seconds": elapsed,
+        "effective_speed": send_us / 1e6 / stats.send_span if stats.send_span > 0 else 0.0,
+        "connections": stats.connections,
+        "failed_connections": stats.failed_connections,
+        "frames_sent": stats.frames_sent,
+        "datagrams_sent": stats.datagrams_sent,
+        "bytes_sent": stats.bytes_sent,
+        "bytes_received": stats.bytes_received,
+        "datagrams_received": stats.datagrams_received,
+        "send_rate_mb_s": stats.bytes_sent / 1024**2 / stats.send_span if stats.send_span > 0 else 0.0,
+        "frames_received": dict(stats.frames_received),
+        "handshake_failures": stats.handshake_failures,
+        "tunnel_open_failures": stats.tunnel_open_failures,
+        "gate_timeouts": stats.gate_timeouts,
+        "skipped": stats.skipped,
+        "schedule_lag_ms": stats.lag.summary_ms(),
+        "latency_ms": {name: h.summary_ms() for name, h in stats.latency.items() if h.count},
+    }
+
+def print_replay_report(results):
+    log_header("回放结果")
+    speed = f"{results['speed']:g}x" if results["speed"] else "max"
+    print(f"倍速 {speed}：轨迹发送阶段 {results['recorded_seconds']:.2f}s，实际 {results['effective_speed']:.1f}x，"
+          f"回放总耗时 {results['elapsed_seconds']:.2f}s")
+    print(f"连接 {results['connections']}（失败 {results['failed_connections']}），"
+          f"发送帧 {results['frames_sent']}、数据报 {results['datagrams_sent']}，"
+          f"{results['bytes_sent'] / 1024**2:.2f} MB（{results['send_rate_mb_s']:.1f} MB/s），"
+          f"接收 {results['bytes_received'] / 1024**2:.2f} MB")
+    if results["frames_received"]:
+        print("收到的帧: " + "  ".join(f"{name}={n}" for name, n in sorted(results["frames_received"].items())))
+    print(f"握手失败 {results['handshake_failures']}，隧道打开失败 {results['tunnel_open_failures']}，"
+          f"等待响应超时 {results['gate_timeouts']}，跳过 {results['skipped']}")
+    lag = results["schedule_lag_ms"]
+    if lag["count"]:
+        print(f"发送滞后（晚于计划时间）: p50={lag['p50']:.2f}ms p99={lag['p99']:.2f}ms max={lag['max']:.2f}ms")
+    for name, s in results["latency_ms"].items():
+        print(f"{name:<12} 响应延迟: n={s['count']} p50={s['p50']:.2f}ms p99={s['p99']:.2f}ms max={s['max']:.2f}ms")
+
+def parse_speed(text):
+    if text == "max":
+        return None
+    speed = float(text)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError(f"倍速必须大于 0: {text}")
+    return speed
+
+def parse_secret(text):
+    client_id, sep, secret = text.partition("=")
+    if not sep or not client_id.isdigit():
+        raise argparse.ArgumentTypeError(f"格式应为 CLIENT_ID=SECRET_KEY: {text}")
+    return int(client_id), secret
+
+def cmd_replay(args):
+    meta, records = read_trace(args.trace)
+    if not records:
+        log_error("轨迹为空")
+        return 1
+    secrets = secrets_from_trace(records)
+    if args.credentials:
+        secrets.update({c["client_id"]: c["secret_key"] for c in load_credentials(args.credentials)})
+    secrets.update(dict(args.secret or []))
+    if meta.get("payloads") == "none" and meta.get("protocol") == "tcp":
+        log_warning("轨迹未保存控制帧包体，回放的握手和命令为零字节，server 会拒绝这些连接")
+    duration = records[-1].t_us / 1e6
+    speed = f"{args.speed:g}x" if args.speed else "max"
+    log_info(f"回放 {args.trace}（{len(records)} 条记录，{duration:.2f}s）→ {args.target}，倍速 {speed}")
+
+    replayer = Replayer(records, parse_address(args.target), args.speed, secrets, args.gate_timeout, args.linger)
+    elapsed = asyncio.run(replayer.run())
+    send_us = max((r.t_us for r in records if not r.s2c and r.kind in (KIND_FRAME, KIND_RAW, KIND_DATAGRAM)),
+                  default=0)
+    results = replay_results(replayer.stats, send_us, elapsed, args.speed)
+    print_replay_report(results)
+
+    if results["skipped"]:
+        log_warning(f"缺少 SecretKey，跳过了 {results['skipped']} 个握手第二阶段（使用 --credentials 或 --secret 提供）")
+    failed = (results["failed_connections"] + results["handshake_failures"] + results["tunnel_open_failures"]
+              + results["skipped"])
+    if not args.no_store:
+        from results_store import DEFAULT_DB, ResultsStore
+        with ResultsStore(args.results_db or DEFAULT_DB) as store:
+            run_id = store.record_run("replay", results, transport=meta.get("protocol"),
+                                      label=f"{Path(args.trace).name} {speed}", passed=failed == 0)
+        log_info(f"结果已写入结果库 (运行 #{run_id})")
+    if failed:
+        log_warning(f"{failed} 个连接、握手或隧道失败")
+        return 1
+    log_success("回放完成")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="tunnox 流量录制与回放")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("record", help="透明代理并录制轨迹")
+    p.add_argument('--listen', required=True, help='代理监听地址 host:port（客户端的 server 地址改为这里）')
+    p.add_argument('--upstream', required=True, help='真实 server 地址 host:port')
+    p.add_argument('--out', required=True, help='轨迹文件（.gz 结尾时压缩）')
+    p.add_argument('--udp', action='store_true', help='录制 UDP（kcp / quic）：只记录数据报的时间和长度')
+    p.add_argument('--payloads', choices=PAYLOAD_MODES, default='control',
+                   help='保存哪些包体：control 控制帧（默认），none 不保存，all 全部')
+    p.add_argument('--redact', action='store_true', help='清除握手请求中的明文 SecretKey')
+    p.add_argument('--duration', type=float, help='录制时长（秒，默认直到 Ctrl+C）')
+    p.add_argument('--udp-idle', type=float, default=60, help='UDP 流空闲多少秒后视为结束')
+    p.add_argument('--note', help='写入轨迹元数据的备注（如工单号）')
+    p.set_defaults(func=cmd_record)
+
+    p = sub.add_parser("info", help="轨迹统计")
+    p.add_argument('trace')
+    p.set_defaults(func=cmd_info)
+
+    p = sub.add_parser("replay", help="按轨迹驱动 server")
+    p.add_argument('trace')
+    p.add_argument('--target', required=True, help='server 地址 host:port（与录制时协议相同的端口）')
+    p.add_argument('--speed', type=parse_speed, default=1.0, help='倍速：1、10 … 或 max（不等待，尽快发送）')
+    p.add_argument('--credentials', help='客户端凭据 JSON（[{"client_id", "secret_key"}]，与 control_sim.py 相同）')
+    p.add_argument('--secret', type=parse_secret, action='append', metavar='CLIENT_ID=KEY',
+                   help='指定客户端的 SecretKey（可重复，优先于轨迹和 --credentials）')
+    p.add_argument('--gate-timeout', type=float, default=5.0, help='等待对应响应的最长时间（秒）')
+    p.add_argument('--linger', type=float, default=2.0, help='发送完后等待 server 数据的时间（秒）')
+    p.add_argument('--results-db', help='测试结果库路径（默认 ~/tunnox-test/results.db）')
+    p.add_argument('--no-store', action='store_true', help='不把结果写入结果库')
+    p.set_defaults(func=cmd_replay)
+
+    args = parser.parse_args()
+
+    # SIGTERM 与 Ctrl+C 一样走清理流程，录制时保证轨迹文件完整写出
+    def _raise_interrupt(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        log_info("已停止")
+        return 130
+    except (OSError, ValueError) as e:
+        log_error(str(e))
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
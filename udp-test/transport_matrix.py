@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+传输协议对比测试
+
+对每种客户端连接协议（tcp / websocket / quic / kcp）分别启动一次本地回环测试栈，
+通过同一个 MySQL 映射跑完全相同的负载：
+
+1. 延迟：N 个并发连接执行小查询（默认 SELECT 1），统计 p50/p99
+2. 吞吐：N 个并发连接执行大结果集查询（MySQL 替身返回确定的行数），
+   按结果集的线路字节数计算吞吐；此阶段同时采样 server 和两个客户端的 CPU、RSS
+
+最后输出一张对比表：吞吐、p99 延迟、每 GB 数据消耗的 CPU 秒数、RSS 峰值。
+
+用法:
+    ./transport_matrix.py                              # 全部协议
+    ./transport_matrix.py --transports tcp,kcp --duration 20 --connections 16
+    ./transport_matrix.py --out matrix.json
+
+每个协议的结果作为一条 matrix 类型的运行写入结果库（results_store.py）。
+"""
+
+import argparse
+import copy
+import json
+import sys
+from pathlib import Path
+
+from common import CONFIG_FILE, log_info, log_success, log_error, log_header, load_config
+from local_stack import LocalStack, SUPPORTED_TRANSPORTS, DEFAULT_WORK_DIR
+from mysql_load import run_load
+from mysql_standin import parse_columns, result_set_wire_bytes
+from proc_sampler import ProcSampler
+from readiness import ReadinessTracker
+from results_store import DEFAULT_DB, ResultsStore
+
+# 计入隧道开销的进程（不含 MySQL 替身）
+TUNNEL_PROCESSES = ("server", "target-client", "listen-client")
+
+def run_transport(config, transport, connections, duration, rows, latency_sql, sample_interval):
+    """对单个协议启动测试栈并执行延迟 + 吞吐负载，返回一行对比结果"""
+    # 每个协议使用独立的工作目录，保留各自的配置和日志
+    config = copy.deepcopy(config)
+    local_config = config.setdefault("local", {})
+    base_dir = Path(local_config.get("work-dir", DEFAULT_WORK_DIR)).expanduser()
+    local_config["work-dir"] = str(base_dir / "matrix" / transport)
+
+    readiness = ReadinessTracker()
+    stack = LocalStack(config, transport=transport, readiness=readiness)
+    if not stack.mysql_standin["enabled"]:
+        raise RuntimeError("协议对比需要 MySQL 替身服务（local.mysql-standin.enabled）来计算传输字节数")
+    mysql_config = config["listen-client"]["mysql-listen"]
+    throughput_sql = f"SELECT * FROM standin LIMIT {rows}"
+    bytes_per_query = result_set_wire_bytes(parse_columns(stack.mysql_standin["columns"]), rows)
+
+    with stack:
+        stack.start()
+
+        log_header(f"[{transport}] 延迟负载")
+        latency = run_load(mysql_config, connections, duration=duration, sql=latency_sql)
+
+        log_header(f"[{transport}] 吞吐负载")
+        sampler = ProcSampler(
+            lambda: {n: p for n, p in stack.supervisor.pids.items() if n in TUNNEL_PROCESSES},
+            interval=sample_interval,
+        )
+        with sampler:
+            throughput = run_load(mysql_config, connections, duration=duration, sql=throughput_sql)
+
+    resources = sampler.summary()
+    total_bytes = throughput["queries_ok"] * bytes_per_query
+    gigabytes = total_bytes / 1024**3
+    cpu_seconds = sum(r.get("cpu_seconds", 0) for r in resources.values())
+    return {
+        "transport": transport,
+        "ready_seconds": readiness.metrics().get("mysql-listen"),
+        "latency_qps": latency["qps"],
+        "latency_ms": latency["latency_ms"],
+        "latency_errors": latency["queries_failed"],
+        "throughput_mb_s": total_bytes / 1024**2 / throughput["elapsed_seconds"],
+        "throughput_bytes": total_bytes,
+        "throughput_latency_ms": throughput["latency_ms"],
+        "throughput_errors": throughput["queries_failed"],
+        "cpu_seconds": cpu_seconds,
+        "cpu_seconds_per_gb": cpu_seconds / gigabytes if gigabytes > 0 else None,
+        "rss_peak_mb": sum(r.get("rss_peak", 0) for r in resources.values()) / 1024**2,
+        "resources": resources,
+    }
+
+def print_matrix(rows):
+    log_header("传输协议对比")
+    print(f"{'协议':<12}{'吞吐(MB/s)':>12}{'p50(ms)':>10}{'p99(ms)':>10}"
+          f"{'QPS':>10}{'CPU-s/GB':>10}{'RSS(MB)':>10}{'错误':>8}")
+    for r in rows:
+        if "error" in r:
+            print(f"{r['transport']:<12}  失败: {r['error']}")
+            continue
+        cpu_per_gb = f"{r['cpu_seconds_per_gb']:.1f}" if r["cpu_seconds_per_gb"] is not None else "-"
+        p50 = r["latency_ms"].get("p50")
+        p99 = r["latency_ms"].get("p99")
+        print(f"{r['transport']:<12}{r['throughput_mb_s']:>12.1f}"
+              f"{(f'{p50:.2f}' if p50 is not None else '-'):>10}"
+              f"{(f'{p99:.2f}' if p99 is not None else '-'):>10}"
+              f"{r['latency_qps']:>10.0f}{cpu_per_gb:>10}{r['rss_peak_mb']:>10.1f}"
+              f"{r['latency_errors'] + r['throughput_errors']:>8}")
+    print("\n延迟为小查询的 p50/p99；CPU-s/GB 与 RSS 为吞吐阶段 server + 两个客户端的合计。")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Tunnox 传输协议对比测试（本地回环）")
+    parser.add_argument('--config', default=str(CONFIG_FILE), help='配置文件路径')
+    parser.add_argument('--transports', default=",".join(SUPPORTED_TRANSPORTS),
+                        help='逗号分隔的协议列表')
+    parser.add_argument('--connections', type=int, default=8, help='并发连接数')
+    parser.add_argument('--duration', type=float, default=15, help='每个负载阶段的时长（秒）')
+    parser.add_argument('--rows', type=int, default=10000, help='吞吐阶段每次查询返回的行数')
+    parser.add_argument('--latency-sql', default="SELECT 1", help='延迟阶段执行的 SQL')
+    parser.add_argument('--sample-interval', type=float, default=0.2, help='资源采样间隔（秒）')
+    parser.add_argument('--skip-build', action='store_true', help='跳过编译，直接使用 bin/ 下已有的二进制')
+    parser.add_argument('--rebuild', action='store_true', help='忽略构建缓存，强制重新编译')
+    parser.add_argument('--out', help='将对比结果保存为 JSON 文件')
+    parser.add_argument('--results-db', default=str(DEFAULT_DB), help='测试结果库（SQLite）路径')
+    parser.add_argument('--no-store', action='store_true', help='不把结果写入结果库')
+    parser.add_argument('--label', help='写入结果库时附加的标签')
+    return parser.parse_args()
+
+def main():
+    args = parse_args()
+    transports = [t.strip() for t in args.transports.split(",") if t.strip()]
+    for t in transports:
+        if t not in SUPPORTED_TRANSPORTS:
+            log_error(f"不支持的协议: {t} (可选: {', '.join(SUPPORTED_TRANSPORTS)})")
+            return 1
+
+    config = load_config(args.config)
+    if not args.skip_build:
+        from integration_test import build_binaries
+        build_binaries(local=True, force=args.rebuild)
+
+    rows = []
+    try:
+        for transport in transports:
+            log_header(f"协议: {transport}")
+            try:
+                rows.append(run_transport(config, transport, args.connections, args.duration,
+                                          args.rows, args.latency_sql, args.sample_interval))
+            except Exception as e:
+                log_error(f"{transport} 测试失败: {e}")
+                rows.append({"transport": transport, "error": str(e)})
+    except KeyboardInterrupt:
+        log_error("测试被用户中断")
+        return 130
+
+    print_matrix(rows)
+    if args.out:
+        path = Path(args.out)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(rows, indent=2, ensure_ascii=False))
+        log_info(f"结果已保存: {path}")
+    if not args.no_store:
+        # 每个协议一条运行记录，便于按协议与基线比较
+        with ResultsStore(args.results_db) as store:
+            for r in rows:
+                if "error" not in r:
+                    run_id = store.record_run("matrix", r, transport=r["transport"], config=config,
+                                              label=args.label, passed=True)
+                    log_info(f"{r['transport']} 结果已写入结果库 (运行 #{run_id})")
+
+    if any("error" in r for r in rows):
+        return 1
+    log_success("协议对比完成")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
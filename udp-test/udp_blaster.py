@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+UDP 映射发包测试
+
+多进程发送端按目标 pps 向 UDP 映射发包，多进程接收端（SO_REUSEPORT）在映射目标端收包。
+每个数据报带有头部：
+
+    run_id(u32) sender(u16) reserved(u16) seq(u64) send_ns(u64)   共 24 字节，其余填充到指定大小
+
+接收端按发送端逐个跟踪序号，统计：
+- 实际发送 / 接收 pps 与带宽
+- 单向延迟分布（接收时刻 - 发送时刻，两端须在同一主机，使用 CLOCK_MONOTONIC）
+- 丢包、重复、乱序（包数与最大乱序深度：比已收到的最大序号小多少）
+
+包大小可以扫描（默认 64 ~ 1400 字节），每个大小输出一行结果。
+
+用法:
+    ./udp_blaster.py --local --pps 50000 --sizes 64,512,1400 --duration 10
+    ./udp_blaster.py --target 127.0.0.1:9995 --receiver-port 19500 --senders 4 --pps 200000
+"""
+
+import argparse
+import multiprocessing
+import socket
+import struct
+import sys
+import time
+from pathlib import Path
+
+from common import (
+    CONFIG_FILE, log_info, log_success, log_warning, log_error, log_header, load_config, parse_address,
+)
+from histogram import LatencyHistogram
+from local_stack import add_cluster_arguments, add_impair_arguments, network_label
+
+HEADER = struct.Struct(">IHHQQ")
+MIN_SIZE = HEADER.size
+DEFAULT_SIZES = (64, 128, 256, 512, 1024, 1400)
+SOCKET_BUFFER = 8 * 1024 * 1024
+# 单个发送端每轮最多连续发送的包数，避免落后时长时间占用 CPU 不检查截止时间
+MAX_BURST = 256
+WARMUP_RUN_ID = 0
+
+clock_ns = time.monotonic_ns
+
+# ---------- 接收端 ----------
+
+class SenderTrack:
+    """单个发送端的序号跟踪"""
+
+    __slots__ = ("seen", "received", "duplicates", "reordered", "max_depth", "max_seq")
+
+    def __init__(self):
+        self.seen = bytearray()
+        self.received = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.max_depth = 0
+        self.max_seq = -1
+
+    def add(self, seq):
+        if seq >= len(self.seen):
+            self.seen.extend(bytes(max(seq + 1 - len(self.seen), len(self.seen))))
+        if self.seen[seq]:
+            self.duplicates += 1
+            return False
+        self.seen[seq] = 1
+        self.received += 1
+        if seq < self.max_seq:
+            self.reordered += 1
+            self.max_depth = max(self.max_depth, self.max_seq - seq)
+        else:
+            self.max_seq = seq
+        return True
+
+class RunStats:
+    """一次运行（run_id）在单个接收进程中的统计"""
+
+    def __init__(self):
+        self.senders = {}
+        self.latency = LatencyHistogram()
+        self.bytes = 0
+        self.first_ns = None
+        self.last_ns = None
+
+    def to_dict(self):
+        return {
+            "senders": {
+                sid: {"received": t.received, "duplicates": t.duplicates,
+                      "reordered": t.reordered, "max_depth": t.max_depth}
+                for sid, t in self.senders.items()
+            },
+            "latency": self.latency.encode(),
+            "bytes": self.bytes,
+            "first_ns": self.first_ns,
+            "last_ns": self.last_ns,
+        }
+
+def receiver_main(host, port, control):
+    """接收进程：收包直到收到 stop；收到 ("report", run_id) 时返回并清除该运行的统计"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER)
+    sock.bind((host, port))
+    sock.settimeout(0.05)
+    control.send("ready")
+
+    runs = {}
+    buf = bytearray(65536)
+    unpack = HEADER.unpack_from
+    while True:
+        if control.poll():
+            cmd = control.recv()
+            if cmd == "stop":
+                break
+            _, run_id = cmd
+            stats = runs.pop(run_id, None)
+            control.send(stats.to_dict() if stats else None)
+            continue
+        try:
+            n = sock.recv_into(buf)
+        except socket.timeout:
+            continue
+        now = clock_ns()
+        if n < MIN_SIZE:
+            continue
+        run_id, sender, _, seq, sent_ns = unpack(buf)
+        stats = runs.get(run_id)
+        if stats is None:
+            stats = runs[run_id] = RunStats()
+        track = stats.senders.get(sender)
+        if track is None:
+            track = stats.senders[sender] = SenderTrack()
+        if track.add(seq):
+            stats.latency.record(now - sent_ns)
+            stats.bytes += n
+            if stats.first_ns is None:
+                stats.first_ns = now
+            stats.last_ns = now
+    sock.close()
+
+class ReceiverPool:
+    """一组 SO_REUSEPORT 接收进程"""
+
+    def __init__(self, host, port, processes):
+        self.host = host
+        self.port = port
+        self.workers = []
+        for _ in range(processes):
+            parent, child = multiprocessing.Pipe()
+            proc = multiprocessing.Process(target=receiver_main, args=(host, port, child), daemon=True)
+            self.workers.append((proc, parent))
+
+    def start(self):
+        for proc, pipe in self.workers:
+            proc.start()
+            if not pipe.poll(5):
+                raise RuntimeError("接收进程启动超时")
+            pipe.recv()
+        log_info(f"接收端: {len(self.workers)} 个进程监听 {self.host}:{self.port}")
+        return self
+
+    def collect(self, run_id):
+        """汇总所有接收进程中 run_id 的统计"""
+        for _, pipe in self.workers:
+            pipe.send(("report", run_id))
+        merged = {"senders": {}, "latency": LatencyHistogram(), "bytes": 0, "first_ns": None, "last_ns": None}
+        for _, pipe in self.workers:
+            part = pipe.recv()
+            if part is None:
+                continue
+            merged["latency"].merge(LatencyHistogram.decode(part["latency"]))
+            merged["bytes"] += part["bytes"]
+            for sid, s in part["senders"].items():
+                m = merged["senders"].setdefault(sid, {"received": 0, "duplicates": 0, "reordered": 0, "max_depth": 0})
+                m["received"] += s["received"]
+                m["duplicates"] += s["duplicates"]
+                m["reordered"] += s["reordered"]
+                m["max_depth"] = max(m["max_depth"], s["max_depth"])
+            for key, pick in (("first_ns", min), ("last_ns", max)):
+                if part[key] is not None:
+                    merged[key] = part[key] if merged[key] is None else pick(merged[key], part[key])
+        return merged
+
+    def stop(self):
+        for proc, pipe in self.workers:
+            try:
+                pipe.send("stop")
+            except (BrokenPipeError, OSError):
+                pass
+        for proc, _ in self.workers:
+            proc.join(timeout=2)
+            if proc.is_alive():
+                proc.terminate()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+# ---------- 发送端 ----------
+
+def sender_main(target, run_id, sender_id, size, pps, duration, start_at, result):
+    """发送进程：按 pps 均匀发包，返回成功发出的包数和本地发送错误数（失败的包不计入发送数）"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+    sock.connect(target)
+    packet = bytearray(size)
+    pack_into = HEADER.pack_into
+    send = sock.send
+    errors = 0
+    sent = 0
+    # attempts 用于节奏控制和序号，sent 只统计 send 成功的包
+    attempts = 0
+
+    while time.monotonic() < start_at:
+        time.sleep(0.001)
+    start_ns = clock_ns()
+    end_ns = start_ns + int(duration * 1e9)
+    interval_ns = 1e9 / pps
+    while True:
+        now = clock_ns()
+        if now >= end_ns:
+            break
+        due = int((now - start_ns) / interval_ns) + 1
+        burst = min(due - attempts, MAX_BURST)
+        if burst <= 0:
+            time.sleep(min((attempts - due + 1) * interval_ns / 1e9, 0.001))
+            continue
+        for _ in range(burst):
+            pack_into(packet, 0, run_id, sender_id, 0, attempts, clock_ns())
+            attempts += 1
+            try:
+                send(packet)
+            except (BlockingIOError, ConnectionRefusedError, OSError):
+                errors += 1
+                continue
+            sent += 1
+    elapsed = (clock_ns() - start_ns) / 1e9
+    result.put((sender_id, sent, errors, elapsed))
+    sock.close()
+
+def run_senders(target, run_id, senders, size, pps, duration):
+    """启动多个发送进程，返回 {sender_id: (sent, errors, elapsed)}"""
+    queue = multiprocessing.Queue()
+    start_at = time.monotonic() + 0.2
+    procs = [
+        multiprocessing.Process(
+            target=sender_main,
+            args=(target, run_id, i, size, pps / senders, duration, start_at, queue),
+            daemon=True,
+        )
+        for i in range(senders)
+    ]
+    for p in procs:
+        p.start()
+    results = {}
+    for _ in procs:
+        sender_id, sent, errors, elapsed = queue.get(timeout=duration + 30)
+        results[sender_id] = (sent, errors, elapsed)
+    for p in procs:
+        p.join()
+    return results
+
+# ---------- 测试流程 ----------
+
+def warmup(target, receivers, timeout=30):
+    """低速发包直到接收端收到，确认映射已经打通（UDP 映射没有可 accept 的端口）"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    packet = bytearray(MIN_SIZE)
+    deadline = time.monotonic() + timeout
+    seq = 0
+    try:
+        while time.monotonic() < deadline:
+            HEADER.pack_into(packet, 0, WARMUP_RUN_ID, 0, 0, seq, clock_ns())
+            sock.sendto(packet, target)
+            seq += 1
+            time.sleep(0.1)
+            if receivers.collect(WARMUP_RUN_ID)["senders"]:
+                return True
+    finally:
+        sock.close()
+    return False
+
+def run_size(target, receivers, run_id, senders, size, pps, duration, drain):
+    """以指定包大小运行一轮，返回结果"""
+    sent_info = run_senders(target, run_id, senders, size, pps, duration)
+    time.sleep(drain)
+    got = receivers.collect(run_id)
+
+    total_sent = sum(s for s, _, _ in sent_info.values())
+    send_errors = sum(e for _, e, _ in sent_info.values())
+    send_elapsed = max(el for _, _, el in sent_info.values())
+    received = sum(s["received"] for s in got["senders"].values())
+    duplicates = sum(s["duplicates"] for s in got["senders"].values())
+    reordered = sum(s["reordered"] for s in got["senders"].values())
+    max_depth = max((s["max_depth"] for s in got["senders"].values()), default=0)
+    recv_span = ((got["last_ns"] - got["first_ns"]) / 1e9) if got["first_ns"] is not None else 0.0
+    latency = got["latency"]
+    return {
+        "size": size,
+        "target_pps": pps,
+        "senders": senders,
+        "sent": total_sent,
+        "send_errors": send_errors,
+        "sent_pps": total_sent / send_elapsed if send_elapsed > 0 else 0.0,
+        "received": received,
+        "received_pps": received / recv_span if recv_span > 0 else 0.0,
+        "received_mbit_s": got["bytes"] * 8 / 1e6 / recv_span if recv_span > 0 else 0.0,
+        # 丢包率只按实际发出的包计算，本地发送错误单独计入 send_errors
+        "loss_rate": max(total_sent - received, 0) / total_sent if total_sent else 0.0,
+        "duplicates": duplicates,
+        "reordered": reordered,
+        "reorder_rate": reordered / received if received else 0.0,
+        "max_reorder_depth": max_depth,
+        "latency_ms": latency.summary_ms(),
+        "latency_histogram": latency.encode(),
+    }
+
+def run_sweep(target, receiver_addr, args):
+    results = []
+    with ReceiverPool(receiver_addr[0], receiver_addr[1], args.receivers) as receivers:
+        if not warmup(target, receivers):
+            raise RuntimeError(f"预热超时：接收端没有收到经 {target[0]}:{target[1]} 转发的数据包")
+        log_success("UDP 映射已打通")
+        for run_id, size in enumerate(args.sizes, start=1):
+            log_info(f"包大小 {size} 字节，目标 {args.pps:.0f} pps，{args.senders} 个发送进程，{args.duration}s")
+            results.append(run_size(target, receivers, run_id, args.senders, size, args.pps,
+                                    args.duration, args.drain))
+    return results
+
+def print_report(results):
+    log_header("UDP 映射发包结果")
+    print(f"{'大小':>6}{'发送pps':>11}{'接收pps':>11}{'Mbit/s':>9}{'丢包':>8}{'重复':>7}{'乱序':>8}{'深度':>6}"
+          f"{'p50(ms)':>9}{'p99(ms)':>9}{'p99.9(ms)':>10}{'max(ms)':>9}")
+    for r in results:
+        lat = r["latency_ms"]
+        cells = [f"{lat[k]:.2f}" if lat.get(k) is not None else "-" for k in ("p50", "p99", "p99.9", "max")]
+        print(f"{r['size']:>6}{r['sent_pps']:>11.0f}{r['received_pps']:>11.0f}{r['received_mbit_s']:>9.1f}"
+              f"{r['loss_rate'] * 100:>7.2f}%{r['duplicates']:>7}{r['reorder_rate'] * 100:>7.2f}%"
+              f"{r['max_reorder_depth']:>6}{cells[0]:>9}{cells[1]:>9}{cells[2]:>10}{cells[3]:>9}")
+    errors = sum(r["send_errors"] for r in results)
+    if errors:
+        log_warning(f"发送端 sendto 失败 {errors} 次（通常是本机发送缓冲区满，不计入发送数和丢包率）")
+
+def run_local(config, args):
+    from local_stack import LocalStack, cluster_options, find_free_port
+
+    stack = LocalStack(config, transport=args.transport, **cluster_options(args))
+    with stack:
+        stack.start_tunnel()
+        receiver_port = args.receiver_port or find_free_port("udp")
+        listen_port = args.listen_port or find_free_port("udp")
+        stack.create_mapping("udp-blast", "udp", listen_port, "127.0.0.1", receiver_port)
+        results = run_sweep(("127.0.0.1", listen_port), ("127.0.0.1", receiver_port), args)
+    # 损伤代理的最终计数在测试栈停止后才写出
+    return stack.transport, results, stack.impair_summary
+
+def parse_sizes(text):
+    sizes = [int(s) for s in text.split(",") if s.strip()]
+    for s in sizes:
+        if not MIN_SIZE <= s <= 65507:
+            raise argparse.ArgumentTypeError(f"包大小须在 {MIN_SIZE} ~ 65507 之间: {s}")
+    return sizes
+
+def main():
+    parser = argparse.ArgumentParser(description="UDP 映射发包测试（丢包、乱序、重复、单向延迟）")
+    parser.add_argument('--config', default=str(CONFIG_FILE), help='配置文件路径（--local 时读取 local 段）')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--target', help='UDP 映射的本地地址 host:port（映射目标须指向 --receiver-port）')
+    target.add_argument('--local', action='store_true', help='启动本地栈并新建 UDP 映射')
+    parser.add_argument('--transport', choices=['tcp', 'websocket', 'quic', 'kcp'], help='本地模式的连接协议')
+    parser.add_argument('--receiver-port', type=int, help='接收端端口（--target 模式必填）')
+    parser.add_argument('--listen-port', type=int, help='本地模式映射监听端口（默认自动分配）')
+    parser.add_argument('--pps', type=float, default=20000, help='目标发包速率（所有发送进程合计）')
+    parser.add_argument('--sizes', type=parse_sizes, default=list(DEFAULT_SIZES),
+                        help='逗号分隔的包大小列表（字节）')
+    parser.add_argument('--duration', type=float, default=5, help='每个包大小的发送时长（秒）')
+    parser.add_argument('--senders', type=int, default=2, help='发送进程数（每个进程是一个独立的 UDP 会话）')
+    parser.add_argument('--receivers', type=int, default=2, help='接收进程数（SO_REUSEPORT）')
+    parser.add_argument('--drain', type=float, default=1.0, help='发送结束后等待在途数据包的时间（秒）')
+    parser.add_argument('--results-db', help='测试结果库路径（默认 ~/tunnox-test/results.db）')
+    parser.add_argument('--no-store', action='store_true', help='不把结果写入结果库')
+    add_cluster_arguments(parser)
+    add_impair_arguments(parser)
+    args = parser.parse_args()
+
+    config = {}
+    try:
+        if args.local:
+            config = load_config(args.config) if Path(args.config).exists() else {}
+            transport, results, impairment = run_local(config, args)
+        else:
+            if not args.receiver_port:
+                parser.error("--target 模式需要 --receiver-port")
+            transport, impairment = None, None
+            results = run_sweep(parse_address(args.target), ("0.0.0.0", args.receiver_port), args)
+    except KeyboardInterrupt:
+        log_error("测试被用户中断")
+        return 130
+
+    print_report(results)
+    if not args.no_store:
+        from results_store import DEFAULT_DB, ResultsStore
+        metrics = {f"size_{r['size']}": r for r in results}
+        if impairment:
+            metrics["impairment"] = impairment
+        with ResultsStore(args.results_db or DEFAULT_DB) as store:
+            run_id = store.record_run("udp", metrics, transport=transport, config=config, label=network_label(args),
+                                      passed=all(r["received"] > 0 for r in results))
+        log_info(f"结果已写入结果库 (运行 #{run_id})")
+    empty = [str(r["size"]) for r in results if r["received"] == 0]
+    if empty:
+        log_error(f"接收端没有收到数据包（包大小 {', '.join(empty)}）")
+        return 1
+    log_success("UDP 发包测试完成")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+UDP echo 目标服务
+
+原样回显收到的每个数据报，作为 UDP 映射、SOCKS5 UDP ASSOCIATE 等测试的目标端。
+
+用法:
+    ./udp_echo.py --port 19100
+"""
+
+import argparse
+import asyncio
+import signal
+import socket
+import sys
+
+SOCKET_BUFFER = 4 * 1024 * 1024
+
+class EchoProtocol(asyncio.DatagramProtocol):
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.transport.sendto(data, addr)
+
+async def serve(host, port):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+    sock.bind((host, port))
+    loop = asyncio.get_running_loop()
+    transport, _ = await loop.create_datagram_endpoint(EchoProtocol, sock=sock)
+    stop = loop.create_future()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set_result, None)
+    try:
+        await stop
+    finally:
+        transport.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="UDP echo 目标服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, required=True)
+    args = parser.parse_args()
+
+    print(f"UDP echo 监听 {args.host}:{args.port}", flush=True)
+    asyncio.run(serve(args.host, args.port))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
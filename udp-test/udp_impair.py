@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+UDP 网络损伤代理（用户态，不需要 root 和 tc）
+
+放在客户端和 server 的 UDP 端口（kcp / quic）之间，按客户端地址区分流，每条流使用一个连接到 server 的 socket。
+两个方向各自模拟一条链路：up 为 client→server，down 为 server→client。
+
+- delay / jitter：单向固定时延（毫秒）与正态分布抖动；抖动不改变包的先后顺序
+- loss：独立（Bernoulli）丢包概率
+- burst：Gilbert-Elliott 突发丢包，burst=P_GB/P_BG[/BAD_LOSS]，每个包按概率在好 / 坏状态间转移，
+  坏状态下丢包概率为 BAD_LOSS（默认 1），好状态下为 loss；平均突发长度约 1/P_BG 个包
+- reorder / reorder-gap：按概率把包额外延后 reorder-gap 毫秒（默认 10），其后的包先于它到达
+- duplicate：按概率复制一份
+- rate / queue：链路速率（kbit/s）与队列长度（毫秒），排队超过 queue 的包被丢弃（尾丢弃）
+
+参数写成 '预设,键=值,...'，概率可以写成百分数；键加 up. / down. 前缀时只作用于一个方向：
+    wan
+    wan,loss=2%
+    delay=20,jitter=5,burst=0.01/0.25,rate=10000
+    mobile,up.rate=2000,down.rate=20000
+
+同一方向的所有流共享一条链路（丢包状态机、速率与队列），计数器按流分别统计。
+--stats-file 每秒和退出时写出 JSON（参数、各方向合计、各流计数），local_stack 在本地模式下读取它。
+
+用法:
+    ./udp_impair.py --listen 127.0.0.1:18000 --upstream 127.0.0.1:8000 --profile wan
+    ./udp_impair.py --listen 127.0.0.1:18000 --upstream 127.0.0.1:8000 --profile "lossy,loss=1%" --stats 5
+    ./udp_impair.py --list-profiles
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import signal
+import socket
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+from common import parse_address
+
+# 单向时延（毫秒），预设只描述链路特征，具体数值可以用 键=值 覆盖
+PROFILES = {
+    "clean": {},
+    "lan": {"delay": 0.5, "jitter": 0.1},
+    "broadband": {"delay": 10, "jitter": 2, "loss": 0.001},
+    "wan": {"delay": 40, "jitter": 5, "loss": 0.005, "reorder": 0.001},
+    "lossy": {"delay": 30, "jitter": 8, "loss": 0.01, "burst": (0.005, 0.3, 0.5)},
+    "mobile": {"delay": 60, "jitter": 25, "loss": 0.005, "burst": (0.01, 0.2, 0.6), "rate": 5000},
+    "satellite": {"delay": 300, "jitter": 10, "loss": 0.002, "rate": 20000, "queue": 500},
+}
+
+DEFAULTS = {
+    "delay": 0.0, "jitter": 0.0, "loss": 0.0, "burst": None, "reorder": 0.0, "reorder-gap": 10.0,
+    "duplicate": 0.0, "rate": 0.0, "queue": 100.0,
+}
+PROBABILITY_KEYS = ("loss", "reorder", "duplicate")
+DIRECTIONS = ("up", "down")
+COUNTER_KEYS = ("packets", "bytes", "forwarded", "lost", "burst_lost", "queue_dropped", "reordered",
+                "duplicated", "send_errors")
+
+MAX_DATAGRAM = 65535
+# 每次可读回调最多读取的数据报数，避免一个方向长时间占用事件循环
+READ_BATCH = 64
+
+def _parse_number(key, text):
+    text = text.strip()
+    value = float(text[:-1]) / 100 if text.endswith("%") else float(text)
+    if value < 0 or (key in PROBABILITY_KEYS and value > 1):
+        raise ValueError(f"{key} 取值无效: {text}")
+    return value
+
+def _parse_burst(text):
+    parts = [_parse_number("burst", p) for p in text.split("/")]
+    if len(parts) not in (2, 3) or any(p > 1 for p in parts):
+        raise ValueError(f"burst 格式应为 P_GB/P_BG[/BAD_LOSS]: {text}")
+    return tuple(parts) if len(parts) == 3 else (parts[0], parts[1], 1.0)
+
+def parse_spec(spec):
+    """'预设,键=值,...' → {"up": 参数, "down": 参数}"""
+    items = [item.strip() for item in (spec or "clean").split(",") if item.strip()]
+    base = {}
+    if items and "=" not in items[0]:
+        name = items.pop(0)
+        if name not in PROFILES:
+            raise ValueError(f"未知的预设: {name}（可选: {', '.join(PROFILES)}）")
+        base = PROFILES[name]
+    params = {d: {**DEFAULTS, **base} for d in DIRECTIONS}
+    for item in items:
+        key, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"参数格式应为 键=值: {item}")
+        directions = DIRECTIONS
+        prefix, dot, rest = key.partition(".")
+        if dot and prefix in DIRECTIONS:
+            directions, key = (prefix,), rest
+        if key not in DEFAULTS:
+            raise ValueError(f"未知的参数: {key}（可选: {', '.join(DEFAULTS)}）")
+        parsed = _parse_burst(value) if key == "burst" else _parse_number(key, value)
+        for d in directions:
+            params[d][key] = parsed
+    return params
+
+def describe(params):
+    """单个方向参数的简短描述"""
+    parts = []
+    if params["delay"] or params["jitter"]:
+        parts.append(f"{params['delay']:g}±{params['jitter']:g}ms")
+    if params["loss"]:
+        parts.append(f"丢包 {params['loss'] * 100:g}%")
+    if params["burst"]:
+        p_gb, p_bg, bad = params["burst"]
+        parts.append(f"突发 {p_gb:g}/{p_bg:g}/{bad:g}")
+    if params["reorder"]:
+        parts.append(f"乱序 {params['reorder'] * 100:g}%(+{params['reorder-gap']:g}ms)")
+    if params["duplicate"]:
+        parts.append(f"重复 {params['duplicate'] * 100:g}%")
+    if params["rate"]:
+        parts.append(f"{params['rate']:g}kbit/s 队列 {params['queue']:g}ms")
+    return " ".join(parts) or "无损伤"
+
+class Link:
+    """一个方向的链路模型：丢包状态机、速率与队列、时延与乱序"""
+
+    def __init__(self, params, rng):
+        self.rng = rng
+        self.delay = params["delay"] / 1000
+        self.jitter = params["jitter"] / 1000
+        self.loss = params["loss"]
+        self.burst = params["burst"]
+        self.reorder = params["reorder"]
+        self.reorder_gap = params["reorder-gap"] / 1000
+        self.duplicate = params["duplicate"]
+        # kbit/s → 秒/字节
+        self.byte_time = 8 / (params["rate"] * 1000) if params["rate"] else 0.0
+        self.queue = params["queue"] / 1000
+        self.bad = False
+        self.free_at = 0.0
+        self.last_departure = 0.0
+        self.max_queue_delay = 0.0
+        # 没有任何损伤时直接转发，不经过定时器
+        self.passthrough = not any((self.delay, self.jitter, self.loss, self.burst, self.reorder,
+                                    self.duplicate, self.byte_time))
+
+    def schedule(self, size, now, counters):
+        """返回该包的发送时刻列表（空列表表示丢弃），同时更新流的计数器"""
+        counters["packets"] += 1
+        counters["bytes"] += size
+        rng = self.rng
+        if self.burst:
+            p_gb, p_bg, bad_loss = self.burst
+            if self.bad:
+                self.bad = rng.random() >= p_bg
+            else:
+                self.bad = rng.random() < p_gb
+            if self.bad and rng.random() < bad_loss:
+                counters["burst_lost"] += 1
+                return []
+        # 坏状态只按 BAD_LOSS 丢包，独立丢包只作用于好状态
+        if self.loss and not self.bad and rng.random() < self.loss:
+            counters["lost"] += 1
+            return []
+
+        t = now
+        if self.byte_time:
+            start = max(now, self.free_at)
+            if start - now > self.queue:
+                counters["queue_dropped"] += 1
+                return []
+            self.max_queue_delay = max(self.max_queue_delay, start - now)
+            self.free_at = start + size * self.byte_time
+            t = self.free_at
+        t += max(self.delay + (rng.gauss(0, self.jitter) if self.jitter else 0.0), 0.0)
+        if self.reorder and rng.random() < self.reorder:
+            counters["reordered"] += 1
+            t += self.reorder_gap
+        else:
+            # 抖动只改变间隔，不让包越过前一个包
+            t = max(t, self.last_departure)
+            self.last_departure = t
+        times = [t]
+        if self.duplicate and rng.random() < self.duplicate:
+            counters["duplicated"] += 1
+            times.append(t)
+        counters["forwarded"] += len(times)
+        return times
+
+class Flow:
+    def __init__(self, name, sock):
+        self.name = name
+        self.sock = sock
+        self.counters = {d: Counter() for d in DIRECTIONS}
+        self.last = time.monotonic()
+
+def rates(counters):
+    """计数器 → 字典，附加丢弃率"""
+    result = {key: counters.get(key, 0) for key in COUNTER_KEYS}
+    dropped = result["lost"] + result["burst_lost"] + result["queue_dropped"]
+    result["loss_rate"] = dropped / result["packets"] if result["packets"] else 0.0
+    return result
+
+class ImpairProxy:
+    def __init__(self, listen, upstream, params, seed=None, idle_timeout=120, quiet=False):
+        self.listen = listen
+        self.upstream = upstream
+        self.params = params
+        rng = random.Random(seed)
+        self.links = {d: Link(params[d], random.Random(rng.random())) for d in DIRECTIONS}
+        self.idle_timeout = idle_timeout
+        self.quiet = quiet
+        self.flows = {}
+        self.loop = None
+        self.sock = None
+        self.started = None
+
+    def log(self, msg):
+        if not self.quiet:
+            print(f"[udp-impair] {msg}", flush=True)
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.sock.bind(self.listen)
+        self.sock.setblocking(False)
+        self.loop.add_reader(self.sock.fileno(), self._on_client_readable)
+        self.started = time.monotonic()
+        # 就绪日志由 local_stack 的 log_line_probe 匹配，必须输出
+        print(f"[udp-impair] 已启动 {self.listen[0]}:{self.listen[1]} → {self.upstream[0]}:{self.upstream[1]}",
+              flush=True)
+        for d in DIRECTIONS:
+            self.log(f"{d:<4} {describe(self.params[d])}")
+
+    def close(self):
+        if self.sock is None:
+            return
+        self.loop.remove_reader(self.sock.fileno())
+        self.sock.close()
+        self.sock = None
+        for flow in self.flows.values():
+            self._close_flow(flow)
+
+    # ----- 转发 -----
+
+    def _open_flow(self, addr):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        sock.connect(self.upstream)
+        sock.setblocking(False)
+        flow = Flow(f"{addr[0]}:{addr[1]}", sock)
+        self.flows[addr] = flow
+        self.loop.add_reader(sock.fileno(), self._on_upstream_readable, flow, addr)
+        self.log(f"新流 {flow.name}")
+        return flow
+
+    def _close_flow(self, flow):
+        if flow.sock is not None:
+            self.loop.remove_reader(flow.sock.fileno())
+            flow.sock.close()
+            flow.sock = None
+
+    def _on_client_readable(self):
+        for _ in range(READ_BATCH):
+            try:
+                data, addr = self.sock.recvfrom(MAX_DATAGRAM)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # 转发目标不可达时内核回报的 ICMP 错误，忽略
+                continue
+            flow = self.flows.get(addr)
+            if flow is None or flow.sock is None:
+                flow = self._open_flow(addr)
+            flow.last = time.monotonic()
+            self._forward(self.links["up"], flow.counters["up"], data, self._send_up, flow)
+
+    def _on_upstream_readable(self, flow, addr):
+        for _ in range(READ_BATCH):
+            if flow.sock is None:
+                return
+            try:
+                data = flow.sock.recv(MAX_DATAGRAM)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                continue
+            flow.last = time.monotonic()
+            self._forward(self.links["down"], flow.counters["down"], data, self._send_down, addr, flow)
+
+    def _forward(self, link, counters, data, send, *target):
+        if link.passthrough:
+            counters["packets"] += 1
+            counters["bytes"] += len(data)
+            counters["forwarded"] += 1
+            send(data, counters, *target)
+            return
+        now = self.loop.time()
+        for t in link.schedule(len(data), now, counters):
+            if t <= now:
+                send(data, counters, *target)
+            else:
+                self.loop.call_at(t, send, data, counters, *target)
+
+    def _send_up(self, data, counters, flow):
+        try:
+            flow.sock.send(data)
+        except (OSError, AttributeError):
+            # 发送缓冲区满、server 不可达，或流已因空闲关闭
+            counters["send_errors"] += 1
+
+    def _send_down(self, data, counters, addr, flow):
+        try:
+            self.sock.sendto(data, addr)
+        except (OSError, AttributeError):
+            counters["send_errors"] += 1
+
+    def expire_idle(self):
+        now = time.monotonic()
+        for flow in self.flows.values():
+            if flow.sock is not None and now - flow.last > self.idle_timeout:
+                self.log(f"流 {flow.name} 空闲 {self.idle_timeout:g}s，关闭")
+                self._close_flow(flow)
+
+    # ----- 统计 -----
+
+    def snapshot(self):
+        totals = {d: Counter() for d in DIRECTIONS}
+        flows = []
+        for flow in self.flows.values():
+            for d in DIRECTIONS:
+                totals[d].update(flow.counters[d])
+            flows.append({"name": flow.name, **{d: rates(flow.counters[d]) for d in DIRECTIONS}})
+        result = {"elapsed_seconds": time.monotonic() - self.started, "flows_total": len(flows)}
+        for d in DIRECTIONS:
+            result[d] = {**rates(totals[d]), "max_queue_ms": self.links[d].max_queue_delay * 1000}
+        return {
+            "params": {d: {k: v for k, v in self.params[d].items() if v} for d in DIRECTIONS},
+            "totals": result,
+            "flows": flows,
+        }
+
+    def stats_line(self):
+        totals = self.snapshot()["totals"]
+        parts = []
+        for d in DIRECTIONS:
+            t = totals[d]
+            parts.append(f"{d} {t['packets']} 包 丢弃 {t['loss_rate'] * 100:.2f}% 乱序 {t['reordered']} "
+                         f"重复 {t['duplicated']}")
+        return f"{len(self.flows)} 条流  " + "  ".join(parts)
+
+    def print_flows(self):
+        snap = self.snapshot()
+        print(f"{'流':<22}{'方向':<6}{'包':>10}{'转发':>10}{'丢包':>8}{'突发丢':>8}{'队列丢':>8}"
+              f"{'乱序':>8}{'重复':>8}{'丢弃率':>9}", flush=True)
+        for flow in snap["flows"] + [{"name": "合计", **snap["totals"]}]:
+            for d in DIRECTIONS:
+                c = flow[d]
+                print(f"{flow['name'] if d == 'up' else '':<22}{d:<6}{c['packets']:>10}{c['forwarded']:>10}"
+                      f"{c['lost']:>8}{c['burst_lost']:>8}{c['queue_dropped']:>8}{c['reordered']:>8}"
+                      f"{c['duplicated']:>8}{c['loss_rate'] * 100:>8.2f}%", flush=True)
+
+def write_stats(proxy, path):
+    path = Path(path)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(proxy.snapshot(), indent=2, ensure_ascii=False))
+    tmp.replace(path)
+
+async def serve(args, params):
+    proxy = ImpairProxy(parse_address(args.listen), parse_address(args.upstream), params,
+                        seed=args.seed, idle_timeout=args.idle_timeout, quiet=args.quiet)
+    proxy.start()
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    last_stats = time.monotonic()
+    try:
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), 1.0)
+            except asyncio.TimeoutError:
+                pass
+            proxy.expire_idle()
+            if args.stats_file:
+                write_stats(proxy, args.stats_file)
+            if args.stats and time.monotonic() - last_stats >= args.stats:
+                last_stats = time.monotonic()
+                proxy.log(proxy.stats_line())
+    finally:
+        proxy.close()
+        if args.stats_file:
+            write_stats(proxy, args.stats_file)
+        if not args.quiet:
+            proxy.print_flows()
+
+def main():
+    parser = argparse.ArgumentParser(description="UDP 网络损伤代理（时延、抖动、丢包、突发丢包、乱序、重复、限速）")
+    parser.add_argument('--listen', help='监听地址 host:port（客户端的 server 地址改为这里）')
+    parser.add_argument('--upstream', help='server 的 UDP 地址 host:port（kcp / quic 端口）')
+    parser.add_argument('--profile', default='clean', help="损伤参数，如 wan、'lossy,loss=1%%'、'delay=20,up.rate=2000'")
+    parser.add_argument('--seed', type=int, help='随机数种子（相同种子和流量得到相同的丢包序列）')
+    parser.add_argument('--idle-timeout', type=float, default=120, help='流空闲多少秒后关闭对应的上游 socket')
+    parser.add_argument('--stats', type=float, default=0, help='每隔若干秒输出一行统计（0 为只在退出时输出）')
+    parser.add_argument('--stats-file', help='每秒和退出时写出 JSON 统计')
+    parser.add_argument('--quiet', action='store_true', help='只输出启动行')
+    parser.add_argument('--list-profiles', action='store_true', help='列出预设')
+    args = parser.parse_args()
+
+    if args.list_profiles:
+        for name in PROFILES:
+            print(f"{name:<12}{describe(parse_spec(name)['up'])}")
+        return 0
+    if not args.listen or not args.upstream:
+        parser.error("需要 --listen 和 --upstream")
+    try:
+        params = parse_spec(args.profile)
+    except ValueError as e:
+        parser.error(str(e))
+    asyncio.run(serve(args, params))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())